@@ -0,0 +1,109 @@
+BRAND_POSITIONS = ['pos1', 'pos2', 'pos3', 'pos4', 'pos5']
+# классы знаков в списках поиска: любая цифра и любой другой знак
+DIGIT_CLASS = '#'
+LETTER_CLASS = '*'
+
+
+def make_bitset(ids, size):
+    """
+    Битовое множество (целое число) из номеров ids в диапазоне [0, size).
+    """
+    data = bytearray((size + 7) // 8)
+    for i in ids:
+        data[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(data, 'little')
+
+
+def bitset_ids(bits, size):
+    """
+    Номера установленных битов по возрастанию.
+    """
+    ids = []
+    for byte_index, byte in enumerate(bits.to_bytes((size + 7) // 8, 'little')):
+        if byte:
+            for bit in range(8):
+                if byte >> bit & 1:
+                    ids.append((byte_index << 3) + bit)
+    return ids
+
+
+def bitset_count(bits):
+    # int.bit_count есть начиная с Python 3.10
+    return bits.bit_count() if hasattr(bits, 'bit_count') else bin(bits).count('1')
+
+
+class BrandIndex:
+    """
+    Инвертированный индекс знаков меток животных (AnimalNames.pos1..pos5) для поиска по известным знакам.
+
+    Для каждой позиции хранятся битовые множества номеров животных (номер - индекс в списке животных)
+    по значению знака и по классам DIGIT_CLASS / LETTER_CLASS. Пустые значения в множества не входят,
+    как и в прежнем поиске. Поиск по любому сочетанию позиций - пересечение нескольких множеств;
+    животные возвращаются в порядке исходного списка.
+    """
+    def __init__(self, animals):
+        self.animals = list(animals)
+        self.size = len(self.animals)
+        self.all = (1 << self.size) - 1
+        # позиция -> отсортированные значения знака (как в прежних списках поиска, вместе с пустыми)
+        self.values: dict[str, list] = {}
+        # позиция -> знак или класс -> битовое множество
+        self.bits: dict[str, dict] = {}
+
+        for pos in BRAND_POSITIONS:
+            ids = {}
+            digits = []
+            letters = []
+            for i, animal in enumerate(self.animals):
+                value = getattr(animal, pos)
+                ids.setdefault(value, []).append(i)
+                if value:
+                    (digits if str(value).isdigit() else letters).append(i)
+
+            self.values[pos] = sorted(ids)
+            self.bits[pos] = {}
+            for value, value_ids in ids.items():
+                if value:
+                    # знак сравнивается по строке, как текст списка поиска
+                    self.bits[pos][str(value)] = self.bits[pos].get(str(value), 0) | make_bitset(value_ids, self.size)
+            self.bits[pos][DIGIT_CLASS] = make_bitset(digits, self.size)
+            self.bits[pos][LETTER_CLASS] = make_bitset(letters, self.size)
+
+    def match(self, symbols):
+        """
+        Битовое множество животных, у которых совпадают знаки symbols (позиция -> знак, DIGIT_CLASS или
+        LETTER_CLASS). Позиции без знака (None) не ограничивают поиск.
+        """
+        result = self.all
+        for pos, symbol in symbols.items():
+            if symbol is None:
+                continue
+            result &= self.bits[pos].get(symbol, 0)
+            if not result:
+                break
+        return result
+
+    def search(self, symbols):
+        """
+        Животные, у которых совпадают знаки symbols, в порядке исходного списка.
+        """
+        return [self.animals[i] for i in bitset_ids(self.match(symbols), self.size)]
+
+    def counts(self, pos, symbols=None):
+        """
+        Количество животных по значениям знака и классам позиции pos среди животных, совпадающих
+        с остальными знаками symbols.
+        """
+        others = self.match({p: s for p, s in (symbols or {}).items() if p != pos})
+        return {symbol: bitset_count(bits & others) for symbol, bits in self.bits[pos].items()}
+
+    @staticmethod
+    def for_animals(animals):
+        """
+        Индекс списка животных animals. Для справочника (IndexedList) индекс строится один раз и хранится
+        вместе с его индексами поиска: изменение списка или invalidate() сбрасывает и его.
+        """
+        cached = getattr(animals, 'cached', None)
+        if cached is None:
+            return BrandIndex(animals)
+        return cached('brand_index', BrandIndex)
@@ -0,0 +1,52 @@
+from PyQt5 import QtGui
+from PyQt5.QtGui import QBrush, QColor, QConicalGradient
+
+from app.models.support_db import AnimalCategories
+
+
+def make_category_brush(category: AnimalCategories):
+    """
+    Создает кисть точки категории животного: конический градиент из цветов
+    color_representation_small и color_representation_large.
+    """
+    gradient = QConicalGradient()
+    start_color = QColor(category.color_representation_small)
+    end_color = QColor(category.color_representation_large)
+
+    gradient.setColorAt(0.0, start_color)
+    gradient.setColorAt(0.25, start_color.lighter())
+    gradient.setColorAt(0.5, start_color.darker())
+    gradient.setColorAt(0.75, end_color.darker())
+    gradient.setColorAt(1.0, end_color)
+    gradient.setSpread(QtGui.QGradient.RepeatSpread)
+
+    return QBrush(gradient)
+
+
+class CategoryBrushCache:
+    """
+    Кэш кистей точек по категориям животных.
+
+    Кисть создается один раз для пары (вид, категория) и используется всеми точками этой категории,
+    слой точек различает кисти по идентичности объекта. Запись сбрасывается только при изменении
+    цвета категории (ColorsDialog).
+    """
+    def __init__(self):
+        self._brushes: dict[tuple, QBrush] = {}
+
+    @staticmethod
+    def key(category: AnimalCategories):
+        return category.species, category.animal_category
+
+    def brush(self, category: AnimalCategories):
+        key = self.key(category)
+        brush = self._brushes.get(key)
+        if brush is None:
+            brush = self._brushes[key] = make_category_brush(category)
+        return brush
+
+    def invalidate(self, category: AnimalCategories):
+        self._brushes.pop(self.key(category), None)
+
+    def clear(self):
+        self._brushes.clear()
@@ -7,13 +7,15 @@ from app.controllers.items_file import ItemFile
 from app.controllers.support_lists import LocalSitesList, CountTypesList, ObserversList, AnimalCategoriesList, \
     AnimalStatusList, AnimalNamesList, AnimalInfoList
 from app.services.db_manager import SessionFactorySupport, SessionFactoryMain
+from app.services.point_queue import PointWriteQueue
 from app.services.user_settings import Settings
 from app.models.support_db import AnimalCategories, LocalSites, Observers, CountTypes, AnimalStatus, AnimalNames, \
     EffortTypes, AnimalInfo
 from app.services.main_style import style_sheet
 
 user_settings = Settings.instance()
-session_factory_main = SessionFactoryMain()
+point_queue = PointWriteQueue()
+session_factory_main = SessionFactoryMain(point_queue=point_queue)
 session_factory_support = SessionFactorySupport()
 support_session = session_factory_support.get_session()
 
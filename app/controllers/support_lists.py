@@ -1,11 +1,127 @@
 from PyQt5.QtCore import Qt
 
-from app.controllers.items_point import PointItem
+from app.controllers.items_point import PointHandle
 from app.models.support_db import LocalSites, CountTypes, Observers, AnimalCategories, AnimalStatus, AnimalNames, \
     AnimalInfo, Sites, Species
 
 
-class SitesList(list[Sites]):
+class IndexedList(list):
+    """
+    Список объектов справочника с поиском через словари.
+
+    Индекс строится при первом поиске по нему: словарь значение ключа -> первый объект списка с этим значением
+    (как при последовательном поиске next(...)). Функция ключей keys возвращает для объекта одно или несколько
+    значений, например идентификатор и имя для поиска по имени или идентификатору. Любое изменение самого
+    списка сбрасывает индексы и структуры cached(); после изменения атрибутов объектов списка нужно вызвать
+    invalidate().
+    """
+    _indexes: dict = None
+
+    def invalidate(self):
+        self._indexes = None
+
+    def _index(self, name, keys):
+        if self._indexes is None:
+            self._indexes = {}
+        index = self._indexes.get(name)
+        if index is None:
+            index = {}
+            for item in self:
+                for key in keys(item):
+                    if key is not None:
+                        index.setdefault(key, item)
+            self._indexes[name] = index
+        return index
+
+    def _groups(self, name, key):
+        """
+        Индекс значение ключа -> все объекты списка с этим значением (в порядке списка).
+        """
+        if self._indexes is None:
+            self._indexes = {}
+        groups = self._indexes.get(name)
+        if groups is None:
+            groups = {}
+            for item in self:
+                groups.setdefault(key(item), []).append(item)
+            self._indexes[name] = groups
+        return groups
+
+    def cached(self, name, build):
+        """
+        Производная структура списка (например, BrandIndex), построенная функцией build(список).
+        Хранится вместе с индексами поиска и сбрасывается вместе с ними.
+        """
+        if self._indexes is None:
+            self._indexes = {}
+        value = self._indexes.get(name)
+        if value is None:
+            value = build(self)
+            self._indexes[name] = value
+        return value
+
+    def _find(self, name, keys, value):
+        index = self._index(name, keys)
+        try:
+            return index.get(value)
+        except TypeError:
+            # нехешируемое значение не может совпасть с ключом справочника
+            return None
+
+    def append(self, item):
+        self._indexes = None
+        super().append(item)
+
+    def extend(self, items):
+        self._indexes = None
+        super().extend(items)
+
+    def insert(self, index, item):
+        self._indexes = None
+        super().insert(index, item)
+
+    def remove(self, item):
+        self._indexes = None
+        super().remove(item)
+
+    def pop(self, index=-1):
+        self._indexes = None
+        return super().pop(index)
+
+    def clear(self):
+        self._indexes = None
+        super().clear()
+
+    def sort(self, *args, **kwargs):
+        self._indexes = None
+        super().sort(*args, **kwargs)
+
+    def reverse(self):
+        self._indexes = None
+        super().reverse()
+
+    def __setitem__(self, index, item):
+        self._indexes = None
+        super().__setitem__(index, item)
+
+    def __delitem__(self, index):
+        self._indexes = None
+        super().__delitem__(index)
+
+    def __iadd__(self, items):
+        self._indexes = None
+        return super().__iadd__(items)
+
+    def __imul__(self, n):
+        self._indexes = None
+        return super().__imul__(n)
+
+
+def lower(value):
+    return value.lower() if value is not None else None
+
+
+class SitesList(IndexedList, list[Sites]):
     """
 
     Класс SitesList
@@ -19,21 +135,13 @@ class SitesList(list[Sites]):
     """
 
     def itemFromId(self, id_site: int):
-        try:
-            result = next(x for x in self if x.site == id_site)
-        except StopIteration:
-            result = None
-        return result
+        return self._find('site', lambda x: (x.site,), id_site)
 
     def itemFromName(self, name_site: str):
-        try:
-            result = next(x for x in self if x.site_name == name_site)
-        except StopIteration:
-            result = None
-        return result
+        return self._find('site_name', lambda x: (x.site_name,), name_site)
 
 
-class LocalSitesList(list[LocalSites]):
+class LocalSitesList(IndexedList, list[LocalSites]):
     """
     Класс LocalSitesList является подклассом встроенного класса list и содержит коллекцию объектов LocalSites.
     Он предоставляет методы для извлечения объектов LocalSites на основе различных критериев.
@@ -50,37 +158,20 @@ class LocalSitesList(list[LocalSites]):
     """
 
     def itemFromName(self, name: str):
-        try:
-            result = next(x for x in self if x.local_site_name == name)
-        except StopIteration:
-            result = None
-        return result
+        return self._find('local_site_name', lambda x: (x.local_site_name,), name)
 
     def itemFromId(self, id_name: str):
-        try:
-            result = next(x for x in self if x.local_site_id == id_name)
-        except StopIteration:
-            result = None
-        return result
+        return self._find('local_site_id', lambda x: (x.local_site_id,), id_name)
 
     def itemFromNameOrId(self, value: str):
-        try:
-            result = next(x for x in self if x.local_site_id == value or x.local_site_name == value)
-        except StopIteration:
-            result = None
-        return result
+        return self._find('local_site', lambda x: (x.local_site_id, x.local_site_name), value)
 
     def itemFromNameOrIdAndSite(self, nameOrId: str, site: int):
-        try:
-            result = next(
-                x for x in self if (x.local_site_id == nameOrId or x.local_site_name == nameOrId) and x.site == site)
-        except StopIteration:
-            result = None
-
-        return result
+        return self._find('local_site_and_site', lambda x: ((x.local_site_id, x.site), (x.local_site_name, x.site)),
+                          (nameOrId, site))
 
 
-class CountTypesList(list[CountTypes]):
+class CountTypesList(IndexedList, list[CountTypes]):
     """
     Класс CountTypesList
     Подкласс встроенного класса list, который представляет собой список объектов CountTypes.
@@ -93,21 +184,13 @@ class CountTypesList(list[CountTypes]):
     """
 
     def itemFromName(self, name: str):
-        try:
-            result = next(x for x in self if x.description == name)
-        except StopIteration:
-            result = None
-        return result
+        return self._find('description', lambda x: (x.description,), name)
 
     def itemFromId(self, id_name: str):
-        try:
-            result = next(x for x in self if x.type_id == id_name)
-        except StopIteration:
-            result = None
-        return result
+        return self._find('type_id', lambda x: (x.type_id,), id_name)
 
 
-class ObserversList(list[Observers]):
+class ObserversList(IndexedList, list[Observers]):
     """
     Класс ObserversList является подклассом встроенного класса list в Python.
     Он представляет собой список объектов Observers, которые предполагается имеют свойства 'observer_name' и 'observer'.
@@ -121,21 +204,13 @@ class ObserversList(list[Observers]):
     """
 
     def itemFromName(self, name: str):
-        try:
-            result = next(x for x in self if x.observer_name == name)
-        except StopIteration:
-            result = None
-        return result
+        return self._find('observer_name', lambda x: (x.observer_name,), name)
 
     def itemFromId(self, id_name: str):
-        try:
-            result = next(x for x in self if x.observer == id_name)
-        except StopIteration:
-            result = None
-        return result
+        return self._find('observer', lambda x: (x.observer,), id_name)
 
 
-class AnimalCategoriesList(list[AnimalCategories]):
+class AnimalCategoriesList(IndexedList, list[AnimalCategories]):
     """
     Класс, представляющий список объектов AnimalCategories.
     Методы: - itemFromName(name: str): Возвращает первый объект AnimalCategories в списке с указанным именем.
@@ -143,14 +218,10 @@ class AnimalCategoriesList(list[AnimalCategories]):
     """
 
     def itemFromName(self, name: str):
-        try:
-            result = next(x for x in self if x.animal_category == name)
-        except StopIteration:
-            result = None
-        return result
+        return self._find('animal_category', lambda x: (x.animal_category,), name)
 
 
-class AnimalStatusList(list[AnimalStatus]):
+class AnimalStatusList(IndexedList, list[AnimalStatus]):
     """
     Класс, представляющий список объектов AnimalStatus. Наследуется от встроенного класса list.
     Методы:
@@ -159,14 +230,10 @@ class AnimalStatusList(list[AnimalStatus]):
     """
 
     def itemFromName(self, name: str):
-        try:
-            result = next(x for x in self if x.status == name)
-        except StopIteration:
-            result = None
-        return result
+        return self._find('status', lambda x: (x.status,), name)
 
 
-class AnimalNamesList(list[AnimalNames]):
+class AnimalNamesList(IndexedList, list[AnimalNames]):
     """
     Класс, представляющий список имен животных.
     Класс AnimalNamesList расширяет встроенный класс list для хранения объектов типа AnimalNames.
@@ -176,14 +243,10 @@ class AnimalNamesList(list[AnimalNames]):
     """
 
     def itemFromName(self, name: str):
-        try:
-            result = next(x for x in self if x.animal_name == name)
-        except StopIteration:
-            result = None
-        return result
+        return self._find('animal_name', lambda x: (x.animal_name,), name)
 
 
-class AnimalInfoList(list[AnimalInfo]):
+class AnimalInfoList(IndexedList, list[AnimalInfo]):
     """
     Класс AnimalInfoList предоставляет реализацию списка, специально разработанную для хранения и
     манипулирования объектами AnimalInfo.
@@ -195,23 +258,17 @@ class AnimalInfoList(list[AnimalInfo]):
     """
 
     def itemFromId(self, infoId: str):
-        try:
-            result = next(x for x in self if str(x.info_id).lower() == infoId.lower())
-        except StopIteration:
-            result = None
-        return result
+        return self._find('info_id', lambda x: (str(x.info_id).lower(),), infoId.lower())
 
     def itemsFromSex(self, sex_name: str):
-        result = []
         try:
-            result = list(filter(lambda x: str(x.applicable_sex).lower() == sex_name.lower(), self))
+            groups = self._groups('applicable_sex', lambda x: str(x.applicable_sex).lower())
+            return list(groups.get(sex_name.lower(), []))
         except Exception:
-            result = []
-        finally:
-            return result
+            return []
 
 
-class SpeciesList(list[Species]):
+class SpeciesList(IndexedList, list[Species]):
     """
     Класс для представления списка видов животных.
     Наследуется от встроенного класса list и указывает, что элементы в списке имеют тип Species.
@@ -222,27 +279,19 @@ class SpeciesList(list[Species]):
     """
 
     def itemFromNameOrId(self, nameOrId: str):
-
-        try:
-            result = next(
-                x for x in self if (x.species.lower() == nameOrId.lower() or
-                                    x.species_name.lower() == nameOrId.lower()))
-        except StopIteration:
-            result = None
-
-        return result
+        return self._find('species', lambda x: (lower(x.species), lower(x.species_name)), nameOrId.lower())
 
 
-class PointsList(list[PointItem]):
+class PointsList(list[PointHandle]):
     """
-    Класс, представляющий список объектов PointItem.
+    Класс, представляющий список объектов PointHandle.
     Этот класс расширяет встроенный класс list, чтобы предоставить дополнительную функциональность
-    для работы с объектами PointItem.
-    Методы: - itemFromData(data: object) -> PointItem: Возвращает объект PointItem из списка,
+    для работы с объектами PointHandle.
+    Методы: - itemFromData(data: object) -> PointHandle: Возвращает объект PointHandle из списка,
     который имеет указанные данные.
     """
 
-    def itemFromData(self, data: object) -> PointItem:
+    def itemFromData(self, data: object) -> PointHandle:
         try:
             result = next(x for x in self if x.data(Qt.UserRole) == data)
         except StopIteration:
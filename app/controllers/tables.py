@@ -12,14 +12,38 @@ class PandasTableModel(QtGui.QStandardItemModel):
         QtGui.QStandardItemModel.__init__(self, parent)
         self.__readonly_cols = []
         self._data = data
+        # строки вставлялись после создания: заголовки строк - номера по порядку, а не индекс data
+        self._inserted = False
 
         for row in data.values.tolist():
             data_row = [QtGui.QStandardItem("{}".format(x)) for x in row]
             self.appendRow(data_row)
         return
 
-    def rowCount(self, parent=None):
-        return len(self._data.values)
+    def rowCount(self, parent=QModelIndex()):
+        # количество строк ведет QStandardItemModel: оно меняется между сигналами начала и конца вставки
+        return QtGui.QStandardItemModel.rowCount(self, parent)
+
+    def insertFrame(self, row, data):
+        """
+        Вставляет строки data (те же столбцы) перед строкой row. Уже показанные строки не пересоздаются,
+        поэтому сортировка и прокрутка представления сохраняются. Вставленные строки нумеруются по порядку.
+        Строки вставляются одной операцией, а значения ячеек передаются представлениям одним сигналом
+        dataChanged: сортирующая прокси-модель пересортирует строки один раз, а не на каждую ячейку.
+        """
+        rows = data.values.tolist()
+        if not rows:
+            return
+        self._inserted = True
+        self.insertRows(row, len(rows))
+        blocked = self.blockSignals(True)
+        try:
+            for i, values in enumerate(rows):
+                for column, x in enumerate(values):
+                    self.setItem(row + i, column, QtGui.QStandardItem("{}".format(x)))
+        finally:
+            self.blockSignals(blocked)
+        self.dataChanged.emit(self.index(row, 0), self.index(row + len(rows) - 1, self.columnCount() - 1))
 
     def columnCount(self, parent=None):
         return self._data.columns.size
@@ -28,6 +52,8 @@ class PandasTableModel(QtGui.QStandardItemModel):
         if orientation == Qt.Horizontal and role == Qt.DisplayRole:
             return self._data.columns[x]
         if orientation == Qt.Vertical and role == Qt.DisplayRole:
+            if self._inserted:
+                return x + 1
             return self._data.index[x] + 1
         return None
 
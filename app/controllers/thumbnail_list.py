@@ -0,0 +1,146 @@
+from collections import OrderedDict
+
+from PyQt5.QtCore import QObject, Qt, QTimer, QSize, QPoint
+from PyQt5.QtGui import QIcon, QPixmap, QColor, QImage, QKeySequence
+from PyQt5.QtWidgets import QListWidget, QListView, QShortcut
+
+from app.services.thumbnails import ThumbnailLoader, THUMBNAIL_SIZE
+from app.services.user_settings import Settings
+
+# количество иконок, которые хранятся в памяти для одного списка
+MAX_ICONS = 1000
+
+
+def item_data_path(item):
+    """
+    Путь к файлу из данных элемента списка (ItemFile в Qt.UserRole)
+    """
+    data = item.data(Qt.UserRole)
+    return getattr(data, 'path', None) if data else None
+
+
+class ThumbnailListController(QObject):
+    """
+    Режим миниатюр для списка фотографий.
+
+    Переключает QListWidget между текстовым списком и режимом иконок (Ctrl+T), состояние сохраняется
+    в настройках. Миниатюры запрашиваются только для видимых строк, после прокрутки с небольшой задержкой,
+    и загружаются ThumbnailLoader в фоне из хранилища миниатюр проекта.
+    """
+    def __init__(self, list_widget: QListWidget, settings_key, path_for_item=item_data_path, size=THUMBNAIL_SIZE):
+        super().__init__(list_widget)
+        self.list_widget = list_widget
+        self.settings_key = settings_key
+        self.path_for_item = path_for_item
+        self.size = size
+
+        self.loader = ThumbnailLoader(size, self)
+        self.loader.thumbnailReady.connect(self._thumbnail_ready)
+
+        self._icons: OrderedDict[str, QIcon] = OrderedDict()
+        self._rows: dict[str, int] = {}
+
+        placeholder = QPixmap(size, size)
+        placeholder.fill(QColor(60, 60, 60))
+        self._placeholder = QIcon(placeholder)
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(60)
+        self.timer.timeout.connect(self.update_visible)
+
+        self.list_widget.verticalScrollBar().valueChanged.connect(self.timer.start)
+        self.list_widget.model().rowsInserted.connect(self.timer.start)
+        self.list_widget.model().modelReset.connect(self.timer.start)
+
+        self.shortcut = QShortcut(QKeySequence("Ctrl+T"), self.list_widget)
+        self.shortcut.setContext(Qt.WidgetWithChildrenShortcut)
+        self.shortcut.activated.connect(self.toggle)
+
+        settings = Settings.instance()
+        self.enabled = settings.contains(settings_key) and str(settings.value(settings_key)).lower() == 'true'
+        self._apply_mode()
+
+    def toggle(self):
+        self.setEnabled(not self.enabled)
+
+    def setEnabled(self, value):
+        self.enabled = value
+        Settings.instance().setValue(self.settings_key, value)
+        self._apply_mode()
+
+    def _apply_mode(self):
+        lw = self.list_widget
+        if self.enabled:
+            lw.setViewMode(QListView.IconMode)
+            lw.setMovement(QListView.Static)
+            lw.setResizeMode(QListView.Adjust)
+            lw.setIconSize(QSize(self.size, self.size))
+            lw.setGridSize(QSize(self.size + 24, self.size + 36))
+            lw.setWordWrap(True)
+            lw.setUniformItemSizes(True)
+            lw.setLayoutMode(QListView.Batched)
+            lw.setBatchSize(200)
+            self.timer.start()
+        else:
+            self.loader.cancel()
+            lw.setViewMode(QListView.ListMode)
+            lw.setGridSize(QSize())
+            lw.setIconSize(QSize())
+            lw.setWordWrap(False)
+            lw.setLayoutMode(QListView.SinglePass)
+            for row in range(lw.count()):
+                lw.item(row).setIcon(QIcon())
+
+    def _visible_rows(self):
+        lw = self.list_widget
+        if not lw.count():
+            return range(0)
+        rect = lw.viewport().rect()
+        first = lw.indexAt(QPoint(1, 1))
+        last = lw.indexAt(rect.bottomRight() - QPoint(1, 1))
+        first_row = first.row() if first.isValid() else 0
+        last_row = last.row() if last.isValid() else lw.count() - 1
+        return range(first_row, last_row + 1)
+
+    def update_visible(self):
+        """
+        Устанавливает иконки видимым строкам и запрашивает недостающие миниатюры.
+        """
+        if not self.enabled:
+            return
+
+        self._rows.clear()
+        missing = []
+        for row in self._visible_rows():
+            item = self.list_widget.item(row)
+            path = self.path_for_item(item)
+            if not path:
+                continue
+            icon = self._icons.get(path)
+            if icon is not None:
+                item.setIcon(icon)
+                continue
+            item.setIcon(self._placeholder)
+            self._rows[path] = row
+            missing.append(path)
+
+        if missing:
+            self.loader.request(missing)
+
+    def _thumbnail_ready(self, path, data):
+        icon = self._placeholder
+        if data:
+            image = QImage.fromData(data, 'JPG')
+            if not image.isNull():
+                icon = QIcon(QPixmap.fromImage(image))
+
+        self._icons[path] = icon
+        while len(self._icons) > MAX_ICONS:
+            self._icons.popitem(last=False)
+
+        row = self._rows.pop(path, None)
+        if self.enabled and row is not None and row < self.list_widget.count():
+            item = self.list_widget.item(row)
+            if self.path_for_item(item) == path:
+                item.setIcon(icon)
@@ -1,10 +1,12 @@
-from PyQt5.QtCore import Qt, QRectF, pyqtSignal, QPoint
-from PyQt5.QtGui import QBrush, QFont, QPixmap, QColor, QPen
-from PyQt5.QtWidgets import QGraphicsView, QGraphicsPixmapItem, QGraphicsScene, QFrame, QGraphicsRectItem
+from PyQt5.QtCore import Qt, QRectF, pyqtSignal, QPoint, QRect, QSize, QEvent
+from PyQt5.QtGui import QBrush, QFont, QColor, QPen, QImage
+from PyQt5.QtWidgets import QGraphicsView, QGraphicsScene, QFrame, QGraphicsRectItem, QRubberBand, QMenu, QToolTip
 
-from app.controllers.items_point import PointItem
+from app.controllers.items_point import PointHandle
 from app.controllers.support_lists import PointsList
-from app.services.helpers import open_image_to_pixmap
+from app.custom_widgets.points_overlay import PointsOverlayItem
+from app.custom_widgets.tiled_image_item import TiledImageItem
+from app.services.helpers import open_image_to_qimage, open_image_preview
 
 ZOOM_IN_FACTOR = 1.25
 ZOOM_OUT_FACTOR = 0.8
@@ -21,14 +23,17 @@ class ImageViewer(QGraphicsView):
     - newPoint: Сигнал, который посылается при создании новой точки на видах. Он передает позицию
     новой точки в виде QPoint.
     - selectedPoints: Сигнал, который посылается при выборе одной или нескольких точек на видах. Он передает список
-    выбранных точек в виде списка объектов PointItem.
+    выбранных точек в виде списка объектов PointHandle.
     - deletePointsInParent: Сигнал, который посылается при активации операции удаления точек.
     - movePoint: Сигнал, который посылается при перемещении точки по видам. Он передает перемещенную точку
-    как объект PointItem.
+    как объект PointHandle.
+
+    Все точки рисуются одним элементом PointsOverlayItem, поиск точки под курсором и выделение рамкой
+    выполняются через его пространственную сетку.
 
     Методы:
     - __init__(self): Конструктор класса, инициализирует основные параметры и переменные, создает объекты
-    QGraphicsPixmapItem, QGraphicsScene и настраивает интерфейс.
+    TiledImageItem, QGraphicsScene и настраивает интерфейс.
 
     - initUI(self): Настройка интерфейса виджета, устанавливает определенные свойства для QGraphicsView.
 
@@ -46,6 +51,8 @@ class ImageViewer(QGraphicsView):
 
     - setPhoto(self, file_path, factor=None): Загружает фото из файла и подгоняет его.
 
+    - setImage(self, image, factor=None): Устанавливает уже декодированное изображение QImage и подгоняет его.
+
     - clearAllRects(self): Удаляет все прямоугольники из сцены.
 
     - drawRect(self, rect: QRectF): Рисует прямоугольник на сцене.
@@ -54,6 +61,8 @@ class ImageViewer(QGraphicsView):
 
     - addPoint: Добавляет точку на сцену.
 
+    - pointAt(self, pos): Возвращает точку под позицией курсора.
+
     - removedPointFromContextMenu: Обрабатывает удаление точек из контекстного меню.
 
     - selectPoints(self, rows): Выделяет точки с определенными данными.
@@ -74,6 +83,8 @@ class ImageViewer(QGraphicsView):
 
     - mouseReleaseEvent(self, event): Обрабатывает событие отпускания кнопки мыши.
 
+    - selectPointsInRect(self, rect): Выделяет точки рамкой.
+
     - view_magnifier(self, pos): Отображает увеличенное изображение в магнифаере.
 
     - font: Свойство для получения/установки шрифта.
@@ -86,13 +97,13 @@ class ImageViewer(QGraphicsView):
     newPoint = pyqtSignal(QPoint)
     selectedPoints = pyqtSignal(list)
     deletePointsInParent = pyqtSignal()
-    movePoint = pyqtSignal(PointItem)
+    movePoint = pyqtSignal(object)
 
     def __init__(self):
         super().__init__()
         self.initUI()
 
-        self.photo = QGraphicsPixmapItem()
+        self.photo = TiledImageItem()
 
         self.scene = QGraphicsScene(self)
         self.scene.addItem(self.photo)
@@ -107,10 +118,15 @@ class ImageViewer(QGraphicsView):
         self._font: QFont = QFont("Arial", self.sizePoint, QFont.Normal)
         self._visibleTextPoint: bool = True
 
-        # контейнер для хранения точек
-        self.points: PointsList[PointItem] = PointsList()
+        # слой точек и контейнер для хранения точек
+        self.overlay = PointsOverlayItem(self._size_point)
+        self.overlay.setZValue(1)
+        self.scene.addItem(self.overlay)
+        self.points: PointsList[PointHandle] = PointsList()
 
         self.active_point = None
+        self.rubberBand = QRubberBand(QRubberBand.Rectangle, self.viewport())
+        self.rubberBandOrigin = None
 
         # состояния
         self.isPanning = False
@@ -139,19 +155,13 @@ class ImageViewer(QGraphicsView):
         self.scene.update()
 
     def changeColorPoint(self, text, color):
-        for item in self.points:
-            if item.text == text:
-                item.color = color
-        self.scene.update()
+        self.overlay.setCategoryBrush(text, color)
 
     def visiblePoint(self, text, value):
-        for item in self.points:
-            if item.text == text:
-                item.setVisible(value)
-        self.scene.update()
+        self.overlay.setCategoryVisible(text, value)
 
     def recalculateSceneRect(self):
-        rect = QRectF(self.photo.pixmap().rect())
+        rect = self.photo.imageRect()
         self.setSceneRect(rect)
 
     def fitInView(self, rect=None, factor=None, flags=Qt.IgnoreAspectRatio):
@@ -160,7 +170,7 @@ class ImageViewer(QGraphicsView):
         """
         if not rect:
             # получаем rectangle сцены
-            rect = QRectF(self.photo.pixmap().rect())
+            rect = self.photo.imageRect()
 
         if not rect.isNull():
             self.setSceneRect(rect)
@@ -180,11 +190,17 @@ class ImageViewer(QGraphicsView):
     def setPhoto(self, file_path, factor=None):
         self.scene_clear()
 
-        # загружаем фото из файла
-        pixmap = open_image_to_pixmap(file_path)
+        # загружаем фото из файла и добавляем в сцену
+        self.photo.setImage(open_image_to_qimage(file_path))
+        self.overlay.setImageRect(self.photo.imageRect())
 
-        # добавляем в сцену
-        self.photo.setPixmap(pixmap)
+        # обновляем вид
+        self.fitInView(factor=factor)
+
+    def setImage(self, image: QImage, factor=None):
+        self.scene_clear()
+        self.photo.setImage(image)
+        self.overlay.setImageRect(self.photo.imageRect())
 
         # обновляем вид
         self.fitInView(factor=factor)
@@ -203,52 +219,64 @@ class ImageViewer(QGraphicsView):
         self.scene.addItem(rectItem)
 
     def scene_clear(self):
-        self.removePoints(self.points.copy())
+        self.points.clear()
+        self.overlay.clear()
+        self.active_point = None
         self.setDragMode(QGraphicsView.NoDrag)
-        self.photo.setPixmap(QPixmap())
+        self.photo.setPyramid(None)
+        self.overlay.setImageRect(QRectF())
 
     def addPoint(self, pos, text, data=None, tooltip=None, color=QColor('#FF0000')):
 
-        point = PointItem(parent=self, text=text, color=color, size=self.sizePoint)
-        point.setPos(pos)
+        point = PointHandle(overlay=self.overlay, text=text, color=color)
+        point.index = self.overlay.addPoint(point, pos.x(), pos.y(), text, color)
         point.setToolTip(tooltip)
-        point.textVisible = self.visibleTextPoint
 
         if data:
             point.setData(Qt.UserRole, data)
 
-        self.scene.addItem(point)
         self.points.append(point)
 
+    def pointAt(self, pos):
+        """
+        Возвращает точку под позицией pos в координатах виджета или None.
+        """
+        index = self.overlay.pointAt(self.mapToScene(pos), self.transform().m11())
+        if index is None:
+            return None
+        return self.overlay.handles[index]
+
     def removedPointFromContextMenu(self, point):
         self.selectedPoints.emit([point])
         self.deletePointsInParent.emit()
 
     def selectPoints(self, rows):
-        self.scene.clearSelection()
+        self.overlay.clearSelection()
+        points = {}
+        for point in self.points:
+            points.setdefault(id(point.data(Qt.UserRole)), []).append(point)
         for data in rows:
-            for point in self.points:
-                if data == point.data(Qt.UserRole):
-                    point.setSelected(True)
+            for point in points.get(id(data), []):
+                point.setSelected(True)
 
     def removePoints(self, points):
-        for point in points:
-            self.removePoint(point)
+        removed = {id(x) for x in points}
+        self.overlay.removePoints([x.index for x in self.points if id(x) in removed])
+        self.points[:] = [x for x in self.points if id(x) not in removed]
 
     def removePoint(self, point):
-        if point in self.points:
-            self.points.remove(point)
-            self.scene.removeItem(point)
+        self.removePoints([point])
 
     def setPixmap(self, pixmap, factor=None):
         self.scene_clear()
         self.photo.setPixmap(pixmap)
+        self.overlay.setImageRect(self.photo.imageRect())
 
         # обновляем вид
         self.fitInView(factor=factor)
 
     def get_zoom(self):
-        rect = QRectF(self.photo.pixmap().rect())
+        rect = self.photo.imageRect()
         zoom = self.transform().mapRect(rect)
         if rect.isNull():
             res = 0
@@ -308,10 +336,15 @@ class ImageViewer(QGraphicsView):
                 self.newPoint.emit(point)
 
             else:
-                point = self.itemAt(pos)
-                if isinstance(point, PointItem):
+                point = self.pointAt(pos)
+                if point:
                     self.selectedPoints.emit([point])
                     self.active_point = point
+                else:
+                    # выделение точек рамкой
+                    self.rubberBandOrigin = pos
+                    self.rubberBand.setGeometry(QRect(pos, QSize()))
+                    self.rubberBand.show()
 
         if event.button() == 4:
             if self.isMagnifier:
@@ -332,6 +365,10 @@ class ImageViewer(QGraphicsView):
                 self.active_point.setPos(self.active_point.pos() + diff)
                 event.accept()
 
+        if self.rubberBandOrigin is not None and event.buttons() == Qt.LeftButton:
+            self.rubberBand.setGeometry(QRect(self.rubberBandOrigin, event.pos()).normalized())
+            event.accept()
+
         if self.isMagnifier:
             self.view_magnifier(event.pos())
         elif self.isMousePressed and self.isPanning and not self.isMagnifier:
@@ -350,16 +387,18 @@ class ImageViewer(QGraphicsView):
             data = self.active_point.data(Qt.UserRole)
             y = self.active_point.pos().y()
             x = self.active_point.pos().x()
-            if (data.iTop, data.iLeft) != (
-                    y, x) and self.photo.pixmap().height() >= y >= 0 and self.photo.pixmap().width() >= x >= 0:
+            rect = self.photo.imageRect()
+            if (data.iTop, data.iLeft) != (y, x) and rect.height() >= y >= 0 and rect.width() >= x >= 0:
                 self.movePoint.emit(self.active_point)
             else:
                 self.active_point.setPos(QPoint(data.iLeft, data.iTop))
             self.active_point = None
+        if self.rubberBandOrigin is not None and event.button() == Qt.LeftButton:
+            self.selectPointsInRect(self.rubberBand.geometry())
         if event.button() == 4:
             self.isMagnifier = False
             self.isMousePressed = False
-            self.magnifier.photo.setPixmap(QPixmap())
+            self.magnifier.photo.setPyramid(None)
             self.magnifier.close()
         if event.button() == Qt.RightButton:
             self.isPanning = False
@@ -367,11 +406,50 @@ class ImageViewer(QGraphicsView):
             self.setCursor(Qt.ArrowCursor)
         super(ImageViewer, self).mouseReleaseEvent(event)
 
+    def selectPointsInRect(self, rect: QRect):
+        """
+        Выделяет точки, попавшие в рамку rect (координаты виджета), и передает их в selectedPoints.
+        """
+        self.rubberBand.hide()
+        self.rubberBandOrigin = None
+        if rect.width() < 3 and rect.height() < 3:
+            return
+
+        self.overlay.clearSelection()
+        scene_rect = self.mapToScene(rect).boundingRect()
+        points = [self.overlay.handles[i] for i in self.overlay.pointsInRect(scene_rect)]
+        for point in points:
+            point.setSelected(True)
+        self.selectedPoints.emit(points)
+
+    def contextMenuEvent(self, event):
+        point = self.pointAt(event.pos())
+        if not point:
+            super(ImageViewer, self).contextMenuEvent(event)
+            return
+
+        menu = QMenu()
+        menu.addAction("Remove Point", lambda: self.removedPointFromContextMenu(point))
+        menu.exec_(event.globalPos())
+        event.accept()
+
+    def viewportEvent(self, event):
+        if event.type() == QEvent.ToolTip:
+            point = self.pointAt(event.pos())
+            if point and point.toolTip():
+                QToolTip.showText(event.globalPos(), point.toolTip(), self)
+            else:
+                QToolTip.hideText()
+            return True
+        return super(ImageViewer, self).viewportEvent(event)
+
     def view_magnifier(self, pos):
         if not self.magnifier:
             return
         pos_map = self.mapToScene(pos).toPoint()
-        self.magnifier.photo.setPixmap(self.photo.pixmap())
+        # лупа использует ту же пирамиду тайлов, что и основной вид
+        if self.magnifier.photo.pyramid is not self.photo.pyramid:
+            self.magnifier.photo.setPyramid(self.photo.pyramid)
         self.magnifier.setSceneRect(pos_map.x() - 200, pos_map.y() - 200, self.magnifier.geometry().width(),
                                     self.magnifier.geometry().height())
 
@@ -400,8 +478,7 @@ class ImageViewer(QGraphicsView):
     def font(self, value):
         if self._font != value:
             self._font = value
-            for item in self.points:
-                item.setPointFont(value)
+            self.overlay.setPointFont(value)
 
     @property
     def sizePoint(self):
@@ -411,8 +488,7 @@ class ImageViewer(QGraphicsView):
     def sizePoint(self, value):
         if self._size_point != value:
             self._size_point = value
-            for item in self.points:
-                item.setPointSize(value)
+            self.overlay.setPointSize(value)
 
     @property
     def visibleTextPoint(self):
@@ -422,8 +498,7 @@ class ImageViewer(QGraphicsView):
     def visibleTextPoint(self, value):
         if self._visibleTextPoint != value:
             self._visibleTextPoint = value
-            for item in self.points:
-                item.textVisible = value
+            self.overlay.setTextVisible(value)
 
 
 class PreviewImageViewer(ImageViewer):
@@ -441,11 +516,16 @@ class PreviewImageViewer(ImageViewer):
         - tooltip (str): Дополнительный текст всплывающей подсказки, который будет отображаться при наведении на
         точку (необязательно). - color (str): Дополнительный цвет для точки (необязательно).
     - get_zoom(): Этот метод возвращает текущий уровень увеличения в просмотрщике изображений.
+    - setPreview(file_path): Загружает фото в разрешении, достаточном для текущего размера окна просмотра.
 
     """
     def __init__(self):
         super().__init__()
 
+    def setPreview(self, file_path):
+        size = self.viewport().size() * self.devicePixelRatioF()
+        self.setImage(open_image_preview(file_path, (size.width(), size.height())))
+
     def addPoint(self, pos, text, data=None, tooltip=None, color=None):
         pass
 
@@ -468,6 +548,6 @@ class Magnifier(QGraphicsView):
 
         self.scale(3, 3)
         self.scene = QGraphicsScene()
-        self.photo = QGraphicsPixmapItem()
+        self.photo = TiledImageItem()
         self.scene.addItem(self.photo)
         self.setScene(self.scene)
\ No newline at end of file
@@ -0,0 +1,333 @@
+import numpy as np
+from PyQt5.QtCore import Qt, QRectF, QPointF
+from PyQt5.QtGui import QBrush, QPen, QFont, QTransform
+from PyQt5.QtWidgets import QGraphicsItem
+
+# размер ячейки пространственной сетки в пикселях изображения
+GRID_CELL = 256
+
+
+class PointsOverlayItem(QGraphicsItem):
+    """
+    Единый элемент сцены, который рисует все точки учета.
+
+    Координаты точек, индексы кисти и категории, флаги видимости и выделения хранятся в массивах NumPy,
+    а номера точек разложены по ячейкам пространственной сетки. При отрисовке выбираются только точки
+    из ячеек, попадающих в открытую область, кисти общие для точек с одинаковым цветом.
+    Точки рисуются в пикселях экрана, как элементы с флагом ItemIgnoresTransformations:
+    размер точки и текста не зависит от масштаба.
+    Через сетку выполняются поиск точки под курсором и выделение рамкой.
+    """
+    def __init__(self, size=10, parent=None):
+        super().__init__(parent)
+        self.size = size
+        self.font = QFont("Arial", size, QFont.Normal)
+        self.textVisible = True
+        self.imageRect = QRectF()
+
+        self.handles: list = []
+        self._x = np.zeros(0, dtype=np.float64)
+        self._y = np.zeros(0, dtype=np.float64)
+        self._category = np.zeros(0, dtype=np.int32)
+        self._brush = np.zeros(0, dtype=np.int32)
+        self._visible = np.zeros(0, dtype=bool)
+        self._selected = np.zeros(0, dtype=bool)
+        self._alive = np.zeros(0, dtype=bool)
+        self._count = 0
+
+        self.categories: list[str] = []
+        self._category_index: dict[str, int] = {}
+        self.brushes: list[QBrush] = []
+        self.pens: list[QPen] = []
+        self._brush_ids: dict[int, int] = {}
+        self._brush_sources: list = []
+        self._grid: dict[tuple, set] = {}
+
+    # --- хранение ---
+
+    def _grow(self):
+        capacity = max(64, len(self._x) * 2)
+        for name in ('_x', '_y', '_category', '_brush', '_visible', '_selected', '_alive'):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def categoryId(self, text):
+        index = self._category_index.get(text)
+        if index is None:
+            index = self._category_index[text] = len(self.categories)
+            self.categories.append(text)
+        return index
+
+    def brushId(self, brush):
+        """
+        Номер кисти в таблице кистей слоя. Кисти из кэша (CategoryBrushCache) находятся по идентичности
+        объекта без сравнения градиентов, перо для подписи создается один раз на кисть.
+        """
+        index = self._brush_ids.get(id(brush))
+        if index is not None:
+            return index
+
+        value = QBrush(brush)
+        index = next((i for i, item in enumerate(self.brushes) if item == value), None)
+        if index is None:
+            index = len(self.brushes)
+            self.brushes.append(value)
+            self.pens.append(QPen(value, 0, Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin))
+
+        # исходный объект сохраняется, чтобы его id не был переиспользован
+        self._brush_ids[id(brush)] = index
+        self._brush_sources.append(brush)
+        return index
+
+    @staticmethod
+    def _cell(x, y):
+        return int(x // GRID_CELL), int(y // GRID_CELL)
+
+    def addPoint(self, handle, x, y, text, brush):
+        if self._count == len(self._x):
+            self._grow()
+
+        index = self._count
+        self._count += 1
+        self._x[index] = x
+        self._y[index] = y
+        self._category[index] = self.categoryId(text)
+        self._brush[index] = self.brushId(brush)
+        self._visible[index] = True
+        self._selected[index] = False
+        self._alive[index] = True
+        self.handles.append(handle)
+        self._grid.setdefault(self._cell(x, y), set()).add(index)
+
+        self.prepareGeometryChange()
+        return index
+
+    def removePoints(self, indices):
+        for index in indices:
+            if not self._alive[index]:
+                continue
+            self._alive[index] = False
+            self._selected[index] = False
+            self._grid.get(self._cell(self._x[index], self._y[index]), set()).discard(index)
+            self.handles[index] = None
+        self.update()
+
+    def clear(self):
+        self.prepareGeometryChange()
+        self.handles = []
+        self._count = 0
+        self._alive[:] = False
+        self._selected[:] = False
+        self._grid.clear()
+        self.brushes.clear()
+        self.pens.clear()
+        self._brush_ids.clear()
+        self._brush_sources.clear()
+
+    def movePoint(self, index, x, y):
+        old_cell = self._cell(self._x[index], self._y[index])
+        new_cell = self._cell(x, y)
+        if old_cell != new_cell:
+            self._grid.get(old_cell, set()).discard(index)
+            self._grid.setdefault(new_cell, set()).add(index)
+        self._x[index] = x
+        self._y[index] = y
+        self.prepareGeometryChange()
+
+    def position(self, index):
+        return QPointF(self._x[index], self._y[index])
+
+    def setPointCategory(self, index, text):
+        self._category[index] = self.categoryId(text)
+        self.update()
+
+    def pointCategory(self, index):
+        return self.categories[self._category[index]]
+
+    def setPointBrush(self, index, brush):
+        self._brush[index] = self.brushId(brush)
+        self.update()
+
+    def pointBrush(self, index):
+        return self.brushes[self._brush[index]]
+
+    def setCategoryBrush(self, text, brush):
+        if text not in self._category_index:
+            return
+        mask = self._category[:self._count] == self._category_index[text]
+        self._brush[:self._count][mask] = self.brushId(brush)
+        self.update()
+
+    def setPointVisible(self, index, value):
+        self._visible[index] = value
+        self.update()
+
+    def isPointVisible(self, index):
+        return bool(self._visible[index])
+
+    def setCategoryVisible(self, text, value):
+        if text not in self._category_index:
+            return
+        mask = self._category[:self._count] == self._category_index[text]
+        self._visible[:self._count][mask] = value
+        self.update()
+
+    def setPointSelected(self, index, value):
+        self._selected[index] = value and self._alive[index]
+        self.update()
+
+    def isPointSelected(self, index):
+        return bool(self._selected[index])
+
+    def clearSelection(self):
+        self._selected[:] = False
+        self.update()
+
+    def setPointSize(self, size):
+        self.size = size
+        self.font = QFont("Arial", size, QFont.Normal)
+        self.prepareGeometryChange()
+
+    def setPointFont(self, font):
+        self.font = font
+        self.update()
+
+    def setTextVisible(self, value):
+        self.textVisible = value
+        self.update()
+
+    def setImageRect(self, rect: QRectF):
+        self.prepareGeometryChange()
+        self.imageRect = QRectF(rect)
+
+    # --- геометрия ---
+
+    def _extent(self):
+        """
+        Максимальный размер подписи точки в пикселях экрана.
+        """
+        length = max((len(x) for x in self.categories), default=0) + 1 if self.textVisible else 1
+        return length * self.size + self.size * 2
+
+    def _pointRect(self, index):
+        """
+        Прямоугольник точки в пикселях экрана относительно ее центра (вместе с подписью).
+        """
+        cords_factor = self.size * 0.5
+        length_text = 1
+        height_factor = self.size * 0.3
+        if self.textVisible:
+            length_text = len(self.categories[self._category[index]]) + 1
+            height_factor = self.size
+        return QRectF(-cords_factor, -cords_factor, length_text * self.size, height_factor + self.size * 0.8)
+
+    def _candidates(self, rect: QRectF):
+        """
+        Номера живых и видимых точек из ячеек сетки, пересекающих прямоугольник сцены rect.
+        """
+        left, top = self._cell(rect.left(), rect.top())
+        right, bottom = self._cell(rect.right(), rect.bottom())
+        if (right - left + 1) * (bottom - top + 1) > len(self._grid):
+            cells = [v for k, v in self._grid.items() if left <= k[0] <= right and top <= k[1] <= bottom]
+        else:
+            cells = [self._grid[(cx, cy)] for cx in range(left, right + 1) for cy in range(top, bottom + 1)
+                     if (cx, cy) in self._grid]
+        if not cells:
+            return np.zeros(0, dtype=np.int64)
+
+        indices = np.fromiter((i for cell in cells for i in cell), dtype=np.int64)
+        return indices[self._alive[indices] & self._visible[indices]]
+
+    def pointsInRect(self, rect: QRectF):
+        """
+        Номера видимых точек, центры которых лежат в прямоугольнике сцены rect.
+        """
+        rect = rect.normalized()
+        indices = self._candidates(rect)
+        x, y = self._x[indices], self._y[indices]
+        mask = (x >= rect.left()) & (x <= rect.right()) & (y >= rect.top()) & (y <= rect.bottom())
+        return np.sort(indices[mask]).tolist()
+
+    def pointAt(self, pos: QPointF, scale):
+        """
+        Номер верхней (последней добавленной) точки, прямоугольник которой содержит точку сцены pos, или None.
+        scale - масштаб вида (пикселей экрана на пиксель изображения).
+        """
+        if scale <= 0:
+            return None
+        margin = self._extent() / scale
+        indices = self._candidates(QRectF(pos.x() - margin, pos.y() - margin, margin * 2, margin * 2))
+        for index in sorted(indices.tolist(), reverse=True):
+            local = QPointF((pos.x() - self._x[index]) * scale, (pos.y() - self._y[index]) * scale)
+            if self._pointRect(index).contains(local):
+                return index
+        return None
+
+    def boundingRect(self):
+        # подписи точек рисуются в пикселях экрана и при малом масштабе выходят далеко за точку,
+        # поэтому область элемента берется с запасом в размер изображения
+        rect = self.imageRect
+        if self._count:
+            alive = self._alive[:self._count]
+            if alive.any():
+                x, y = self._x[:self._count][alive], self._y[:self._count][alive]
+                rect = rect.united(QRectF(x.min(), y.min(), x.max() - x.min() + 1, y.max() - y.min() + 1))
+        margin = max(rect.width(), rect.height(), GRID_CELL)
+        return rect.adjusted(-margin, -margin, margin, margin)
+
+    # --- отрисовка ---
+
+    def paint(self, painter, option, widget=None):
+        if not self._count:
+            return
+
+        transform = painter.worldTransform()
+        scale = option.levelOfDetailFromTransform(transform)
+        if scale <= 0:
+            return
+
+        margin = self._extent() / scale
+        exposed = option.exposedRect.adjusted(-margin, -margin, margin, margin)
+        indices = self._candidates(exposed)
+        if not len(indices):
+            return
+        indices.sort()
+
+        # координаты центров точек в пикселях экрана
+        device_x = transform.m11() * self._x[indices] + transform.m21() * self._y[indices] + transform.dx()
+        device_y = transform.m12() * self._x[indices] + transform.m22() * self._y[indices] + transform.dy()
+
+        cords_factor = self.size * 0.5
+        painter.save()
+        painter.setFont(self.font)
+        current_brush = -1
+        selected_pen = QPen(Qt.white, 2, Qt.DashLine)
+
+        for index, px, py in zip(indices.tolist(), device_x.tolist(), device_y.tolist()):
+            painter.setTransform(QTransform.fromTranslate(px, py))
+
+            brush_id = self._brush[index]
+            if brush_id != current_brush:
+                current_brush = brush_id
+                brush = self.brushes[brush_id]
+                pen = self.pens[brush_id]
+
+            # рисуем точку
+            painter.setPen(QPen())
+            painter.setBrush(brush)
+            painter.drawEllipse(QRectF(-cords_factor, -cords_factor, self.size, self.size))
+
+            if self.textVisible:
+                # рисуем текст
+                painter.setPen(pen)
+                painter.drawText(QPointF(cords_factor, self.size), self.categories[self._category[index]])
+
+            # рисуем выделение точки
+            if self._selected[index]:
+                painter.setBrush(Qt.NoBrush)
+                painter.setPen(selected_pen)
+                painter.drawRect(self._pointRect(index))
+
+        painter.restore()
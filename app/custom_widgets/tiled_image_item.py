@@ -0,0 +1,133 @@
+import math
+from collections import OrderedDict
+
+from PyQt5.QtCore import Qt, QRectF
+from PyQt5.QtGui import QImage, QPixmap, QPainter
+from PyQt5.QtWidgets import QGraphicsItem, QStyleOptionGraphicsItem
+
+# размер стороны тайла в пикселях уровня
+TILE_SIZE = 512
+# максимальное количество тайлов, которые хранятся в виде QPixmap
+MAX_TILES = 192
+
+
+class ImagePyramid:
+    """
+    Многоуровневая пирамида изображения.
+
+    Уровень 0 - исходное изображение, каждый следующий уровень в два раза меньше предыдущего,
+    пока большая сторона не станет меньше размера тайла. Уровни строятся лениво при первом обращении,
+    тайлы нарезаются по требованию и хранятся в ограниченном LRU-кэше QPixmap.
+    Одна пирамида может использоваться несколькими TiledImageItem (основной вид и лупа).
+    """
+    def __init__(self, image: QImage):
+        self.levels: list[QImage] = [image]
+        self.width = image.width()
+        self.height = image.height()
+
+        side = max(self.width, self.height)
+        self.level_count = 1
+        while side > TILE_SIZE:
+            side //= 2
+            self.level_count += 1
+
+        self._tiles: OrderedDict[tuple, QPixmap] = OrderedDict()
+
+    def rect(self):
+        return QRectF(0, 0, self.width, self.height)
+
+    def level_for_scale(self, scale):
+        """
+        Возвращает уровень, у которого один пиксель занимает не меньше одного пикселя экрана при масштабе scale.
+        """
+        if scale <= 0 or scale >= 1:
+            return 0
+        return min(int(math.floor(math.log2(1 / scale))), self.level_count - 1)
+
+    def level(self, index):
+        while len(self.levels) <= index:
+            prev = self.levels[-1]
+            self.levels.append(prev.scaled(max(1, prev.width() // 2), max(1, prev.height() // 2),
+                                           Qt.IgnoreAspectRatio, Qt.SmoothTransformation))
+        return self.levels[index]
+
+    def tile(self, level, tx, ty):
+        key = (level, tx, ty)
+        pixmap = self._tiles.get(key)
+        if pixmap is not None:
+            self._tiles.move_to_end(key)
+            return pixmap
+
+        image = self.level(level)
+        x, y = tx * TILE_SIZE, ty * TILE_SIZE
+        width, height = min(TILE_SIZE, image.width() - x), min(TILE_SIZE, image.height() - y)
+        if width <= 0 or height <= 0:
+            return QPixmap()
+
+        pixmap = QPixmap.fromImage(image.copy(x, y, width, height))
+        self._tiles[key] = pixmap
+        while len(self._tiles) > MAX_TILES:
+            self._tiles.popitem(last=False)
+        return pixmap
+
+
+class TiledImageItem(QGraphicsItem):
+    """
+    Элемент сцены, отображающий изображение по тайлам пирамиды.
+
+    При отрисовке выбирается уровень пирамиды по текущему масштабу и рисуются только тайлы,
+    попадающие в открытую область (exposedRect), поэтому масштабирование и прокрутка не требуют
+    пересчета всего изображения. Координаты сцены всегда соответствуют пикселям исходного изображения.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pyramid: ImagePyramid | None = None
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption, True)
+
+    def setPyramid(self, pyramid):
+        self.prepareGeometryChange()
+        self.pyramid = pyramid
+        self.update()
+
+    def setImage(self, image: QImage):
+        self.setPyramid(None if image is None or image.isNull() else ImagePyramid(image))
+
+    def setPixmap(self, pixmap: QPixmap):
+        self.setImage(None if pixmap.isNull() else pixmap.toImage())
+
+    def imageRect(self):
+        if self.pyramid is None:
+            return QRectF()
+        return self.pyramid.rect()
+
+    def boundingRect(self):
+        return self.imageRect()
+
+    def paint(self, painter, option: QStyleOptionGraphicsItem, widget=None):
+        if self.pyramid is None:
+            return
+
+        scale = option.levelOfDetailFromTransform(painter.worldTransform())
+        level = self.pyramid.level_for_scale(scale)
+        factor = 2 ** level
+        tile_size = TILE_SIZE * factor
+
+        exposed = option.exposedRect.intersected(self.imageRect())
+        if exposed.isEmpty():
+            return
+
+        if scale * factor != 1:
+            painter.setRenderHint(QPainter.SmoothPixmapTransform, True)
+
+        left = int(exposed.left() // tile_size)
+        right = int(math.ceil(exposed.right() / tile_size))
+        top = int(exposed.top() // tile_size)
+        bottom = int(math.ceil(exposed.bottom() / tile_size))
+
+        for ty in range(top, bottom):
+            for tx in range(left, right):
+                pixmap = self.pyramid.tile(level, tx, ty)
+                if pixmap.isNull():
+                    continue
+                target = QRectF(tx * tile_size, ty * tile_size, pixmap.width() * factor, pixmap.height() * factor)
+                painter.drawPixmap(target, pixmap, QRectF(pixmap.rect()))
@@ -10,7 +10,9 @@ from app.custom_widgets.image_viewer import PreviewImageViewer
 from app.custom_widgets.list_widget_drag_and_drop import DragDropListWidget
 from app.models.main_db import CountEffortTypes
 from app.controllers.items_file import ItemFile
+from app.controllers.thumbnail_list import ThumbnailListController
 from app.services.helpers import select_project_folders, search_path_photo
+from app.services.photo_index import PhotoIndex
 from app.view.ui_dialog_add_count_photos import Ui_add_photos_count_dialog
 
 
@@ -100,6 +102,9 @@ class AddPhotosDialog(QtWidgets.QDialog):
 
         self.sourcePhotos.move_item_complete.connect(self.move_item_complete)
 
+        # режим миниатюр списка фотографий (Ctrl+T)
+        self.thumbnails_source = ThumbnailListController(self.sourcePhotos, "ThumbnailsSourcePhotos")
+
         # Создаем обработчики событий клавиатуры для копирования и вставки
         self.copy_shortcut = QShortcut(QKeySequence.Copy, self.sourcePhotos)
         self.paste_shortcut = QShortcut(QKeySequence.Paste, self.addedPhotos)
@@ -137,6 +142,12 @@ class AddPhotosDialog(QtWidgets.QDialog):
         copy.triggered.connect(self.copy_selected_items)
         menu.addAction(copy)
 
+        thumbnails = QtWidgets.QAction('Thumbnails', menu)
+        thumbnails.setCheckable(True)
+        thumbnails.setChecked(self.thumbnails_source.enabled)
+        thumbnails.triggered.connect(self.thumbnails_source.setEnabled)
+        menu.addAction(thumbnails)
+
         menu.exec(self.sourcePhotos.mapToGlobal(point))
 
     def context_menu_added_photos(self, point):
@@ -241,29 +252,23 @@ class AddPhotosDialog(QtWidgets.QDialog):
             self.selected_directory = d
 
             if os.path.isdir(d + "/" + day):
-                for dirs, folders, files in os.walk(str(os.path.join(d, day))):
-
-                    files.sort()
-                    sources = files
-
-                    if str(self.countType.folder).lower() == 'opp':
-                        sources = folders
+                # в режиме opp источниками служат папки внутри дня, иначе файлы
+                folders_mode = str(self.countType.folder).lower() == 'opp'
+                sources = [x.name for x in PhotoIndex.for_root(d).entries(day) if x.is_dir == folders_mode]
 
-                    for item in sources:
+                for item in sources:
 
-                        item_file = ItemFile()
-                        item_file.fileName = item
-                        item_file.path = f'{d}/{day}/{item}'
+                    item_file = ItemFile()
+                    item_file.fileName = item
+                    item_file.path = f'{d}/{day}/{item}'
 
-                        lw_item = QListWidgetItem('%s' % item)
-                        lw_item.setData(Qt.UserRole, item_file)
+                    lw_item = QListWidgetItem('%s' % item)
+                    lw_item.setData(Qt.UserRole, item_file)
 
-                        if self.addedPhotos.findItems(str(item), Qt.MatchFixedString | Qt.MatchRecursive):
-                            lw_item.setForeground(QColor('#FF0000'))
+                    if self.addedPhotos.findItems(str(item), Qt.MatchFixedString | Qt.MatchRecursive):
+                        lw_item.setForeground(QColor('#FF0000'))
 
-                        self.sourcePhotos.addItem(lw_item)
-
-                    break
+                    self.sourcePhotos.addItem(lw_item)
         except Exception as ex:
             QMessageBox.warning(self, 'Exception', ex.args[0])
 
@@ -280,13 +285,10 @@ class AddPhotosDialog(QtWidgets.QDialog):
             if str(self.countType.folder).lower() in str(p[0]).lower():
                 m_params.model_directories.appendRow(item)
 
-                for dirs, folders, files in os.walk(os.path.join(path)):
-                    folders.sort()
-                    for f in folders:
-                        i = QStandardItem(f)
+                for f in PhotoIndex.for_root(path).day_folders():
+                    i = QStandardItem(f)
 
-                        item.appendRow(i)
-                    break
+                    item.appendRow(i)
         if len(drivers) > 0:
             m_params.model_directories.setHeaderData(0, Qt.Horizontal, " ")
             self.ui.treeView_directories.setModel(m_params.model_directories)
@@ -321,5 +323,4 @@ class AddPhotosDialog(QtWidgets.QDialog):
         data = item.data(Qt.UserRole)
         if data.path:
             self.ui.groupBox.setTitle(data.path)
-            pix_map = QPixmap(data.path)
-            self.view.setPixmap(pix_map)
+            self.view.setPreview(data.path)
@@ -2,10 +2,17 @@ import sqlalchemy as db
 from pyinstaller_versionfile.exceptions import ValidationError
 from sqlalchemy import ForeignKeyConstraint, DDL, event
 
-from sqlalchemy.orm import relationship, declarative_base
+from sqlalchemy.orm import relationship, declarative_base, object_session, Session
 
 Base = declarative_base()  # базовый класс для декларативных моделей
 
+# суррогатные ключи (миграция 2): не входят в as_dict, отчеты и выгрузки видят только естественные столбцы.
+# Таблицы точек ссылаются на файл учета и дневную запись по source_id / daily_id, но хранят и копию
+# естественного ключа: по нему точки выбирают окна, очередь записи, отчеты по чужим файлам и кэш отчетов,
+# а ORM API моделей не меняется. Вместо составного первичного ключа из 8-10 столбцов у точек уникальный
+# индекс (source_id, iLeft, iTop), а внешний ключ проверяется по целочисленному id.
+SURROGATE_KEYS = ('id', 'source_id', 'daily_id')
+
 
 class SurveyEffort(Base):
     __tablename__ = "survey_effort"
@@ -33,14 +40,18 @@ class CountList(Base):
             ['r_year', 'site', 'species'],
             ['survey_effort.r_year', 'survey_effort.site', 'survey_effort.species'],
             onupdate="CASCADE", ondelete="CASCADE"
-        ),)
-
-    r_year = db.Column(db.Integer, primary_key=True, nullable=False)
-    site = db.Column(db.Integer, primary_key=True, nullable=False)
-    r_date = db.Column(db.Integer, primary_key=True, nullable=False)
-    time_start = db.Column(db.String(collation='NOCASE'), primary_key=True, nullable=False)
-    creator = db.Column(db.String(collation='NOCASE'), primary_key=True, nullable=False)
-    species = db.Column(db.String(collation='NOCASE'), primary_key=True, nullable=False)
+        ),
+        db.UniqueConstraint('r_year', 'site', 'r_date', 'time_start', 'creator', 'species', name='uq_count_list'),
+    )
+
+    # суррогатный ключ учета
+    id = db.Column(db.Integer, primary_key=True)
+    r_year = db.Column(db.Integer, nullable=False)
+    site = db.Column(db.Integer, nullable=False)
+    r_date = db.Column(db.Integer, nullable=False)
+    time_start = db.Column(db.String(collation='NOCASE'), nullable=False)
+    creator = db.Column(db.String(collation='NOCASE'), nullable=False)
+    species = db.Column(db.String(collation='NOCASE'), nullable=False)
     comments = db.Column(db.Text, default=None)
 
     datecreated = db.Column(db.String, default=db.func.now())
@@ -49,8 +60,10 @@ class CountList(Base):
     effort_types = relationship("CountEffortTypes", back_populates="count_list", cascade="all, delete-orphan")
     survey_effort = relationship("SurveyEffort", back_populates="count_list")
 
+    __mapper_args__ = {'primary_key': [r_year, site, r_date, time_start, creator, species]}
+
     def as_dict(self):
-        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
+        return {c.name: getattr(self, c.name) for c in self.__table__.columns if c.name not in SURROGATE_KEYS}
 
     def validate(self):
         validate_required(self)
@@ -180,18 +193,23 @@ class CountFiles(Base):
              'count_effort_types.time_start', 'count_effort_types.creator', 'count_effort_types.species',
              'count_effort_types.count_type'],
             onupdate="CASCADE", ondelete="CASCADE"
-        ),)
-
-    r_year = db.Column(db.Integer, primary_key=True, nullable=False)
-    site = db.Column(db.Integer, primary_key=True, nullable=False)
-    r_date = db.Column(db.Integer, primary_key=True, nullable=False)
-    time_start = db.Column(db.String, primary_key=True, nullable=False)
-    creator = db.Column(db.String(collation='NOCASE'), primary_key=True, nullable=False)
-    species = db.Column(db.String(collation='NOCASE'), primary_key=True, nullable=False)
+        ),
+        db.UniqueConstraint('r_year', 'site', 'r_date', 'time_start', 'creator', 'species', 'file_name', 'count_type',
+                            name='uq_count_source'),
+    )
+
+    # суррогатный ключ файла учета, на него ссылаются точки учета
+    id = db.Column(db.Integer, primary_key=True)
+    r_year = db.Column(db.Integer, nullable=False)
+    site = db.Column(db.Integer, nullable=False)
+    r_date = db.Column(db.Integer, nullable=False)
+    time_start = db.Column(db.String, nullable=False)
+    creator = db.Column(db.String(collation='NOCASE'), nullable=False)
+    species = db.Column(db.String(collation='NOCASE'), nullable=False)
     observer = db.Column(db.String(collation='NOCASE'), nullable=False)
     comments = db.Column(db.Text, default=None)
-    file_name = db.Column(db.String(collation='NOCASE'), primary_key=True, nullable=False)
-    count_type = db.Column(db.String(collation='NOCASE'), primary_key=True, nullable=False)
+    file_name = db.Column(db.String(collation='NOCASE'), nullable=False)
+    count_type = db.Column(db.String(collation='NOCASE'), nullable=False)
 
     datecreated = db.Column(db.String, default=db.func.now())
     dateupdated = db.Column(db.String, default=None, onupdate=db.func.now())
@@ -202,8 +220,10 @@ class CountFiles(Base):
 
     effort_types = relationship("CountEffortTypes", back_populates="count_files")
 
+    __mapper_args__ = {'primary_key': [r_year, site, r_date, time_start, creator, species, file_name, count_type]}
+
     def as_dict(self):
-        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
+        return {c.name: getattr(self, c.name) for c in self.__table__.columns if c.name not in SURROGATE_KEYS}
 
     def validate(self):
         validate_required(self)
@@ -213,35 +233,38 @@ class PointsCount(Base):
     __tablename__ = "count_pointscount"
 
     __table_args__ = (
-        ForeignKeyConstraint(
-            ['r_year', 'site', 'r_date', 'time_start', 'creator', 'species', 'file_name', 'count_type'],
-            ['count_source.r_year', 'count_source.site', 'count_source.r_date',
-             'count_source.time_start', 'count_source.creator', 'count_source.species',
-             'count_source.file_name', 'count_source.count_type'],
-            onupdate="CASCADE", ondelete="CASCADE"
-        ),)
-
-    r_year = db.Column(db.Integer, primary_key=True, nullable=False)
-    site = db.Column(db.Integer, primary_key=True, nullable=False)
-    r_date = db.Column(db.Integer, primary_key=True, nullable=False)
-    time_start = db.Column(db.String, primary_key=True, nullable=False)
-    creator = db.Column(db.String(collation='NOCASE'), primary_key=True, nullable=False)
-    species = db.Column(db.String(collation='NOCASE'), primary_key=True, nullable=False)
+        db.UniqueConstraint('source_id', 'iLeft', 'iTop', name='uq_count_pointscount'),
+        # выборка точек файла (load_points, get_view_other_animals)
+        db.Index('ix_count_pointscount_file', 'r_year', 'site', 'r_date', 'time_start', 'file_name', 'count_type',
+                 'species', 'creator'),
+    )
+
+    # файл учета (count_source.id); заполняется перед вставкой по естественному ключу
+    source_id = db.Column(db.Integer, db.ForeignKey('count_source.id', ondelete="CASCADE"), nullable=False)
+    r_year = db.Column(db.Integer, nullable=False)
+    site = db.Column(db.Integer, nullable=False)
+    r_date = db.Column(db.Integer, nullable=False)
+    time_start = db.Column(db.String, nullable=False)
+    creator = db.Column(db.String(collation='NOCASE'), nullable=False)
+    species = db.Column(db.String(collation='NOCASE'), nullable=False)
     observer = db.Column(db.String(collation='NOCASE'), nullable=False)
     local_site = db.Column(db.String(collation='NOCASE'), nullable=False)
     animal_category = db.Column(db.String(collation='NOCASE'), nullable=False)
-    iLeft = db.Column(db.Integer, primary_key=True, nullable=False)
-    iTop = db.Column(db.Integer, primary_key=True, nullable=False)
-    file_name = db.Column(db.String(collation='NOCASE'), primary_key=True, nullable=False)
-    count_type = db.Column(db.String(collation='NOCASE'), primary_key=True, nullable=False)
+    iLeft = db.Column(db.Integer, nullable=False)
+    iTop = db.Column(db.Integer, nullable=False)
+    file_name = db.Column(db.String(collation='NOCASE'), nullable=False)
+    count_type = db.Column(db.String(collation='NOCASE'), nullable=False)
 
     datecreated = db.Column(db.String, default=db.func.now())
     dateupdated = db.Column(db.String, default=None, onupdate=db.func.now())
 
     count_files = relationship("CountFiles", back_populates="points_count")
 
+    __mapper_args__ = {'primary_key': [r_year, site, r_date, time_start, creator, species, iLeft, iTop, file_name,
+                                       count_type]}
+
     def as_dict(self):
-        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
+        return {c.name: getattr(self, c.name) for c in self.__table__.columns if c.name not in SURROGATE_KEYS}
 
     def validate(self):
         validate_required(self)
@@ -251,35 +274,37 @@ class PatternCount(Base):
     __tablename__ = "count_patternscount"
 
     __table_args__ = (
-        ForeignKeyConstraint(
-            ['r_year', 'site', 'r_date', 'time_start', 'creator', 'species', 'file_name', 'count_type'],
-            ['count_source.r_year', 'count_source.site', 'count_source.r_date',
-             'count_source.time_start', 'count_source.creator', 'count_source.species',
-             'count_source.file_name', 'count_source.count_type'],
-            onupdate="CASCADE", ondelete="CASCADE"
-        ),)
-
-    r_year = db.Column(db.Integer, primary_key=True, nullable=False)
-    site = db.Column(db.Integer, primary_key=True, nullable=False)
-    r_date = db.Column(db.Integer, primary_key=True, nullable=False)
-    time_start = db.Column(db.String, primary_key=True, nullable=False)
-    creator = db.Column(db.String(collation='NOCASE'), primary_key=True, nullable=False)
-    species = db.Column(db.String(collation='NOCASE'), primary_key=True, nullable=False)
+        db.UniqueConstraint('source_id', 'iLeft', 'iTop', name='uq_count_patternscount'),
+        db.Index('ix_count_patternscount_file', 'r_year', 'site', 'r_date', 'time_start', 'file_name', 'count_type',
+                 'species', 'creator'),
+    )
+
+    # файл учета (count_source.id); заполняется перед вставкой по естественному ключу
+    source_id = db.Column(db.Integer, db.ForeignKey('count_source.id', ondelete="CASCADE"), nullable=False)
+    r_year = db.Column(db.Integer, nullable=False)
+    site = db.Column(db.Integer, nullable=False)
+    r_date = db.Column(db.Integer, nullable=False)
+    time_start = db.Column(db.String, nullable=False)
+    creator = db.Column(db.String(collation='NOCASE'), nullable=False)
+    species = db.Column(db.String(collation='NOCASE'), nullable=False)
     observer = db.Column(db.String(collation='NOCASE'), nullable=False)
     local_site = db.Column(db.String(collation='NOCASE'), nullable=False)
     animal_category = db.Column(db.String(collation='NOCASE'), nullable=False)
-    iLeft = db.Column(db.Integer, primary_key=True, nullable=False)
-    iTop = db.Column(db.Integer, primary_key=True, nullable=False)
-    file_name = db.Column(db.String(collation='NOCASE'), primary_key=True, nullable=False)
-    count_type = db.Column(db.String(collation='NOCASE'), primary_key=True, nullable=False)
+    iLeft = db.Column(db.Integer, nullable=False)
+    iTop = db.Column(db.Integer, nullable=False)
+    file_name = db.Column(db.String(collation='NOCASE'), nullable=False)
+    count_type = db.Column(db.String(collation='NOCASE'), nullable=False)
 
     datecreated = db.Column(db.String, default=db.func.now())
     dateupdated = db.Column(db.String, default=None, onupdate=db.func.now())
 
     count_files = relationship("CountFiles", back_populates="pattern_count")
 
+    __mapper_args__ = {'primary_key': [r_year, site, r_date, time_start, creator, species, iLeft, iTop, file_name,
+                                       count_type]}
+
     def as_dict(self):
-        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
+        return {c.name: getattr(self, c.name) for c in self.__table__.columns if c.name not in SURROGATE_KEYS}
 
     def validate(self):
         validate_required(self)
@@ -289,36 +314,38 @@ class GroupsCount(Base):
     __tablename__ = "count_groupscount"
 
     __table_args__ = (
-        ForeignKeyConstraint(
-            ['r_year', 'site', 'r_date', 'time_start', 'creator', 'species', 'file_name', 'count_type'],
-            ['count_source.r_year', 'count_source.site', 'count_source.r_date',
-             'count_source.time_start', 'count_source.creator', 'count_source.species',
-             'count_source.file_name', 'count_source.count_type'],
-            onupdate="CASCADE", ondelete="CASCADE"
-        ),)
-
-    r_year = db.Column(db.Integer, primary_key=True, nullable=False)
-    site = db.Column(db.Integer, primary_key=True, nullable=False)
-    r_date = db.Column(db.Integer, primary_key=True, nullable=False)
-    time_start = db.Column(db.String, primary_key=True, nullable=False)
-    creator = db.Column(db.String(collation='NOCASE'), primary_key=True, nullable=False)
-    species = db.Column(db.String(collation='NOCASE'), primary_key=True, nullable=False)
+        db.UniqueConstraint('source_id', 'local_site', 'animal_category', name='uq_count_groupscount'),
+        db.Index('ix_count_groupscount_file', 'r_year', 'site', 'r_date', 'time_start', 'file_name', 'count_type',
+                 'species', 'creator'),
+    )
+
+    # файл учета (count_source.id); заполняется перед вставкой по естественному ключу
+    source_id = db.Column(db.Integer, db.ForeignKey('count_source.id', ondelete="CASCADE"), nullable=False)
+    r_year = db.Column(db.Integer, nullable=False)
+    site = db.Column(db.Integer, nullable=False)
+    r_date = db.Column(db.Integer, nullable=False)
+    time_start = db.Column(db.String, nullable=False)
+    creator = db.Column(db.String(collation='NOCASE'), nullable=False)
+    species = db.Column(db.String(collation='NOCASE'), nullable=False)
     observer = db.Column(db.String(collation='NOCASE'), nullable=False)
-    local_site = db.Column(db.String(collation='NOCASE'), primary_key=True, nullable=False)
+    local_site = db.Column(db.String(collation='NOCASE'), nullable=False)
     time_s = db.Column(db.String, nullable=False)
     time_f = db.Column(db.String, nullable=True)
-    animal_category = db.Column(db.String(collation='NOCASE'), primary_key=True, nullable=False)
+    animal_category = db.Column(db.String(collation='NOCASE'), nullable=False)
     count = db.Column(db.Integer, nullable=False)
-    file_name = db.Column(db.String(collation='NOCASE'), primary_key=True, nullable=False)
-    count_type = db.Column(db.String(collation='NOCASE'), primary_key=True, nullable=False)
+    file_name = db.Column(db.String(collation='NOCASE'), nullable=False)
+    count_type = db.Column(db.String(collation='NOCASE'), nullable=False)
 
     datecreated = db.Column(db.String, default=db.func.now())
     dateupdated = db.Column(db.String, default=None, onupdate=db.func.now())
 
     count_files = relationship("CountFiles", back_populates="groups_count")
 
+    __mapper_args__ = {'primary_key': [r_year, site, r_date, time_start, creator, species, local_site, animal_category,
+                                       file_name, count_type]}
+
     def as_dict(self):
-        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
+        return {c.name: getattr(self, c.name) for c in self.__table__.columns if c.name not in SURROGATE_KEYS}
 
     def validate(self):
         validate_required(self)
@@ -333,12 +360,16 @@ class Resight(Base):
             ['r_year', 'site', 'species'],
             ['survey_effort.r_year', 'survey_effort.site', 'survey_effort.species'],
             onupdate="CASCADE", ondelete="CASCADE"
-        ),)
-
-    species = db.Column(db.String(collation='NOCASE'), primary_key=True, nullable=False)
-    r_year = db.Column(db.Integer, primary_key=True, nullable=False)
-    site = db.Column(db.Integer, primary_key=True, nullable=False)
-    animal_name = db.Column(db.String(collation='NOCASE'), primary_key=True, nullable=False)
+        ),
+        db.UniqueConstraint('species', 'r_year', 'site', 'animal_name', name='uq_id_resight'),
+    )
+
+    # суррогатный ключ животного
+    id = db.Column(db.Integer, primary_key=True)
+    species = db.Column(db.String(collation='NOCASE'), nullable=False)
+    r_year = db.Column(db.Integer, nullable=False)
+    site = db.Column(db.Integer, nullable=False)
+    animal_name = db.Column(db.String(collation='NOCASE'), nullable=False)
     brand_quality = db.Column(db.String(collation='NOCASE'))
     sex_r = db.Column(db.String(collation='NOCASE'), nullable=False)
     status = db.Column(db.String(collation='NOCASE'), nullable=False)
@@ -355,8 +386,10 @@ class Resight(Base):
 
 
 
+    __mapper_args__ = {'primary_key': [species, r_year, site, animal_name]}
+
     def as_dict(self):
-        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
+        return {c.name: getattr(self, c.name) for c in self.__table__.columns if c.name not in SURROGATE_KEYS}
 
     def validate(self):
         validate_required(self)
@@ -370,13 +403,19 @@ class Daily(Base):
             ['r_year', 'site', 'species', 'animal_name'],
             ['id_resight.r_year', 'id_resight.site', 'id_resight.species', 'id_resight.animal_name'],
             onupdate="CASCADE", ondelete="CASCADE"
-        ),)
-
-    species = db.Column(db.String(collation='NOCASE'), primary_key=True, nullable=False)
-    r_year = db.Column(db.Integer, primary_key=True, nullable=False)
-    site = db.Column(db.Integer, primary_key=True, nullable=False)
-    animal_name = db.Column(db.String(collation='NOCASE'), primary_key=True, nullable=False)
-    r_date = db.Column(db.Integer, primary_key=True, nullable=False)
+        ),
+        db.UniqueConstraint('species', 'r_year', 'site', 'animal_name', 'r_date', name='uq_id_daily'),
+        # выборка по дню (load_daily_report, load_dates_list)
+        db.Index('ix_id_daily_date', 'r_year', 'site', 'species', 'r_date'),
+    )
+
+    # суррогатный ключ дневной записи, на него ссылаются точки локаций
+    id = db.Column(db.Integer, primary_key=True)
+    species = db.Column(db.String(collation='NOCASE'), nullable=False)
+    r_year = db.Column(db.Integer, nullable=False)
+    site = db.Column(db.Integer, nullable=False)
+    animal_name = db.Column(db.String(collation='NOCASE'), nullable=False)
+    r_date = db.Column(db.Integer, nullable=False)
     status = db.Column(db.String(collation='NOCASE'), nullable=False)
     local_site = db.Column(db.String(collation='NOCASE'))
     comments = db.Column(db.Text)
@@ -389,8 +428,10 @@ class Daily(Base):
 
     location_table = relationship("Location", back_populates="daily_table", cascade="all, delete-orphan")
 
+    __mapper_args__ = {'primary_key': [species, r_year, site, animal_name, r_date]}
+
     def as_dict(self):
-        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
+        return {c.name: getattr(self, c.name) for c in self.__table__.columns if c.name not in SURROGATE_KEYS}
 
     def validate(self):
         validate_required(self)
@@ -400,24 +441,25 @@ class Location(Base):
     __tablename__ = "id_location"
 
     __table_args__ = (
-        ForeignKeyConstraint(
-            ['r_year', 'site', 'species', 'animal_name', 'r_date'],
-            ['id_daily.r_year', 'id_daily.site', 'id_daily.species', 'id_daily.animal_name', 'id_daily.r_date'],
-            onupdate="CASCADE", ondelete="CASCADE"
-        ),)
-
-    species = db.Column(db.String(collation='NOCASE'), primary_key=True, nullable=False)
-    r_year = db.Column(db.Integer, primary_key=True, nullable=False)
-    site = db.Column(db.Integer, primary_key=True, nullable=False)
-    animal_name = db.Column(db.String(collation='NOCASE'), primary_key=True, nullable=False)
-    r_date = db.Column(db.Integer, primary_key=True, nullable=False)
+        db.UniqueConstraint('daily_id', 'iLeft', 'iTop', 'file_name', name='uq_id_location'),
+        # точки дня и файла (load_done_location_files, LocationWindow.load_points)
+        db.Index('ix_id_location_date', 'r_year', 'site', 'species', 'r_date', 'file_name'),
+    )
+
+    # дневная запись (id_daily.id); заполняется перед вставкой по естественному ключу
+    daily_id = db.Column(db.Integer, db.ForeignKey('id_daily.id', ondelete="CASCADE"), nullable=False)
+    species = db.Column(db.String(collation='NOCASE'), nullable=False)
+    r_year = db.Column(db.Integer, nullable=False)
+    site = db.Column(db.Integer, nullable=False)
+    animal_name = db.Column(db.String(collation='NOCASE'), nullable=False)
+    r_date = db.Column(db.Integer, nullable=False)
     time_start = db.Column(db.String, nullable=False)
     local_site = db.Column(db.String(collation='NOCASE'))
     animal_type = db.Column(db.String(collation='NOCASE'), nullable=False)
-    iLeft = db.Column(db.Integer, primary_key=True, nullable=False)
-    iTop = db.Column(db.Integer, primary_key=True, nullable=False)
+    iLeft = db.Column(db.Integer, nullable=False)
+    iTop = db.Column(db.Integer, nullable=False)
     observer = db.Column(db.String(collation='NOCASE'), nullable=False)
-    file_name = db.Column(db.String(collation='NOCASE'), primary_key=True, nullable=False)
+    file_name = db.Column(db.String(collation='NOCASE'), nullable=False)
     type_photo = db.Column(db.String(collation='NOCASE'))
     is_prediction_point = db.Column(db.Integer, nullable=False)
 
@@ -426,8 +468,10 @@ class Location(Base):
 
     daily_table = relationship("Daily", back_populates="location_table")
 
+    __mapper_args__ = {'primary_key': [species, r_year, site, animal_name, r_date, iLeft, iTop, file_name]}
+
     def as_dict(self):
-        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
+        return {c.name: getattr(self, c.name) for c in self.__table__.columns if c.name not in SURROGATE_KEYS}
 
     def validate(self):
         validate_required(self)
@@ -467,7 +511,7 @@ def validate_required(parent):
     """
     Проверка заполнения ключей
     """
-    pKeys = parent.__table__.primary_key.columns.keys()
+    pKeys = [c.key for c in db.inspect(type(parent)).primary_key]
     for field in pKeys:
         if getattr(parent, field) is None:
             raise ValidationError(f"In the {parent.__table__} table, the {field} field  must be set! ")
@@ -492,3 +536,85 @@ count_effort_sites_AFTER_UPDATE = DDL('''
         END;''')
 
 event.listen(CountEffortSites.__table__, 'after_create', count_effort_sites_AFTER_UPDATE)
+
+
+def _natural_key_id(connection, table, target, columns):
+    """
+    id строки таблицы table с теми же значениями столбцов columns, что у target.
+    Найденные id запоминаются до конца сброса сессии: точки одного файла учета или дня, записанные вместе,
+    ищут строку владельца одним запросом.
+    """
+    session = object_session(target)
+    ids = session.info.setdefault('natural_key_ids', {}) if session is not None else {}
+    key = (table.name,) + tuple(getattr(target, name) for name in columns)
+    key_id = ids.get(key)
+    if key_id is None:
+        statement = db.select(table.c.id).where(*[table.c[name] == getattr(target, name) for name in columns])
+        key_id = connection.execute(statement).scalar()
+        if key_id is None:
+            raise ValidationError(f"In the {table} table, there is no row for the {target.__table__} row!")
+        ids[key] = key_id
+    return key_id
+
+
+@event.listens_for(Session, 'before_flush')
+def clear_natural_key_ids(session, flush_context, instances):
+    # строки владельцев могут удаляться и создаваться заново между сбросами (в том числе после неудачного сброса)
+    session.info.pop('natural_key_ids', None)
+
+
+@event.listens_for(PointsCount, 'before_insert')
+@event.listens_for(PatternCount, 'before_insert')
+@event.listens_for(GroupsCount, 'before_insert')
+def set_source_id(mapper, connection, target):
+    if target.source_id is None:
+        target.source_id = _natural_key_id(connection, CountFiles.__table__, target,
+                                           ['r_year', 'site', 'r_date', 'time_start', 'creator', 'species',
+                                            'file_name', 'count_type'])
+
+
+@event.listens_for(Location, 'before_insert')
+def set_daily_id(mapper, connection, target):
+    if target.daily_id is None:
+        target.daily_id = _natural_key_id(connection, Daily.__table__, target,
+                                          ['species', 'r_year', 'site', 'animal_name', 'r_date'])
+
+
+# точки хранят копию естественного ключа файла учета и дневной записи, при его изменении копия обновляется
+count_source_AFTER_UPDATE = DDL('''
+    CREATE TRIGGER count_source_AFTER_UPDATE
+                 AFTER UPDATE OF r_year, site, r_date, time_start, creator, species, file_name, count_type
+                    ON count_source
+              FOR EACH ROW
+        BEGIN
+            UPDATE count_pointscount
+               SET r_year = NEW.r_year, site = NEW.site, r_date = NEW.r_date, time_start = NEW.time_start,
+                   creator = NEW.creator, species = NEW.species, file_name = NEW.file_name,
+                   count_type = NEW.count_type
+             WHERE source_id = NEW.id;
+            UPDATE count_patternscount
+               SET r_year = NEW.r_year, site = NEW.site, r_date = NEW.r_date, time_start = NEW.time_start,
+                   creator = NEW.creator, species = NEW.species, file_name = NEW.file_name,
+                   count_type = NEW.count_type
+             WHERE source_id = NEW.id;
+            UPDATE count_groupscount
+               SET r_year = NEW.r_year, site = NEW.site, r_date = NEW.r_date, time_start = NEW.time_start,
+                   creator = NEW.creator, species = NEW.species, file_name = NEW.file_name,
+                   count_type = NEW.count_type
+             WHERE source_id = NEW.id;
+        END;''')
+
+id_daily_AFTER_UPDATE = DDL('''
+    CREATE TRIGGER id_daily_AFTER_UPDATE
+                 AFTER UPDATE OF species, r_year, site, animal_name, r_date
+                    ON id_daily
+              FOR EACH ROW
+        BEGIN
+            UPDATE id_location
+               SET species = NEW.species, r_year = NEW.r_year, site = NEW.site, animal_name = NEW.animal_name,
+                   r_date = NEW.r_date
+             WHERE daily_id = NEW.id;
+        END;''')
+
+event.listen(CountFiles.__table__, 'after_create', count_source_AFTER_UPDATE)
+event.listen(Daily.__table__, 'after_create', id_daily_AFTER_UPDATE)
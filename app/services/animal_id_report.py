@@ -0,0 +1,289 @@
+"""
+Отчет регистраций животных (AnimalIdReportWindow): чтение частей отчета и сборка листов.
+
+Часть отчета - файл базы, год и участок (ReportPart из count_report). Части читаются в пуле процессов
+отчетов (animal_id_report_part): строки выбираются запросами SQLAlchemy Core без объектов ORM и возвращаются
+таблицами pandas. Регистрации за год (Resight) и сведения о животных (AnimalInfo) кэшируются частью на файл
+базы, год и участок, ежедневные регистрации (Daily) - частью на день. При повторном отчете заново читаются
+только части, исходные строки которых изменились. Листы отчета собираются из таблиц всех частей один раз
+(animal_id_report_sheets).
+"""
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+
+from app.models.main_db import Resight, Daily, AnimalInfo, SURROGATE_KEYS
+from app.services.db_manager import create_readonly_engine
+from app.services.report_cache import ReportCache, report_context, table_fingerprints
+
+# ключ животного в таблицах частей отчета
+ANIMAL_KEY = ['species', 'r_year', 'site', 'animal_name']
+# сведения о животных, которые выносятся в столбцы листа Summary
+ANIMAL_INFO_TYPES = ["BiopsyTaken", "DatePupBirth", "MomPresence", "IsFocalFemale", "MomSuckling", "NursingJuvenile",
+                     "NursingPup", "PresenceJuvenile", "PupName", "PupSurvival"]
+
+RESIGHT_HEADER = ['Species', 'Year', 'Site', 'Animal Name', 'Brand Quality', 'Gender', 'Status',
+                  'Comment', 'IdStatus', 'Datecreated', 'Dateupdated', 'Time Seen', 'First Seen',
+                  'Last Seen', 'FirstSeenWithPup', 'NursingJuvenile', 'NursingPup', 'BiopsyTaken',
+                  'DatePupBirth', 'MomPresence', 'IsFocalFemale', 'MomSuckling', 'PresenceJuvenile',
+                  'PupName', 'PupSurvival', 'Age', 'Natal Rookery', 'Rookery Site']
+DAILY_HEADER = ['Species', 'Year', 'Site', 'Animal Name', 'Date', 'Status', 'Local Site Id', 'Comment',
+                'Observer', 'Date Created', 'Date Updated', 'Local Site Name']
+DAILY_SHEET = ['Species', 'Year', 'Site', 'Animal Name', 'Date', 'Status', 'Local Site Id',
+               'Local Site Name', 'Comment', 'Observer', 'Date Created', 'Date Updated']
+SUMMARY_SHEET = ['Species', 'Year', 'Site', 'Natal Rookery', 'Rookery Site', 'Animal Name', 'Age',
+                 'Brand Quality', 'Gender', 'Status', 'Comment', 'Time Seen', 'First Seen',
+                 'Last Seen', 'FirstSeenWithPup', 'NursingJuvenile', 'NursingPup', 'BiopsyTaken',
+                 'DatePupBirth', 'MomPresence', 'IsFocalFemale', 'MomSuckling', 'PresenceJuvenile',
+                 'PupName', 'PupSurvival', 'IdStatus', 'Datecreated', 'Dateupdated']
+
+
+def report_columns(model):
+    """
+    Столбцы таблицы модели model в отчете (как в as_dict: без суррогатных ключей).
+    """
+    return [column for column in model.__table__.columns if column.name not in SURROGATE_KEYS]
+
+
+def rows_frame(model, rows):
+    """
+    Таблица pandas из строк (кортежей значений report_columns) модели model.
+    """
+    return pd.DataFrame.from_records(rows, columns=[column.name for column in report_columns(model)])
+
+
+def concat_frames(frames):
+    """
+    Объединяет таблицы частей; пустые части не участвуют, чтобы не менять типы столбцов.
+    """
+    filled = [frame for frame in frames if len(frame)]
+    if not filled:
+        return frames[0]
+    return pd.concat(filled, ignore_index=True) if len(filled) > 1 else filled[0].reset_index(drop=True)
+
+
+def load_year_rows(connection, cache, db_file, model, kind, year, site, species):
+    """
+    Строки (кортежи значений report_columns) модели model за год year на участке site. Часть кэша - весь год.
+    """
+    where = {'r_year': year, 'site': site, 'species': species}
+    fingerprint = table_fingerprints(connection, model, where, []).get((), '')
+    key = (year, site, species)
+    context = report_context(kind, species)
+    rows = cache.get(db_file, kind, key, context, fingerprint) if cache else None
+    if rows is None:
+        table = model.__table__
+        query = select(*report_columns(model)).where(*[table.c[name] == value for name, value in where.items()])
+        rows = [tuple(row) for row in connection.execute(query)]
+        if cache:
+            cache.put(db_file, kind, key, context, fingerprint, rows)
+    return rows
+
+
+def load_daily_rows(connection, cache, db_file, year, site, species):
+    """
+    Ежедневные регистрации за год year на участке site по дням (по возрастанию даты, внутри дня в порядке
+    записи). Дни, которых нет в кэше или которые изменились, читаются одним запросом.
+    """
+    where = {'r_year': year, 'site': site, 'species': species}
+    fingerprints = table_fingerprints(connection, Daily, where, ['r_date'])
+    context = report_context('daily', species)
+
+    days = {}
+    changed = []
+    for (r_date,), fingerprint in fingerprints.items():
+        rows = cache.get(db_file, 'daily', (year, site, species, r_date), context, fingerprint) if cache else None
+        if rows is None:
+            changed.append(r_date)
+        else:
+            days[r_date] = rows
+
+    if changed:
+        for r_date in changed:
+            days[r_date] = []
+        table = Daily.__table__
+        columns = report_columns(Daily)
+        date_index = [column.name for column in columns].index('r_date')
+        query = select(*columns).where(*[table.c[name] == value for name, value in where.items()],
+                                       table.c.r_date.in_(changed)).order_by(table.c.id)
+        for row in connection.execute(query):
+            days[row[date_index]].append(tuple(row))
+        if cache:
+            for r_date in changed:
+                cache.put(db_file, 'daily', (year, site, species, r_date), context, fingerprints[(r_date,)],
+                          days[r_date])
+
+    return [row for r_date in sorted(days) for row in days[r_date]]
+
+
+def local_site_names(support_local_sites, site):
+    """
+    Названия локальных участков участка site по коду и по названию: первый локальный участок списка,
+    как в LocalSitesList.itemFromNameOrIdAndSite.
+    """
+    names = {}
+    for local_site in support_local_sites:
+        if local_site.site == site:
+            names.setdefault(local_site.local_site_id, local_site.local_site_name)
+            names.setdefault(local_site.local_site_name, local_site.local_site_name)
+    return names
+
+
+def animal_id_report_part(part, species, local_sites):
+    """
+    Читает часть отчета part (ReportPart) для вида species. local_sites - названия локальных участков
+    участка part.site (local_site_names). Возвращает таблицы регистраций за год, ежедневных регистраций
+    (с названием локального участка, если код есть в справочнике) и сведений о животных.
+    """
+    engine = create_readonly_engine(part.db_file)
+    cache = ReportCache.open()
+    try:
+        with engine.connect() as connection:
+            resight = load_year_rows(connection, cache, part.db_file, Resight, 'resight', part.year, part.site,
+                                     species)
+            daily = load_daily_rows(connection, cache, part.db_file, part.year, part.site, species)
+            animal_info = load_year_rows(connection, cache, part.db_file, AnimalInfo, 'animal_info', part.year,
+                                         part.site, species)
+    finally:
+        if cache:
+            cache.close()
+        engine.dispose()
+
+    daily_df = rows_frame(Daily, daily)
+    names = daily_df['local_site'].map(local_sites)
+    daily_df['local_site_name'] = names.where(names.notna(), daily_df['local_site'])
+    return rows_frame(Resight, resight), daily_df, rows_frame(AnimalInfo, animal_info)
+
+
+def resight_sheet(resight_df):
+    """
+    Лист Resight из таблицы регистраций за год.
+    """
+    return resight_df.set_axis(RESIGHT_HEADER[:len(resight_df.columns)], axis=1).fillna('')
+
+
+def daily_sheet(daily_df):
+    """
+    Лист Daily из таблицы ежедневных регистраций.
+    """
+    return daily_df.set_axis(DAILY_HEADER, axis=1)[DAILY_SHEET].fillna('')
+
+
+def truthy(series):
+    """
+    Маска непустых значений столбца (как проверка if value: пустые строки, 0, None и NaN - ложь).
+    """
+    return series.fillna(0).astype(bool)
+
+
+class DataProcessor:
+    """
+    Возраст, лежбище рождения и лежбище регистрации для строк регистраций за год resight_df.
+
+    Справочники имен животных (support_animal_names) и лежбищ (support_sites) переводятся в таблицы
+    и присоединяются к регистрациям слиянием по имени животного и номеру лежбища, поэтому значения
+    соответствуют строкам по построению. Возраст - год регистрации минус год мечения (первые четыре знака t_date).
+    Для имени, которого нет в справочнике, возраст и лежбище рождения не заполняются.
+    """
+    def __init__(self, resight_df, support_animal_names, support_sites):
+        self.resight_df = resight_df
+        self.support_animal_names = support_animal_names
+        self.support_sites = support_sites
+
+    def sites_df(self):
+        """
+        Таблица номер лежбища -> название (первое лежбище с номером, как в SitesList.itemFromId).
+        """
+        sites_df = pd.DataFrame([(x.site, x.site_name) for x in self.support_sites], columns=['site', 'site_name'])
+        return sites_df.drop_duplicates('site')
+
+    def animal_names_df(self, sites_df):
+        """
+        Таблица имя животного -> год мечения и лежбище рождения (первое животное с именем,
+        как в AnimalNamesList.itemFromName).
+        """
+        names_df = pd.DataFrame([(x.animal_name, x.t_date, x.t_site) for x in self.support_animal_names],
+                                columns=['animal_name', 't_date', 't_site'])
+        names_df = names_df.drop_duplicates('animal_name')
+
+        t_date = names_df['t_date'][truthy(names_df['t_date'])]
+        names_df['t_year'] = pd.to_numeric(t_date.astype(str).str[0:4], errors='coerce').reindex(names_df.index)
+
+        t_site = pd.to_numeric(names_df['t_site'].where(truthy(names_df['t_site'])), errors='coerce')
+        names_df['natal_rookery'] = t_site.map(sites_df.set_index('site')['site_name'])
+        return names_df[['animal_name', 't_year', 'natal_rookery']]
+
+    def process(self):
+        """
+        Добавляет в resight_df столбцы age, natal_rookery и rookery_site и возвращает таблицу.
+        """
+        sites_df = self.sites_df()
+        names_df = self.animal_names_df(sites_df)
+
+        df = self.resight_df.merge(names_df, on='animal_name', how='left')
+
+        # возраст - целое число и при неизвестном возрасте части строк (пустые значения не переводят
+        # весь столбец в float); столбец объектов, чтобы листы могли заполнить пустые значения строкой
+        age = (pd.to_numeric(df['r_year']) - df['t_year']).astype('Int64').astype(object)
+
+        site = pd.to_numeric(df['site'].where(truthy(df['site'])), errors='coerce')
+        rookery_site = site.map(sites_df.set_index('site')['site_name'])
+
+        self.resight_df['age'] = age.to_numpy()
+        self.resight_df['natal_rookery'] = df['natal_rookery'].where(df['natal_rookery'].notna(), None).to_numpy()
+        self.resight_df['rookery_site'] = rookery_site.where(rookery_site.notna(), None).to_numpy()
+        return self.resight_df
+
+
+def animal_id_report_sheets(parts, support_animal_names, support_sites):
+    """
+    Листы отчета (Resight, Daily, Summary, Summary for day) из результатов частей animal_id_report_part
+    в порядке частей.
+
+    Сводки ежедневных регистраций по животному (количество встреч, первая и последняя дата, первая встреча
+    с щенком) и сведения о животных считаются по всем частям группировками и присоединяются к регистрациям
+    за год слияниями по ключу животного.
+    """
+    resight_df = concat_frames([part[0] for part in parts])
+    daily_df = concat_frames([part[1] for part in parts])
+    animal_info_df = concat_frames([part[2] for part in parts])
+
+    # количество встреч, первая и последняя дата встречи
+    seen_df = daily_df.groupby(ANIMAL_KEY).agg(time_seen=('r_date', 'size'), first_seen=('r_date', 'min'),
+                                               last_seen=('r_date', 'max')).reset_index()
+
+    # первая дата встречи самки с щенком (status без учета регистра)
+    with_pup_df = daily_df[daily_df['status'].str.lower().isin(['wp', 'np'])]
+    first_seen_with_pup_df = with_pup_df.groupby(ANIMAL_KEY)['r_date'].min().reset_index()
+    first_seen_with_pup_df.columns = ANIMAL_KEY + ['first_seen_with_pup']
+
+    # сведения о животных в столбцы: первое значение info_type, кроме 'no' (без учета регистра)
+    filtered_animal_info = animal_info_df[(animal_info_df['info_type'].isin(ANIMAL_INFO_TYPES)) &
+                                          (~animal_info_df['info_value'].str.lower().eq('no'))]
+    grouped_animal_info_df = filtered_animal_info.groupby(ANIMAL_KEY + ['info_type'])['info_value'].first()
+    pivoted_animal_info_df = grouped_animal_info_df.reset_index().pivot(index=ANIMAL_KEY, columns='info_type',
+                                                                        values='info_value').reset_index()
+    for col in ANIMAL_INFO_TYPES:
+        if col not in pivoted_animal_info_df.columns:
+            pivoted_animal_info_df[col] = np.nan
+
+    summary_df = resight_df.merge(seen_df, on=ANIMAL_KEY, how='left') \
+        .merge(first_seen_with_pup_df, on=ANIMAL_KEY, how='left') \
+        .merge(pivoted_animal_info_df, on=ANIMAL_KEY, how='left')
+    summary_df = DataProcessor(summary_df, support_animal_names, support_sites).process()
+
+    # значения по датам как отдельные колонки для Summary for day; если животное в один день записано
+    # на нескольких участках или в нескольких файлах, берется первая запись в порядке частей
+    daily_pivot = daily_df.drop_duplicates(['animal_name', 'r_date']).pivot(index=['animal_name'], columns='r_date',
+                                                                             values='status')
+    dates_summary = sorted(set(daily_df['r_date'].tolist()))
+    summary_day_df = summary_df.join(daily_pivot, on='animal_name')[['species', 'animal_name', 'sex_r', 'status']
+                                                                    + dates_summary]
+    summary_day_df.columns = ['Species', 'Animal Name', 'Gender', 'Status'] + dates_summary
+
+    summary_df.columns = RESIGHT_HEADER
+    summary_df = summary_df.fillna('')
+    summary_df['FirstSeenWithPup'] = summary_df['FirstSeenWithPup'].apply(
+        lambda x: int(x) if x and not pd.isna(x) else '')
+
+    return [resight_sheet(resight_df), daily_sheet(daily_df), summary_df[SUMMARY_SHEET], summary_day_df.fillna('')]
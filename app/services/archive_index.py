@@ -0,0 +1,303 @@
+"""
+Индекс архива фотографий меток животных (m_params.archive_animals_path).
+
+Архив устроен как <архив>/<папка года или проверки>/<имя животного>/<фотографии>; фотографии из папок,
+в пути которых есть not_verified, считаются непроверенными. Индекс хранится в файле ARCHIVE_INDEX_FILE
+рядом с config.ini (архив может быть только для чтения) и в памяти процесса как словарь имя животного ->
+фотографии, поэтому выбор животного не обходит архив. Папки пересканируются только при изменении их
+времени изменения; обновление всего архива выполняет ArchiveIndexer в фоновом потоке.
+"""
+import os
+import sqlite3
+import threading
+from collections import namedtuple
+from pathlib import Path
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from app import PATTERN_SUFFIX
+from app.services.user_settings import Settings
+
+ARCHIVE_INDEX_FILE = "archive_index.sqlite"
+# папка года, имена папок животных в которой нужно исправить (ошибка при формировании архива)
+ARCHIVE_RENAME_FOLDER = "B_2017"
+# настройка со списком архивов, в которых исправление уже выполнено
+ARCHIVE_RENAME_SETTING = "ArchiveRenamed"
+
+ArchiveImage = namedtuple('ArchiveImage', ['path', 'verified'])
+
+_archives: dict[str, "ArchiveIndex"] = {}
+_archives_lock = threading.Lock()
+
+
+def migrate_archive(archive_path):
+    """
+    Однократное исправление архива: к именам папок в B_2017 без окончания L добавляется L.
+    Выполненное исправление запоминается в настройках для каждого архива.
+    """
+    if not archive_path:
+        return
+    settings = Settings.instance()
+    archive_path = os.path.abspath(archive_path)
+    done = settings.value(ARCHIVE_RENAME_SETTING) if settings.contains(ARCHIVE_RENAME_SETTING) else []
+    if isinstance(done, str):
+        done = [done]
+    done = list(done or [])
+    if archive_path in done:
+        return
+
+    directory = os.path.join(archive_path, ARCHIVE_RENAME_FOLDER)
+    try:
+        if os.path.exists(directory):
+            for entry in os.scandir(directory):
+                if entry.is_dir() and entry.name[-1] != 'L':
+                    os.rename(entry.path, os.path.join(directory, entry.name + "L"))
+    except OSError as ex:
+        print(ex)
+        return
+
+    done.append(archive_path)
+    settings.setValue(ARCHIVE_RENAME_SETTING, done)
+
+
+def list_dirs(path):
+    """
+    Имена вложенных папок path.
+    """
+    with os.scandir(path) as it:
+        return [entry.name for entry in it if entry.is_dir()]
+
+
+class ArchiveIndex:
+    """
+    Индекс одного архива. Таблица archive_dirs хранит время изменения папок архива (корень, папки годов,
+    папки животных), archive_images - фотографии папок животных. Поиск фотографий животного - обращение
+    к словарю в памяти; перед выдачей проверяется только время изменения папок этого животного.
+    """
+    def __init__(self, archive_path, index_file=None):
+        self.archive = os.path.abspath(archive_path)
+        self.index_file = index_file or os.path.abspath(ARCHIVE_INDEX_FILE)
+        self._ready = False
+        self._images: dict[str, list] = None
+        self._animal_dirs: dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def for_path(archive_path):
+        archive = os.path.abspath(archive_path)
+        with _archives_lock:
+            index = _archives.get(archive)
+            if index is None:
+                index = _archives[archive] = ArchiveIndex(archive)
+            return index
+
+    def connect(self):
+        con = sqlite3.connect(self.index_file, timeout=30)
+        if not self._ready:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("CREATE TABLE IF NOT EXISTS archive_dirs ("
+                        "archive TEXT NOT NULL, "
+                        "rel_dir TEXT NOT NULL, "
+                        "mtime INTEGER NOT NULL, "
+                        "PRIMARY KEY (archive, rel_dir))")
+            con.execute("CREATE TABLE IF NOT EXISTS archive_images ("
+                        "archive TEXT NOT NULL, "
+                        "rel_dir TEXT NOT NULL, "
+                        "animal_name TEXT NOT NULL, "
+                        "name TEXT NOT NULL, "
+                        "verified INTEGER NOT NULL, "
+                        "PRIMARY KEY (archive, rel_dir, name))")
+            con.execute("CREATE INDEX IF NOT EXISTS ix_archive_images_animal ON archive_images (archive, animal_name)")
+            con.commit()
+            self._ready = True
+        return con
+
+    def _abs(self, rel_dir):
+        return os.path.join(self.archive, *rel_dir.split('/')) if rel_dir else self.archive
+
+    def _scan_animal_dir(self, con, rel_dir):
+        """
+        Перечитывает фотографии папки животного rel_dir.
+        """
+        animal_name = rel_dir.split('/')[-1]
+        verified = int('not_verified' not in rel_dir)
+        try:
+            with os.scandir(self._abs(rel_dir)) as it:
+                names = [entry.name for entry in it
+                         if Path(entry.name).suffix.lower() in PATTERN_SUFFIX and not entry.is_dir()]
+        except OSError:
+            names = []
+        con.execute("DELETE FROM archive_images WHERE archive = ? AND rel_dir = ?", (self.archive, rel_dir))
+        con.executemany("INSERT INTO archive_images (archive, rel_dir, animal_name, name, verified) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        [(self.archive, rel_dir, animal_name, name, verified) for name in names])
+
+    def _forget(self, con, rel_dir):
+        """
+        Удаляет из индекса папку rel_dir и все вложенные в нее.
+        """
+        pattern = rel_dir.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '/%'
+        for table in ('archive_dirs', 'archive_images'):
+            con.execute(f"DELETE FROM {table} WHERE archive = ? AND (rel_dir = ? OR rel_dir LIKE ? ESCAPE '\\')",
+                        (self.archive, rel_dir, pattern))
+
+    def refresh(self, is_interrupted=lambda: False):
+        """
+        Обновляет индекс архива. Список вложенных папок читается только для папок с изменившимся временем
+        изменения, остальные берутся из индекса; фотографии перечитываются только в измененных папках животных.
+        Возвращает True, если индекс изменился.
+        """
+        if not os.path.isdir(self.archive):
+            return False
+        con = self.connect()
+        changed = False
+        try:
+            known = dict(con.execute("SELECT rel_dir, mtime FROM archive_dirs WHERE archive = ?", (self.archive,)))
+            children: dict[str, list] = {}
+            for rel_dir in known:
+                if rel_dir:
+                    parent, _, name = rel_dir.rpartition('/')
+                    children.setdefault(parent, []).append(name)
+
+            # уровни: корень архива (0), папки годов (1), папки животных (2)
+            level = ['']
+            for depth in range(3):
+                next_level = []
+                for rel_dir in level:
+                    if is_interrupted():
+                        con.commit()
+                        return changed
+                    try:
+                        mtime = os.stat(self._abs(rel_dir)).st_mtime_ns
+                    except OSError:
+                        self._forget(con, rel_dir)
+                        changed = True
+                        continue
+
+                    prefix = rel_dir + '/' if rel_dir else ''
+                    if known.get(rel_dir) == mtime:
+                        if depth < 2:
+                            next_level.extend(prefix + name for name in children.get(rel_dir, []))
+                        continue
+
+                    changed = True
+                    if depth < 2:
+                        try:
+                            names = list_dirs(self._abs(rel_dir))
+                        except OSError:
+                            names = []
+                        for name in set(children.get(rel_dir, [])) - set(names):
+                            self._forget(con, prefix + name)
+                        # новые папки записываются сразу (с нулевым временем изменения), чтобы при прерывании
+                        # обновления они были просканированы в следующий раз
+                        con.executemany("INSERT OR IGNORE INTO archive_dirs (archive, rel_dir, mtime) VALUES (?, ?, 0)",
+                                        [(self.archive, prefix + name) for name in names])
+                        next_level.extend(prefix + name for name in names)
+                    else:
+                        self._scan_animal_dir(con, rel_dir)
+                    con.execute("INSERT OR REPLACE INTO archive_dirs (archive, rel_dir, mtime) VALUES (?, ?, ?)",
+                                (self.archive, rel_dir, mtime))
+                con.commit()
+                level = next_level
+        finally:
+            con.close()
+
+        if changed or self._images is None:
+            self.load()
+        return changed
+
+    def load(self):
+        """
+        Загружает индекс архива из файла в словари имя животного -> фотографии (по папкам и именам файлов)
+        и имя животного -> папки животного с временем изменения.
+        """
+        con = self.connect()
+        try:
+            rows = con.execute("SELECT animal_name, rel_dir, name, verified FROM archive_images WHERE archive = ? "
+                               "ORDER BY rel_dir, name", (self.archive,)).fetchall()
+            dirs = con.execute("SELECT rel_dir, mtime FROM archive_dirs WHERE archive = ? AND rel_dir LIKE '%/%' "
+                               "ORDER BY rel_dir", (self.archive,)).fetchall()
+        finally:
+            con.close()
+        images = {}
+        for animal_name, rel_dir, name, verified in rows:
+            images.setdefault(animal_name, []).append(
+                ArchiveImage(os.path.join(self._abs(rel_dir), name), bool(verified)))
+        animal_dirs = {}
+        for rel_dir, mtime in dirs:
+            animal_dirs.setdefault(rel_dir.split('/')[-1], []).append((rel_dir, mtime))
+        with self._lock:
+            self._images = images
+            self._animal_dirs = animal_dirs
+
+    def _refresh_animal(self, animal_name):
+        """
+        Перечитывает папки животного, время изменения которых изменилось (добавлены или удалены фотографии).
+        Если папки не изменились, файл индекса не открывается.
+        """
+        with self._lock:
+            dirs = list(self._animal_dirs.get(animal_name, []))
+        stale = []
+        for rel_dir, mtime in dirs:
+            try:
+                current = os.stat(self._abs(rel_dir)).st_mtime_ns
+            except OSError:
+                current = None
+            if current != mtime:
+                stale.append((rel_dir, current))
+        if not stale:
+            return
+
+        con = self.connect()
+        try:
+            for rel_dir, current in stale:
+                if current is None:
+                    self._forget(con, rel_dir)
+                else:
+                    self._scan_animal_dir(con, rel_dir)
+                    con.execute("UPDATE archive_dirs SET mtime = ? WHERE archive = ? AND rel_dir = ?",
+                                (current, self.archive, rel_dir))
+            con.commit()
+        finally:
+            con.close()
+        self.load()
+
+    def images(self, animal_name, refresh=True):
+        """
+        Фотографии животного animal_name (ArchiveImage). При refresh=True проверяются папки этого животного.
+        Если архив недоступен (отключен диск), возвращается пустой список.
+        """
+        if not os.path.isdir(self.archive):
+            return []
+        if self._images is None:
+            self.load()
+        if refresh:
+            try:
+                self._refresh_animal(animal_name)
+            except sqlite3.Error as ex:
+                print(ex)
+        with self._lock:
+            return list(self._images.get(animal_name, []))
+
+
+class ArchiveIndexer(QThread):
+    """
+    Фоновое обновление индекса архива.
+    Сигналы:
+    - indexed: индекс архива archive обновлен (True, если в нем что-то изменилось).
+    """
+    indexed = pyqtSignal(str, bool)
+
+    def __init__(self, archive_path, parent=None):
+        super().__init__(parent)
+        self.archive_path = archive_path
+
+    def run(self):
+        try:
+            index = ArchiveIndex.for_path(self.archive_path)
+            changed = index.refresh(self.isInterruptionRequested)
+        except (OSError, sqlite3.Error) as ex:
+            print(ex)
+            return
+        if not self.isInterruptionRequested():
+            self.indexed.emit(self.archive_path, changed)
@@ -0,0 +1,461 @@
+"""
+Отчет по учетам нескольких файлов баз (CountReportWindow) в пуле процессов.
+
+Отчет делится на части: файл базы, год и участок. Каждая часть считается функцией count_report_part
+в отдельном процессе на собственном подключении только для чтения, части объединяются в порядке
+report_parts (файлы в порядке списка, годы и участки по возрастанию), поэтому результат не зависит
+от того, в каком порядке завершились процессы. Списки типов учета и комментариев в ячейках сортируются:
+порядок множества строк различается между процессами. Справочники системной базы (категории, наблюдатели,
+локальные участки) передаются в процессы готовыми словарями.
+"""
+import multiprocessing
+import os
+import re
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from app.models.main_db import CountList, PointsCount, GroupsCount, CountEffortCategories, CountFiles, \
+    CountEffortTypes, CountEffortSites
+from app.services.db_manager import create_sqlite_engine, create_readonly_engine, sqlite_profile
+from app.services.migrations import migrate, MigrationError, SCHEMA_VERSION
+from app.services.report_cache import ReportCache, report_context, table_fingerprints, combine_fingerprints
+from app.services.user_settings import Settings
+
+# категория точек отчета (вместо AnimalCategories системной базы, которые нельзя передать в процесс)
+ReportCategory = namedtuple('ReportCategory', ['animal_category', 'count_category'])
+# часть отчета: файл базы, год, участок
+ReportPart = namedtuple('ReportPart', ['db_file', 'year', 'site'])
+
+REPORT_SHEETS = 4
+# таблицы, строки которых входят в расчет сводки учета
+COUNT_MODELS = [CountList, CountEffortTypes, CountEffortSites, CountEffortCategories, CountFiles, PointsCount,
+                GroupsCount]
+
+
+def report_workers():
+    """
+    Количество процессов отчета: настройка ReportWorkers или количество ядер.
+    """
+    settings = Settings.instance()
+    if settings.contains("ReportWorkers") and settings.value("ReportWorkers"):
+        return max(1, int(settings.value("ReportWorkers")))
+    return os.cpu_count() or 1
+
+
+def report_parts(db_list, years, sites):
+    """
+    Части отчета в порядке объединения результатов.
+    """
+    return [ReportPart(db_file, year, site) for db_file in db_list for year in sorted(years) for site in sorted(sites)]
+
+
+def report_executor(workers):
+    """
+    Пул процессов отчета. Процессы запускаются через spawn на всех платформах: fork процесса с потоками Qt
+    небезопасен.
+    """
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def run_report_parts(parts, read_part, part_args, part_done, is_canceled):
+    """
+    Читает части отчета функцией read_part(part, *part_args(part)) и возвращает результаты в порядке частей.
+    Части раздаются пулу процессов отчетов (report_workers); при одной части или одном процессе пул не
+    запускается. После каждой прочитанной части вызывается part_done(индекс, результат, прочитано частей).
+    is_canceled проверяется между частями: после отмены непрочитанные части не запускаются, начатые
+    дочитываются в своих процессах, а у непрочитанных частей результат None.
+    """
+    results = [None] * len(parts)
+    workers = min(report_workers(), len(parts))
+    if workers <= 1:
+        for index, part in enumerate(parts):
+            if is_canceled():
+                break
+            results[index] = read_part(part, *part_args(part))
+            part_done(index, results[index], index + 1)
+        return results
+
+    executor = report_executor(workers)
+    try:
+        futures = {executor.submit(read_part, part, *part_args(part)): index for index, part in enumerate(parts)}
+        pending = set(futures)
+        finished = 0
+        while pending:
+            # ожидание с таймаутом, чтобы отмена срабатывала, пока части читаются
+            done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+            if is_canceled():
+                break
+            for future in done:
+                index = futures[future]
+                results[index] = future.result()
+                finished += 1
+                part_done(index, results[index], finished)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return results
+
+
+def prepare_report_db(db_file):
+    """
+    Проверяет версию схемы файла базы до запуска частей отчета: процессы открывают базу только для чтения.
+    Файл открывается для записи, только если схема устарела (миграции применяются без смены режима журнала),
+    поэтому отчет по актуальным файлам работает и на носителях только для чтения. Если устаревший файл
+    нельзя изменить, вызывается MigrationError с именем файла.
+    """
+    engine = create_readonly_engine(db_file)
+    try:
+        with engine.connect() as connection:
+            version = connection.exec_driver_sql("PRAGMA user_version").scalar()
+    finally:
+        engine.dispose()
+    if version >= SCHEMA_VERSION:
+        return
+
+    name = Path(db_file).name
+    folder = os.path.dirname(os.path.abspath(db_file))
+    if not os.access(db_file, os.W_OK) or not os.access(folder, os.W_OK):
+        raise MigrationError(f"{name}: schema version {version} must be updated to {SCHEMA_VERSION}, "
+                             f"but the file is read-only. Open it once from a writable folder.")
+
+    profile = {key: value for key, value in sqlite_profile("SqliteMain").items() if key != 'journal_mode'}
+    engine = create_sqlite_engine(f'sqlite:///{db_file}', "SqliteMain", profile)
+    try:
+        migrate(engine)
+    except MigrationError:
+        raise
+    except Exception as ex:
+        raise MigrationError(f"{name}: schema version {version} cannot be updated to {SCHEMA_VERSION}: {ex}") \
+            from ex
+    finally:
+        engine.dispose()
+
+
+def merge_report_parts(results):
+    """
+    Объединяет результаты частей (в порядке report_parts) в четыре листа отчета.
+    """
+    sheets = [[] for _ in range(REPORT_SHEETS)]
+    for result in results:
+        for rows, part_rows in zip(sheets, result):
+            rows.extend(part_rows)
+    return [pd.DataFrame(rows) for rows in sheets]
+
+
+def effort_animal_categories(eff_type, db_session):
+    """
+    Категории животных, связанные с заданным типом усилий.
+    """
+    effort_categories_points = db_session.query(CountEffortCategories).filter_by(
+        species=eff_type.species,
+        r_year=eff_type.r_year,
+        site=eff_type.site,
+        r_date=eff_type.r_date,
+        time_start=eff_type.time_start,
+        creator=eff_type.creator,
+        count_type=eff_type.count_type, ).all()
+    return list(map(lambda x: x.animal_category, effort_categories_points))
+
+
+def count_report_rows(db_session, count_item, categories, observers, local_sites):
+    """
+    Строки листов отчета для одного учета count_item (строки count_list): сводка учетов,
+    сводка по локальным участкам, усилия, сводка по камерам.
+    """
+    locals_sites_summary = []
+    count_summary = []
+    efforts_report = []
+    cameras_summary = []
+
+    points_count = db_session.query(PointsCount).filter_by(
+        r_year=count_item.r_year,
+        r_date=count_item.r_date,
+        site=count_item.site,
+        species=count_item.species,
+        time_start=count_item.time_start,
+        creator=count_item.creator).all()
+    points_count = list(map(lambda x: x.as_dict(), points_count))
+    df_points_count = pd.DataFrame(points_count)
+
+    groups_count = db_session.query(GroupsCount).filter_by(
+        r_year=count_item.r_year,
+        r_date=count_item.r_date,
+        site=count_item.site,
+        species=count_item.species,
+        time_start=count_item.time_start,
+        creator=count_item.creator).all()
+    groups_count = list(map(lambda x: x.as_dict(), groups_count))
+    df_groups_count = pd.DataFrame(groups_count)
+
+    data = []
+    for eff_type in count_item.effort_types:
+        eff_type_sites = eff_type.effort_sites
+        eff_type_sites.sort(key=lambda x: x.local_site)
+        effort_categories = effort_animal_categories(eff_type, db_session)
+        for eff_site in eff_type_sites:
+            if eff_type.count_type == eff_site.count_type:
+
+                efforts_report.append(eff_site.as_dict())
+
+                for cat in categories:
+
+                    _temp_data = {'r_year': count_item.r_year,
+                                  'site': count_item.site,
+                                  'r_date': count_item.r_date,
+                                  'time_start': count_item.time_start,
+                                  'count_type': eff_type.count_type,
+                                  'creator': count_item.creator,
+                                  'species': count_item.species,
+                                  'local_site': eff_site.local_site,
+                                  'animal_category': cat.animal_category,
+                                  'comments': eff_type.comments,
+                                  'count': 'NA'
+                                  }
+                    if cat.animal_category in effort_categories and eff_site.count_performed:
+                        _temp_data['count'] = 0
+
+                    if not df_points_count.empty:
+                        local_sites_points = list(set(df_points_count['local_site']))
+                        local_sites_points.sort()
+
+                        if eff_site.local_site in local_sites_points:
+                            count_point = df_points_count[
+                                (df_points_count['animal_category'] == cat.animal_category) &
+                                (df_points_count['local_site'] == eff_site.local_site) &
+                                (df_points_count['count_type'] == eff_type.count_type)]
+
+                            if not count_point.empty:
+                                _temp_data['count'] = len(count_point)
+                    if not df_groups_count.empty:
+                        local_sites_groups = list(set(df_groups_count['local_site']))
+                        local_sites_groups.sort()
+                        if eff_site.local_site in local_sites_groups:
+                            temp_count = df_groups_count[
+                                (df_groups_count['animal_category'] == cat.animal_category) &
+                                (df_groups_count['local_site'] == eff_site.local_site) &
+                                (df_groups_count['count_type'] == eff_type.count_type)]
+
+                            if not temp_count.empty:
+                                count = temp_count.groupby(['animal_category', 'local_site']).sum()
+                                _temp_data['count'] = count['count'].iloc[0]
+
+                    data.append(_temp_data)
+
+    df = pd.DataFrame(data)
+
+    local_sites_count = list(set(df['local_site']))
+    local_sites_count.sort()
+
+    creator = observers.get(count_item.creator, count_item.creator)
+
+    # count summary
+    count_types = sorted(set(df['count_type'].tolist()))
+    count = 'NA'
+    total = 'NA'
+    _count_summary = {'r_year': count_item.r_year, 'site': count_item.site,
+                      'r_date': count_item.r_date, 'time_start': count_item.time_start,
+                      'creator': creator, 'species': count_item.species, 'cameras': 'NA',
+                      'local_sites': f"{len(local_sites_count)}: {local_sites_count}",
+                      'count_types': f"{len(count_types)}: {count_types}",
+                      'comments': count_item.comments, }
+
+    if 'Map' in count_types:
+        photo_files_count = db_session.query(CountFiles).filter_by(
+            r_year=count_item.r_year,
+            r_date=count_item.r_date,
+            site=count_item.site,
+            species=count_item.species,
+            time_start=count_item.time_start,
+            creator=count_item.creator,
+            count_type='Map', ).all()
+        photo_files_point = db_session.query(PointsCount).filter_by(
+            r_year=count_item.r_year,
+            r_date=count_item.r_date,
+            site=count_item.site,
+            species=count_item.species,
+            time_start=count_item.time_start,
+            creator=count_item.creator,
+            count_type="Map").all()
+
+        photo_files = photo_files_count + photo_files_point
+
+        if photo_files:
+            pattern = r'_([A-Za-z\d-]+)(?:\.)'
+            cameras = list(
+                set(re.search(pattern, file.file_name).group(1) for file in photo_files))
+            cameras.sort()
+            _count_summary['cameras'] = f"{len(cameras)}: {cameras}"
+
+            """cameras_summary"""
+            temp_df = pd.DataFrame([item.as_dict() for item in photo_files_point])
+
+            if not temp_df.empty:
+                # Извлекаем имя камеры из столбца 'file_name'
+                temp_df['camera_name'] = temp_df['file_name'].str.extract(r"_([A-Za-z\d-]+)(?:\.)")
+
+                # Группировка данных
+                grouped_data = temp_df.groupby(
+                    ['r_date', 'time_start', 'count_type', 'species', 'animal_category',
+                     'camera_name']).size().reset_index(
+                    name='count')
+
+                # Создаем сводную таблицу
+                pivot_table = pd.pivot_table(grouped_data, values='count',
+                                             index=['camera_name',
+                                                    'r_date',
+                                                    'time_start',
+                                                    'count_type',
+                                                    'species'],
+                                             columns=['animal_category'],
+                                             aggfunc='sum', fill_value=0)
+
+                # Сбрасываем индексы, чтобы сделать столбцы 'camera_name' обычными столбцами
+                pivot_table.reset_index(inplace=True)
+
+                for cam in cameras:
+                    cam_total = 0
+                    _cameras_summary = {'r_year': count_item.r_year,
+                                        'site': count_item.site,
+                                        'r_date': count_item.r_date,
+                                        'time_start': count_item.time_start,
+                                        'species': count_item.species,
+                                        'creator': count_item.creator,
+                                        'count_type': "Map",
+                                        'camera_name': cam, }
+
+                    for cat in categories:
+                        count = 0
+
+                        temp_cam_count = pivot_table[(pivot_table['camera_name'] == cam)]
+                        if not temp_cam_count.empty and cat.animal_category in temp_cam_count:
+                            count = temp_cam_count[cat.animal_category].sum()
+                        if cat.count_category:
+                            cam_total += count
+                        _cameras_summary[cat.animal_category] = count
+                    _cameras_summary['Total'] = cam_total
+                    cameras_summary.append(_cameras_summary)
+            """"""
+
+    temp_count = df[(df['count'] != 'NA')]
+    if not temp_count.empty:
+        total = 0
+    for cat in categories:
+        temp_count = df[(df['animal_category'] == cat.animal_category) & (df['count'] != 'NA')]
+        if not temp_count.empty:
+            count = temp_count.groupby(['animal_category'])['count'].sum().iloc[0]
+            if cat.count_category:
+                total += count
+        else:
+            count = 'NA'
+        _count_summary[cat.animal_category] = count
+
+    _count_summary['Total'] = total
+    count_summary.append(_count_summary)
+
+    # local sites summary
+    for item_site in local_sites_count:
+        local_site_name = local_sites.get(item_site, item_site)
+
+        _eff_loc_site_comments = sorted(set(df[(df['local_site'] == item_site)]['comments'].tolist()), key=str)
+        _local_sites_summary = {
+            'r_year': count_item.r_year,
+            'site': count_item.site,
+            'r_date': count_item.r_date,
+            'time_start': count_item.time_start,
+            'creator': creator,
+            'species': count_item.species,
+            'local_site_id': item_site,
+            'local_site_name': local_site_name,
+            'cameras': 'NA',
+            'comments': list(filter(lambda x: x not in ["", ".", " "], _eff_loc_site_comments))
+        }
+        total = 'NA'
+        lc_count_types = sorted(set(df[(df['local_site'] == item_site)]['count_type'].tolist()))
+        if 'Map' in lc_count_types:
+            points_count_local_site = db_session.query(PointsCount).filter_by(
+                r_year=count_item.r_year,
+                r_date=count_item.r_date,
+                site=count_item.site,
+                species=count_item.species,
+                time_start=count_item.time_start,
+                creator=count_item.creator,
+                local_site=item_site,
+                count_type="Map").all()
+            cameras_lc = list(
+                set(str(file.file_name).split('_')[-1].split('.')[0] for file in
+                    points_count_local_site))
+            cameras_lc.sort()
+            _local_sites_summary['cameras'] = f"{len(cameras_lc)}: {cameras_lc}"
+
+        _local_sites_summary['count_types'] = f"{len(lc_count_types)}: {lc_count_types}"
+        temp_count = df[(df['local_site'] == item_site) & (df['count'] != 'NA')]
+        if not temp_count.empty:
+            total = 0
+        for cat in categories:
+
+            temp_count = df[(df['animal_category'] == cat.animal_category) &
+                            (df['local_site'] == item_site) & (df['count'] != 'NA')]
+            if not temp_count.empty:
+                count = temp_count.groupby(['animal_category', 'local_site'])['count'].sum().iloc[0]
+                if cat.count_category:
+                    total += count
+            else:
+                count = 'NA'
+            _local_sites_summary[cat.animal_category] = count
+
+        _local_sites_summary['Total'] = total
+        locals_sites_summary.append(_local_sites_summary)
+
+    return count_summary, locals_sites_summary, efforts_report, cameras_summary
+
+
+def count_fingerprints(connection, part, species):
+    """
+    Отпечатки исходных строк учетов части part по ключу учета (r_date, time_start, creator).
+    """
+    where = {'r_year': part.year, 'site': part.site, 'species': species}
+    group = ['r_date', 'time_start', 'creator']
+    return combine_fingerprints(*[table_fingerprints(connection, model, where, group) for model in COUNT_MODELS])
+
+
+def count_report_part(part, species, categories, observers, local_sites):
+    """
+    Считает часть отчета part (ReportPart) для вида species.
+    categories - список ReportCategory, observers - имена наблюдателей по коду,
+    local_sites - названия локальных участков участка part.site по коду.
+    Строки учетов, исходные данные которых не изменились с прошлого отчета, берутся из кэша отчетов.
+    Возвращает строки листов: сводка учетов, сводка по локальным участкам, усилия, сводка по камерам.
+    """
+    sheets = [[] for _ in range(REPORT_SHEETS)]
+    context = report_context('count', species, categories, sorted(observers.items()), sorted(local_sites.items()))
+
+    engine = create_readonly_engine(part.db_file)
+    db_session = Session(bind=engine)
+    cache = ReportCache.open()
+    try:
+        counts_list = db_session.query(CountList).filter_by(r_year=part.year,
+                                                            species=species,
+                                                            site=part.site).all()
+        fingerprints = count_fingerprints(db_session, part, species)
+
+        for count_item in counts_list:
+            key = (count_item.r_year, count_item.site, count_item.r_date, count_item.time_start,
+                   count_item.creator, count_item.species)
+            fingerprint = fingerprints.get((count_item.r_date, count_item.time_start, count_item.creator), '')
+            rows = cache.get(part.db_file, 'count', key, context, fingerprint) if cache else None
+            if rows is None:
+                rows = count_report_rows(db_session, count_item, categories, observers, local_sites)
+                if cache:
+                    cache.put(part.db_file, 'count', key, context, fingerprint, rows)
+            for sheet, count_rows in zip(sheets, rows):
+                sheet.extend(count_rows)
+    finally:
+        if cache:
+            cache.close()
+        db_session.close()
+        engine.dispose()
+
+    return sheets
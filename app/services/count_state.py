@@ -0,0 +1,137 @@
+import sqlalchemy as db
+
+from app.models.main_db import CountFiles, PointsCount, PatternCount
+
+# категории-отметки пустого кадра и цвета, которыми файл выделяется в списках
+MARK_COLORS = {'NoAnimal': '#031FCB', 'NoMarked': '#108405'}
+DONE_COLOR = '#FF0000'
+# точки этой категории хранятся в PatternCount (как в CountWindow.new_point)
+PATTERN_CATEGORY = 'inj'
+
+
+class CountFileState:
+    """
+    Файл учета (строка count_source) и количество его точек по категориям: points - PointsCount,
+    patterns - PatternCount.
+    """
+    def __init__(self, data: CountFiles):
+        self.data = data
+        self.points: dict[str, int] = {}
+        self.patterns: dict[str, int] = {}
+
+    @property
+    def file_name(self):
+        return self.data.file_name
+
+    @property
+    def done(self):
+        return any(self.points.values()) or any(self.patterns.values())
+
+    @property
+    def mark(self):
+        """
+        Отметка пустого кадра (NoAnimal / NoMarked) или None.
+        Отметка ставится точкой (-1, -1), поэтому на файле она единственная и идет первой среди его точек.
+        """
+        for category in MARK_COLORS:
+            if self.points.get(category):
+                return category
+        return None
+
+    @property
+    def color(self):
+        """
+        Цвет файла в списках: цвет отметки, красный для файла с точками или None для файла без точек.
+        """
+        if not self.done:
+            return None
+        return MARK_COLORS.get(self.mark, DONE_COLOR)
+
+
+class CountState:
+    """
+    Файлы учета и количество точек по файлам и категориям для одного учета (строки count_list).
+
+    Загружается одним сгруппированным запросом (load) и используется списком файлов, списком выполненных
+    файлов и дневным отчетом главного окна. Пока окно учета открыто, изменения точек передаются
+    сигналом update_done_photo_count и применяются к состоянию (apply) без повторного запроса.
+    """
+    def __init__(self, count_item, files: list[CountFileState]):
+        self.count_item = count_item
+        self.files = files
+        self._by_key = {(f.file_name, f.data.count_type): f for f in files}
+
+    @staticmethod
+    def load(session, count_item):
+        """
+        Загружает файлы учета count_item вместе с количеством точек PointsCount и PatternCount
+        по категориям. Файлы упорядочены по имени и типу учета.
+        """
+        marks = db.union_all(
+            *[db.select(model.source_id.label('source_id'),
+                        db.literal(model is PatternCount).label('pattern'),
+                        model.animal_category.label('animal_category'))
+              .where(model.r_year == count_item.r_year,
+                     model.site == count_item.site,
+                     model.r_date == count_item.r_date,
+                     model.time_start == count_item.time_start,
+                     model.creator == count_item.creator,
+                     model.species == count_item.species)
+              for model in (PointsCount, PatternCount)]).subquery()
+
+        statement = db.select(CountFiles, marks.c.pattern, marks.c.animal_category,
+                              db.func.count(marks.c.source_id)) \
+            .outerjoin(marks, marks.c.source_id == CountFiles.id) \
+            .where(CountFiles.r_year == count_item.r_year,
+                   CountFiles.site == count_item.site,
+                   CountFiles.r_date == count_item.r_date,
+                   CountFiles.time_start == count_item.time_start,
+                   CountFiles.creator == count_item.creator,
+                   CountFiles.species == count_item.species) \
+            .group_by(CountFiles.id, marks.c.pattern, marks.c.animal_category) \
+            .order_by(CountFiles.file_name, CountFiles.count_type)
+
+        files = []
+        states = {}
+        for data, pattern, category, count in session.execute(statement):
+            state = states.get(data.id)
+            if state is None:
+                state = states[data.id] = CountFileState(data)
+                files.append(state)
+            if category is not None:
+                (state.patterns if pattern else state.points)[category] = count
+        return CountState(count_item, files)
+
+    def file(self, file_name, count_type):
+        return self._by_key.get((file_name, count_type))
+
+    def done_files(self):
+        """
+        Имена файлов с точками без повторов, отсортированные по времени из имени файла.
+        """
+        done_files = list({f.file_name for f in self.files if f.done})
+        done_files.sort(key=lambda x: int(str(x).split('_')[1]))
+        return done_files
+
+    def category_totals(self):
+        """
+        Количество точек PointsCount учета по категориям.
+        """
+        totals = {}
+        for f in self.files:
+            for category, count in f.points.items():
+                totals[category] = totals.get(category, 0) + count
+        return totals
+
+    def apply(self, file_name, count_type, categories, currentOperator):
+        """
+        Применяет изменение точек файла из сигнала окна учета: categories - количество точек по категориям,
+        currentOperator - operator.add или operator.sub.
+        """
+        state = self.file(file_name, count_type)
+        if state is None:
+            return None
+        for category, count in categories.items():
+            counts = state.patterns if str(category).lower() == PATTERN_CATEGORY else state.points
+            counts[category] = max(0, currentOperator(counts.get(category, 0), count))
+        return state
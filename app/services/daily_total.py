@@ -0,0 +1,175 @@
+import pandas as pd
+import sqlalchemy as db
+
+from app import m_params
+from app.controllers.parameters import session_factory_main
+from app.models.main_db import PointsCount, GroupsCount, CountEffortCategories
+
+
+def camera_from_file_name(file_name):
+    """
+    Камера из имени файла: часть имени после последнего '_' без расширения.
+    """
+    return str(file_name).split('_')[-1].split('.')[0]
+
+
+class DailyTotalCount(object):
+    """
+
+    Представляет собой объект суммарного ежедневного подсчета.
+
+    Количество точек, сумма групповых учетов и категории усилий считаются сгруппированными запросами
+    (по одному на таблицу) для всего учета, после чего таблица собирается по словарям за один проход
+    по участкам усилий и категориям.
+
+    """
+    def __init__(self, count_item, session=None):
+        super().__init__()
+
+        self.main_session = session or session_factory_main.get_session()
+
+        self.count_item = count_item
+
+    def _where_count(self, model):
+        """
+        Условие отбора строк model, относящихся к учету.
+        """
+        item = self.count_item
+        return (model.r_year == item.r_year,
+                model.r_date == item.r_date,
+                model.site == item.site,
+                model.species == item.species,
+                model.time_start == item.time_start,
+                model.creator == item.creator)
+
+    def point_counts(self):
+        """
+        Количество точек по (тип учета, локальный участок, категория).
+        Значения группируются с учетом регистра, как при сравнении в pandas.
+        """
+        columns = [PointsCount.count_type.collate('BINARY'),
+                   PointsCount.local_site.collate('BINARY'),
+                   PointsCount.animal_category.collate('BINARY')]
+        statement = db.select(*columns, db.func.count()).where(*self._where_count(PointsCount)).group_by(*columns)
+        return {(t, ls, cat): count for t, ls, cat, count in self.main_session.execute(statement)}
+
+    def group_counts(self):
+        """
+        Сумма групповых учетов по (тип учета, локальный участок, категория).
+        """
+        columns = [GroupsCount.count_type.collate('BINARY'),
+                   GroupsCount.local_site.collate('BINARY'),
+                   GroupsCount.animal_category.collate('BINARY')]
+        statement = db.select(*columns, db.func.sum(GroupsCount.count)) \
+            .where(*self._where_count(GroupsCount)).group_by(*columns)
+        return {(t, ls, cat): count for t, ls, cat, count in self.main_session.execute(statement)}
+
+    def effort_categories(self):
+        """
+        Категории усилий учета по типам учета.
+        """
+        item = self.count_item
+        statement = db.select(CountEffortCategories.count_type, CountEffortCategories.animal_category).where(
+            CountEffortCategories.species == item.species,
+            CountEffortCategories.r_year == item.r_year,
+            CountEffortCategories.site == item.site,
+            CountEffortCategories.r_date == item.r_date,
+            CountEffortCategories.time_start == item.time_start,
+            CountEffortCategories.creator == item.creator)
+        categories = {}
+        for count_type, animal_category in self.main_session.execute(statement):
+            categories.setdefault(count_type, set()).add(animal_category)
+        return categories
+
+    def map_cameras(self):
+        """
+        Камеры файлов с точками учета по карте (count_type = 'Map') по локальным участкам.
+        Участок сравнивается без учета регистра, как в запросе по столбцу с COLLATE NOCASE.
+        """
+        statement = db.select(PointsCount.local_site, PointsCount.file_name).distinct() \
+            .where(*self._where_count(PointsCount), PointsCount.count_type == 'Map')
+        cameras = {}
+        for local_site, file_name in self.main_session.execute(statement):
+            cameras.setdefault(str(local_site).lower(), set()).add(camera_from_file_name(file_name))
+        return cameras
+
+    def get_data(self):
+        """
+        Возвращает фрейм данных, содержащий данные, вычисленные на основе различных подсчетов.
+        """
+        points = self.point_counts()
+        groups = self.group_counts()
+        effort_categories = self.effort_categories()
+
+        data = []
+        for eff_type in self.count_item.effort_types:
+            eff_categories = effort_categories.get(eff_type.count_type, set())
+            for eff_site in sorted(eff_type.effort_sites, key=lambda x: x.local_site):
+                if eff_type.count_type != eff_site.count_type:
+                    continue
+                for cat in m_params.support_categories_points:
+                    key = (eff_type.count_type, eff_site.local_site, cat.animal_category)
+                    count = 'NA'
+                    if cat.animal_category in eff_categories:
+                        count = 0
+                    if key in points:
+                        count = points[key]
+                    if key in groups:
+                        count = groups[key]
+                    data.append({'local_site': eff_site.local_site, 'count_type': eff_type.count_type,
+                                 'animal_category': cat.animal_category, 'count': count})
+
+        if not data:
+            return pd.DataFrame([])
+
+        creator = self.count_item.creator
+        support_creator = m_params.support_observers.itemFromId(self.count_item.creator)
+        if support_creator:
+            creator = support_creator.observer_name
+
+        cameras = self.map_cameras() if any(row['count_type'] == 'Map' for row in data) else {}
+
+        res = []
+        for local_site_id in sorted(set(row['local_site'] for row in data)):
+            local_site_name = local_site_id
+
+            support_local_site = m_params.support_local_sites.itemFromNameOrId(local_site_id)
+            if support_local_site:
+                local_site_name = support_local_site.local_site_name
+
+            temp = {'r_year': self.count_item.r_year,
+                    'site': self.count_item.site,
+                    'r_date': self.count_item.r_date,
+                    'time_start': self.count_item.time_start,
+                    'creator': creator,
+                    'species': self.count_item.species,
+                    'local_site_id': local_site_id,
+                    'local_site_name': local_site_name,
+                    'cameras': 'NA',
+                    'count_types': '',
+                    'comments': self.count_item.comments,
+                    }
+            site_rows = [row for row in data if row['local_site'] == local_site_id]
+            # типы учета сортируются: порядок множества строк меняется между запусками программы
+            lc_count_types = sorted(set(row['count_type'] for row in site_rows))
+            if 'Map' in lc_count_types:
+                cameras_lc = sorted(cameras.get(str(local_site_id).lower(), set()))
+                temp['cameras'] = f"{len(cameras_lc)}: {cameras_lc}"
+            temp['count_types'] = f"{len(lc_count_types)}: {lc_count_types}"
+
+            counted = {}
+            for row in site_rows:
+                if row['count'] != 'NA':
+                    counted[row['animal_category']] = counted.get(row['animal_category'], 0) + row['count']
+
+            total = 0 if counted else 'NA'
+            for cat in m_params.support_categories_points:
+                count = counted.get(cat.animal_category, 'NA')
+                if count != 'NA' and cat.count_category:
+                    total += count
+                temp[cat.animal_category] = count
+
+            temp['Total'] = total
+            res.append(temp)
+        df_res = pd.DataFrame(res)
+        return df_res
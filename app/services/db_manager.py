@@ -1,20 +1,99 @@
+from pathlib import Path
 
-from sqlalchemy import create_engine, event, Engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, scoped_session
 
 from app.models.main_db import Base
+from app.services.migrations import migrate
+from app.services.user_settings import Settings
+
+# параметры подключения SQLite по умолчанию; переопределяются в config.ini в группах
+# [SqliteMain] (файл учета) и [SqliteSupport] (системный файл), например SqliteMain/synchronous=FULL
+SQLITE_PROFILE = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -65536,  # в КиБ (64 МиБ)
+    'mmap_size': 268435456,
+    'temp_store': 'MEMORY',
+}
+
+
+def sqlite_profile(group):
+    """
+    Параметры подключения SQLite для группы настроек group: значения по умолчанию SQLITE_PROFILE,
+    переопределенные ключами group/<pragma> из config.ini.
+    """
+    settings = Settings.instance()
+    profile = dict(SQLITE_PROFILE)
+    for name in profile:
+        key = f"{group}/{name}"
+        if settings.contains(key) and settings.value(key):
+            profile[name] = settings.value(key)
+    return profile
+
+
+def create_sqlite_engine(db_url, group, profile=None):
+    """
+    Создает движок SQLite, каждое подключение которого получает PRAGMA foreign_keys и параметры профиля group
+    (или явно переданного словаря profile).
+    """
+    engine = create_engine(db_url)
+    if profile is None:
+        profile = sqlite_profile(group)
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragma(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        for name, value in profile.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    return engine
+
+
+def create_readonly_engine(path, group="SqliteMain"):
+    """
+    Движок SQLite только для чтения файла path (URI с mode=ro и PRAGMA query_only) для фоновых отчетов.
+    Режим журнала не меняется: его задает подключение, которое пишет в базу. Закрывается engine.dispose(),
+    а не close_engine: checkpoint требует записи.
+    """
+    profile = {name: value for name, value in sqlite_profile(group).items() if name != 'journal_mode'}
+    profile['query_only'] = 'ON'
+    return create_sqlite_engine(f"sqlite:///{Path(path).resolve().as_uri()}?mode=ro&uri=true", group, profile)
+
+
+def close_engine(engine):
+    """
+    Закрывает подключения движка. Перед закрытием журнал WAL переносится в файл базы (checkpoint),
+    чтобы рядом с базой не оставались файлы -wal и -shm. Ошибка checkpoint не мешает закрытию:
+    данные из журнала SQLite перенесет при следующем открытии.
+    """
+    if engine is None:
+        return
+    try:
+        with engine.connect() as connection:
+            connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+    except Exception as ex:
+        print(ex)
+    engine.dispose()
 
 
 class SessionFactoryMain:
     """
     Фабрика подключения к файлу хранения данных
     Если нет url базы, подключение будет выполнено в оперативной памяти
+    point_queue - очередь отложенной записи точек (PointWriteQueue), которая переключается вместе с базой
     """
-    def __init__(self, db_url=None):
+    def __init__(self, db_url=None, point_queue=None):
         if not db_url:
             db_url = f'sqlite:///:memory:'
-        self.engine = create_engine(db_url)
+        self.engine = create_sqlite_engine(db_url, "SqliteMain")
+        migrate(self.engine)
         self.Session = scoped_session(sessionmaker(bind=self.engine))
+        self.point_queue = point_queue
+        if self.point_queue:
+            self.point_queue.open(self.engine)
 
     def get_session(self):
         """
@@ -26,17 +105,34 @@ class SessionFactoryMain:
         """
         Подключение к бд
         """
-        self.engine = create_engine(db_url)
+        self.close()
+        self.engine = create_sqlite_engine(db_url, "SqliteMain")
+        migrate(self.engine)
+        if self.point_queue:
+            self.point_queue.open(self.engine)
         self._make_session()
 
     def create_db(self, db_url):
         """
         Создание таблиц базы
         """
-        self.engine = create_engine(db_url)
+        self.close()
+        self.engine = create_sqlite_engine(db_url, "SqliteMain")
         Base.metadata.create_all(bind=self.engine)
+        migrate(self.engine)
+        if self.point_queue:
+            self.point_queue.open(self.engine)
         self._make_session()
 
+    def close(self):
+        """
+        Закрывает сессию и подключения к текущей базе
+        """
+        if self.point_queue:
+            self.point_queue.close()
+        self.Session.remove()
+        close_engine(self.engine)
+
     def _make_session(self):
         """
         Создаст сессию
@@ -50,15 +146,15 @@ class SessionFactorySupport:
     """
     def __init__(self):
         db_url = f'sqlite:///support_base.sqlite'
-        self.engine = create_engine(db_url)
+        self.engine = create_sqlite_engine(db_url, "SqliteSupport")
         self.Session = scoped_session(sessionmaker(bind=self.engine))
 
     def get_session(self):
         return self.Session()
 
-
-@event.listens_for(Engine, "connect")
-def set_sqlite_pragma(dbapi_connection, connection_record):
-    cursor = dbapi_connection.cursor()
-    cursor.execute("PRAGMA foreign_keys=ON")
-    cursor.close()
+    def close(self):
+        """
+        Закрывает сессию и подключения к системной базе
+        """
+        self.Session.remove()
+        close_engine(self.engine)
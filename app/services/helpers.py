@@ -1,8 +1,13 @@
 import os
 import sys
+import time
+from collections import deque
 from datetime import datetime
 
 import cv2
+import numpy as np
+import psutil
+from PIL import Image
 from pathlib import Path
 
 from PyQt5 import QtGui
@@ -11,6 +16,32 @@ from PyQt5.QtGui import QImage
 from PyQt5.QtWidgets import QFileSystemModel
 
 from app import COUNT_FOLDERS, LOCATION_FOLDERS, PATTERN_SUFFIX, m_params
+from app.services.image_cache import image_cache
+from app.services.photo_index import path_resolver
+
+
+class DecodeStats:
+    """
+    Статистика одного декодирования: размер кадра, время, объем буфера QImage и прирост RSS процесса
+    между началом и концом декодирования (RSS замеряется до и после, а не пиковое значение).
+    """
+    def __init__(self, path: str, width: int, height: int, seconds: float, image_bytes: int, rss_delta_bytes: int):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.seconds = seconds
+        self.image_bytes = image_bytes
+        self.rss_delta_bytes = rss_delta_bytes
+
+
+# флаги декодирования OpenCV с уменьшением средствами JPEG (DCT scaling)
+REDUCED_FLAGS = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+
+# форматы, которые могут содержать альфа-канал: читаются без приведения к BGR, чтобы прозрачность сохранилась
+ALPHA_SUFFIXES = (".png", ".bmp")
+
+# статистика последних декодирований для оценки расхода памяти
+decode_stats: deque[DecodeStats] = deque(maxlen=100)
 
 
 def select_project_folders(param):
@@ -52,27 +83,143 @@ def check_pattern_suffixes(item):
     return False
 
 
-def open_image_to_pixmap(path):
+def open_image_to_qimage(path):
     """
-    Открывает изображение и помещает его в QPixmap
+    Открывает изображение и помещает его в QImage.
+    В отличие от QPixmap, QImage можно создавать вне GUI-потока, поэтому функция используется фоновыми загрузчиками.
+    Декодированное изображение берется из общего кэша image_cache и помещается в него.
     """
     if not check_pattern_suffixes(path):
-        return QtGui.QPixmap()
+        return QImage()
+
+    key = image_cache.make_key(path)
+    img = image_cache.get(key)
+    if img is not None:
+        return img
+
+    flags = cv2.IMREAD_UNCHANGED if path.lower().endswith(ALPHA_SUFFIXES) else cv2.IMREAD_COLOR
+    img = _decode_image(path, flags)
+    image_cache.put(key, img)
+    return img
+
+
+def _decode_image(path, flags=cv2.IMREAD_COLOR):
+    """
+    Декодирует изображение с диска в QImage без обращения к кэшу.
+
+    Буфер QImage выделяется и принадлежит Qt, а OpenCV записывает в него пиксели сразу в порядке RGB
+    (cvtColor с dst), поэтому отдельной копии после rgbSwapped() не создается. Изображения с альфа-каналом
+    (flags=IMREAD_UNCHANGED) декодируются в Format_RGBA8888, остальные - в Format_RGB888. Буфер OpenCV
+    освобождается сразу после конвертации. Статистика памяти каждого декодирования сохраняется в decode_stats.
+    """
+    process = psutil.Process()
+    rss_start = process.memory_info().rss
+    time_start = time.perf_counter()
+
+    image = cv2.imread(path, flags)  # загружает изображение из файла path в порядке BGR
+    if image is None:
+        return QImage()
+    rss_end = process.memory_info().rss
+
+    # IMREAD_UNCHANGED сохраняет глубину и число каналов файла: приводим к 8 битам и BGR/BGRA
+    if image.dtype != np.uint8:
+        image = cv2.convertScaleAbs(image, alpha=255 / np.iinfo(image.dtype).max)
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+
+    channels = image.shape[2]
+    if channels == 4:
+        qformat, code = QImage.Format_RGBA8888, cv2.COLOR_BGRA2RGBA
+    else:
+        qformat, code = QImage.Format_RGB888, cv2.COLOR_BGR2RGB
+
+    height, width = image.shape[:2]
+    img = QImage(width, height, qformat)
+    if img.isNull():
+        return img
+
+    # numpy-представление буфера QImage с учетом выравнивания строк
+    ptr = img.bits()
+    ptr.setsize(img.sizeInBytes())
+    dst = np.ndarray(shape=(height, width, channels), dtype=np.uint8, buffer=ptr,
+                     strides=(img.bytesPerLine(), channels, 1))
+    cv2.cvtColor(image, code, dst=dst)
+
+    rss_end = max(rss_end, process.memory_info().rss)
+    del dst, image
+
+    decode_stats.append(DecodeStats(path=path,
+                                    width=width,
+                                    height=height,
+                                    seconds=time.perf_counter() - time_start,
+                                    image_bytes=img.sizeInBytes(),
+                                    rss_delta_bytes=max(0, rss_end - rss_start)))
+    return img
+
+
+def decode_memory_report():
+    """
+    Возвращает сводку по последним декодированиям: количество, среднее время, средний и максимальный
+    прирост RSS процесса за декодирование.
+    """
+    if not decode_stats:
+        return {'count': 0, 'avg_seconds': 0, 'avg_rss_delta_bytes': 0, 'max_rss_delta_bytes': 0}
+    return {'count': len(decode_stats),
+            'avg_seconds': sum(x.seconds for x in decode_stats) / len(decode_stats),
+            'avg_rss_delta_bytes': sum(x.rss_delta_bytes for x in decode_stats) // len(decode_stats),
+            'max_rss_delta_bytes': max(x.rss_delta_bytes for x in decode_stats)}
+
+
+def preview_reduction(path, target_size):
+    """
+    Подбирает коэффициент уменьшения JPEG (1, 2, 4 или 8) так, чтобы изображение было не меньше target_size.
+    Размер изображения читается из заголовка файла без декодирования пикселей.
+    """
+    try:
+        with Image.open(path) as im:
+            width, height = im.size
+    except (OSError, ValueError):
+        return 1
 
-    image = cv2.imread(path)  # загружает изображение из файла path с помощью OpenCV
-    size = image.shape  # получаем размер изображения
-    step = image.size / size[0]  # вычисляем шаг строки в байтах (смещение между строками в памяти)
-    qformat = QImage.Format_Indexed8  # для grayscale изображений
+    side = max(width, height)
+    target = max(target_size[0], target_size[1], 1)
+    factor = 1
+    while factor < 8 and side / (factor * 2) >= target:
+        factor *= 2
+    return factor
 
-    # Определяем формат QImage на основе числа каналов
-    if len(size) == 3:
-        if size[2] == 4:
-            qformat = QImage.Format_RGBA8888  # для изображений RGBA
-        else:
-            qformat = QImage.Format_RGB888  # для изображений RGB
 
-    # Создаем QImage, передавая ему данные из OpenCV изображения и преобразуем из BGR порядка в RGB.
-    img = QImage(image, size[1], size[0], step, qformat).rgbSwapped()
+def open_image_preview(path, target_size):
+    """
+    Открывает изображение для окна предпросмотра в уменьшенном разрешении.
+
+    JPEG декодируется сразу с уменьшением в 2, 4 или 8 раз (IMREAD_REDUCED_COLOR_*), коэффициент выбирается
+    по размеру области просмотра target_size (ширина, высота). Для окон учета используется open_image_to_qimage.
+    """
+    if not check_pattern_suffixes(path):
+        return QImage()
+
+    factor = preview_reduction(path, target_size)
+    if factor == 1:
+        return open_image_to_qimage(path)
+
+    key = image_cache.make_key(path, ('reduced', factor))
+    img = image_cache.get(key)
+    if img is not None:
+        return img
+
+    img = _decode_image(path, REDUCED_FLAGS[factor])
+    image_cache.put(key, img)
+    return img
+
+
+def open_image_to_pixmap(path):
+    """
+    Открывает изображение и помещает его в QPixmap
+    """
+    img = open_image_to_qimage(path)
+    if img.isNull():
+        return QtGui.QPixmap()
     return QtGui.QPixmap.fromImage(img)
 
 
@@ -87,7 +234,7 @@ def makeDatecreated():
 
 def search_path_photo(name_photo):
     """
-    Ищет путь к фотографии на основе ее имени
+    Ищет путь к фотографии на основе ее имени в папке дня по индексу файлов проекта (PathResolver)
 
     Parameters:
     - name_photo (str): Имя фотографии
@@ -95,14 +242,4 @@ def search_path_photo(name_photo):
     Returns:
     - str: Путь к фотографии, если она найдена, или None, если фотография не найдена.
     """
-    date = name_photo[0:8]
-    items = m_params.model_directories.findItems(date, Qt.MatchFixedString | Qt.MatchRecursive)
-    if items:
-        for item in items:
-            parent = m_params.model_directories.parent(item.index())
-            path = os.path.join(parent.data(), date, name_photo)
-            folder = str(parent.data()).split('_')[-1]
-
-            if os.path.exists(path):
-                return path
-    return None
+    return path_resolver.resolve(name_photo)
@@ -0,0 +1,98 @@
+import os
+import threading
+from collections import OrderedDict
+
+from PyQt5.QtGui import QImage
+
+from app.services.user_settings import Settings
+
+# бюджет кэша по умолчанию, МБ
+IMAGE_CACHE_MB = 512
+
+
+class ImageCache:
+    """
+    Общий для всего процесса кэш декодированных изображений.
+
+    Ключ - путь к файлу, время изменения файла и целевое разрешение (None для полного),
+    поэтому измененный на диске файл не будет взят из кэша.
+    Кэш ограничен по объему в байтах и вытесняет давно не использованные изображения (LRU).
+    Хранятся QImage, т.к. их можно создавать и читать из фоновых потоков.
+    """
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items: OrderedDict[tuple, QImage] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(path, size=None):
+        """
+        Возвращает ключ кэша для файла или None, если файл недоступен.
+        """
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        return os.path.normcase(os.path.abspath(path)), mtime, size
+
+    def get(self, key):
+        if key is None:
+            return None
+        with self._lock:
+            image = self._items.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return image
+
+    def put(self, key, image: QImage):
+        if key is None or image.isNull():
+            return
+        nbytes = image.sizeInBytes()
+        if nbytes > self.budget_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size_bytes -= old.sizeInBytes()
+            self._items[key] = image
+            self.size_bytes += nbytes
+            self._evict()
+
+    def set_budget(self, budget_bytes):
+        with self._lock:
+            self.budget_bytes = budget_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.size_bytes = 0
+
+    def stats(self):
+        """
+        Возвращает счетчики кэша: попадания, промахи, число изображений и занятый объем в байтах.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'items': len(self._items), 'bytes': self.size_bytes}
+
+    def _evict(self):
+        while self.size_bytes > self.budget_bytes and self._items:
+            _, image = self._items.popitem(last=False)
+            self.size_bytes -= image.sizeInBytes()
+
+
+def _budget_from_settings():
+    settings = Settings.instance()
+    budget = IMAGE_CACHE_MB
+    if settings.contains("ImageCacheMB") and settings.value("ImageCacheMB"):
+        budget = int(settings.value("ImageCacheMB"))
+    return budget * 1024 * 1024
+
+
+image_cache = ImageCache(_budget_from_settings())
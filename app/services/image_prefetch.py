@@ -0,0 +1,148 @@
+from PyQt5.QtCore import QObject, QRunnable, QThread, QThreadPool, pyqtSignal
+from PyQt5.QtGui import QImage
+
+from app.services.helpers import open_image_to_qimage
+from app.services.user_settings import Settings
+
+# количество кадров до и после текущего, которые декодируются заранее
+PREFETCH_DEPTH = 2
+
+
+class PrefetchSignals(QObject):
+    """
+    Сигналы фоновой задачи декодирования.
+    QRunnable не является QObject, поэтому сигналы вынесены в отдельный объект, живущий в GUI-потоке.
+    """
+    finished = pyqtSignal(object, QImage)
+
+
+class PrefetchTask(QRunnable):
+    """
+    Задача декодирования одного кадра в QImage в пуле потоков.
+    Пул не удаляет задачу после выполнения (autoDelete выключен): задачей владеет ImagePrefetcher и
+    освобождает ее по сигналу finished, поэтому отмена (tryTake) никогда не обращается к удаленному объекту.
+    """
+    def __init__(self, path, signals):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.path = path
+        self.signals = signals
+        self.cancelled = False
+
+    def run(self):
+        image = QImage() if self.cancelled else open_image_to_qimage(self.path)
+        # сигнал отправляется и для отмененной задачи: по нему задача освобождается
+        self.signals.finished.emit(self, image)
+
+
+class ImagePrefetcher(QObject):
+    """
+    Фоновая предзагрузка кадров вокруг текущей строки списка изображений.
+
+    Декодирует depth кадров до и после текущего в пуле потоков и хранит готовые QImage, так что переход
+    на соседний кадр сводится к замене изображения во viewer.
+    Политика отмены: при каждом переходе задачи и изображения вне нового окна отменяются, а при прыжке
+    дальше окна отменяются все ранее запущенные задачи и их результаты отбрасываются.
+    Сигналы:
+    - imageReady: изображение по пути path декодировано и готово к показу.
+    """
+    imageReady = pyqtSignal(str)
+
+    def __init__(self, depth=None, parent=None):
+        super().__init__(parent)
+
+        if depth is None:
+            settings = Settings.instance()
+            depth = PREFETCH_DEPTH
+            if settings.contains("PrefetchDepth") and settings.value("PrefetchDepth"):
+                depth = int(settings.value("PrefetchDepth"))
+        self.depth = max(0, depth)
+
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max(1, min(self.depth * 2, QThread.idealThreadCount() - 1)))
+
+        self.signals = PrefetchSignals()
+        self.signals.finished.connect(self._task_finished)
+
+        self._row = None
+        self._window = []
+        self._tasks: dict[str, PrefetchTask] = {}
+        # запущенные в пуле задачи (в том числе отмененные), которые еще не прислали finished
+        self._started: set[PrefetchTask] = set()
+        self._images: dict[str, QImage] = {}
+
+    def take(self, path):
+        """
+        Возвращает готовое изображение для path или None, если кадр еще не декодирован.
+        """
+        return self._images.get(path)
+
+    def update(self, row, paths):
+        """
+        Перестраивает окно предзагрузки вокруг строки row.
+
+        paths - список путей к кадрам в порядке строк списка изображений.
+        """
+        if self._row is not None and abs(row - self._row) > self.depth:
+            self._cancel_all()
+        self._row = row
+
+        # ближайшие кадры идут первыми, чтобы получить больший приоритет в пуле
+        window = []
+        for distance in range(1, self.depth + 1):
+            for r in (row + distance, row - distance):
+                if 0 <= r < len(paths):
+                    window.append(paths[r])
+
+        # текущий кадр держим, пока окно не сместится
+        keep = set(window)
+        if 0 <= row < len(paths):
+            keep.add(paths[row])
+
+        for path in list(self._tasks):
+            if path not in keep:
+                self._cancel(path)
+
+        for path in list(self._images):
+            if path not in keep:
+                del self._images[path]
+
+        self._window = window
+        for priority, path in enumerate(reversed(window)):
+            if path in self._images or path in self._tasks:
+                continue
+            task = PrefetchTask(path, self.signals)
+            self._tasks[path] = task
+            self._started.add(task)
+            self.pool.start(task, priority)
+
+    def clear(self):
+        """
+        Отменяет все задачи и освобождает декодированные изображения.
+        """
+        self._cancel_all()
+        self._images.clear()
+        self._window = []
+        self._row = None
+
+    def _cancel_all(self):
+        for path in list(self._tasks):
+            self._cancel(path)
+
+    def _cancel(self, path):
+        task = self._tasks.pop(path)
+        task.cancelled = True
+        if self.pool.tryTake(task):
+            # задача еще не начала выполняться и finished не пришлет
+            self._started.discard(task)
+
+    def _task_finished(self, task, image):
+        self._started.discard(task)
+        if task.cancelled or self._tasks.get(task.path) is not task:
+            return
+
+        path = task.path
+        del self._tasks[path]
+        if path in self._window and not image.isNull():
+            self._images[path] = image
+            self.imageReady.emit(path)
@@ -0,0 +1,437 @@
+"""
+Миграции схемы файла учета (main_db).
+
+Версия схемы хранится в PRAGMA user_version. Каждая миграция - функция, которая получает подключение sqlite3
+и выполняется в отдельной транзакции вместе с записью новой версии; при ошибке транзакция откатывается
+и база остается в прежней версии. Текст миграций не меняется после выпуска: новые изменения схемы
+добавляются новой миграцией в конец MIGRATIONS.
+"""
+from sqlalchemy import inspect
+
+
+class MigrationError(Exception):
+    pass
+
+
+# индексы под частые запросы: (имя, таблица, столбцы)
+SECONDARY_INDEXES = [
+    ('ix_count_pointscount_file', 'count_pointscount',
+     ['r_year', 'site', 'r_date', 'time_start', 'file_name', 'count_type', 'species', 'creator']),
+    ('ix_count_patternscount_file', 'count_patternscount',
+     ['r_year', 'site', 'r_date', 'time_start', 'file_name', 'count_type', 'species', 'creator']),
+    ('ix_count_groupscount_file', 'count_groupscount',
+     ['r_year', 'site', 'r_date', 'time_start', 'file_name', 'count_type', 'species', 'creator']),
+    ('ix_id_daily_date', 'id_daily', ['r_year', 'site', 'species', 'r_date']),
+    ('ix_id_location_date', 'id_location', ['r_year', 'site', 'species', 'r_date', 'file_name']),
+]
+
+# частые запросы, для которых план не должен содержать полного просмотра таблицы
+HOT_QUERIES = {
+    'load_points': "SELECT * FROM count_pointscount WHERE r_year = 0 AND site = 0 AND r_date = 0 "
+                   "AND time_start = '' AND file_name = '' AND species = '' AND creator = '' AND count_type = ''",
+    'load_pattern_points': "SELECT * FROM count_patternscount WHERE r_year = 0 AND site = 0 AND r_date = 0 "
+                           "AND time_start = '' AND file_name = '' AND species = '' AND creator = '' "
+                           "AND count_type = ''",
+    'get_view_other_animals': "SELECT * FROM count_pointscount WHERE r_year = 0 AND site = 0 AND r_date = 0 "
+                              "AND time_start = '' AND file_name = '' AND count_type = '' AND species != ''",
+    'get_view_other_animals_pattern': "SELECT * FROM count_patternscount WHERE r_year = 0 AND site = 0 "
+                                      "AND r_date = 0 AND time_start = '' AND file_name = '' AND count_type = '' "
+                                      "AND species != ''",
+    'load_done_count_files': "SELECT * FROM count_pointscount WHERE r_year = 0 AND site = 0 AND r_date = 0 "
+                             "AND time_start = '' AND creator = '' AND species = ''",
+    'daily_total_count': "SELECT * FROM count_pointscount WHERE r_year = 0 AND r_date = 0 AND site = 0 "
+                         "AND species = '' AND time_start = '' AND creator = ''",
+    'load_count_files': "SELECT * FROM count_source WHERE r_year = 0 AND site = 0 AND r_date = 0 "
+                        "AND time_start = '' AND creator = '' AND species = ''",
+    'load_daily_report': "SELECT * FROM id_daily WHERE r_year = 0 AND site = 0 AND species = '' AND r_date = 0",
+    'load_done_location_files': "SELECT * FROM id_location WHERE r_year = 0 AND site = 0 AND r_date = 0 "
+                                "AND species = ''",
+    'location_points': "SELECT * FROM id_location WHERE r_year = 0 AND site = 0 AND r_date = 0 "
+                       "AND file_name = '' AND species = ''",
+}
+
+
+def table_names(con):
+    return {row[0] for row in con.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def table_columns(con, table):
+    return [row[1] for row in con.execute(f"PRAGMA table_info({table})")]
+
+
+def create_secondary_indexes(con, only_table=None):
+    tables = table_names(con)
+    for name, table, columns in SECONDARY_INDEXES:
+        if table in tables and only_table in (None, table):
+            con.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})")
+
+
+# Миграция 2 (суррогатные ключи). Таблицы и триггеры записаны текстом на момент выпуска миграции, а не берутся
+# из моделей: последующие изменения моделей не должны менять то, что миграция создает в старых файлах.
+
+# таблицы, получающие суррогатный ключ id
+SURROGATE_PARENTS = ['count_list', 'count_source', 'id_resight', 'id_daily']
+# таблицы точек, которые ссылаются на суррогатный ключ:
+# (таблица, столбец ссылки, таблица-владелец ключа, столбцы естественного ключа владельца)
+SURROGATE_CHILDREN = [
+    ('count_pointscount', 'source_id', 'count_source',
+     ['r_year', 'site', 'r_date', 'time_start', 'creator', 'species', 'file_name', 'count_type']),
+    ('count_patternscount', 'source_id', 'count_source',
+     ['r_year', 'site', 'r_date', 'time_start', 'creator', 'species', 'file_name', 'count_type']),
+    ('count_groupscount', 'source_id', 'count_source',
+     ['r_year', 'site', 'r_date', 'time_start', 'creator', 'species', 'file_name', 'count_type']),
+    ('id_location', 'daily_id', 'id_daily', ['species', 'r_year', 'site', 'animal_name', 'r_date']),
+]
+
+# таблица -> CREATE TABLE
+SURROGATE_TABLES = {
+    'count_list': """
+        CREATE TABLE count_list (
+            id INTEGER NOT NULL,
+            r_year INTEGER NOT NULL,
+            site INTEGER NOT NULL,
+            r_date INTEGER NOT NULL,
+            time_start VARCHAR COLLATE "NOCASE" NOT NULL,
+            creator VARCHAR COLLATE "NOCASE" NOT NULL,
+            species VARCHAR COLLATE "NOCASE" NOT NULL,
+            comments TEXT,
+            datecreated VARCHAR,
+            dateupdated VARCHAR,
+            PRIMARY KEY (id),
+            FOREIGN KEY(r_year, site, species) REFERENCES survey_effort (r_year, site, species)
+                ON DELETE CASCADE ON UPDATE CASCADE,
+            CONSTRAINT uq_count_list UNIQUE (r_year, site, r_date, time_start, creator, species)
+        )""",
+    'count_source': """
+        CREATE TABLE count_source (
+            id INTEGER NOT NULL,
+            r_year INTEGER NOT NULL,
+            site INTEGER NOT NULL,
+            r_date INTEGER NOT NULL,
+            time_start VARCHAR NOT NULL,
+            creator VARCHAR COLLATE "NOCASE" NOT NULL,
+            species VARCHAR COLLATE "NOCASE" NOT NULL,
+            observer VARCHAR COLLATE "NOCASE" NOT NULL,
+            comments TEXT,
+            file_name VARCHAR COLLATE "NOCASE" NOT NULL,
+            count_type VARCHAR COLLATE "NOCASE" NOT NULL,
+            datecreated VARCHAR,
+            dateupdated VARCHAR,
+            PRIMARY KEY (id),
+            FOREIGN KEY(r_year, site, r_date, time_start, creator, species, count_type)
+                REFERENCES count_effort_types (r_year, site, r_date, time_start, creator, species, count_type)
+                ON DELETE CASCADE ON UPDATE CASCADE,
+            CONSTRAINT uq_count_source UNIQUE (r_year, site, r_date, time_start, creator, species, file_name,
+                                              count_type)
+        )""",
+    'id_resight': """
+        CREATE TABLE id_resight (
+            id INTEGER NOT NULL,
+            species VARCHAR COLLATE "NOCASE" NOT NULL,
+            r_year INTEGER NOT NULL,
+            site INTEGER NOT NULL,
+            animal_name VARCHAR COLLATE "NOCASE" NOT NULL,
+            brand_quality VARCHAR COLLATE "NOCASE",
+            sex_r VARCHAR COLLATE "NOCASE" NOT NULL,
+            status VARCHAR COLLATE "NOCASE" NOT NULL,
+            comments TEXT,
+            id_status INTEGER,
+            datecreated VARCHAR,
+            dateupdated VARCHAR,
+            PRIMARY KEY (id),
+            FOREIGN KEY(r_year, site, species) REFERENCES survey_effort (r_year, site, species)
+                ON DELETE CASCADE ON UPDATE CASCADE,
+            CONSTRAINT uq_id_resight UNIQUE (species, r_year, site, animal_name)
+        )""",
+    'id_daily': """
+        CREATE TABLE id_daily (
+            id INTEGER NOT NULL,
+            species VARCHAR COLLATE "NOCASE" NOT NULL,
+            r_year INTEGER NOT NULL,
+            site INTEGER NOT NULL,
+            animal_name VARCHAR COLLATE "NOCASE" NOT NULL,
+            r_date INTEGER NOT NULL,
+            status VARCHAR COLLATE "NOCASE" NOT NULL,
+            local_site VARCHAR COLLATE "NOCASE",
+            comments TEXT,
+            observer VARCHAR COLLATE "NOCASE" NOT NULL,
+            datecreated VARCHAR,
+            dateupdated VARCHAR,
+            PRIMARY KEY (id),
+            FOREIGN KEY(r_year, site, species, animal_name) REFERENCES id_resight (r_year, site, species, animal_name)
+                ON DELETE CASCADE ON UPDATE CASCADE,
+            CONSTRAINT uq_id_daily UNIQUE (species, r_year, site, animal_name, r_date)
+        )""",
+    'count_pointscount': """
+        CREATE TABLE count_pointscount (
+            source_id INTEGER NOT NULL,
+            r_year INTEGER NOT NULL,
+            site INTEGER NOT NULL,
+            r_date INTEGER NOT NULL,
+            time_start VARCHAR NOT NULL,
+            creator VARCHAR COLLATE "NOCASE" NOT NULL,
+            species VARCHAR COLLATE "NOCASE" NOT NULL,
+            observer VARCHAR COLLATE "NOCASE" NOT NULL,
+            local_site VARCHAR COLLATE "NOCASE" NOT NULL,
+            animal_category VARCHAR COLLATE "NOCASE" NOT NULL,
+            "iLeft" INTEGER NOT NULL,
+            "iTop" INTEGER NOT NULL,
+            file_name VARCHAR COLLATE "NOCASE" NOT NULL,
+            count_type VARCHAR COLLATE "NOCASE" NOT NULL,
+            datecreated VARCHAR,
+            dateupdated VARCHAR,
+            CONSTRAINT uq_count_pointscount UNIQUE (source_id, "iLeft", "iTop"),
+            FOREIGN KEY(source_id) REFERENCES count_source (id) ON DELETE CASCADE
+        )""",
+    'count_patternscount': """
+        CREATE TABLE count_patternscount (
+            source_id INTEGER NOT NULL,
+            r_year INTEGER NOT NULL,
+            site INTEGER NOT NULL,
+            r_date INTEGER NOT NULL,
+            time_start VARCHAR NOT NULL,
+            creator VARCHAR COLLATE "NOCASE" NOT NULL,
+            species VARCHAR COLLATE "NOCASE" NOT NULL,
+            observer VARCHAR COLLATE "NOCASE" NOT NULL,
+            local_site VARCHAR COLLATE "NOCASE" NOT NULL,
+            animal_category VARCHAR COLLATE "NOCASE" NOT NULL,
+            "iLeft" INTEGER NOT NULL,
+            "iTop" INTEGER NOT NULL,
+            file_name VARCHAR COLLATE "NOCASE" NOT NULL,
+            count_type VARCHAR COLLATE "NOCASE" NOT NULL,
+            datecreated VARCHAR,
+            dateupdated VARCHAR,
+            CONSTRAINT uq_count_patternscount UNIQUE (source_id, "iLeft", "iTop"),
+            FOREIGN KEY(source_id) REFERENCES count_source (id) ON DELETE CASCADE
+        )""",
+    'count_groupscount': """
+        CREATE TABLE count_groupscount (
+            source_id INTEGER NOT NULL,
+            r_year INTEGER NOT NULL,
+            site INTEGER NOT NULL,
+            r_date INTEGER NOT NULL,
+            time_start VARCHAR NOT NULL,
+            creator VARCHAR COLLATE "NOCASE" NOT NULL,
+            species VARCHAR COLLATE "NOCASE" NOT NULL,
+            observer VARCHAR COLLATE "NOCASE" NOT NULL,
+            local_site VARCHAR COLLATE "NOCASE" NOT NULL,
+            time_s VARCHAR NOT NULL,
+            time_f VARCHAR,
+            animal_category VARCHAR COLLATE "NOCASE" NOT NULL,
+            count INTEGER NOT NULL,
+            file_name VARCHAR COLLATE "NOCASE" NOT NULL,
+            count_type VARCHAR COLLATE "NOCASE" NOT NULL,
+            datecreated VARCHAR,
+            dateupdated VARCHAR,
+            CONSTRAINT uq_count_groupscount UNIQUE (source_id, local_site, animal_category),
+            FOREIGN KEY(source_id) REFERENCES count_source (id) ON DELETE CASCADE
+        )""",
+    'id_location': """
+        CREATE TABLE id_location (
+            daily_id INTEGER NOT NULL,
+            species VARCHAR COLLATE "NOCASE" NOT NULL,
+            r_year INTEGER NOT NULL,
+            site INTEGER NOT NULL,
+            animal_name VARCHAR COLLATE "NOCASE" NOT NULL,
+            r_date INTEGER NOT NULL,
+            time_start VARCHAR NOT NULL,
+            local_site VARCHAR COLLATE "NOCASE",
+            animal_type VARCHAR COLLATE "NOCASE" NOT NULL,
+            "iLeft" INTEGER NOT NULL,
+            "iTop" INTEGER NOT NULL,
+            observer VARCHAR COLLATE "NOCASE" NOT NULL,
+            file_name VARCHAR COLLATE "NOCASE" NOT NULL,
+            type_photo VARCHAR COLLATE "NOCASE",
+            is_prediction_point INTEGER NOT NULL,
+            datecreated VARCHAR,
+            dateupdated VARCHAR,
+            CONSTRAINT uq_id_location UNIQUE (daily_id, "iLeft", "iTop", file_name),
+            FOREIGN KEY(daily_id) REFERENCES id_daily (id) ON DELETE CASCADE
+        )""",
+}
+
+# таблица-владелец -> значения столбцов (выражения по строкам точек c), кроме естественного ключа, для строки
+# владельца, которую миграция создает для точек без владельца
+SURROGATE_RESTORED = {
+    'count_source': {'observer': 'min(c.observer)'},
+    'id_daily': {'observer': 'min(c.observer)', 'status': "''", 'local_site': 'min(c.local_site)'},
+}
+RESTORED_COMMENT = 'Restored by migration 2: the row was missing for existing points'
+
+# таблица -> триггер, который переносит изменения естественного ключа владельца в таблицы точек
+SURROGATE_TRIGGERS = {
+    'count_source': """
+        CREATE TRIGGER count_source_AFTER_UPDATE
+                 AFTER UPDATE OF r_year, site, r_date, time_start, creator, species, file_name, count_type
+                    ON count_source
+              FOR EACH ROW
+        BEGIN
+            UPDATE count_pointscount
+               SET r_year = NEW.r_year, site = NEW.site, r_date = NEW.r_date, time_start = NEW.time_start,
+                   creator = NEW.creator, species = NEW.species, file_name = NEW.file_name,
+                   count_type = NEW.count_type
+             WHERE source_id = NEW.id;
+            UPDATE count_patternscount
+               SET r_year = NEW.r_year, site = NEW.site, r_date = NEW.r_date, time_start = NEW.time_start,
+                   creator = NEW.creator, species = NEW.species, file_name = NEW.file_name,
+                   count_type = NEW.count_type
+             WHERE source_id = NEW.id;
+            UPDATE count_groupscount
+               SET r_year = NEW.r_year, site = NEW.site, r_date = NEW.r_date, time_start = NEW.time_start,
+                   creator = NEW.creator, species = NEW.species, file_name = NEW.file_name,
+                   count_type = NEW.count_type
+             WHERE source_id = NEW.id;
+        END;""",
+    'id_daily': """
+        CREATE TRIGGER id_daily_AFTER_UPDATE
+                 AFTER UPDATE OF species, r_year, site, animal_name, r_date
+                    ON id_daily
+              FOR EACH ROW
+        BEGIN
+            UPDATE id_location
+               SET species = NEW.species, r_year = NEW.r_year, site = NEW.site, animal_name = NEW.animal_name,
+                   r_date = NEW.r_date
+             WHERE daily_id = NEW.id;
+        END;""",
+}
+
+
+def _rebuild_table(con, table, select_sql):
+    """
+    Пересоздает таблицу table по SURROGATE_TABLES: создает новую таблицу, копирует в нее строки запросом,
+    который возвращает select_sql(столбцы новой таблицы), сверяет количество строк, удаляет старую таблицу
+    и создает индексы таблицы из SECONDARY_INDEXES.
+    """
+    new_name = f"{table}__new"
+    con.execute(SURROGATE_TABLES[table].replace(f"CREATE TABLE {table} (", f"CREATE TABLE {new_name} (", 1))
+
+    columns = table_columns(con, new_name)
+    con.execute(f"INSERT INTO {new_name} ({', '.join(columns)}) {select_sql(columns)}")
+
+    old_count = con.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+    new_count = con.execute(f"SELECT count(*) FROM {new_name}").fetchone()[0]
+    if old_count != new_count:
+        raise MigrationError(f"{table}: {old_count} rows before migration, {new_count} after")
+
+    con.execute(f"DROP TABLE {table}")
+    con.execute(f"ALTER TABLE {new_name} RENAME TO {table}")
+    create_secondary_indexes(con, table)
+
+
+def restore_parents(con, table, parent, parent_columns, match):
+    """
+    Создает строки владельца parent для точек table, у которых владельца нет (файл записан с отключенной
+    проверкой внешних ключей): ссылка на владельца обязательна, а точки должны остаться в файле.
+    Созданные строки помечаются RESTORED_COMMENT.
+    """
+    values = SURROGATE_RESTORED[parent]
+    key = ', '.join(f'c.{column}' for column in parent_columns)
+    con.execute(f"INSERT INTO {parent} ({', '.join(parent_columns)}, {', '.join(values)}, comments, datecreated) "
+                f"SELECT {key}, {', '.join(values.values())}, ?, CURRENT_TIMESTAMP FROM {table} c "
+                f"WHERE NOT EXISTS (SELECT 1 FROM {parent} p WHERE {match}) GROUP BY {key}", (RESTORED_COMMENT,))
+
+
+def add_surrogate_keys(con):
+    """
+    Суррогатные ключи: count_list, count_source, id_resight и id_daily получают id INTEGER PRIMARY KEY,
+    естественный ключ остается уникальным. Таблицы точек получают обязательную ссылку source_id / daily_id
+    вместо составного внешнего ключа, значения ссылок заполняются по естественному ключу; для точек без
+    владельца строка владельца создается (restore_parents).
+    Таблицы, у которых столбец ключа уже есть (база создана по новым моделям), не пересоздаются.
+    """
+    tables = table_names(con)
+
+    for name in SURROGATE_PARENTS:
+        if name not in tables or 'id' in table_columns(con, name):
+            continue
+        old_columns = table_columns(con, name)
+        _rebuild_table(con, name, lambda columns: "SELECT {} FROM {} ORDER BY rowid".format(
+            ', '.join(c if c in old_columns else 'NULL' for c in columns), name))
+
+    for name, key, parent, parent_columns in SURROGATE_CHILDREN:
+        if name not in tables or key in table_columns(con, name):
+            continue
+        old_columns = table_columns(con, name)
+        match = ' AND '.join(f"p.{column} = c.{column}" for column in parent_columns)
+        restore_parents(con, name, parent, parent_columns, match)
+        # ссылка - подзапрос, а не соединение: количество строк точек не зависит от строк владельца
+        owner_id = f"(SELECT p.id FROM {parent} p WHERE {match} LIMIT 1)"
+        _rebuild_table(con, name, lambda columns: "SELECT {} FROM {} c ORDER BY c.rowid".format(
+            ', '.join(owner_id if c == key else f"c.{c}" if c in old_columns else 'NULL' for c in columns), name))
+
+    tables = table_names(con)
+    for table, trigger in SURROGATE_TRIGGERS.items():
+        name = f"{table}_AFTER_UPDATE"
+        exists = con.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?", (name,)).fetchone()
+        if table in tables and not exists:
+            con.execute(trigger)
+
+
+# (версия, описание, функция)
+MIGRATIONS = [
+    (1, 'secondary indexes for hot queries', create_secondary_indexes),
+    (2, 'surrogate integer keys for count, source, resight and daily rows', add_surrogate_keys),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(con):
+    return con.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(engine):
+    """
+    Применяет к базе engine миграции с версией больше текущей. Возвращает список примененных описаний.
+    На время миграций отключаются проверка внешних ключей и перезапись ссылок при переименовании таблиц,
+    как требует порядок пересоздания таблиц SQLite.
+    """
+    applied = []
+    raw = engine.raw_connection()
+    con = raw.driver_connection
+    isolation_level = con.isolation_level
+    try:
+        con.isolation_level = None
+        current = schema_version(con)
+        if current >= SCHEMA_VERSION:
+            return applied
+
+        con.execute("PRAGMA foreign_keys=OFF")
+        con.execute("PRAGMA legacy_alter_table=ON")
+        for version, description, step in MIGRATIONS:
+            if version <= current:
+                continue
+            con.execute("BEGIN")
+            try:
+                step(con)
+                con.execute(f"PRAGMA user_version = {version}")
+                con.execute("COMMIT")
+            except Exception:
+                con.execute("ROLLBACK")
+                raise
+            applied.append(description)
+    finally:
+        con.execute("PRAGMA legacy_alter_table=OFF")
+        con.execute("PRAGMA foreign_keys=ON")
+        con.isolation_level = isolation_level
+        raw.close()
+    return applied
+
+
+def check_query_plans(engine, queries=None):
+    """
+    Проверяет планы частых запросов (EXPLAIN QUERY PLAN). Возвращает словарь имя запроса -> строки плана
+    для запросов, в плане которых есть полный просмотр таблицы (SCAN). Пустой словарь - все запросы
+    используют индексы.
+    """
+    failed = {}
+    with engine.connect() as connection:
+        tables = set(inspect(connection).get_table_names())
+        for name, sql in (queries or HOT_QUERIES).items():
+            table = sql.split(' FROM ')[1].split()[0]
+            if table not in tables:
+                continue
+            plan = [row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+            if any(str(detail).startswith('SCAN') for detail in plan):
+                failed[name] = plan
+    return failed
@@ -0,0 +1,314 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+from PIL import Image
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from app import PATTERN_SUFFIX, m_params
+from app.services.thumbnails import CACHE_FILE_NAME, cache_file
+
+# теги EXIF: вложенный блок Exif, время съемки и время изменения
+EXIF_IFD = 0x8769
+EXIF_DATETIME_ORIGINAL = 36867
+EXIF_DATETIME = 306
+
+_indexes: dict[str, "PhotoIndex"] = {}
+_indexes_lock = threading.Lock()
+
+
+def camera_suffix(name):
+    """
+    Суффикс камеры из имени файла: часть имени после последнего '_' (например, C1 для 20170615_123456_C1.jpg).
+    """
+    stem = Path(name).stem
+    parts = stem.split('_')
+    return parts[-1] if len(parts) > 2 else ''
+
+
+def read_capture_time(path):
+    """
+    Время съемки из EXIF (DateTimeOriginal, при его отсутствии DateTime) или пустая строка.
+    """
+    try:
+        with Image.open(path) as im:
+            exif = im.getexif()
+            value = exif.get_ifd(EXIF_IFD).get(EXIF_DATETIME_ORIGINAL) or exif.get(EXIF_DATETIME)
+    except Exception:
+        return ''
+    return str(value).strip('\x00 ') if value else ''
+
+
+class IndexEntry:
+    """
+    Запись индекса: файл или папка внутри папки дня.
+    """
+    def __init__(self, name, path, is_dir, size, mtime, camera, captured):
+        self.name = name
+        self.path = path
+        self.is_dir = is_dir
+        self.size = size
+        self.mtime = mtime
+        self.camera = camera
+        self.captured = captured
+
+
+class PhotoIndex:
+    """
+    Индекс содержимого папки проекта <SPECIES>_DB/<year>_<site>_<folder>.
+
+    Хранит для папок дней и файлов в них имя, размер, время изменения, суффикс камеры и время съемки из EXIF
+    в таблицах файла кэша проекта (cache_file, тот же файл, что и у миниатюр). Файл лежит вне корня, поэтому
+    открытие индекса не меняет время изменения корня. Папка пересканируется только когда изменилось ее время
+    изменения, поэтому повторный выбор дня требует одного stat и одного запроса.
+    Если файл кэша нельзя открыть для записи, индекс хранится в памяти процесса.
+    """
+    def __init__(self, root):
+        self.root = root
+        self.path = cache_file(root)
+        self._uri = None
+        self._keeper = None
+        self._ready = False
+
+    @staticmethod
+    def for_root(root):
+        root = os.path.dirname(os.path.abspath(root) + "/")
+        with _indexes_lock:
+            index = _indexes.get(root)
+            if index is None:
+                index = _indexes[root] = PhotoIndex(root)
+            return index
+
+    def connect(self):
+        if self._uri:
+            con = sqlite3.connect(self._uri, uri=True, timeout=30)
+        else:
+            try:
+                con = sqlite3.connect(self.path, timeout=30)
+                if not self._ready:
+                    con.execute("PRAGMA journal_mode=WAL")
+            except sqlite3.Error:
+                # папка кэша только для чтения: общий для потоков индекс в памяти
+                name = hashlib.md5(self.root.encode()).hexdigest()
+                self._uri = f"file:photo_index_{name}?mode=memory&cache=shared"
+                self._keeper = sqlite3.connect(self._uri, uri=True, check_same_thread=False)
+                self._ready = False
+                con = sqlite3.connect(self._uri, uri=True, timeout=30)
+
+        if not self._ready:
+            con.execute("CREATE TABLE IF NOT EXISTS photo_dirs ("
+                        "rel_dir TEXT PRIMARY KEY, "
+                        "mtime INTEGER NOT NULL)")
+            con.execute("CREATE TABLE IF NOT EXISTS photo_files ("
+                        "rel_dir TEXT NOT NULL, "
+                        "name TEXT NOT NULL, "
+                        "is_dir INTEGER NOT NULL, "
+                        "size INTEGER NOT NULL, "
+                        "mtime INTEGER NOT NULL, "
+                        "camera TEXT NOT NULL, "
+                        "captured TEXT, "
+                        "PRIMARY KEY (rel_dir, name))")
+            con.commit()
+            self._ready = True
+        return con
+
+    def _abs(self, rel_dir):
+        return os.path.join(self.root, rel_dir) if rel_dir else self.root
+
+    def refresh_dir(self, con, rel_dir):
+        """
+        Пересканирует папку rel_dir, если изменилось ее время изменения. Возвращает True, если индекс обновлен.
+        Для файлов с прежними размером и временем изменения сохраняется уже прочитанное время съемки.
+        """
+        path = self._abs(rel_dir)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            con.execute("DELETE FROM photo_files WHERE rel_dir = ?", (rel_dir,))
+            con.execute("DELETE FROM photo_dirs WHERE rel_dir = ?", (rel_dir,))
+            con.commit()
+            return True
+
+        row = con.execute("SELECT mtime FROM photo_dirs WHERE rel_dir = ?", (rel_dir,)).fetchone()
+        if row and row[0] == mtime:
+            return False
+
+        known = {r[0]: r[1:] for r in con.execute(
+            "SELECT name, size, mtime, captured FROM photo_files WHERE rel_dir = ?", (rel_dir,))}
+
+        rows = []
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.name == CACHE_FILE_NAME or entry.name.startswith(CACHE_FILE_NAME):
+                    continue
+                try:
+                    is_dir = entry.is_dir()
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                size = 0 if is_dir else stat.st_size
+                captured = None
+                old = known.get(entry.name)
+                if old and old[0] == size and old[1] == stat.st_mtime_ns:
+                    captured = old[2]
+                rows.append((rel_dir, entry.name, int(is_dir), size, stat.st_mtime_ns,
+                             camera_suffix(entry.name), captured))
+
+        con.execute("DELETE FROM photo_files WHERE rel_dir = ?", (rel_dir,))
+        con.executemany("INSERT INTO photo_files (rel_dir, name, is_dir, size, mtime, camera, captured) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        con.execute("INSERT OR REPLACE INTO photo_dirs (rel_dir, mtime) VALUES (?, ?)", (rel_dir, mtime))
+        con.commit()
+        return True
+
+    def entries(self, rel_dir='', refresh=True):
+        """
+        Содержимое папки rel_dir (относительно корня) из индекса, отсортированное по имени.
+        При refresh=False папка не проверяется на изменения.
+        """
+        con = self.connect()
+        try:
+            if refresh:
+                self.refresh_dir(con, rel_dir)
+            rows = con.execute("SELECT name, is_dir, size, mtime, camera, captured FROM photo_files "
+                               "WHERE rel_dir = ? ORDER BY name", (rel_dir,)).fetchall()
+        finally:
+            con.close()
+
+        base = self._abs(rel_dir).replace('\\', '/')
+        return [IndexEntry(r[0], f"{base}/{r[0]}", bool(r[1]), r[2], r[3], r[4], r[5]) for r in rows]
+
+    def day_folders(self):
+        """
+        Отсортированные имена папок дней в корне проекта.
+        """
+        return [x.name for x in self.entries() if x.is_dir]
+
+    def day_files(self, day):
+        """
+        Файлы папки дня (без вложенных папок), отсортированные по имени.
+        """
+        return [x for x in self.entries(day) if not x.is_dir]
+
+    def fill_capture_times(self, con, rel_dir):
+        """
+        Читает время съемки из EXIF для изображений папки, у которых оно еще не записано.
+        """
+        names = [r[0] for r in con.execute("SELECT name FROM photo_files "
+                                           "WHERE rel_dir = ? AND is_dir = 0 AND captured IS NULL", (rel_dir,))]
+        base = self._abs(rel_dir)
+        values = []
+        for name in names:
+            captured = read_capture_time(os.path.join(base, name)) if Path(name).suffix.lower() in PATTERN_SUFFIX \
+                else ''
+            values.append((captured, rel_dir, name))
+        if values:
+            con.executemany("UPDATE photo_files SET captured = ? WHERE rel_dir = ? AND name = ?", values)
+            con.commit()
+
+    def index_all(self, is_interrupted=lambda: False, progress=None):
+        """
+        Полная индексация корня проекта: список дней, файлы каждого дня и время съемки.
+        Папки с неизменным временем изменения не пересканируются.
+        """
+        con = self.connect()
+        try:
+            self.refresh_dir(con, '')
+            days = [r[0] for r in con.execute("SELECT name FROM photo_files WHERE rel_dir = '' AND is_dir = 1 "
+                                              "ORDER BY name")]
+            for day in days:
+                if is_interrupted():
+                    return
+                self.refresh_dir(con, day)
+                self.fill_capture_times(con, day)
+                if progress:
+                    progress(self.root, day)
+        finally:
+            con.close()
+
+
+class PhotoIndexer(QThread):
+    """
+    Фоновая индексация корней проекта.
+    Сигналы:
+    - dayIndexed: папка дня day в корне root проиндексирована.
+    """
+    dayIndexed = pyqtSignal(str, str)
+
+    def __init__(self, roots, parent=None):
+        super().__init__(parent)
+        self.roots = list(roots)
+
+    def run(self):
+        for root in self.roots:
+            if self.isInterruptionRequested():
+                return
+            try:
+                PhotoIndex.for_root(root).index_all(self.isInterruptionRequested, self.dayIndexed.emit)
+            except (OSError, sqlite3.Error) as ex:
+                print(ex)
+
+
+class PathResolver:
+    """
+    Поиск пути к фотографии по имени файла.
+
+    Фотография ищется в папке дня name[0:8] корней проекта из дерева директорий (m_params.model_directories),
+    в порядке корней в дереве. Содержимое папки дня читается из PhotoIndex один раз и хранится как множество
+    имен, после чего поиск каждого файла - проверка по словарю без обращения к диску.
+    Папки, в которых PhotoTreeWatcher заметил изменения, сбрасываются через invalidate.
+    """
+    def __init__(self):
+        self._days: dict[tuple, set] = {}
+
+    @staticmethod
+    def roots():
+        model = m_params.model_directories
+        return [model.item(row).text() for row in range(model.rowCount())]
+
+    def _day_names(self, root, day):
+        key = (os.path.normpath(root), day)
+        names = self._days.get(key)
+        if names is None:
+            try:
+                names = {x.name for x in PhotoIndex.for_root(root).day_files(day)}
+            except (OSError, sqlite3.Error):
+                names = set()
+            self._days[key] = names
+        return names
+
+    def resolve(self, name_photo, roots=None):
+        """
+        Путь к фотографии name_photo или None, если она не найдена.
+        """
+        day = name_photo[0:8]
+        for root in self.roots() if roots is None else roots:
+            if name_photo in self._day_names(root, day):
+                return os.path.join(root, day, name_photo)
+        return None
+
+    def resolve_many(self, names):
+        """
+        Пути к фотографиям names: словарь имя -> путь или None.
+        """
+        roots = self.roots()
+        return {name: self.resolve(name, roots) for name in names}
+
+    def invalidate(self, root, day=None):
+        """
+        Сбрасывает сохраненное содержимое папки дня day корня root (всех дней корня, если day не указан).
+        """
+        root = os.path.normpath(root)
+        for key in [k for k in self._days if k[0] == root and (day is None or k[1] == day)]:
+            del self._days[key]
+
+    def clear(self):
+        """
+        Сбрасывает сохраненное содержимое всех папок дней, вызывается при перестроении корней проекта.
+        """
+        self._days.clear()
+
+
+path_resolver = PathResolver()
@@ -0,0 +1,157 @@
+import os
+import sqlite3
+
+from PyQt5.QtCore import QObject, QFileSystemWatcher, QTimer, pyqtSignal
+
+from app.services.photo_index import PhotoIndex
+
+# задержка перед обработкой изменений папки, чтобы копирование с карты обрабатывалось пачками
+WATCH_DELAY = 300
+
+
+def diff_entries(old, new):
+    """
+    Сравнивает содержимое папки до и после изменения.
+    old, new - словари имя -> (is_dir, size, mtime).
+    Удаленная и добавленная записи с одинаковыми типом, размером и временем изменения считаются переименованием.
+    Возвращает списки added, removed и renamed (пары старое, новое имя).
+    """
+    added = sorted(set(new) - set(old))
+    removed = sorted(set(old) - set(new))
+    renamed = []
+    for name in list(removed):
+        match = next((x for x in added if new[x] == old[name]), None)
+        if match is not None:
+            renamed.append((name, match))
+            removed.remove(name)
+            added.remove(match)
+    return added, removed, renamed
+
+
+class PhotoTreeWatcher(QObject):
+    """
+    Отслеживает изменения в корнях проекта и папках дней через QFileSystemWatcher.
+
+    Для каждой папки хранится последний известный список записей. При изменении папка пересканируется
+    в PhotoIndex, а разница со списком передается сигналами, чтобы дерево папок и список фотографий
+    обновлялись без полной перезагрузки. Обработчики сигналов должны допускать повторные события.
+    Сигналы:
+    - dayAdded, dayRemoved: (root, day)
+    - dayRenamed: (root, old, new)
+    - fileAdded, fileRemoved: (root, day, name)
+    - fileRenamed: (root, day, old, new)
+    """
+    dayAdded = pyqtSignal(str, str)
+    dayRemoved = pyqtSignal(str, str)
+    dayRenamed = pyqtSignal(str, str, str)
+    fileAdded = pyqtSignal(str, str, str)
+    fileRemoved = pyqtSignal(str, str, str)
+    fileRenamed = pyqtSignal(str, str, str, str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self._directory_changed)
+
+        self._dirs: dict[str, tuple] = {}
+        self._snapshots: dict[str, dict] = {}
+        self._pending: set[str] = set()
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(WATCH_DELAY)
+        self.timer.timeout.connect(self._process)
+
+    @staticmethod
+    def _norm(path):
+        return os.path.normpath(path)
+
+    def setRoots(self, roots):
+        """
+        Начинает отслеживание корней roots и их папок дней, прежние пути снимаются с отслеживания.
+        """
+        self.clear()
+        for root in roots:
+            if not os.path.isdir(root):
+                continue
+            # корень индексируется до снимка, иначе снимок еще не проиндексированного корня пуст
+            # и первое изменение корня сообщило бы обо всех днях как о добавленных
+            days = PhotoIndex.for_root(root).day_folders()
+            self._watch(root, root, '')
+            for day in days:
+                self._watch(os.path.join(root, day), root, day)
+
+    def clear(self):
+        self.timer.stop()
+        self._pending.clear()
+        paths = self.watcher.directories()
+        if paths:
+            self.watcher.removePaths(paths)
+        self._dirs.clear()
+        self._snapshots.clear()
+
+    @staticmethod
+    def _listing(root, day, refresh):
+        return {x.name: (x.is_dir, x.size, x.mtime) for x in PhotoIndex.for_root(root).entries(day, refresh)}
+
+    def _watch(self, path, root, day):
+        # снимок берется из индекса без сканирования: еще не проиндексированные папки не читаются с диска
+        self._dirs[self._norm(path)] = (root, day)
+        self._snapshots[self._norm(path)] = self._listing(root, day, False)
+        self.watcher.addPath(path)
+
+    def _unwatch(self, path):
+        self._dirs.pop(self._norm(path), None)
+        self._snapshots.pop(self._norm(path), None)
+        self.watcher.removePath(path)
+
+    def _directory_changed(self, path):
+        self._pending.add(self._norm(path))
+        self.timer.start()
+
+    def _process(self):
+        pending, self._pending = self._pending, set()
+        for path in sorted(pending):
+            target = self._dirs.get(path)
+            if target is None:
+                continue
+            root, day = target
+            try:
+                self._update(path, root, day)
+            except (OSError, sqlite3.Error) as ex:
+                print(ex)
+
+    def _update(self, path, root, day):
+        old = self._snapshots.get(path, {})
+        new = self._snapshots[path] = self._listing(root, day, True)
+        if new == old:
+            # время изменения папки сменилось без изменения записей (например, служебные файлы)
+            return
+        added, removed, renamed = diff_entries(old, new)
+
+        if not day:
+            # корень проекта: изменились папки дней
+            for name in removed:
+                if old[name][0]:
+                    self._unwatch(os.path.join(root, name))
+                    self.dayRemoved.emit(root, name)
+            for name, new_name in renamed:
+                if old[name][0]:
+                    self._unwatch(os.path.join(root, name))
+                    self._watch(os.path.join(root, new_name), root, new_name)
+                    self.dayRenamed.emit(root, name, new_name)
+            for name in added:
+                if new[name][0]:
+                    self._watch(os.path.join(root, name), root, name)
+                    self.dayAdded.emit(root, name)
+            return
+
+        for name in removed:
+            if not old[name][0]:
+                self.fileRemoved.emit(root, day, name)
+        for name, new_name in renamed:
+            if not old[name][0]:
+                self.fileRenamed.emit(root, day, name, new_name)
+        for name in added:
+            if not new[name][0]:
+                self.fileAdded.emit(root, day, name)
@@ -0,0 +1,320 @@
+import json
+import os
+import threading
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session
+
+from app.models.main_db import PointsCount, PatternCount, GroupsCount, Location, SURROGATE_KEYS
+from app.services.user_settings import Settings
+
+# задержка записи после первой операции (мс) и количество операций, после которого запись начинается сразу
+WRITE_DELAY = 500
+WRITE_BATCH = 50
+# журнал очереди лежит рядом с файлом учета: <файл учета>-points.journal
+JOURNAL_SUFFIX = '-points.journal'
+
+POINT_MODELS = {model.__tablename__: model for model in (PointsCount, PatternCount, GroupsCount, Location)}
+
+
+def point_values(point):
+    """
+    Значения столбцов точки без суррогатных ключей (они заполняются при вставке).
+    """
+    return {c.key: getattr(point, c.key) for c in point.__table__.columns if c.key not in SURROGATE_KEYS}
+
+
+def natural_key(model, values):
+    """
+    Естественный ключ точки (первичный ключ отображения) из словаря значений столбцов.
+    """
+    return {c.key: values[c.key] for c in inspect(model).primary_key}
+
+
+def apply_record(session, record):
+    """
+    Выполняет одну операцию очереди в сессии session.
+    Изменение и удаление строки, которой уже нет в базе, пропускаются.
+    """
+    model = POINT_MODELS[record['table']]
+    if record['op'] == 'insert':
+        # вставки записываются вместе при следующем запросе или фиксации сессии
+        session.add(model(**record['values']))
+        return
+
+    row = session.query(model).filter_by(**record['key']).first()
+    if row is None:
+        return
+    if record['op'] == 'delete':
+        session.delete(row)
+    else:
+        for name, value in record['values'].items():
+            setattr(row, name, value)
+    # изменение ключа должно попасть в базу раньше следующей вставки на освободившееся место
+    session.flush()
+
+
+def write_records(engine, records):
+    """
+    Записывает операции одной транзакцией. Если транзакция не прошла, операции записываются по одной
+    до первой ошибочной: следующие операции могут зависеть от нее, поэтому пропускать ее нельзя.
+    Возвращает количество записанных операций (с начала списка) и ошибку или None.
+    """
+    try:
+        with Session(bind=engine) as session:
+            for record in records:
+                apply_record(session, record)
+            session.commit()
+        return len(records), None
+    except Exception:
+        pass
+
+    for written, record in enumerate(records):
+        try:
+            with Session(bind=engine) as session:
+                apply_record(session, record)
+                session.commit()
+        except Exception as ex:
+            return written, ex
+    return len(records), None
+
+
+def replay_records(engine, records):
+    """
+    Повторяет операции журнала, оставшегося после аварийного завершения.
+
+    Неизвестно, какие из операций журнала уже записаны, поэтому повторяется итоговое состояние:
+    строки по всем ключам, которые точки журнала занимали, удаляются, после чего вставляется последнее
+    состояние каждой неудаленной точки. Повтор можно выполнять сколько угодно раз.
+    Возвращает False, если журнал повторить не удалось.
+    """
+    touched = {}
+    finals = {}
+    for record in records:
+        model = POINT_MODELS[record['table']]
+        for key in (record['key'], record['values'] and natural_key(model, record['values'])):
+            if key:
+                touched[(record['table'], tuple(sorted(key.items())))] = key
+        if record['op'] == 'delete':
+            finals.pop(record['point'], None)
+        else:
+            finals[record['point']] = record
+
+    try:
+        with Session(bind=engine) as session:
+            for (table, _), key in touched.items():
+                session.query(POINT_MODELS[table]).filter_by(**key).delete(synchronize_session=False)
+            session.flush()
+            for record in finals.values():
+                session.add(POINT_MODELS[record['table']](**record['values']))
+            session.commit()
+    except Exception as ex:
+        print(ex)
+        return False
+    return True
+
+
+class PointWriteTask(QRunnable):
+    """
+    Задача записи пакета операций очереди в пуле потоков.
+    """
+    def __init__(self, queue, records):
+        super().__init__()
+        self.queue = queue
+        self.records = records
+
+    def run(self):
+        self.queue.write(self.records)
+
+
+class PointWriteQueue(QObject):
+    """
+    Отложенная запись точек учета и регистраций (PointsCount, PatternCount, GroupsCount, Location).
+
+    Окна учета не сохраняют точку сразу после клика: вставка, перемещение, изменение и удаление точки
+    ставятся в очередь в памяти и записываются пакетом в фоновом потоке через WRITE_DELAY мс после первой
+    операции или сразу после WRITE_BATCH операций. Пакет записывается одной транзакцией на собственном
+    подключении, пакеты записываются по порядку (пул из одного потока).
+
+    Каждая операция перед постановкой в очередь дописывается в журнал рядом с файлом учета (строка JSON),
+    журнал очищается, когда записаны все операции. Если программа завершилась аварийно, журнал повторяется
+    при следующем подключении к файлу учета (replay_records). Журнал, как и WAL с synchronous=NORMAL,
+    переживает падение программы, но не отключение питания.
+
+    Если пакет записать не удалось (файл заблокирован, диск недоступен), незаписанные операции остаются
+    в очереди по порядку и записываются перед следующим пакетом, а журнал не очищается, пока они не будут
+    записаны; при закрытии файла они остаются в журнале и повторяются при следующем подключении.
+    Об ошибке сообщает сигнал writeFailed (один раз, пока запись снова не пройдет).
+
+    Точки, которые передаются в очередь, не должны находиться в сессии окна: загруженные точки
+    отсоединяются от сессии (expunge), новые точки в сессию не добавляются.
+    Для базы в памяти (файл учета не открыт) операции записываются сразу.
+    Сигналы:
+    - writeFailed: точки не записаны в базу, текст ошибки.
+    """
+    writeFailed = pyqtSignal(str)
+
+    def __init__(self, delay=None, batch=None, parent=None):
+        super().__init__(parent)
+
+        settings = Settings.instance()
+        if delay is None:
+            delay = WRITE_DELAY
+            if settings.contains("PointWriteDelay") and settings.value("PointWriteDelay"):
+                delay = int(settings.value("PointWriteDelay"))
+        if batch is None:
+            batch = WRITE_BATCH
+            if settings.contains("PointWriteBatch") and settings.value("PointWriteBatch"):
+                batch = int(settings.value("PointWriteBatch"))
+        self.batch = max(1, batch)
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(max(0, delay))
+        self.timer.timeout.connect(self.flush)
+
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+
+        self.engine = None
+        self.journal_path = None
+        self._journal = None
+        self._lock = threading.Lock()
+        self._pending = []
+        # операции, которые не удалось записать; записываются первыми в следующем пакете
+        self._failed = []
+        self._seq = 0
+        self._written_seq = 0
+        self._failing = False
+        self._next_point = 0
+
+    def open(self, engine):
+        """
+        Привязывает очередь к движку engine. Журнал, оставшийся от прошлого запуска, повторяется.
+        """
+        self.close()
+        self.engine = engine
+        database = engine.url.database
+        if not database or database == ':memory:':
+            return
+
+        self.journal_path = database + JOURNAL_SUFFIX
+        if os.path.isfile(self.journal_path):
+            records = []
+            with open(self.journal_path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        # последняя строка могла остаться недописанной
+                        break
+            if records and not replay_records(engine, records):
+                # журнал сохраняется рядом для ручного разбора, очередь начинает новый
+                os.replace(self.journal_path, self.journal_path + '.failed')
+        self._journal = open(self.journal_path, 'w', encoding='utf-8')
+
+    def close(self):
+        """
+        Записывает очередь и закрывает журнал.
+        """
+        self.flush(wait=True)
+        # незаписанные операции остаются в журнале и повторяются при следующем подключении к файлу
+        self._failed = []
+        self._failing = False
+        if self._journal:
+            self._journal.close()
+            self._journal = None
+            if os.path.isfile(self.journal_path) and not os.path.getsize(self.journal_path):
+                os.remove(self.journal_path)
+        self.engine = None
+        self.journal_path = None
+
+    def insert(self, point):
+        self._enqueue('insert', point)
+
+    def update(self, point):
+        """
+        Ставит в очередь изменение точки (в том числе перемещение: ключ в базе берется из последней операции
+        с этой точкой или из загруженной строки). Изменения точек, которые не записывались в базу
+        (например, копий точек других видов), не сохраняются.
+        """
+        self._enqueue('update', point)
+
+    def delete(self, point):
+        self._enqueue('delete', point)
+
+    def _stored_key(self, point):
+        if hasattr(point, '_write_key'):
+            return point._write_key
+        identity = inspect(point).identity
+        if identity is None:
+            return None
+        return dict(zip([c.key for c in inspect(type(point)).primary_key], identity))
+
+    def _enqueue(self, op, point):
+        key = None
+        if op != 'insert':
+            key = self._stored_key(point)
+            if key is None:
+                return
+        values = None if op == 'delete' else point_values(point)
+
+        with self._lock:
+            self._seq += 1
+            if not hasattr(point, '_write_point'):
+                self._next_point += 1
+                point._write_point = self._next_point
+            point._write_key = natural_key(type(point), values) if values else None
+
+            record = {'seq': self._seq, 'point': point._write_point, 'op': op, 'table': point.__tablename__,
+                      'key': key, 'values': values}
+            self._pending.append(record)
+            if self._journal:
+                self._journal.write(json.dumps(record) + '\n')
+                self._journal.flush()
+            count = len(self._pending)
+
+        if not self._journal or count >= self.batch:
+            self.flush()
+        elif not self.timer.isActive():
+            self.timer.start()
+
+    def flush(self, wait=False):
+        """
+        Отправляет накопленные операции на запись. При wait=True дожидается записи всех пакетов.
+        """
+        self.timer.stop()
+        with self._lock:
+            records, self._pending = self._pending, []
+            retry = bool(self._failed)
+
+        if (records or retry) and self.engine is not None:
+            if self._journal:
+                self.pool.start(PointWriteTask(self, records))
+            else:
+                self.write(records)
+        if wait:
+            self.pool.waitForDone()
+
+    def write(self, records):
+        with self._lock:
+            records, self._failed = self._failed + records, []
+        if not records:
+            return
+
+        written, error = write_records(self.engine, records)
+        with self._lock:
+            if written:
+                self._written_seq = records[written - 1]['seq']
+            # журнал очищается, только если записаны все операции
+            self._failed = records[written:]
+            if self._journal and not self._failed and self._written_seq == self._seq:
+                self._journal.seek(0)
+                self._journal.truncate()
+            report = error is not None and not self._failing
+            self._failing = error is not None
+
+        if report:
+            # для ошибок SQLAlchemy показывается исходная ошибка базы без текста запроса
+            self.writeFailed.emit(str(getattr(error, 'orig', None) or error))
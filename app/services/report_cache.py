@@ -0,0 +1,116 @@
+import hashlib
+import os
+import pickle
+import sqlite3
+from pathlib import Path
+
+from sqlalchemy import text
+
+# файл кэша отчетов рядом с config.ini и системной базой
+REPORT_CACHE_FILE = "report_cache.sqlite"
+# версия формата частей отчетов: при изменении расчета отчета старые части перестают совпадать
+REPORT_CACHE_VERSION = 2
+
+
+def report_context(*values):
+    """
+    Ключ условий расчета части отчета (вид, справочники системной базы и т.п.): части, посчитанные
+    при других справочниках, не используются.
+    """
+    return hashlib.md5(repr((REPORT_CACHE_VERSION,) + values).encode()).hexdigest()
+
+
+def table_fingerprints(connection, model, where, group_columns):
+    """
+    Отпечатки строк таблицы модели model, отобранных условием where (словарь столбец - значение),
+    по значениям столбцов group_columns: количество строк, сумма rowid и последние datecreated / dateupdated.
+    Вставка и удаление строки меняют количество или сумму rowid, изменение через ORM - dateupdated.
+    Возвращает словарь кортеж значений group_columns -> отпечаток (строка).
+    """
+    table = model.__table__.name
+    group = ', '.join(group_columns)
+    conditions = ' AND '.join(f"{column} = :{column}" for column in where)
+    sql = (f"SELECT {group + ', ' if group else ''}count(*), total(rowid), max(datecreated), max(dateupdated) "
+           f"FROM {table} WHERE {conditions}" + (f" GROUP BY {group}" if group else ''))
+    fingerprints = {}
+    for row in connection.execute(text(sql), where):
+        key = tuple(row[:len(group_columns)])
+        fingerprints[key] = f"{table}:{':'.join(str(value) for value in row[len(group_columns):])}"
+    return fingerprints
+
+
+def combine_fingerprints(*fingerprints):
+    """
+    Объединяет словари отпечатков нескольких таблиц в один отпечаток на ключ.
+    """
+    keys = set()
+    for item in fingerprints:
+        keys.update(item)
+    return {key: '|'.join(item.get(key, '') for item in fingerprints) for key in keys}
+
+
+class ReportCache:
+    """
+    Кэш частей отчетов (сводки одного учета, регистрации одного дня и т.п.) в файле SQLite.
+
+    Часть идентифицируется файлом базы, видом части kind, ключом части и ключом условий расчета context
+    и хранится вместе с отпечатком исходных строк (table_fingerprints). Часть используется, пока отпечаток
+    не изменился; измененные части пересчитываются и перезаписываются. Данные хранятся в pickle.
+    Соединение открывается на каждый объект, кэш можно использовать из разных процессов.
+    Если файл кэша открыть нельзя, отчет считается без кэша (open возвращает None).
+    """
+    def __init__(self, con):
+        self.con = con
+
+    @staticmethod
+    def open(path=None):
+        path = path or os.path.abspath(REPORT_CACHE_FILE)
+        try:
+            con = sqlite3.connect(path, timeout=30)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.execute("CREATE TABLE IF NOT EXISTS report_parts ("
+                        "db_file TEXT NOT NULL, "
+                        "kind TEXT NOT NULL, "
+                        "part_key TEXT NOT NULL, "
+                        "context TEXT NOT NULL, "
+                        "fingerprint TEXT NOT NULL, "
+                        "data BLOB NOT NULL, "
+                        "PRIMARY KEY (db_file, kind, part_key, context))")
+            con.commit()
+        except sqlite3.Error as ex:
+            print(ex)
+            return None
+        return ReportCache(con)
+
+    @staticmethod
+    def db_key(db_file):
+        return str(Path(db_file).resolve())
+
+    def get(self, db_file, kind, part_key, context, fingerprint):
+        """
+        Часть отчета или None, если ее нет или исходные строки изменились.
+        """
+        try:
+            row = self.con.execute("SELECT fingerprint, data FROM report_parts "
+                                   "WHERE db_file = ? AND kind = ? AND part_key = ? AND context = ?",
+                                   (self.db_key(db_file), kind, repr(part_key), context)).fetchone()
+            if row is None or row[0] != fingerprint:
+                return None
+            return pickle.loads(row[1])
+        except (sqlite3.Error, pickle.UnpicklingError, EOFError) as ex:
+            print(ex)
+            return None
+
+    def put(self, db_file, kind, part_key, context, fingerprint, data):
+        try:
+            self.con.execute("INSERT OR REPLACE INTO report_parts "
+                             "(db_file, kind, part_key, context, fingerprint, data) VALUES (?, ?, ?, ?, ?, ?)",
+                             (self.db_key(db_file), kind, repr(part_key), context, fingerprint,
+                              sqlite3.Binary(pickle.dumps(data, pickle.HIGHEST_PROTOCOL))))
+            self.con.commit()
+        except sqlite3.Error as ex:
+            print(ex)
+
+    def close(self):
+        self.con.close()
@@ -0,0 +1,97 @@
+"""
+Годы, участки и виды файлов баз для выбора отчета (CountReportWindow, AnimalIdReportWindow).
+
+Файл открывается подключением sqlite3 только для чтения, значения выбираются одним запросом
+SELECT DISTINCT без ORM. Результат хранится в памяти процесса по пути, времени изменения и размеру файла
+базы и его журнала WAL (записи в режиме WAL до checkpoint не меняют сам файл базы), поэтому повторное
+добавление тех же файлов не читает базы. Файлы читаются параллельно в пуле потоков: sqlite3 отпускает GIL
+на время запроса.
+"""
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+CATALOG_WORKERS = 8
+
+_catalog: dict[tuple, list] = {}
+_catalog_lock = threading.Lock()
+
+
+def file_signature(db_file):
+    """
+    Время изменения и размер файла базы и журнала WAL или None, если файла нет.
+    """
+    try:
+        stat = os.stat(db_file)
+    except OSError:
+        return None
+    try:
+        wal = os.stat(db_file + '-wal')
+        wal_signature = (wal.st_mtime_ns, wal.st_size)
+    except OSError:
+        wal_signature = None
+    return stat.st_mtime_ns, stat.st_size, wal_signature
+
+
+def probe_catalog(db_file, table):
+    """
+    Различные (r_year, site, species) таблицы table файла базы db_file. Вид сравнивается с учетом регистра,
+    как значения в множестве Python. Если файл нельзя открыть или таблицы нет, возвращается пустой список.
+    """
+    signature = file_signature(db_file)
+    if signature is None:
+        return []
+    key = (os.path.abspath(db_file), table, signature)
+    with _catalog_lock:
+        if key in _catalog:
+            return _catalog[key]
+
+    try:
+        con = sqlite3.connect(f"{Path(db_file).resolve().as_uri()}?mode=ro", uri=True, timeout=30)
+        try:
+            rows = con.execute(f"SELECT DISTINCT r_year, site, species COLLATE BINARY FROM {table}").fetchall()
+        finally:
+            con.close()
+    except sqlite3.Error as ex:
+        print(ex)
+        return []
+
+    with _catalog_lock:
+        _catalog[key] = rows
+    return rows
+
+
+def load_catalog(db_files, table):
+    """
+    Годы, участки и виды таблицы table всех файлов db_files: три отсортированных списка без повторов.
+    Пул потоков запускается только для файлов, которых нет в памяти.
+    """
+    results = {}
+    missing = []
+    for db_file in db_files:
+        signature = file_signature(db_file)
+        with _catalog_lock:
+            rows = _catalog.get((os.path.abspath(db_file), table, signature))
+        if rows is None:
+            missing.append(db_file)
+        else:
+            results[db_file] = rows
+
+    if len(missing) == 1:
+        results[missing[0]] = probe_catalog(missing[0], table)
+    elif missing:
+        with ThreadPoolExecutor(max_workers=min(CATALOG_WORKERS, len(missing))) as executor:
+            for db_file, rows in zip(missing, executor.map(lambda path: probe_catalog(path, table), missing)):
+                results[db_file] = rows
+
+    years = set()
+    sites = set()
+    species = set()
+    for rows in results.values():
+        for r_year, site, spec in rows:
+            years.add(r_year)
+            sites.add(site)
+            species.add(spec)
+    return sorted(years), sorted(sites), sorted(species)
@@ -0,0 +1,213 @@
+import hashlib
+import os
+import sqlite3
+import threading
+
+import cv2
+from PyQt5.QtCore import QObject, QRunnable, QThread, QThreadPool, pyqtSignal
+
+# файл кэша прежних версий в корне папки проекта <SPECIES>_DB/<year>_<site>_<folder>; в индекс не попадает
+CACHE_FILE_NAME = "photocount_cache.sqlite"
+# папка файлов кэша проектов рядом с config.ini: файл кэша (и его -wal, -shm) в корне проекта менял бы
+# время изменения корня при каждом открытии, и отслеживание папок и индекс пересканировали бы корень без изменений
+CACHE_DIR = "photo_cache"
+# размер большей стороны миниатюры
+THUMBNAIL_SIZE = 160
+THUMBNAIL_QUALITY = 80
+
+_stores: dict[str, "ThumbnailStore"] = {}
+_stores_lock = threading.Lock()
+
+
+def cache_root(path):
+    """
+    Возвращает корень проекта для файла: папку, родитель которой называется <SPECIES>_DB.
+    Если такой папки нет, возвращается папка файла.
+    """
+    folder = os.path.dirname(os.path.abspath(path))
+    current = folder
+    while True:
+        parent = os.path.dirname(current)
+        if parent == current:
+            return folder
+        if os.path.basename(parent).upper().endswith('_DB'):
+            return current
+        current = parent
+
+
+def cache_file(root):
+    """
+    Файл кэша проекта root (миниатюры и индекс папок) в папке CACHE_DIR. Папка создается при необходимости.
+    """
+    root = os.path.abspath(root)
+    key = hashlib.md5(os.path.normcase(root).encode()).hexdigest()
+    folder = os.path.abspath(CACHE_DIR)
+    try:
+        os.makedirs(folder, exist_ok=True)
+    except OSError:
+        pass
+    return os.path.join(folder, f"{os.path.basename(root)}_{key}.sqlite")
+
+
+class ThumbnailStore:
+    """
+    Хранилище миниатюр проекта в одном файле SQLite (cache_file).
+
+    Миниатюры хранятся в виде JPEG и идентифицируются относительным путем и размером.
+    Запись считается действительной, пока у файла не изменились время изменения и размер.
+    Соединение открывается на каждый вызов, поэтому хранилище можно использовать из разных потоков.
+    """
+    def __init__(self, root):
+        self.root = root
+        self.path = cache_file(root)
+        self._ready = False
+
+    @staticmethod
+    def for_path(path):
+        root = cache_root(path)
+        with _stores_lock:
+            store = _stores.get(root)
+            if store is None:
+                store = _stores[root] = ThumbnailStore(root)
+            return store
+
+    def connect(self):
+        con = sqlite3.connect(self.path, timeout=30)
+        if not self._ready:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("CREATE TABLE IF NOT EXISTS thumbnails ("
+                        "rel_path TEXT NOT NULL, "
+                        "size INTEGER NOT NULL, "
+                        "mtime INTEGER NOT NULL, "
+                        "file_size INTEGER NOT NULL, "
+                        "data BLOB NOT NULL, "
+                        "PRIMARY KEY (rel_path, size))")
+            con.commit()
+            self._ready = True
+        return con
+
+    def rel_path(self, path):
+        return os.path.relpath(os.path.abspath(path), self.root).replace('\\', '/')
+
+    def get(self, con, path, size, stat):
+        row = con.execute("SELECT mtime, file_size, data FROM thumbnails WHERE rel_path = ? AND size = ?",
+                          (self.rel_path(path), size)).fetchone()
+        if row and row[0] == stat.st_mtime_ns and row[1] == stat.st_size:
+            return row[2]
+        return None
+
+    def put(self, con, path, size, stat, data):
+        con.execute("INSERT OR REPLACE INTO thumbnails (rel_path, size, mtime, file_size, data) VALUES (?, ?, ?, ?, ?)",
+                    (self.rel_path(path), size, stat.st_mtime_ns, stat.st_size, sqlite3.Binary(data)))
+        con.commit()
+
+
+def make_thumbnail(path, size=THUMBNAIL_SIZE):
+    """
+    Создает миниатюру в формате JPEG. Изображение декодируется с уменьшением в 8 раз средствами JPEG,
+    поэтому полное декодирование кадра не требуется.
+    """
+    image = cv2.imread(path, cv2.IMREAD_REDUCED_COLOR_8)
+    if image is None:
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+    if image is None:
+        return None
+
+    height, width = image.shape[:2]
+    scale = size / max(height, width)
+    if scale < 1:
+        image = cv2.resize(image, (max(1, int(width * scale)), max(1, int(height * scale))),
+                           interpolation=cv2.INTER_AREA)
+
+    ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, THUMBNAIL_QUALITY])
+    return buffer.tobytes() if ok else None
+
+
+def load_thumbnail(path, size=THUMBNAIL_SIZE):
+    """
+    Возвращает JPEG миниатюры из хранилища или создает ее и сохраняет.
+    Если хранилище недоступно для записи (например, диск только для чтения), миниатюра просто создается.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    store = ThumbnailStore.for_path(path)
+    try:
+        con = store.connect()
+    except sqlite3.Error:
+        return make_thumbnail(path, size)
+
+    try:
+        data = store.get(con, path, size, stat)
+        if data is None:
+            data = make_thumbnail(path, size)
+            if data:
+                store.put(con, path, size, stat, data)
+        return data
+    except sqlite3.Error:
+        return make_thumbnail(path, size)
+    finally:
+        con.close()
+
+
+class ThumbnailSignals(QObject):
+    finished = pyqtSignal(int, str, bytes)
+
+
+class ThumbnailTask(QRunnable):
+    """
+    Фоновая задача получения миниатюры одного файла.
+    """
+    def __init__(self, generation, path, size, signals):
+        super().__init__()
+        self.generation = generation
+        self.path = path
+        self.size = size
+        self.signals = signals
+
+    def run(self):
+        data = load_thumbnail(self.path, self.size)
+        self.signals.finished.emit(self.generation, self.path, data or b'')
+
+
+class ThumbnailLoader(QObject):
+    """
+    Загружает миниатюры в пуле потоков и заполняет хранилища миниатюр.
+    Сигналы:
+    - thumbnailReady: миниатюра для path готова, передаются байты JPEG (пустые, если создать не удалось).
+    """
+    thumbnailReady = pyqtSignal(str, bytes)
+
+    def __init__(self, size=THUMBNAIL_SIZE, parent=None):
+        super().__init__(parent)
+        self.size = size
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max(1, QThread.idealThreadCount() // 2))
+        self.signals = ThumbnailSignals()
+        self.signals.finished.connect(self._task_finished)
+        self._generation = 0
+        self._pending = set()
+
+    def request(self, paths):
+        """
+        Ставит в очередь файлы, для которых еще нет миниатюр. Ранее поставленные, но не начатые задачи
+        отменяются, чтобы при быстрой прокрутке сначала загружались видимые строки.
+        """
+        self.cancel()
+        for path in paths:
+            if path in self._pending:
+                continue
+            self._pending.add(path)
+            self.pool.start(ThumbnailTask(self._generation, path, self.size, self.signals))
+
+    def cancel(self):
+        self._generation += 1
+        self.pool.clear()
+        self._pending.clear()
+
+    def _task_finished(self, generation, path, data):
+        if generation == self._generation:
+            self._pending.discard(path)
+        self.thumbnailReady.emit(path, data)
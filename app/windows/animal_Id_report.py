@@ -4,7 +4,6 @@ from datetime import datetime
 from pathlib import Path
 from typing import Optional
 
-import numpy as np
 import pandas as pd
 from PyQt5 import QtWidgets, QtCore
 from PyQt5.QtCore import QSortFilterProxyModel, Qt, QFileInfo, QCoreApplication
@@ -14,10 +13,13 @@ from app import m_params
 from app.custom_widgets.checkable_comboBox import CheckableComboBox
 from app.controllers.tables import PandasTableModel
 from app.dialogs.open_files_and_dirs_dialog import getOpenFilesAndDirs
-from app.models.main_db import Resight, Daily, AnimalInfo
+from app.models.main_db import Resight
 from app.controllers.support_lists import LocalSitesList, SitesList
 from app.models.support_db import Sites, LocalSites
-from app.services.db_manager import SessionFactoryMain
+from app.services.animal_id_report import animal_id_report_part, animal_id_report_sheets, local_site_names, \
+    resight_sheet, daily_sheet
+from app.services.count_report import report_parts, prepare_report_db, run_report_parts
+from app.services.report_catalog import load_catalog
 from app.controllers.parameters import session_factory_main, support_session, user_settings
 from app.view.ui_window_animal_id_report import Ui_AnimalIdReportWindow
 
@@ -40,6 +42,10 @@ class AnimalIdReportWindow(QtWidgets.QMainWindow):
         self.sheet_header = ['Resight', 'Daily', 'Summary', 'Summary for day']
 
         self.myLongTask: Optional[TaskThread] = None
+        # части отчета, прочитанные до сборки листов: индекс части -> число строк листов Resight и Daily части
+        self.partial_sheets: dict[int, list[int]] = {}
+        # модели показанных вкладок (по порядку sheet_header)
+        self.sheet_models: list[PandasTableModel] = []
 
         self.progress_bar = QProgressBar()
         self.progress_bar.setMaximumHeight(15)
@@ -51,8 +57,11 @@ class AnimalIdReportWindow(QtWidgets.QMainWindow):
 
         self.btn_export = QtWidgets.QPushButton("Export to Excel")
         self.btn_get_report = QtWidgets.QPushButton("Get")
+        self.btn_cancel_report = QtWidgets.QPushButton("Cancel")
         self.btn_export.clicked.connect(self.export)
         self.btn_get_report.clicked.connect(self.get_report)
+        self.btn_cancel_report.clicked.connect(self.cancel_report)
+        self.btn_cancel_report.setVisible(False)
         self.btn_export.setEnabled(False)
         self.ui.horizontalLayout.addWidget(self.btn_export)
 
@@ -77,6 +86,7 @@ class AnimalIdReportWindow(QtWidgets.QMainWindow):
         self.ui.horizontalLayout.addWidget(self.label_species)
         self.ui.horizontalLayout.addWidget(self.comboBox_species)
         self.ui.horizontalLayout.addWidget(self.btn_get_report)
+        self.ui.horizontalLayout.addWidget(self.btn_cancel_report)
 
         # список дата-файлов
         self.db_list = QtWidgets.QListWidget()
@@ -118,24 +128,7 @@ class AnimalIdReportWindow(QtWidgets.QMainWindow):
         if not files_db:
             return
 
-        years = []
-        sites = []
-        species = []
-
-        for file_db in files_db:
-            session_report = SessionFactoryMain(f'sqlite:///{file_db}')
-            db_session = session_report.get_session()
-            resight = db_session.query(Resight).all()
-            years = years + list(map(lambda x: x.r_year, resight))
-            years = list(set(years))
-            years.sort()
-            sites = sites + list(map(lambda x: x.site, resight))
-            sites = list(set(sites))
-            sites.sort()
-
-            species = species + list(map(lambda x: x.species, resight))
-            species = list(set(species))
-            species.sort()
+        years, sites, species = load_catalog(files_db, Resight.__tablename__)
 
         for i, year in enumerate(years):
             if self.comboBox_years.findText(str(year), Qt.MatchFixedString) < 0:
@@ -240,7 +233,8 @@ class AnimalIdReportWindow(QtWidgets.QMainWindow):
     def closeEvent(self, *args, **kwargs):
         if self.myLongTask:
             if self.myLongTask.isRunning():
-                self.myLongTask.quit()
+                self.myLongTask.cancel()
+                self.myLongTask.wait()
 
     def get_report(self):
         """
@@ -252,13 +246,16 @@ class AnimalIdReportWindow(QtWidgets.QMainWindow):
         включает кнопку получения отчета и выходит из метода.
         В противном случае, он извлекает элементы из списка баз данных и создает новый экземпляр
         класса TaskThread с выбранными годами, сайтами, элементами и видами.
-        Он подключает сигнал результата экземпляра TaskThread к методу результата.
+        Он подключает сигналы result, part_result, progress_result, progress и stopped экземпляра TaskThread
+        к соответствующим слотам.
         Затем он запускает TaskThread, устанавливает видимость индикатора прогресса в True,
         устанавливает минимальные и максимальные значения индикатора прогресса на 0,
         и обновляет текст label_status на "Обработка отчета".
         """
         self.btn_export.setEnabled(False)
         self.btn_get_report.setEnabled(False)
+        self.ui.tabWidget.clear()
+        self.partial_sheets = {}
 
         years = []
         sites = []
@@ -281,7 +278,12 @@ class AnimalIdReportWindow(QtWidgets.QMainWindow):
             items_db.append(self.db_list.item(x).data(Qt.UserRole))
         self.myLongTask = TaskThread(years, sites, items_db, self.comboBox_species.currentText())
         self.myLongTask.result[list].connect(self.result)
+        self.myLongTask.part_result[int, list].connect(self.part_result)
+        self.myLongTask.progress_result[str].connect(self.progress_result)
+        self.myLongTask.progress[int, int].connect(self.progress_parts)
+        self.myLongTask.stopped[str].connect(self.stopped)
         self.myLongTask.start()
+        self.btn_cancel_report.setVisible(True)
         self.progress_bar.setVisible(True)
         self.progress_bar.setMinimum(0)
         self.progress_bar.setMaximum(0)
@@ -320,16 +322,65 @@ class AnimalIdReportWindow(QtWidgets.QMainWindow):
             self.progress_bar.setVisible(False)
             self.label_status.setText("Export Completed")
 
-    def result(self, dataFrames: list):
+    def progress_result(self, string):
         """
-        Отображает набор данных отчета в формате таблицы и показывает их в виде вкладок в пользовательском интерфейсе.
+        Обновляет метку статуса.
         """
-        self.ui.tabWidget.clear()
+        self.label_status.setText(string)
 
-        self.reports_tabs = dataFrames
+    def progress_parts(self, done, total):
+        """
+        Устанавливает индикатор прогресса по количеству прочитанных частей отчета.
+        """
+        self.progress_bar.setMinimum(0)
+        self.progress_bar.setMaximum(total)
+        self.progress_bar.setValue(done)
+
+    def part_result(self, index, sheets):
+        """
+        Часть отчета прочитана: листы Resight и Daily показываются по уже прочитанным частям (в порядке частей),
+        пока считаются остальные части. Первая часть создает вкладки, строки следующих частей вставляются
+        в модели вкладок на место по порядку частей, поэтому вкладка, сортировка и прокрутка пользователя
+        сохраняются.
+        """
+        if not self.partial_sheets:
+            self.show_sheets(sheets)
+        else:
+            for sheet, frame in enumerate(sheets):
+                row = sum(counts[sheet] for i, counts in self.partial_sheets.items() if i < index)
+                self.sheet_models[sheet].insertFrame(row, frame)
+        self.partial_sheets[index] = [len(frame) for frame in sheets]
+
+    def cancel_report(self):
+        """
+        Отменяет формирование отчета.
+        """
+        if self.myLongTask and self.myLongTask.isRunning():
+            self.btn_cancel_report.setEnabled(False)
+            self.label_status.setText("Canceling")
+            self.myLongTask.cancel()
+
+    def stopped(self, string):
+        """
+        Отчет остановлен (отмена или ошибка): кнопки возвращаются в исходное состояние.
+        """
+        self.progress_bar.setVisible(False)
+        self.btn_get_report.setEnabled(True)
+        self.btn_cancel_report.setVisible(False)
+        self.btn_cancel_report.setEnabled(True)
+        self.label_status.setText(string)
+
+    def show_sheets(self, dataFrames: list):
+        """
+        Показывает листы отчета dataFrames во вкладках (по порядку sheet_header).
+        """
+        current = self.ui.tabWidget.currentIndex()
+        self.ui.tabWidget.clear()
+        self.sheet_models = []
 
         for i, data in enumerate(dataFrames):
             tablemodel = PandasTableModel(data)
+            self.sheet_models.append(tablemodel)
             tableview = QTableView()
             proxyModel = QSortFilterProxyModel()
             proxyModel.setSourceModel(tablemodel)
@@ -339,85 +390,44 @@ class AnimalIdReportWindow(QtWidgets.QMainWindow):
             tableview.verticalHeader().setModel(tablemodel)
 
             self.ui.tabWidget.addTab(tableview, self.sheet_header[i])
+        if 0 <= current < self.ui.tabWidget.count():
+            self.ui.tabWidget.setCurrentIndex(current)
+
+    def result(self, dataFrames: list):
+        """
+        Отображает набор данных отчета в формате таблицы и показывает их в виде вкладок в пользовательском интерфейсе.
+        """
+        self.reports_tabs = dataFrames
+        self.partial_sheets = {}
+        self.show_sheets(dataFrames)
 
         self.btn_export.setEnabled(True)
         self.progress_bar.setVisible(False)
         self.btn_get_report.setEnabled(True)
+        self.btn_cancel_report.setVisible(False)
         self.myLongTask.quit()
         self.label_status.setText("Report Processing Completed")
 
 
-class DataProcessor:
-    """
-
-    Класс, отвечающий за обработку данных из данных регистраций за год resight.
-
-    """
-    def __init__(self, resight_df):
-        self.resight_df = resight_df
-        self.ages = []
-        self.natal_rookeries = []
-        self.rookery_site = []
-        self.support_sites = SitesList(support_session.query(Sites).all())
-
-    def process_animal_name(self, animal_name):
-        animal_rows = self.resight_df[self.resight_df['animal_name'] == animal_name]
-
-        for index, item_res in animal_rows.iterrows():
-            support_animal_name = m_params.support_animal_names.itemFromName(item_res['animal_name'])
-
-            if support_animal_name:
-                self.get_age(item_res, support_animal_name)
-                self.get_natal_rookery(support_animal_name)
-                self.get_rookery_site(item_res)
-
-    def get_age(self, item_res, support_animal_name):
-        if support_animal_name.t_date:
-            age = int(item_res['r_year']) - int(str(support_animal_name.t_date)[0:4])
-            self.ages.append(age)
-        else:
-            self.ages.append(None)
-
-    def get_natal_rookery(self, support_animal_name):
-        t_site = support_animal_name.t_site
-
-        if t_site:
-            support_rookery = self.support_sites.itemFromId(id_site=int(t_site))
-            if support_rookery:
-                natal_rookery = support_rookery.site_name
-                self.natal_rookeries.append(natal_rookery)
-            else:
-                self.natal_rookeries.append(None)
-        else:
-            self.natal_rookeries.append(None)
-
-    def get_rookery_site(self, item_res):
-        if item_res['site']:
-            support_rookery = self.support_sites.itemFromId(id_site=int(item_res['site']))
-            if support_rookery:
-                self.rookery_site.append(support_rookery.site_name)
-
-    def process_all_animal_names(self):
-        for animal_name in self.resight_df['animal_name'].unique():
-            self.process_animal_name(animal_name)
-
-    def update_resight_df(self):
-        self.resight_df['age'] = self.ages
-        self.resight_df['natal_rookery'] = self.natal_rookeries
-        self.resight_df['rookery_site'] = self.rookery_site
-
-
 class TaskThread(QtCore.QThread):
     """
-
-   Класс TaskThread является подклассом QtCore.QThread.
-   Он отвечает за выполнение задачи формирования отчета в отдельном потоке и отправку сигнала с результатом.
+    Поток формирования отчета регистраций животных.
+    Поток раздает части отчета (файл базы, год, участок) пулу процессов отчетов (run_report_parts), которые читают
+    строки частей (animal_id_report_part), и собирает листы из всех частей (animal_id_report_sheets).
+    Сигналы: result - листы отчета, part_result - индекс прочитанной части и ее листы Resight и Daily,
+    progress - количество прочитанных частей и всего частей, stopped - отчет остановлен (отмена или ошибка)
+    с текстом причины.
     """
     result = QtCore.pyqtSignal(list)
+    part_result = QtCore.pyqtSignal(int, list)
+    progress_result = QtCore.pyqtSignal(str)
+    progress = QtCore.pyqtSignal(int, int)
+    stopped = QtCore.pyqtSignal(str)
 
     def __init__(self, years=None, sites=None, db_list=None, species=None):
         QtCore.QThread.__init__(self)
 
+        self._canceled = False
         if not years or not sites or not db_list or not species:
             return
 
@@ -426,151 +436,51 @@ class TaskThread(QtCore.QThread):
         self.species = species
         self.db_list = db_list
         self.support_local_sites = LocalSitesList(support_session.query(LocalSites).all())
+        self.support_sites = SitesList(support_session.query(Sites).all())
+        self.support_animal_names = m_params.support_animal_names
+
+    def cancel(self):
+        """
+        Отменяет части отчета, которые еще не начали читаться. Начатые части дочитываются в своих процессах,
+        но их результат не используется.
+        """
+        self._canceled = True
 
     def run(self):
         """
-        Запускает метод для извлечения данных из нескольких файлов базы данных за указанные годы, лежбиже и виды животных.
-        """
-        all_dt = []
-
-        all_resight = []
-        all_daily = []
-        all_animal_info = []
-
-        for db_file in self.db_list:
-            session_report = SessionFactoryMain(f'sqlite:///{db_file}')
-            db_session = session_report.get_session()
-            for year in self.years:
-                for site in self.sites:
-                    resight = db_session.query(Resight).filter_by(r_year=year, site=site, species=self.species).all()
-                    r_daily = db_session.query(Daily).filter_by(r_year=year, site=site, species=self.species).all()
-                    animal_info = db_session.query(AnimalInfo).filter_by(r_year=year, site=site,
-                                                                         species=self.species).all()
-
-                    all_resight = all_resight + [item.as_dict() for item in resight]
-                    all_daily = all_daily + [item.as_dict() for item in r_daily]
-                    all_animal_info = all_animal_info + [item.as_dict() for item in animal_info]
-
-        temp_all_daily = []
-        for item_daily in all_daily:
-            support_site_name = self.support_local_sites.itemFromNameOrIdAndSite(nameOrId=item_daily['local_site'],
-                                                                                 site=item_daily['site'])
-            if support_site_name:
-                loc_site_name = support_site_name.local_site_name
-            else:
-                loc_site_name = item_daily['local_site']
-
-            item_daily['local_site_name'] = loc_site_name
-            temp_all_daily.append(item_daily)
-
-        daily_df = pd.DataFrame(temp_all_daily)
-        resight_df = pd.DataFrame(all_resight)
-        animal_info_df = pd.DataFrame(all_animal_info)
-
-        # Группируем по animal_name, считаем количество встреч
-        encounter_count_df = daily_df.groupby(['species', 'r_year', 'site',
-                                               'animal_name']).size().reset_index(name='time_seen')
-
-        # Слияние результата с таблицей resight
-        resight_df = pd.merge(resight_df, encounter_count_df,
-                              on=['species', 'r_year', 'site', 'animal_name'], how='left')
-
-        # Группируем по animal_name и находим первую и последнюю дату r_date
-        result_seen_df = daily_df.groupby(['species', 'r_year', 'site',
-                                           'animal_name']).agg({'r_date': ['min', 'max']}).reset_index()
-        result_seen_df.columns = ['species', 'r_year', 'site', 'animal_name', 'first_seen', 'last_seen']
-
-        # Слияние результата с таблицей resight
-        resight_df = pd.merge(resight_df, result_seen_df,
-                              on=['species', 'r_year', 'site', 'animal_name'], how='left')
-
-        # Фильтруем строки по условию status (без учета регистра)
-        filtered_animal_with_pup_df = daily_df[daily_df['status'].str.lower().isin(['wp', 'np'])]
-
-        # Группируем и выбираем первую дату встречи самки с щенком
-        first_seen_with_pup_df = filtered_animal_with_pup_df.groupby(['species',
-                                                                      'r_year',
-                                                                      'site',
-                                                                      'animal_name'])['r_date'].min().reset_index()
-        first_seen_with_pup_df.columns = ['species', 'r_year', 'site', 'animal_name', 'first_seen_with_pup']
-
-        # Слияние результата с таблицей resight
-        resight_df = pd.merge(resight_df, first_seen_with_pup_df,
-                              on=['species', 'r_year', 'site', 'animal_name'], how='left')
-
-        # Фильтруем строки по условию info_type и info_value!='no' (без учета регистра)
-        column_animal_info = ["BiopsyTaken", "DatePupBirth", "MomPresence",
-                              "IsFocalFemale", "MomSuckling", "NursingJuvenile",
-                              "NursingPup", "PresenceJuvenile", "PupName",
-                              "PupSurvival"]
-        filtered_animal_info = animal_info_df[(animal_info_df['info_type'].isin(column_animal_info)) &
-                                              (~animal_info_df['info_value'].str.lower().eq('no'))]
-
-        # Группируем и выбираем значения для каждой группы
-        grouped_animal_info_df = filtered_animal_info.groupby(['species',
-                                                               'r_year', 'site',
-                                                               'animal_name',
-                                                               'info_type'])['info_value'].first().reset_index()
-
-        # Преобразуем значения столбца info_type в заголовки столбцов
-        pivoted_animal_info_df = grouped_animal_info_df.pivot(index=['species',
-                                                                     'r_year', 'site', 'animal_name'],
-                                                              columns='info_type', values='info_value').reset_index()
-
-        for col in column_animal_info:
-            if col not in pivoted_animal_info_df.columns:
-                pivoted_animal_info_df[col] = np.nan
-
-        # Слияние результата с таблицей resight
-        resight_df = pd.merge(resight_df, pivoted_animal_info_df,
-                              on=['species', 'r_year', 'site', 'animal_name'], how='left')
-
-        data_processor = DataProcessor(resight_df)
-        data_processor.process_all_animal_names()
-        data_processor.update_resight_df()
-
-        # Создаем значения по датам как отдельные колонки для summary_day_df
-        daily_pivot = daily_df.pivot(index=['animal_name'], columns='r_date', values='status')
-
-        # Объединяем таблицы для summary_day_df
-        combining_tables_df = resight_df.join(daily_pivot, on='animal_name')
-
-        # Выбираем нужные колонки для summary_day_df
-        dates_summary = list(set(daily_df['r_date'].tolist()))
-        dates_summary.sort()
-        summary_day_df = combining_tables_df[['species', 'animal_name', 'sex_r', 'status'] + dates_summary]
-
-        # Меняем столбцы
-        summary_day_df.columns = ['Species', 'Animal Name', 'Gender', 'Status'] + dates_summary
-
-        resight_df.columns = ['Species', 'Year', 'Site', 'Animal Name', 'Brand Quality', 'Gender', 'Status',
-                              'Comment', 'IdStatus', 'Datecreated', 'Dateupdated', 'Time Seen', 'First Seen',
-                              'Last Seen', 'FirstSeenWithPup', 'NursingJuvenile', 'NursingPup', 'BiopsyTaken',
-                              'DatePupBirth', 'MomPresence', 'IsFocalFemale', 'MomSuckling', 'PresenceJuvenile',
-                              'PupName', 'PupSurvival', 'Age', 'Natal Rookery', 'Rookery Site']
-
-        daily_df.columns = ['Species', 'Year', 'Site', 'Animal Name', 'Date', 'Status', 'Local Site Id', 'Comment',
-                            'Observer', 'Date Created', 'Date Updated', 'Local Site Name']
-
-        daily_df = daily_df[['Species', 'Year', 'Site', 'Animal Name', 'Date', 'Status', 'Local Site Id',
-                             'Local Site Name', 'Comment', 'Observer', 'Date Created', 'Date Updated']]
-
-        # Заполняем NaN
-        resight_df = resight_df.fillna('')
-        daily_df = daily_df.fillna('')
-        summary_day_df = summary_day_df.fillna('')
-
-        resight_df['FirstSeenWithPup'] = resight_df['FirstSeenWithPup'].apply(
-            lambda x: int(x) if x and not pd.isna(x) else '')
-
-        all_dt.append(resight_df[['Species', 'Year', 'Site', 'Animal Name', 'Brand Quality', 'Gender', 'Status',
-                                  'Comment', 'IdStatus', 'Datecreated', 'Dateupdated']])
-        all_dt.append(daily_df)
-        all_dt.append(resight_df[['Species', 'Year', 'Site', 'Natal Rookery', 'Rookery Site', 'Animal Name', 'Age',
-                                  'Brand Quality', 'Gender', 'Status', 'Comment', 'Time Seen', 'First Seen',
-                                  'Last Seen', 'FirstSeenWithPup', 'NursingJuvenile', 'NursingPup', 'BiopsyTaken',
-                                  'DatePupBirth', 'MomPresence', 'IsFocalFemale', 'MomSuckling', 'PresenceJuvenile',
-                                  'PupName', 'PupSurvival', 'IdStatus', 'Datecreated', 'Dateupdated']])
-        all_dt.append(summary_day_df)
-
-        self.result.emit(all_dt)
+        Запускает метод для извлечения данных из нескольких файлов базы данных за указанные годы, лежбища и виды животных.
+        """
+        self.parts = parts = report_parts(self.db_list, self.years, self.sites)
+        local_sites = {site: local_site_names(self.support_local_sites, site) for site in set(self.sites)}
+
+        self.progress.emit(0, len(parts))
+        try:
+            for db_file in self.db_list:
+                self.progress_result.emit(f"Checking schema: {Path(db_file).name}")
+                prepare_report_db(db_file)
+
+            results = run_report_parts(parts, animal_id_report_part,
+                                       lambda part: (self.species, local_sites[part.site]),
+                                       self.part_done, lambda: self._canceled)
+
+            if self._canceled:
+                self.stopped.emit("Report Canceled")
+                return
+            self.progress_result.emit("Merging report")
+            sheets = animal_id_report_sheets(results, self.support_animal_names, self.support_sites)
+        except Exception as ex:
+            print(ex)
+            self.stopped.emit(f"Report Error: {ex}")
+            return
+
+        self.result.emit(sheets)
+
+    def part_done(self, index, frames, done):
+        """
+        Передает окну листы Resight и Daily прочитанной части и прогресс.
+        """
+        part = self.parts[index]
+        self.part_result.emit(index, [resight_sheet(frames[0]), daily_sheet(frames[1])])
+        self.progress_result.emit(f"Done: {Path(part.db_file).name}, Year: {part.year}, Site: {part.site} "
+                                  f"({done * 100 // len(self.parts)}%)")
+        self.progress.emit(done, len(self.parts))
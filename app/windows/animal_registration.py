@@ -1,20 +1,21 @@
-import os
 import subprocess
 from pathlib import Path
 from datetime import datetime
 from typing import Optional
 
 from PyQt5 import QtWidgets, QtGui
-from PyQt5.QtCore import Qt, pyqtSignal as Signal
+from PyQt5.QtCore import Qt, QThread, pyqtSignal as Signal
 from PyQt5.QtGui import QKeySequence, QPixmap
 from PyQt5.QtWidgets import QShortcut, QDialog, QMessageBox, QFileDialog
 
-from app import m_params, PATTERN_SUFFIX
+from app import m_params
+from app.controllers.brand_index import BrandIndex, BRAND_POSITIONS, DIGIT_CLASS, LETTER_CLASS
 from app.dialogs.confirmation_location_dialog import ConfirmationLocationDialog
 from app.custom_widgets.image_viewer import PreviewImageViewer
 from app.models.main_db import Resight, Daily, Location, AnimalInfo
 from app.models.model_registration_animal import ModelRegistrationAnimal
-from app.services.helpers import makeDatecreated
+from app.services.archive_index import ArchiveIndex, ArchiveIndexer, migrate_archive
+from app.services.helpers import makeDatecreated, open_image_to_qimage
 from app.controllers.parameters import session_factory_main
 from app.view.ui_window_animal_registration import Ui_RegistrationWindow
 
@@ -46,9 +47,11 @@ class AnimalRegistration(QtWidgets.QMainWindow):
         self.currentImageIndex: int = 0
         self.filteredBrand: list[str] = []
         self.pathsImages: list[str] = []
+        self.verifiedImages: dict[str, bool] = {}
         self.animalNames: list[str] = []
 
         self.locationDialog: Optional[ConfirmationLocationDialog] = None
+        self.archiveIndexer: Optional[ArchiveIndexer] = None
 
         self.setMinimumWidth(200)
         self.setMaximumWidth(200)
@@ -88,6 +91,8 @@ class AnimalRegistration(QtWidgets.QMainWindow):
         self.ui.btn_next.clicked.connect(self.next_image)
 
         self.ui.btn_search_brand.clicked.connect(self.search_brand)
+        for pos in BRAND_POSITIONS:
+            getattr(self.ui, f'cmb_{pos}').currentIndexChanged.connect(self.update_pos_counts)
         self.ui.btn_reset_search.clicked.connect(self.fill_pos_search)
         self.ui.list_result_search_brand.itemClicked.connect(self.selected_search_name)
 
@@ -98,6 +103,40 @@ class AnimalRegistration(QtWidgets.QMainWindow):
         self.set_current_animal_name()
 
         self.ui.label_path_archive.setText(f"Archive: {m_params.archive_animals_path}")
+        self.start_archive_indexer()
+
+    def closeEvent(self, event):
+        self.stop_archive_indexer()
+        super().closeEvent(event)
+
+    def start_archive_indexer(self):
+        """
+        Запускает фоновое обновление индекса архива фотографий меток.
+        Перед первым обновлением в архиве один раз выполняется исправление имен папок (migrate_archive).
+        """
+        self.stop_archive_indexer()
+        if not m_params.archive_animals_path:
+            return
+        migrate_archive(m_params.archive_animals_path)
+        self.archiveIndexer = ArchiveIndexer(m_params.archive_animals_path, self)
+        self.archiveIndexer.indexed.connect(self.archive_indexed)
+        self.archiveIndexer.start(QThread.LowPriority)
+
+    def stop_archive_indexer(self):
+        if self.archiveIndexer is not None:
+            self.archiveIndexer.requestInterruption()
+            self.archiveIndexer.wait()
+            self.archiveIndexer = None
+
+    def archive_indexed(self, archive_path, changed):
+        """
+        Индекс архива обновлен: если у текущего животного изменились фотографии, они загружаются заново.
+        """
+        if archive_path != m_params.archive_animals_path or self.isSmallSize:
+            return
+        name = self.ui.cmb_AnimalName.currentText()
+        if name and [x.path for x in self.archive_images(name)] != self.pathsImages:
+            self.get_images(name)
 
     def fill_date_edit(self):
         """
@@ -150,41 +189,43 @@ class AnimalRegistration(QtWidgets.QMainWindow):
         self.filteredBrand.clear()
         self.ui.label_total_search_brand.setText(f"Total result: {len(self.filteredBrand)}")
 
-        p = ["*", "#"]
-        self.ui.cmb_pos1.clear()
-        self.ui.cmb_pos2.clear()
-        self.ui.cmb_pos3.clear()
-        self.ui.cmb_pos4.clear()
-        self.ui.cmb_pos5.clear()
-
-        pos1 = list(map(lambda x: x.pos1, m_params.support_animal_names))
-        pos1 = list(set(pos1))
-        pos1.sort()
-        pos2 = list(map(lambda x: x.pos2, m_params.support_animal_names))
-        pos2 = list(set(pos2))
-        pos2.sort()
-        pos3 = list(map(lambda x: x.pos3, m_params.support_animal_names))
-        pos3 = list(set(pos3))
-        pos3.sort()
-        pos4 = list(map(lambda x: x.pos4, m_params.support_animal_names))
-        pos4 = list(set(pos4))
-        pos4.sort()
-        pos5 = list(map(lambda x: x.pos5, m_params.support_animal_names))
-        pos5 = list(set(pos5))
-        pos5.sort()
-
-        for item in p:
-            pos1.insert(1, item)
-            pos2.insert(1, item)
-            pos3.insert(1, item)
-            pos4.insert(1, item)
-            pos5.insert(1, item)
-
-        self.ui.cmb_pos1.addItems(pos1)
-        self.ui.cmb_pos2.addItems(pos2)
-        self.ui.cmb_pos3.addItems(pos3)
-        self.ui.cmb_pos4.addItems(pos4)
-        self.ui.cmb_pos5.addItems(pos5)
+        # первый элемент списка (наименьшее значение знака) не ограничивает поиск, за ним идут классы знаков;
+        # в данных элемента хранится знак, в тексте - знак и количество животных
+        brand_index = BrandIndex.for_animals(m_params.support_animal_names)
+        for pos in BRAND_POSITIONS:
+            ui_combo = getattr(self.ui, f'cmb_{pos}')
+            ui_combo.blockSignals(True)
+            ui_combo.clear()
+            values = [str(value) for value in brand_index.values[pos]]
+            for item in [LETTER_CLASS, DIGIT_CLASS]:
+                values.insert(1, item)
+            for value in values:
+                ui_combo.addItem(value, value)
+            ui_combo.blockSignals(False)
+        self.update_pos_counts()
+
+    def brand_symbols(self):
+        """
+        Выбранные знаки поиска по позициям (None - позиция не ограничивает поиск).
+        """
+        symbols = {}
+        for pos in BRAND_POSITIONS:
+            ui_combo = getattr(self.ui, f'cmb_{pos}')
+            symbols[pos] = ui_combo.currentData() if ui_combo.currentIndex() > 0 else None
+        return symbols
+
+    def update_pos_counts(self):
+        """
+        Показывает в списках поиска количество животных для каждого знака с учетом знаков на других позициях.
+        """
+        brand_index = BrandIndex.for_animals(m_params.support_animal_names)
+        symbols = self.brand_symbols()
+        for pos in BRAND_POSITIONS:
+            ui_combo = getattr(self.ui, f'cmb_{pos}')
+            counts = brand_index.counts(pos, symbols)
+            for i in range(1, ui_combo.count()):
+                symbol = ui_combo.itemData(i)
+                ui_combo.setItemText(i, f"{symbol} ({counts.get(symbol, 0)})")
 
     def fill_local_sites(self, local_sites):
         """
@@ -445,37 +486,14 @@ class AnimalRegistration(QtWidgets.QMainWindow):
         self.ui.list_result_search_brand.clear()
         self.filteredBrand = []
 
-        filtered_pos1_animals = self.filter_animals_based_on_ui('pos1', m_params.support_animal_names)
-        filtered_pos2_animals = self.filter_animals_based_on_ui('pos2', filtered_pos1_animals)
-        filtered_pos3_animals = self.filter_animals_based_on_ui('pos3', filtered_pos2_animals)
-        filtered_pos4_animals = self.filter_animals_based_on_ui('pos4', filtered_pos3_animals)
-        filtered_pos5_animals = self.filter_animals_based_on_ui('pos5', filtered_pos4_animals)
-
-        for animal in filtered_pos5_animals:
+        brand_index = BrandIndex.for_animals(m_params.support_animal_names)
+        for animal in brand_index.search(self.brand_symbols()):
             age, registration_year = self.calculate_animal_age_and_registration_year(animal)
             if age == 'NA' or age >= 0:
                 self.filteredBrand.append(f"{animal.animal_name} {animal.t_sex} {registration_year} {age}")
         self.ui.list_result_search_brand.addItems(self.filteredBrand)
         self.ui.label_total_search_brand.setText(f"Total result: {len(self.filteredBrand)}")
 
-    def filter_animals_based_on_ui(self, pos, animals):
-        """
-
-        Фильтровать животных на основе выбранного варианта из ниспадающего списка пользовательского интерфейса
-        поиска меток.
-        """
-        ui_combo = getattr(self.ui, f'cmb_{pos}')
-        ui_combo_text = ui_combo.currentText()
-
-        if ui_combo_text == "#":
-            return list(filter(lambda x: str(getattr(x, pos)).isdigit() and getattr(x, pos), animals))
-        elif ui_combo_text == "*":
-            return list(filter(lambda x: not str(getattr(x, pos)).isdigit() and getattr(x, pos), animals))
-        elif ui_combo_text != "#" and ui_combo_text != "*" and ui_combo.currentIndex():
-            return list(filter(lambda x: str(getattr(x, pos)) == ui_combo_text and getattr(x, pos), animals))
-        elif not ui_combo.currentIndex():
-            return animals
-
     def calculate_animal_age_and_registration_year(self, animal):
         """
         Вычисляет возраст и год регистрации животного.
@@ -554,55 +572,36 @@ class AnimalRegistration(QtWidgets.QMainWindow):
             self.scene_clear()
             m_params.archive_animals_path = dialog.selectedFiles()[0]
             self.ui.label_path_archive.setText(f"Archive: {m_params.archive_animals_path}")
+            self.start_archive_indexer()
             if self.ui.cmb_AnimalName.currentText():
                 self.get_images(self.ui.cmb_AnimalName.currentText())
 
     @staticmethod
-    def rename_folder_archive():
-        """
-        Переименует папки в архивном каталоге за год B_2017.
-        P.S. Исправляет ошибку при формировании архива.
-        """
-        archive_path = m_params.archive_animals_path
-        directory = os.path.join(archive_path, "B_2017")
-        if os.path.exists(directory):
-            for dirs, folder, files in os.walk(directory):
-                for f in folder:
-                    if str(f)[-1] != 'L':
-                        os.rename(os.path.join(archive_path, "B_2017", f),
-                                  os.path.join(archive_path, "B_2017", f + "L"))
-                break
+    def archive_images(animal_name):
+        """
+        Фотографии животного animal_name из индекса архива фотографий меток.
+        """
+        if not m_params.archive_animals_path:
+            return []
+        if '>' in animal_name:
+            animal_name = animal_name.replace('>', '^')
+        return ArchiveIndex.for_path(m_params.archive_animals_path).images(animal_name)
 
     def get_images(self, animal_name):
         """
 
-        Этот метод извлекает пути к изображениям на основе данного animal_name из архива фотографий меток
+        Этот метод извлекает пути к изображениям на основе данного animal_name из индекса архива фотографий меток
 
         """
         try:
             self.view.setToolTip('')
             self.ui.label_name_file.setText('')
 
-            self.rename_folder_archive()
-            if '>' in animal_name:
-                animal_name = animal_name.replace('>', '^')
             self.ui.label_verified.setText("")
             self.ui.label_coun_img.setText("")
-            self.pathsImages.clear()
-            directory = "{0}".format(m_params.archive_animals_path)
-
-            if os.path.exists(directory):
-                for (root, dirs, files) in os.walk(directory, topdown=True):
-                    for item in dirs:
-                        for (_, s_dirs, _) in os.walk(os.path.join(root, item), topdown=True):
-                            res_search = list(filter(lambda x: str(x) == animal_name, s_dirs))
-
-                            for res in res_search:
-                                [self.pathsImages.append(os.path.join(root, item, res, f)) for f in
-                                 Path(os.path.join(root, item, res)).glob('*') if
-                                 f.suffix.lower() in PATTERN_SUFFIX]
-                            break
-                    break
+            images = self.archive_images(animal_name)
+            self.pathsImages = [x.path for x in images]
+            self.verifiedImages = {x.path: x.verified for x in images}
 
             self.currentImageIndex = 0
             self.scene_clear()
@@ -631,13 +630,12 @@ class AnimalRegistration(QtWidgets.QMainWindow):
         self.view.setToolTip(path_image)
 
         self.ui.label_verified.setText("")
-        if str(path_image).find('not_verified') > -1:
+        if not self.verifiedImages.get(path_image, str(path_image).find('not_verified') == -1):
             self.ui.label_verified.setText("not verified")
         else:
             self.ui.label_verified.setText("verified")
 
-        pixMap = QtGui.QPixmap(path_image)
-        self.view.setPixmap(pixMap)
+        self.view.setImage(open_image_to_qimage(path_image))
 
         self.ui.label_coun_img.setText(f"{len(self.pathsImages)} / {self.currentImageIndex + 1}")
 
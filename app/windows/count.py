@@ -5,9 +5,9 @@ from typing import Optional
 
 import pandas as pd
 
-from PyQt5 import QtWidgets, QtCore, QtGui
+from PyQt5 import QtWidgets, QtCore
 from PyQt5.QtCore import Qt, pyqtSignal, QPoint, QPointF
-from PyQt5.QtGui import QColor, QKeySequence, QBrush, QConicalGradient
+from PyQt5.QtGui import QColor, QKeySequence, QBrush
 from PyQt5.QtWidgets import QListWidgetItem, QShortcut, QTableWidgetItem, QButtonGroup, QDialog, QToolButton, \
     QMessageBox, QHeaderView, QAbstractItemView, QApplication
 
@@ -15,11 +15,14 @@ from app import m_params
 from app.custom_widgets.image_viewer import ImageViewer
 from app.dialogs.custom_dialog import DialogSelectCountCategory, DialogSelectLocalSite
 from app.models.main_db import PointsCount, CountEffortSites, PatternCount, CountEffortCategories, CountFiles
+from app.controllers.category_brushes import CategoryBrushCache
 from app.controllers.items_file import ItemFileCount
+from app.controllers.thumbnail_list import ThumbnailListController
 from app.controllers.support_lists import AnimalCategoriesList
 from app.models.support_db import AnimalCategories, LocalSites
 from app.services.helpers import makeDatecreated
-from app.controllers.parameters import session_factory_main, user_settings
+from app.services.image_prefetch import ImagePrefetcher
+from app.controllers.parameters import session_factory_main, user_settings, point_queue
 from app.view.ui_window_count import Ui_MainWindow
 
 HEADER_LABELS = ['Category', 'Local Site']
@@ -69,6 +72,8 @@ class CountWindow(QtWidgets.QMainWindow):
             creator=m_params.current_data.creator).all()
 
         self.view = ImageViewer()
+        self.category_brushes = CategoryBrushCache()
+        self.prefetcher = ImagePrefetcher(parent=self)
         self.button_group = QButtonGroup()
         self.cbox_group = QButtonGroup()
         self.btn_category_shortcuts = []
@@ -111,6 +116,7 @@ class CountWindow(QtWidgets.QMainWindow):
         self.view.zoomDisplay.connect(self.zoom_display)
         self.view.selectedPoints.connect(self.selectPointsInTable)
         self.view.deletePointsInParent.connect(self.deleteSelectedPointsInTable)
+        point_queue.writeFailed.connect(self.point_write_failed)
 
         self.ui.spinBox_sizePoint.valueChanged.connect(self.changeSizePoints)
         self.ui.checkBox_view_text_points.setChecked(True)
@@ -118,6 +124,8 @@ class CountWindow(QtWidgets.QMainWindow):
 
         self.ui.listWidget_Images.itemActivated.connect(self.select_image)
         self.ui.listWidget_Images.itemSelectionChanged.connect(self.select_image)
+        # режим миниатюр списка изображений (Ctrl+T)
+        self.thumbnails_images = ThumbnailListController(self.ui.listWidget_Images, "ThumbnailsCountImages")
 
         self.ui.tableWidget_Points.setEditTriggers(QtWidgets.QTableWidget.NoEditTriggers)
         self.ui.tableWidget_Points.itemSelectionChanged.connect(self.selectPointsInImageView)
@@ -317,7 +325,7 @@ class CountWindow(QtWidgets.QMainWindow):
         loc = point.data(Qt.UserRole)
         loc.iTop = point.pos().y()
         loc.iLeft = point.pos().x()
-        self.main_session.commit()
+        point_queue.update(loc)
 
     def keyPressEvent(self, e):
         if e.key() == Qt.Key_Escape:
@@ -369,11 +377,18 @@ class CountWindow(QtWidgets.QMainWindow):
     def open_image(self, item):
         """
         Этот метод открывает изображение и загружает связанные данные.
+        Перед загрузкой точек записывается очередь точек предыдущего изображения.
         """
         self.count_points.clear()
+        point_queue.flush(wait=True)
 
         itemData = item.data(Qt.UserRole)
-        self.view.setPhoto(itemData.path, 1)
+        image = self.prefetcher.take(itemData.path)
+        if image is not None:
+            self.view.setImage(image, 1)
+        else:
+            self.view.setPhoto(itemData.path, 1)
+        self.prefetch_images(self.ui.listWidget_Images.row(item))
         self.count_points = self.load_points(itemData.fileData) + self.load_pattern_points(itemData.fileData)
 
         self.ui.lcd_zoom.display(str(self.view.get_zoom()))
@@ -392,22 +407,19 @@ class CountWindow(QtWidgets.QMainWindow):
 
                 animalCategory = self.effortCategoriesPoints.itemFromName(point.animal_category)
 
-                gradient = QConicalGradient()
-                start_color = QColor(animalCategory.color_representation_small)
-                end_color = QColor(animalCategory.color_representation_large)
-
-                gradient.setColorAt(0.0, start_color)
-                gradient.setColorAt(0.25, start_color.lighter())
-                gradient.setColorAt(0.5, start_color.darker())
-                gradient.setColorAt(0.75, end_color.darker())
-                gradient.setColorAt(1.0, end_color)
-                gradient.setSpread(QtGui.QGradient.RepeatSpread)
-
-                brush = QBrush(gradient)
+                brush = self.category_brushes.brush(animalCategory)
 
                 self.view.addPoint(pos=QPoint(point.iLeft, point.iTop), text=animalCategory.animal_category,
                                    data=point, tooltip=tooltip, color=brush)
 
+    def prefetch_images(self, row):
+        """
+        Запускает фоновую загрузку соседних кадров вокруг текущей строки списка изображений.
+        """
+        paths = [self.ui.listWidget_Images.item(i).data(Qt.UserRole).path
+                 for i in range(self.ui.listWidget_Images.count())]
+        self.prefetcher.update(row, paths)
+
     def get_view_other_animals(self, data: CountFiles):
         """
         Возвращает список объектов PointsCount, которые не относятся к текущему виду.
@@ -520,6 +532,9 @@ class CountWindow(QtWidgets.QMainWindow):
             creator=data.creator,
             count_type=data.count_type).all()
 
+        # точки записываются через point_queue, поэтому в сессии окна они не хранятся
+        for point in points:
+            self.main_session.expunge(point)
         return points
 
     def load_pattern_points(self, data: CountFiles):
@@ -536,6 +551,8 @@ class CountWindow(QtWidgets.QMainWindow):
                                                                  species=data.species,
                                                                  creator=data.creator,
                                                                  count_type=data.count_type).all()
+        for point in points:
+            self.main_session.expunge(point)
         return points
 
     def changeSizePoints(self):
@@ -584,8 +601,9 @@ class CountWindow(QtWidgets.QMainWindow):
         2. Если currentCategory не установлен, метод возвращает False.
         3. Получаются данные элемента для текущего файла в listWidget_Images.
         4. Если в списке count_points есть только одна точка и она принадлежит категории 'nomarked' или 'noanimal',
-        и вид совпадает с m_params.species, то точка удаляется из main_session и списка count_points очищается.
-        5. Если в списке count_points нет точек или текущий локальный участок не выбран, открывается диалог выбора локального участка.
+        и вид совпадает с m_params.species, то эта метка заменяется новой точкой (см. шаг 9).
+        5. Если в списке count_points нет точек (кроме заменяемой метки) или текущий локальный участок не выбран,
+        открывается диалог выбора локального участка.
         - Если диалог отклонен, метод возвращает False.
         - В противном случае локальный участок находится в комбо-боксе cmb_local_site и устанавливается как текущий.
         6. Проверяется локальный участок.
@@ -593,7 +611,8 @@ class CountWindow(QtWidgets.QMainWindow):
         7. Если точка с теми же координатами уже существует в списке count_points, метод возвращает False.
         8. Если категория животного currentCategory не 'inj', создается объект PointsCount.
         - В противном случае создается объект PatternCount.
-        9. Объект точки добавляется в main_session и фиксируется.
+        9. Объект точки ставится в очередь записи point_queue. Заменяемая метка ставится в очередь удаления,
+        вычитается из счетчика фотографии и удаляется из count_points и представления.
         10. Если fileName из itemData отсутствует в списке m_params.done_files, он добавляется.
         11. Устанавливается цвет переднего плана элемента файла на основе currentCategory.
         12. Точка добавляется в список count_points.
@@ -623,18 +642,17 @@ class CountWindow(QtWidgets.QMainWindow):
         file_item = self.ui.listWidget_Images.item(self.currentImageRow)
         itemData = file_item.data(Qt.UserRole)
 
+        point_to_delete = None
         if len(self.count_points) == 1:
-            point_to_delete = self.count_points[0]
             categories = ['nomarked', 'noanimal']
-            if (str(point_to_delete.animal_category).lower() in categories
-                    and point_to_delete.species == m_params.species):
-
-                if self.main_session.is_modified(point_to_delete):
-                    self.main_session.delete(point_to_delete)
-                    self.main_session.commit()
-                self.count_points.clear()
-
-        if not self.count_points or self.ui.cmb_local_site.currentIndex() < 0:
+            if (str(self.count_points[0].animal_category).lower() in categories
+                    and self.count_points[0].species == m_params.species):
+                # метка 'No Animals' / 'No Marked' заменяется первой точкой на фотографии и удаляется только
+                # после того, как новая точка поставлена в очередь записи
+                point_to_delete = self.count_points[0]
+        points = [] if point_to_delete else self.count_points
+
+        if not points or self.ui.cmb_local_site.currentIndex() < 0:
             dialogSelectLocalSite = DialogSelectLocalSite()
             dialogSelectLocalSite.show()
             if dialogSelectLocalSite.exec() == QDialog.Rejected:
@@ -648,7 +666,7 @@ class CountWindow(QtWidgets.QMainWindow):
         if not local_site:
             return
 
-        if any((item.iLeft, item.iTop) == (coords.x(), coords.y()) for item in self.count_points):
+        if any((item.iLeft, item.iTop) == (coords.x(), coords.y()) for item in points):
             return
 
         if self.currentCategory.animal_category.lower() != 'inj':
@@ -684,8 +702,14 @@ class CountWindow(QtWidgets.QMainWindow):
                 creator=m_params.current_data.creator,
                 count_type=itemData.fileData.count_type)
 
-        self.main_session.add(point)
-        self.main_session.commit()
+        point_queue.insert(point)
+
+        if point_to_delete:
+            # метка удаляется из базы и из счетчиков одинаково для метки, поставленной сейчас и загруженной из базы
+            point_queue.delete(point_to_delete)
+            self.update_done_photo_count.emit(itemData, {point_to_delete.animal_category: 1}, operator.sub)
+            self.count_points.remove(point_to_delete)
+            self.view.removePoints([x for x in self.view.points if x.data(Qt.UserRole) is point_to_delete])
 
         if itemData.fileName not in m_params.done_files:
             m_params.done_files.append(itemData.fileName)
@@ -701,18 +725,7 @@ class CountWindow(QtWidgets.QMainWindow):
         if point.iLeft >= 0 and point.iTop >= 0:
             tooltip = f"{point.animal_category} {point.local_site}"
 
-            gradient = QConicalGradient()
-            start_color = QColor(self.currentCategory.color_representation_small)
-            end_color = QColor(self.currentCategory.color_representation_large)
-
-            gradient.setColorAt(0.0, start_color)
-            gradient.setColorAt(0.25, start_color.lighter())
-            gradient.setColorAt(0.5, start_color.darker())
-            gradient.setColorAt(0.75, end_color.darker())
-            gradient.setColorAt(1.0, end_color)
-            gradient.setSpread(QtGui.QGradient.RepeatSpread)
-
-            brush = QBrush(gradient)
+            brush = self.category_brushes.brush(self.currentCategory)
             self.view.addPoint(pos=QPointF(point.iLeft, point.iTop),
                                text=point.animal_category,
                                data=point, tooltip=tooltip, color=brush)
@@ -771,8 +784,8 @@ class CountWindow(QtWidgets.QMainWindow):
 
         Этот метод удаляет выбранные точки в таблице.
         Он извлекает выбранные строки из виджета таблицы, получает данные для каждой выбранной строки, проверяет,
-        соответствует ли вид указанному параметру, добавляет данные в список, удаляет данные из сессии,
-        удаляет точки из представления и фиксирует изменения в сессии.
+        соответствует ли вид указанному параметру, добавляет данные в список, ставит удаление в очередь записи
+        и удаляет точки из представления.
         """
         data_rows = []
 
@@ -784,14 +797,13 @@ class CountWindow(QtWidgets.QMainWindow):
 
             if data.species == m_params.species:
                 data_rows.append(data)
-                self.main_session.delete(data)
+                point_queue.delete(data)
                 self.count_points.remove(data)
 
         data_dict = {r: True for r in data_rows}
         removePoints = [x for x in self.view.points if x.data(Qt.UserRole) in data_dict]
 
         self.view.removePoints(removePoints)
-        self.main_session.commit()
 
         item_photo = self.ui.listWidget_Images.item(self.currentImageRow)
         itemData = item_photo.data(Qt.UserRole)
@@ -867,8 +879,7 @@ class CountWindow(QtWidgets.QMainWindow):
 
                         self.ui.tableWidget_Points.item(row, 1).setText(
                             dialog_selected_loc_site.localSite.local_site_id)
-
-                self.main_session.commit()
+                        point_queue.update(item_data)
 
     def change_category_for_point(self):
         """
@@ -906,24 +917,12 @@ class CountWindow(QtWidgets.QMainWindow):
 
                         animalCategory = self.effortCategoriesPoints.itemFromName(item_data.animal_category)
 
-                        gradient = QConicalGradient()
-                        start_color = QColor(animalCategory.color_representation_small)
-                        end_color = QColor(animalCategory.color_representation_large)
-
-                        gradient.setColorAt(0.0, start_color)
-                        gradient.setColorAt(0.25, start_color.lighter())
-                        gradient.setColorAt(0.5, start_color.darker())
-                        gradient.setColorAt(0.75, end_color.darker())
-                        gradient.setColorAt(1.0, end_color)
-                        gradient.setSpread(QtGui.QGradient.RepeatSpread)
-
-                        brush = QBrush(gradient)
+                        brush = self.category_brushes.brush(animalCategory)
 
                         item_point.setToolTip(f'{item_data.animal_category} {point_data.local_site}')
                         item_point.color = brush
                         item_point.text = item_data.animal_category
-
-                self.main_session.commit()
+                        point_queue.update(item_data)
 
     def search_item_photo_and_select(self, file_name):
         """
@@ -1029,18 +1028,9 @@ class CountWindow(QtWidgets.QMainWindow):
         self.currentCategory = value
         self.effortCategoriesPoints = new_categories
 
-        gradient = QConicalGradient()
-        start_color = QColor(self.currentCategory.color_representation_small)
-        end_color = QColor(self.currentCategory.color_representation_large)
-
-        gradient.setColorAt(0.0, start_color)
-        gradient.setColorAt(0.25, start_color.lighter())
-        gradient.setColorAt(0.5, start_color.darker())
-        gradient.setColorAt(0.75, end_color.darker())
-        gradient.setColorAt(1.0, end_color)
-        gradient.setSpread(QtGui.QGradient.RepeatSpread)
-
-        brush = QBrush(gradient)
+        # цвет категории изменен в ColorsDialog, кисть нужно пересоздать
+        self.category_brushes.invalidate(value)
+        brush = self.category_brushes.brush(self.currentCategory)
 
         self.view.changeColorPoint(text=value.animal_category, color=brush)
         data = pickle.dumps(new_categories)
@@ -1109,6 +1099,14 @@ class CountWindow(QtWidgets.QMainWindow):
         else:
             self.ui.actionPointsPanel.setChecked(False)
 
+    def point_write_failed(self, message):
+        """
+        Точки не записаны в базу: они остаются в очереди и журнале записи и будут записаны позже.
+        """
+        QMessageBox.warning(self, 'Message', f"Points are not saved to the database: {message}\n"
+                                             f"They are kept in the journal and will be written again.",
+                            QMessageBox.Ok, QMessageBox.Ok)
+
     """zoom"""
 
     def zoom_display(self, zoom):
@@ -1222,6 +1220,11 @@ class CountWindow(QtWidgets.QMainWindow):
 
             m_params.windows_list.remove(self)
 
+        point_queue.flush(wait=True)
+        self.prefetcher.clear()
+        # очередь записи общая для окон: закрытое окно не должно получать ее сообщения
+        point_queue.writeFailed.disconnect(self.point_write_failed)
+
 
 class CategoryButton(QToolButton):
     """
@@ -1,5 +1,4 @@
 import os
-import re
 import sys
 from pathlib import Path
 from typing import Optional
@@ -15,10 +14,12 @@ from app.controllers.support_lists import LocalSitesList
 from app.custom_widgets.checkable_comboBox import CheckableComboBox
 from app.dialogs.open_files_and_dirs_dialog import getOpenFilesAndDirs
 from app.controllers.tables import PandasTableModel
-from app.models.main_db import CountList, PointsCount, GroupsCount, CountEffortCategories, CountFiles
+from app.models.main_db import CountList
 from app.models.support_db import Species, LocalSites
-from app.services.db_manager import SessionFactoryMain
-from app.controllers.parameters import session_factory_main, support_session, user_settings
+from app.services.count_report import ReportCategory, report_parts, prepare_report_db, count_report_part, \
+    merge_report_parts, run_report_parts
+from app.services.report_catalog import load_catalog
+from app.controllers.parameters import session_factory_main, support_session, user_settings, point_queue
 from app.view.ui_window_count_report import Ui_CountReportWindow
 
 
@@ -41,8 +42,11 @@ class CountReportWindow(QtWidgets.QMainWindow):
 
         self.btn_export = QtWidgets.QPushButton("Export to Excel")
         self.btn_get_report = QtWidgets.QPushButton("Get")
+        self.btn_cancel_report = QtWidgets.QPushButton("Cancel")
         self.btn_export.clicked.connect(self.export)
         self.btn_get_report.clicked.connect(self.get_report)
+        self.btn_cancel_report.clicked.connect(self.cancel_report)
+        self.btn_cancel_report.setVisible(False)
         self.btn_export.setEnabled(False)
         self.ui.horizontalLayout.addWidget(self.btn_export)
 
@@ -65,6 +69,7 @@ class CountReportWindow(QtWidgets.QMainWindow):
         self.ui.horizontalLayout.addWidget(self.label_species)
         self.ui.horizontalLayout.addWidget(self.comboBox_species)
         self.ui.horizontalLayout.addWidget(self.btn_get_report)
+        self.ui.horizontalLayout.addWidget(self.btn_cancel_report)
 
         self.progress_bar = QProgressBar()
         self.progress_bar.setMaximumHeight(15)
@@ -123,23 +128,7 @@ class CountReportWindow(QtWidgets.QMainWindow):
         if not files_db:
             return
 
-        years = []
-        sites = []
-        species = []
-        for file_db in files_db:
-            session_report = SessionFactoryMain(f'sqlite:///{file_db}')
-            db_session = session_report.get_session()
-            counts_list = pd.DataFrame([cl.as_dict() for cl in db_session.query(CountList).all()])
-
-            years = years + counts_list['r_year'].tolist()
-            years = list(set(years))
-            years.sort()
-            sites = sites + counts_list['site'].tolist()
-            sites = list(set(sites))
-            sites.sort()
-            species = species + counts_list['species'].tolist()
-            species = list(set(species))
-            species.sort()
+        years, sites, species = load_catalog(files_db, CountList.__tablename__)
 
         for i, year in enumerate(years):
             if self.comboBox_years.findText(str(year), Qt.MatchFixedString) < 0:
@@ -247,7 +236,8 @@ class CountReportWindow(QtWidgets.QMainWindow):
         Если года или сайты не выбраны, возвращается без дальнейшей обработки.
         Извлекает элементы из списка баз данных.
         Инициализирует TaskThread с выбранными годами, сайтами, элементами из списка баз данных и выбранными видами.
-        Соединяет сигналы result и progress_result TaskThread c соответствующими слотами. Запускает TaskThread.
+        Соединяет сигналы result, progress_result, progress и stopped TaskThread c соответствующими слотами.
+        Перед запуском записывает очередь точек открытого учета, чтобы отчет видел последние точки. Запускает TaskThread.
         Устанавливает видимость индикатора прогресса и задает его минимальные и максимальные * значения равными 0.
         Устанавливает текст label_status в "Report Processing".
         """
@@ -274,10 +264,14 @@ class CountReportWindow(QtWidgets.QMainWindow):
         items_db = []
         for x in range(self.db_list.count()):
             items_db.append(self.db_list.item(x).data(Qt.UserRole))
+        point_queue.flush(wait=True)
         self.myLongTask = TaskThread(years, sites, items_db, self.comboBox_species.currentText())
         self.myLongTask.result[list].connect(self.result)
         self.myLongTask.progress_result[str].connect(self.progress_result)
+        self.myLongTask.progress[int, int].connect(self.progress_parts)
+        self.myLongTask.stopped[str].connect(self.stopped)
         self.myLongTask.start()
+        self.btn_cancel_report.setVisible(True)
         self.progress_bar.setVisible(True)
         self.progress_bar.setMinimum(0)
         self.progress_bar.setMaximum(0)
@@ -285,12 +279,36 @@ class CountReportWindow(QtWidgets.QMainWindow):
 
     def progress_result(self, string):
         """
-        Устанавливает индикатор прогресса и обновляет метку статуса.
+        Обновляет метку статуса.
         """
         self.progress_bar.setVisible(True)
+        self.label_status.setText(string)
+
+    def progress_parts(self, done, total):
+        """
+        Устанавливает индикатор прогресса по количеству готовых частей отчета.
+        """
         self.progress_bar.setMinimum(0)
-        self.progress_bar.setMaximum(0)
-        self.progress_bar.setValue(0)
+        self.progress_bar.setMaximum(total)
+        self.progress_bar.setValue(done)
+
+    def cancel_report(self):
+        """
+        Отменяет формирование отчета.
+        """
+        if self.myLongTask and self.myLongTask.isRunning():
+            self.btn_cancel_report.setEnabled(False)
+            self.label_status.setText("Canceling")
+            self.myLongTask.cancel()
+
+    def stopped(self, string):
+        """
+        Отчет остановлен (отмена или ошибка): кнопки возвращаются в исходное состояние.
+        """
+        self.progress_bar.setVisible(False)
+        self.btn_get_report.setEnabled(True)
+        self.btn_cancel_report.setVisible(False)
+        self.btn_cancel_report.setEnabled(True)
         self.label_status.setText(string)
 
     def result(self, report):
@@ -312,6 +330,7 @@ class CountReportWindow(QtWidgets.QMainWindow):
         self.btn_export.setEnabled(True)
         self.progress_bar.setVisible(False)
         self.btn_get_report.setEnabled(True)
+        self.btn_cancel_report.setVisible(False)
         self.myLongTask.quit()
         self.label_status.setText("Report Processing Completed")
 
@@ -361,19 +380,26 @@ class CountReportWindow(QtWidgets.QMainWindow):
     def closeEvent(self, *args, **kwargs):
         if self.myLongTask:
             if self.myLongTask.isRunning():
-                self.myLongTask.quit()
+                self.myLongTask.cancel()
+                self.myLongTask.wait()
 
 
 class TaskThread(QtCore.QThread):
     """
     Класс, представляющий поток для формирования отчета в фоновом режиме.
+    Поток раздает части отчета (файл базы, год, участок) пулу процессов count_report (run_report_parts) и собирает
+    результаты в порядке частей. progress - количество готовых частей и всего частей,
+    stopped - отчет остановлен (отмена или ошибка) с текстом причины.
     """
     result = QtCore.pyqtSignal(list)
     progress_result = QtCore.pyqtSignal(str)
+    progress = QtCore.pyqtSignal(int, int)
+    stopped = QtCore.pyqtSignal(str)
 
     def __init__(self, years=None, sites=None, db_list=None, species=None):
         QtCore.QThread.__init__(self)
 
+        self._canceled = False
         if not years or not sites or not db_list or not species:
             return
 
@@ -382,298 +408,52 @@ class TaskThread(QtCore.QThread):
         self.species = species
         self.db_list = db_list
 
-    @staticmethod
-    def get_effort_animal_categories(eff_type, db_session):
+    def cancel(self):
         """
-
-        Этот метод извлекает категории животных, связанные с заданным типом усилий.
-
+        Отменяет части отчета, которые еще не начали считаться. Начатые части досчитываются в своих процессах,
+        но их результат не используется.
         """
-        effort_categories_points = db_session.query(CountEffortCategories).filter_by(
-            species=eff_type.species,
-            r_year=eff_type.r_year,
-            site=eff_type.site,
-            r_date=eff_type.r_date,
-            time_start=eff_type.time_start,
-            creator=eff_type.creator,
-            count_type=eff_type.count_type, ).all()
-        effort_categories_points = list(map(lambda x: x.animal_category, effort_categories_points))
-        return effort_categories_points
+        self._canceled = True
 
     def run(self):
+        self.parts = parts = report_parts(self.db_list, self.years, self.sites)
+
+        categories = [ReportCategory(cat.animal_category, cat.count_category)
+                      for cat in m_params.support_categories_points]
+        observers = {}
+        for observer in m_params.support_observers:
+            observers.setdefault(observer.observer, observer.observer_name)
+        local_sites = {}
+        for site in set(part.site for part in parts):
+            sys_local_sites = LocalSitesList(support_session.query(LocalSites).filter_by(site=int(site)).all())
+            sys_local_sites.sort(key=lambda x: x.local_site_id)
+            local_sites[site] = {}
+            for local_site in sys_local_sites:
+                local_sites[site].setdefault(local_site.local_site_id, local_site.local_site_name)
+
+        self.progress.emit(0, len(parts))
+        try:
+            for db_file in self.db_list:
+                self.progress_result.emit(f"Checking schema: {Path(db_file).name}")
+                prepare_report_db(db_file)
+
+            results = run_report_parts(parts, count_report_part,
+                                       lambda part: (self.species, categories, observers, local_sites[part.site]),
+                                       self.part_done, lambda: self._canceled)
+        except Exception as ex:
+            print(ex)
+            self.stopped.emit(f"Report Error: {ex}")
+            return
+
+        if self._canceled:
+            self.stopped.emit("Report Canceled")
+            return
+        self.result.emit(merge_report_parts(results))
 
-        self.years.sort()
-        self.sites.sort()
-
-        locals_sites_summary = []
-        count_summary = []
-        efforts_report = []
-        cameras_summary = []
-
-        for db_file in self.db_list:
-            session_report = SessionFactoryMain(f'sqlite:///{db_file}')
-            db_session = session_report.get_session()
-            for year in self.years:
-                for site in self.sites:
-                    sys_local_sites = LocalSitesList(support_session.query(LocalSites).filter_by(site=int(site)).all())
-                    sys_local_sites.sort(key=lambda x: x.local_site_id)
-
-                    counts_list = db_session.query(CountList).filter_by(r_year=year,
-                                                                        species=self.species,
-                                                                        site=site).all()
-
-                    for count_item in counts_list:
-                        self.progress_result.emit(f"Grouping data: Site: {site}, Date: {count_item.r_date}")
-                        points_count = db_session.query(PointsCount).filter_by(
-                            r_year=count_item.r_year,
-                            r_date=count_item.r_date,
-                            site=count_item.site,
-                            species=count_item.species,
-                            time_start=count_item.time_start,
-                            creator=count_item.creator).all()
-                        points_count = list(map(lambda x: x.as_dict(), points_count))
-                        df_points_count = pd.DataFrame(points_count)
-
-                        groups_count = db_session.query(GroupsCount).filter_by(
-                            r_year=count_item.r_year,
-                            r_date=count_item.r_date,
-                            site=count_item.site,
-                            species=count_item.species,
-                            time_start=count_item.time_start,
-                            creator=count_item.creator).all()
-                        groups_count = list(map(lambda x: x.as_dict(), groups_count))
-                        df_groups_count = pd.DataFrame(groups_count)
-
-                        data = []
-                        for eff_type in count_item.effort_types:
-                            eff_type_sites = eff_type.effort_sites
-                            eff_type_sites.sort(key=lambda x: x.local_site)
-                            for eff_site in eff_type_sites:
-                                if eff_type.count_type == eff_site.count_type:
-
-                                    item_eff_report = eff_site.as_dict()
-
-                                    efforts_report.append(item_eff_report)
-
-                                    for cat in m_params.support_categories_points:
-
-                                        _temp_data = {'r_year': count_item.r_year,
-                                                      'site': count_item.site,
-                                                      'r_date': count_item.r_date,
-                                                      'time_start': count_item.time_start,
-                                                      'count_type': eff_type.count_type,
-                                                      'creator': count_item.creator,
-                                                      'species': count_item.species,
-                                                      'local_site': eff_site.local_site,
-                                                      'animal_category': cat.animal_category,
-                                                      'comments': eff_type.comments,
-                                                      'count': 'NA'
-                                                      }
-                                        effort_animal_categories = self.get_effort_animal_categories(eff_type,
-                                                                                                     db_session)
-                                        if cat.animal_category in effort_animal_categories and eff_site.count_performed:
-                                            _temp_data['count'] = 0
-
-                                        if not df_points_count.empty:
-                                            local_sites_points = list(set(df_points_count['local_site']))
-                                            local_sites_points.sort()
-
-                                            if eff_site.local_site in local_sites_points:
-                                                count_point = df_points_count[
-                                                    (df_points_count['animal_category'] == cat.animal_category) &
-                                                    (df_points_count['local_site'] == eff_site.local_site) &
-                                                    (df_points_count['count_type'] == eff_type.count_type)]
-
-                                                if not count_point.empty:
-                                                    _temp_data['count'] = len(count_point)
-                                        if not df_groups_count.empty:
-                                            local_sites_groups = list(set(df_groups_count['local_site']))
-                                            local_sites_groups.sort()
-                                            if eff_site.local_site in local_sites_groups:
-                                                temp_count = df_groups_count[
-                                                    (df_groups_count['animal_category'] == cat.animal_category) &
-                                                    (df_groups_count['local_site'] == eff_site.local_site) &
-                                                    (df_groups_count['count_type'] == eff_type.count_type)]
-
-                                                if not temp_count.empty:
-                                                    count = temp_count.groupby(['animal_category', 'local_site']).sum()
-                                                    _temp_data['count'] = count['count'].iloc[0]
-
-                                        data.append(_temp_data)
-
-                        df = pd.DataFrame(data)
-
-                        local_sites = list(set(df['local_site']))
-                        local_sites.sort()
-
-                        creator = count_item.creator
-                        support_creator = m_params.support_observers.itemFromId(count_item.creator)
-                        if support_creator:
-                            creator = support_creator.observer_name
-
-                        # count summary
-                        count_types = list(set(df['count_type'].tolist()))
-                        count = 'NA'
-                        total = 'NA'
-                        _count_summary = {'r_year': count_item.r_year, 'site': count_item.site,
-                                          'r_date': count_item.r_date, 'time_start': count_item.time_start,
-                                          'creator': creator, 'species': count_item.species, 'cameras': 'NA',
-                                          'local_sites': f"{len(local_sites)}: {local_sites}",
-                                          'count_types': f"{len(count_types)}: {count_types}",
-                                          'comments': count_item.comments, }
-
-                        if 'Map' in count_types:
-                            photo_files_count = db_session.query(CountFiles).filter_by(
-                                r_year=count_item.r_year,
-                                r_date=count_item.r_date,
-                                site=count_item.site,
-                                species=count_item.species,
-                                time_start=count_item.time_start,
-                                creator=count_item.creator,
-                                count_type='Map', ).all()
-                            photo_files_point = db_session.query(PointsCount).filter_by(
-                                r_year=count_item.r_year,
-                                r_date=count_item.r_date,
-                                site=count_item.site,
-                                species=count_item.species,
-                                time_start=count_item.time_start,
-                                creator=count_item.creator,
-                                count_type="Map").all()
-
-                            photo_files = photo_files_count + photo_files_point
-
-                            if photo_files:
-                                pattern = r'_([A-Za-z\d-]+)(?:\.)'
-                                cameras = list(
-                                    set(re.search(pattern, file.file_name).group(1) for file in photo_files))
-                                cameras.sort()
-                                _count_summary['cameras'] = f"{len(cameras)}: {cameras}"
-
-                                """cameras_summary"""
-                                temp_df = pd.DataFrame([item.as_dict() for item in photo_files_point])
-
-                                if not temp_df.empty:
-                                    # Извлекаем имя камеры из столбца 'file_name'
-                                    temp_df['camera_name'] = temp_df['file_name'].str.extract(r"_([A-Za-z\d-]+)(?:\.)")
-
-                                    # Группировка данных
-                                    grouped_data = temp_df.groupby(
-                                        ['r_date', 'time_start', 'count_type', 'species', 'animal_category',
-                                         'camera_name']).size().reset_index(
-                                        name='count')
-
-                                    # Создаем сводную таблицу
-                                    pivot_table = pd.pivot_table(grouped_data, values='count',
-                                                                 index=['camera_name',
-                                                                        'r_date',
-                                                                        'time_start',
-                                                                        'count_type',
-                                                                        'species'],
-                                                                 columns=['animal_category'],
-                                                                 aggfunc='sum', fill_value=0)
-
-                                    # Сбрасываем индексы, чтобы сделать столбцы 'camera_name' обычными столбцами
-                                    pivot_table.reset_index(inplace=True)
-
-                                    for cam in cameras:
-                                        cam_total = 0
-                                        _cameras_summary = {'r_year': count_item.r_year,
-                                                            'site': count_item.site,
-                                                            'r_date': count_item.r_date,
-                                                            'time_start': count_item.time_start,
-                                                            'species': count_item.species,
-                                                            'creator': count_item.creator,
-                                                            'count_type': "Map",
-                                                            'camera_name': cam, }
-
-                                        for cat in m_params.support_categories_points:
-                                            count = 0
-
-                                            temp_cam_count = pivot_table[(pivot_table['camera_name'] == cam)]
-                                            if not temp_cam_count.empty and cat.animal_category in temp_cam_count:
-                                                count = temp_cam_count[cat.animal_category].sum()
-                                            if cat.count_category:
-                                                cam_total += count
-                                            _cameras_summary[cat.animal_category] = count
-                                        _cameras_summary['Total'] = cam_total
-                                        cameras_summary.append(_cameras_summary)
-                                    """"""
-
-                        temp_count = df[(df['count'] != 'NA')]
-                        if not temp_count.empty:
-                            total = 0
-                        for cat in m_params.support_categories_points:
-                            temp_count = df[(df['animal_category'] == cat.animal_category) & (df['count'] != 'NA')]
-                            if not temp_count.empty:
-                                count = temp_count.groupby(['animal_category'])['count'].sum().iloc[0]
-                                if cat.count_category:
-                                    total += count
-                            else:
-                                count = 'NA'
-                            _count_summary[cat.animal_category] = count
-
-                        _count_summary['Total'] = total
-                        count_summary.append(_count_summary)
-
-                        # local sites summary
-                        for item_site in local_sites:
-                            local_site_name = item_site
-                            support_local_site = sys_local_sites.itemFromId(item_site)
-                            if support_local_site:
-                                local_site_name = support_local_site.local_site_name
-
-                            _eff_loc_site_comments = list(set(df[(df['local_site'] == item_site)]['comments'].tolist()))
-                            _local_sites_summary = {
-                                'r_year': count_item.r_year,
-                                'site': count_item.site,
-                                'r_date': count_item.r_date,
-                                'time_start': count_item.time_start,
-                                'creator': creator,
-                                'species': count_item.species,
-                                'local_site_id': item_site,
-                                'local_site_name': local_site_name,
-                                'cameras': 'NA',
-                                'comments': list(filter(lambda x: x not in ["", ".", " "], _eff_loc_site_comments))
-                            }
-                            total = 'NA'
-                            lc_count_types = list(set(df[(df['local_site'] == item_site)]['count_type'].tolist()))
-                            if 'Map' in lc_count_types:
-                                points_count_local_site = db_session.query(PointsCount).filter_by(
-                                    r_year=count_item.r_year,
-                                    r_date=count_item.r_date,
-                                    site=count_item.site,
-                                    species=count_item.species,
-                                    time_start=count_item.time_start,
-                                    creator=count_item.creator,
-                                    local_site=item_site,
-                                    count_type="Map").all()
-                                cameras_lc = list(
-                                    set(str(file.file_name).split('_')[-1].split('.')[0] for file in
-                                        points_count_local_site))
-                                cameras_lc.sort()
-                                _local_sites_summary['cameras'] = f"{len(cameras_lc)}: {cameras_lc}"
-
-                            _local_sites_summary['count_types'] = f"{len(lc_count_types)}: {lc_count_types}"
-                            temp_count = df[(df['local_site'] == item_site) & (df['count'] != 'NA')]
-                            if not temp_count.empty:
-                                total = 0
-                            for cat in m_params.support_categories_points:
-
-                                temp_count = df[(df['animal_category'] == cat.animal_category) &
-                                                (df['local_site'] == item_site) & (df['count'] != 'NA')]
-                                if not temp_count.empty:
-                                    count = temp_count.groupby(['animal_category', 'local_site'])['count'].sum().iloc[0]
-                                    if cat.count_category:
-                                        total += count
-                                else:
-                                    count = 'NA'
-                                _local_sites_summary[cat.animal_category] = count
-
-                            _local_sites_summary['Total'] = total
-                            locals_sites_summary.append(_local_sites_summary)
-
-        df_locals_sites_summary = pd.DataFrame(locals_sites_summary)
-        df_count_summary = pd.DataFrame(count_summary)
-        df_efforts_report = pd.DataFrame(efforts_report)
-        df_cameras_summary = pd.DataFrame(cameras_summary)
-        self.result.emit([df_count_summary, df_locals_sites_summary, df_efforts_report, df_cameras_summary])
+    def part_done(self, index, result, done):
+        """
+        Передает окну прогресс после посчитанной части.
+        """
+        part = self.parts[index]
+        self.progress_result.emit(f"Done: {Path(part.db_file).name}, Year: {part.year}, Site: {part.site}")
+        self.progress.emit(done, len(self.parts))
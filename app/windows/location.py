@@ -4,14 +4,14 @@ from typing import Optional
 from PyQt5 import QtWidgets, QtCore
 from PyQt5.QtCore import Qt, pyqtSignal
 from PyQt5.QtGui import QColor, QKeySequence
-from PyQt5.QtWidgets import QListWidgetItem, QTableWidgetItem, QShortcut
+from PyQt5.QtWidgets import QListWidgetItem, QTableWidgetItem, QShortcut, QMessageBox
 
 from app import m_params
 from app.custom_widgets.image_viewer import ImageViewer
 from app.controllers.items_file import ItemFile
 from app.models.model_registration_animal import ModelRegistrationAnimal
 
-from app.controllers.parameters import session_factory_main, user_settings
+from app.controllers.parameters import session_factory_main, user_settings, point_queue
 from app.view.ui_window_location import Ui_LocationWindow
 
 from app.windows.animal_registration import AnimalRegistration
@@ -69,6 +69,7 @@ class LocationWindow(QtWidgets.QMainWindow):
         self.view.newPoint.connect(self.new_point)
         self.view.deletePointsInParent.connect(self.deleteSelectedPointsInTable)
         self.view.movePoint.connect(self.movePoint)
+        point_queue.writeFailed.connect(self.point_write_failed)
 
         self.ui.spinBox_sizePoint.valueChanged.connect(self.changeSizePoints)
         self.ui.tableWidget_Points.setEditTriggers(QtWidgets.QTableWidget.NoEditTriggers)
@@ -271,6 +272,7 @@ class LocationWindow(QtWidgets.QMainWindow):
         отображающими информацию об животном.
         """
         self.location_points.clear()
+        point_queue.flush(wait=True)
 
         data = item.data(Qt.UserRole)
         self.view.setPhoto(data.path, 1)
@@ -297,6 +299,9 @@ class LocationWindow(QtWidgets.QMainWindow):
                                                              file_name=fileName,
                                                              species=m_params.species).all()
 
+        # перемещения точек записываются через point_queue, поэтому в сессии окна точки не хранятся
+        for point in points:
+            self.main_session.expunge(point)
         return points
 
     def selectPointsInImageView(self):
@@ -358,7 +363,7 @@ class LocationWindow(QtWidgets.QMainWindow):
         loc = point.data(Qt.UserRole)
         loc.iTop = int(point.pos().y())
         loc.iLeft = int(point.pos().x())
-        self.main_session.commit()
+        point_queue.update(loc)
 
     # Удаляем запись в Location
     def delete_location(self, locations):
@@ -367,8 +372,8 @@ class LocationWindow(QtWidgets.QMainWindow):
         """
         for loc in locations:
 
-            self.main_session.delete(loc)
-            self.main_session.commit()
+            point_queue.delete(loc)
+            point_queue.flush(wait=True)
 
             all_locations = self.main_session.query(Location).filter_by(r_year=loc.r_year,
                                                                         site=loc.site,
@@ -458,6 +463,8 @@ class LocationWindow(QtWidgets.QMainWindow):
     def handle_input_registration(self, reg: ModelRegistrationAnimal):
         """ Обработка результата ввода данных в форме регистрации"""
 
+        self.main_session.refresh(reg.location)
+        self.main_session.expunge(reg.location)
         self.location_points.append(reg.location)
 
         tooltip = f"{reg.animal_status} {reg.local_site}"
@@ -517,6 +524,14 @@ class LocationWindow(QtWidgets.QMainWindow):
         """
         self.ui.actionPointsPanel.setChecked(self.ui.dockWidget_PointsTable.isVisible())
 
+    def point_write_failed(self, message):
+        """
+        Точки не записаны в базу: они остаются в очереди и журнале записи и будут записаны позже.
+        """
+        QMessageBox.warning(self, 'Message', f"Points are not saved to the database: {message}\n"
+                                             f"They are kept in the journal and will be written again.",
+                            QMessageBox.Ok, QMessageBox.Ok)
+
     """zoom"""
 
     def zoom_display(self, zoom):
@@ -572,6 +587,9 @@ class LocationWindow(QtWidgets.QMainWindow):
         self.ui.toolBar.setVisible(True)
 
     def closeEvent(self, *args, **kwargs):
+        point_queue.flush(wait=True)
+        # очередь записи общая для окон: закрытое окно не должно получать ее сообщения
+        point_queue.writeFailed.disconnect(self.point_write_failed)
         m_params.windows_list.remove(self)
 
     def keyPressEvent(self, e):
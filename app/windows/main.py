@@ -1,3 +1,5 @@
+import bisect
+import multiprocessing
 import os
 import sys
 from typing import Optional
@@ -18,13 +20,18 @@ from PyQt5.QtWidgets import QFileDialog, QMessageBox, QListWidgetItem, QDialog,
 from app import PRODUCT_NAME, COMPANY_NAME, m_params
 from app.controllers.support_lists import SpeciesList
 from app.controllers.tables import PandasTableModel
+from app.controllers.thumbnail_list import ThumbnailListController
 from app.custom_widgets.image_viewer import PreviewImageViewer
 from app.controllers.items_file import ItemFile, ItemFileCount
 from app.models.model_registration_animal import ModelRegistrationAnimal
 from app.services.helpers import check_pattern_suffixes, select_project_folders, \
     search_path_photo
 from app.services.main_style import style_sheet, set_font
-from app.controllers.parameters import session_factory_main, support_session
+from app.services.count_state import CountState, MARK_COLORS, DONE_COLOR
+from app.services.daily_total import DailyTotalCount
+from app.services.photo_index import PhotoIndex, PhotoIndexer, path_resolver
+from app.services.photo_watcher import PhotoTreeWatcher
+from app.controllers.parameters import session_factory_main, session_factory_support, support_session
 from app.view.ui_window_main import Ui_MainWindow
 from app.windows.about import AboutWindow
 from app.windows.animal_Id_report import AnimalIdReportWindow
@@ -35,8 +42,8 @@ from app.windows.location import LocationWindow
 from app.dialogs.create_count_dialog import CreateCountDialog
 from app.dialogs.visual_count_dialog import VisualCountDialog
 from app.windows.count import CountWindow
-from app.models.main_db import CountList, CountFiles, PointsCount, CountEffortSites, GroupsCount, Location, Daily, \
-    Resight, PatternCount, CountEffortCategories
+from app.models.main_db import CountList, CountEffortSites, GroupsCount, Location, Daily, \
+    Resight, CountEffortCategories
 from app.models.support_db import Sites, Species
 
 
@@ -50,6 +57,8 @@ class MainWindow(QtWidgets.QMainWindow):
         self.animal_id: Optional[AnimalIDWindow] = None
         self.count_report: Optional[CountReportWindow] = None
         self.animal_id_report: Optional[AnimalIdReportWindow] = None
+        self.photo_indexer: Optional[PhotoIndexer] = None
+        self.count_state: Optional[CountState] = None
         self.translator = QTranslator()
 
         self.ui = Ui_MainWindow()
@@ -133,6 +142,26 @@ class MainWindow(QtWidgets.QMainWindow):
         self.ui.listWidget_photos.itemActivated.connect(self.selected_photo)
         self.ui.listWidget_photos.itemSelectionChanged.connect(self.select_photo)
 
+        # режим миниатюр списков фотографий (Ctrl+T)
+        self.thumbnails_photos = ThumbnailListController(self.ui.listWidget_photos, "ThumbnailsPhotos")
+        self.thumbnails_done_photos = ThumbnailListController(self.ui.lw_done_photos, "ThumbnailsDonePhotos",
+                                                              path_for_item=lambda x: search_path_photo(x.text()))
+
+        # изменения в папках проекта применяются к дереву и списку фотографий без перезагрузки
+        self.photo_watcher = PhotoTreeWatcher(self)
+        self.photo_watcher.dayAdded.connect(self.day_folder_added)
+        self.photo_watcher.dayRemoved.connect(self.day_folder_removed)
+        self.photo_watcher.dayRenamed.connect(self.day_folder_renamed)
+        self.photo_watcher.fileAdded.connect(self.photo_file_added)
+        self.photo_watcher.fileRemoved.connect(self.photo_file_removed)
+        self.photo_watcher.fileRenamed.connect(self.photo_file_renamed)
+        self.photo_watcher.dayAdded.connect(path_resolver.invalidate)
+        self.photo_watcher.dayRemoved.connect(path_resolver.invalidate)
+        self.photo_watcher.dayRenamed.connect(lambda root, old, new: path_resolver.invalidate(root))
+        self.photo_watcher.fileAdded.connect(lambda root, day, name: path_resolver.invalidate(root, day))
+        self.photo_watcher.fileRemoved.connect(lambda root, day, name: path_resolver.invalidate(root, day))
+        self.photo_watcher.fileRenamed.connect(lambda root, day, old, new: path_resolver.invalidate(root, day))
+
         self.ui.table_info.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.ui.table_visual_count.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.ui.table_effort.setEditTriggers(QAbstractItemView.NoEditTriggers)
@@ -511,6 +540,8 @@ class MainWindow(QtWidgets.QMainWindow):
             elif m_params.current_mode == 'Count':
                 count_item = self.ui.dates_list.item(self.ui.dates_list.currentRow()).data(Qt.UserRole)
                 m_params.current_data = count_item
+                # файлы учета и точки по ним загружаются один раз для списков и дневного отчета
+                self.count_state = CountState.load(self.main_session, count_item) if count_item else None
                 m_params.done_files = self.load_done_count_files(count_item)
 
                 self.load_daily_report()
@@ -563,24 +594,109 @@ class MainWindow(QtWidgets.QMainWindow):
 
             path = os.path.join(data, day)
             if os.path.isdir(path):
-                for dirs, folder, files in os.walk(str(path)):
+                for entry in PhotoIndex.for_root(data).day_files(day):
+                    f_item = entry.name
+                    if check_pattern_suffixes(f_item):
+                        lw_item, lw_item_data = self.photo_list_item(path, f_item)
+                        self.ui.listWidget_photos.addItem(lw_item)
+                        m_params.photos_for_day.append(lw_item_data)
 
-                    files.sort()
+        except Exception as ex:
+            QMessageBox.warning(self, 'Error', ex.args[0])
 
-                    for f_item in files:
-                        if check_pattern_suffixes(f_item):
-                            lw_item_data = ItemFile(fileName=str(f_item), path=str(os.path.join(str(path), f_item)))
-                            lw_item = QListWidgetItem('%s' % f_item)
-                            lw_item.setData(Qt.UserRole, lw_item_data)
+    @staticmethod
+    def photo_list_item(path, f_item):
+        """
+        Создает элемент списка фотографий дня для файла f_item в папке path.
+        Файлы, по которым уже есть данные (m_params.done_files), выделяются красным.
+        """
+        lw_item_data = ItemFile(fileName=str(f_item), path=str(os.path.join(str(path), f_item)))
+        lw_item = QListWidgetItem('%s' % f_item)
+        lw_item.setData(Qt.UserRole, lw_item_data)
 
-                            if str(f_item) in m_params.done_files:
-                                lw_item.setForeground(QColor('#FF0000'))
+        if str(f_item) in m_params.done_files:
+            lw_item.setForeground(QColor('#FF0000'))
+        return lw_item, lw_item_data
 
-                            self.ui.listWidget_photos.addItem(lw_item)
-                            m_params.photos_for_day.append(lw_item_data)
+    def root_directory_item(self, root):
+        """
+        Элемент корня проекта root в дереве директорий или None.
+        """
+        for row in range(m_params.model_directories.rowCount()):
+            item = m_params.model_directories.item(row)
+            if os.path.normpath(item.text()) == os.path.normpath(root):
+                return item
+        return None
 
-        except Exception as ex:
-            QMessageBox.warning(self, 'Error', ex.args[0])
+    def is_shown_day(self, root, day):
+        """
+        Проверяет, что в списке фотографий показана папка дня day корня root.
+        """
+        index = self.ui.treeView_directories.currentIndex()
+        if not index.isValid() or m_params.current_data != day or m_params.model_directories.data(index) != day:
+            return False
+        parent = m_params.model_directories.data(m_params.model_directories.parent(index))
+        return bool(parent) and os.path.normpath(parent) == os.path.normpath(root)
+
+    def day_folder_added(self, root, day):
+        item = self.root_directory_item(root)
+        if item is None:
+            return
+        days = [item.child(row).text() for row in range(item.rowCount())]
+        if day in days:
+            return
+
+        sub_item = QStandardItem(day)
+        if self.ui.dates_list.findItems(day, Qt.MatchFixedString):
+            sub_item.setForeground(QColor('#FF0000'))
+        item.insertRow(bisect.bisect(days, day), sub_item)
+
+    def day_folder_removed(self, root, day):
+        item = self.root_directory_item(root)
+        if item is None:
+            return
+        for row in range(item.rowCount()):
+            if item.child(row).text() == day:
+                item.removeRow(row)
+                return
+
+    def day_folder_renamed(self, root, old, new):
+        shown = self.is_shown_day(root, old)
+        self.day_folder_removed(root, old)
+        self.day_folder_added(root, new)
+        if shown:
+            item = self.root_directory_item(root)
+            days = [item.child(row).text() for row in range(item.rowCount())]
+            self.ui.treeView_directories.setCurrentIndex(item.child(days.index(new)).index())
+
+    def photo_file_added(self, root, day, name):
+        if not self.is_shown_day(root, day) or not check_pattern_suffixes(name):
+            return
+        names = [x.fileName for x in m_params.photos_for_day]
+        if name in names:
+            return
+
+        row = bisect.bisect(names, name)
+        lw_item, lw_item_data = self.photo_list_item(os.path.join(root, day), name)
+        self.ui.listWidget_photos.insertItem(row, lw_item)
+        m_params.photos_for_day.insert(row, lw_item_data)
+
+    def photo_file_removed(self, root, day, name):
+        if not self.is_shown_day(root, day):
+            return
+        names = [x.fileName for x in m_params.photos_for_day]
+        if name not in names:
+            return
+
+        row = names.index(name)
+        if self.ui.listWidget_photos.currentRow() == row:
+            self.scene_clear()
+        self.ui.listWidget_photos.takeItem(row)
+        del m_params.photos_for_day[row]
+
+    def photo_file_renamed(self, root, day, old, new):
+        self.photo_file_removed(root, day, old)
+        self.photo_file_added(root, day, new)
 
     def selected_photo(self, itemFile):
         """
@@ -726,31 +842,28 @@ class MainWindow(QtWidgets.QMainWindow):
 
                     path = os.path.join(d, day)
                     if os.path.isdir(path):
-                        for dirs, folder, files in os.walk(path):
-                            files.sort()
-
-                            for f_item in files:
-                                if check_pattern_suffixes(f_item):
-                                    lw_item_data = ItemFile(fileName=str(f_item), path=str(os.path.join(path, f_item)))
-                                    lw_item = QListWidgetItem('%s' % f_item)
-                                    lw_item.setData(Qt.UserRole, lw_item_data)
-                                    if file_name == str(f_item):
-                                        _temp_index = index
-                                        _flag = True
-                                    if str(f_item) in m_params.done_files:
-                                        lw_item.setForeground(QColor('#FF0000'))
-
-                                    self.ui.listWidget_photos.addItem(lw_item)
-                                    m_params.photos_for_day.append(lw_item_data)
-
-                            if _flag:
-                                self.ui.treeView_directories.setCurrentIndex(_temp_index)
-                                item = self.ui.listWidget_photos.findItems(file_name,
-                                                                           Qt.MatchFixedString | Qt.MatchRecursive)
-                                if item:
-                                    self.ui.listWidget_photos.setCurrentItem(item[0])
-                                return
-                            break
+                        for entry in PhotoIndex.for_root(d).day_files(day):
+                            f_item = entry.name
+                            if check_pattern_suffixes(f_item):
+                                lw_item_data = ItemFile(fileName=str(f_item), path=str(os.path.join(path, f_item)))
+                                lw_item = QListWidgetItem('%s' % f_item)
+                                lw_item.setData(Qt.UserRole, lw_item_data)
+                                if file_name == str(f_item):
+                                    _temp_index = index
+                                    _flag = True
+                                if str(f_item) in m_params.done_files:
+                                    lw_item.setForeground(QColor('#FF0000'))
+
+                                self.ui.listWidget_photos.addItem(lw_item)
+                                m_params.photos_for_day.append(lw_item_data)
+
+                        if _flag:
+                            self.ui.treeView_directories.setCurrentIndex(_temp_index)
+                            item = self.ui.listWidget_photos.findItems(file_name,
+                                                                       Qt.MatchFixedString | Qt.MatchRecursive)
+                            if item:
+                                self.ui.listWidget_photos.setCurrentItem(item[0])
+                            return
 
     def select_photo(self):
         """
@@ -792,6 +905,7 @@ class MainWindow(QtWidgets.QMainWindow):
         """
         m_params.done_files.clear()
         m_params.photos_for_day.clear()
+        self.count_state = None
 
         self.scene_clear()
 
@@ -926,6 +1040,8 @@ class MainWindow(QtWidgets.QMainWindow):
         Заполняет дерево директорий
         """
         m_params.model_directories.clear()
+        # корни проекта строятся заново: сохраненное содержимое папок дней прежних корней больше не нужно
+        path_resolver.clear()
         drivers = select_project_folders(m_params)
         dates = list(map(lambda x: self.ui.dates_list.item(x).text(), range(self.ui.dates_list.count())))
 
@@ -935,21 +1051,39 @@ class MainWindow(QtWidgets.QMainWindow):
             item = QStandardItem(path)
             m_params.model_directories.appendRow(item)
 
-            for dirs, folders, files in os.walk(os.path.join(path)):
-                folders.sort()
-                for folder in folders:
-                    sub_item = QStandardItem(folder)
+            for folder in PhotoIndex.for_root(path).day_folders():
+                sub_item = QStandardItem(folder)
 
-                    if folder in dates:
-                        sub_item.setForeground(QColor('#FF0000'))
+                if folder in dates:
+                    sub_item.setForeground(QColor('#FF0000'))
+
+                item.appendRow(sub_item)
 
-                    item.appendRow(sub_item)
-                break
         if len(drivers) > 0:
             m_params.model_directories.setHeaderData(0, Qt.Horizontal, " ")
             self.ui.treeView_directories.setModel(m_params.model_directories)
             self.ui.treeView_directories.selectionModel().currentChanged.connect(self.selected_folder_location)
 
+        roots = [os.path.dirname(p[0] + "/") for p in drivers]
+        self.photo_watcher.setRoots(roots)
+        self.start_photo_indexer(roots)
+
+    def start_photo_indexer(self, roots):
+        """
+        Запускает фоновую индексацию файлов и EXIF для корней проекта, предыдущая индексация прерывается.
+        """
+        self.stop_photo_indexer()
+        if not roots:
+            return
+        self.photo_indexer = PhotoIndexer(roots, self)
+        self.photo_indexer.start(QtCore.QThread.LowPriority)
+
+    def stop_photo_indexer(self):
+        if self.photo_indexer is not None:
+            self.photo_indexer.requestInterruption()
+            self.photo_indexer.wait()
+            self.photo_indexer = None
+
     def load_count_files(self, count_item):
         """
         Загружает файлы учета на основе параметров.
@@ -963,19 +1097,16 @@ class MainWindow(QtWidgets.QMainWindow):
         if not count_item:
             return
 
-        data_count_files = self.main_session.query(CountFiles).filter_by(r_year=count_item.r_year,
-                                                                         site=count_item.site,
-                                                                         r_date=count_item.r_date,
-                                                                         time_start=count_item.time_start,
-                                                                         creator=count_item.creator,
-                                                                         species=count_item.species).all()
+        count_files = self.load_count_state(count_item).files
         temp_done_files = m_params.done_files.copy()
-        for item in data_count_files:
+        paths = path_resolver.resolve_many([f.file_name for f in count_files])
+        for file_state in count_files:
+            item = file_state.data
             if check_pattern_suffixes(item.file_name):
 
                 lw_item = QListWidgetItem(f'{item.count_type} {item.file_name}')
 
-                path = search_path_photo(item.file_name)
+                path = paths[item.file_name]
                 if path:
                     countType = m_params.support_count_type_id.itemFromId(item.count_type)
                     lw_item_data = ItemFileCount(path=path.replace('\\', '/'),
@@ -986,14 +1117,7 @@ class MainWindow(QtWidgets.QMainWindow):
                     lw_item.setData(Qt.UserRole, lw_item_data)
 
                 if item.file_name in temp_done_files:
-
-                    if item.points_count and item.points_count[0].animal_category == 'NoAnimal':
-                        lw_item.setForeground(QColor('#031FCB'))
-                    elif item.points_count and item.points_count[0].animal_category == 'NoMarked':
-                        lw_item.setForeground(QColor('#108405'))
-                    else:
-                        lw_item.setForeground(QColor('#FF0000'))
-
+                    lw_item.setForeground(QColor(MARK_COLORS.get(file_state.mark, DONE_COLOR)))
                     temp_done_files.remove(item.file_name)
                 self.ui.listWidget_photos.addItem(lw_item)
 
@@ -1006,8 +1130,15 @@ class MainWindow(QtWidgets.QMainWindow):
             :type path: Str
         """
         self.scene_clear()
-        pix_map = QPixmap(path)
-        self.view.setPixmap(pix_map)
+        self.view.setPreview(path)
+
+    def load_count_state(self, count_item):
+        """
+        Состояние файлов учета count_item: сохраненное при выборе учета или загруженное заново для другого учета.
+        """
+        if self.count_state is None or self.count_state.count_item is not count_item:
+            self.count_state = CountState.load(self.main_session, count_item)
+        return self.count_state
 
     def load_done_count_files(self, item_count):
         """
@@ -1015,7 +1146,7 @@ class MainWindow(QtWidgets.QMainWindow):
         Загрузка выполненных файлов подсчета
 
         Очищает список выполненных фотографий в пользовательском интерфейсе.
-        Извлекает данные из базы данных на основе указанных параметров учета.
+        Берет файлы с точками из состояния учета (load_count_state).
         Заполняет список выполненных файлов уникальными именами файлов, отсортированными по времени.
 
         :param item_count: Параметры учета.
@@ -1025,32 +1156,14 @@ class MainWindow(QtWidgets.QMainWindow):
         m_params.done_files.clear()
         self.ui.lw_done_photos.clear()
 
-        data = []
         done_files = []
 
         if not item_count:
             return done_files
 
         if m_params.current_mode == "Count":
-            data = self.main_session.query(PointsCount).filter_by(r_year=item_count.r_year,
-                                                                  site=item_count.site,
-                                                                  r_date=str(item_count.r_date),
-                                                                  time_start=str(item_count.time_start),
-                                                                  creator=item_count.creator,
-                                                                  species=item_count.species).all()
-
-            data_pattern = self.main_session.query(PatternCount).filter_by(r_year=item_count.r_year,
-                                                                           site=item_count.site,
-                                                                           r_date=str(item_count.r_date),
-                                                                           time_start=str(item_count.time_start),
-                                                                           creator=item_count.creator,
-                                                                           species=item_count.species).all()
-            data = data + data_pattern
-        if data:
-            done_files = list(map(lambda x: x.file_name, data))
-
-            done_files = list(set(done_files))
-            done_files.sort(key=lambda x: int(str(x).split('_')[1]))
+            done_files = self.load_count_state(item_count).done_files()
+        if done_files:
             for item in done_files:
                 done_item = QListWidgetItem(f'{item}')
 
@@ -1119,15 +1232,9 @@ class MainWindow(QtWidgets.QMainWindow):
             self.ui.table_daily_report.setColumnCount(2)
             self.ui.table_daily_report.setHorizontalHeaderLabels(('CATEGORY', 'COUNT'))
 
-            data_count = self.main_session.query(PointsCount).filter_by(r_year=current_data_item.r_year,
-                                                                        r_date=current_data_item.r_date,
-                                                                        site=current_data_item.site,
-                                                                        species=current_data_item.species,
-                                                                        time_start=current_data_item.time_start,
-                                                                        creator=current_data_item.creator).all()
+            totals = self.load_count_state(current_data_item).category_totals()
             for item_cat in m_params.support_categories_points:
-                count = len(list(filter(lambda x: x.animal_category == item_cat.animal_category, data_count)))
-                report.append({'name': item_cat.animal_category, 'data': count})
+                report.append({'name': item_cat.animal_category, 'data': totals.get(item_cat.animal_category, 0)})
 
         self.ui.table_daily_report.setRowCount(len(report))
         self.ui.table_daily_report.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
@@ -1437,6 +1544,9 @@ class MainWindow(QtWidgets.QMainWindow):
 
         """
         file_name = itemData.fileName
+        file_state = None
+        if self.count_state:
+            file_state = self.count_state.apply(file_name, itemData.fileData.count_type, categories, currentOperator)
         items_done = self.ui.lw_done_photos.findItems(file_name, Qt.MatchFixedString | Qt.MatchRecursive)
         items_photo = self.ui.listWidget_photos.findItems(f"{itemData.fileData.count_type} {file_name}",
                                                           Qt.MatchFixedString | Qt.MatchRecursive)
@@ -1451,13 +1561,8 @@ class MainWindow(QtWidgets.QMainWindow):
                 self.ui.lw_done_photos.sortItems()
 
             if item_photo:
-                data = item_photo.data(Qt.UserRole).fileData
-                if data.points_count and data.points_count[0].animal_category == 'NoAnimal':
-                    item_photo.setForeground(QColor('#031FCB'))
-                elif data.points_count and data.points_count[0].animal_category == 'NoMarked':
-                    item_photo.setForeground(QColor('#108405'))
-                else:
-                    item_photo.setForeground(QColor('#FF0000'))
+                mark = file_state.mark if file_state else None
+                item_photo.setForeground(QColor(MARK_COLORS.get(mark, DONE_COLOR)))
         else:
             palette = QPalette()
             if item_photo:
@@ -1655,176 +1760,21 @@ class MainWindow(QtWidgets.QMainWindow):
         for w in m_params.windows_list:
             w.close()
 
-
-class DailyTotalCount(object):
-    """
-
-    Представляет собой объект суммарного ежедневного подсчета.
-
-    """
-    def __init__(self, count_item):
-        super().__init__()
-
-        self.main_session = session_factory_main.get_session()
-
-        self.count_item = count_item
-
-    def get_data(self):
-        """
-        Возвращает фрейм данных, содержащий данные, вычисленные на основе различных подсчетов.
-        """
-        points_count = self.main_session.query(PointsCount).filter_by(r_year=self.count_item.r_year,
-                                                                      r_date=self.count_item.r_date,
-                                                                      site=self.count_item.site,
-                                                                      species=self.count_item.species,
-                                                                      time_start=self.count_item.time_start,
-                                                                      creator=self.count_item.creator).all()
-        points_count = list(map(lambda x: x.as_dict(), points_count))
-        df_points = pd.DataFrame(points_count)
-
-        groups_count = self.main_session.query(GroupsCount).filter_by(r_year=self.count_item.r_year,
-                                                                      r_date=self.count_item.r_date,
-                                                                      site=self.count_item.site,
-                                                                      species=self.count_item.species,
-                                                                      time_start=self.count_item.time_start,
-                                                                      creator=self.count_item.creator).all()
-        groups_count = list(map(lambda x: x.as_dict(), groups_count))
-        groups_count = pd.DataFrame(groups_count)
-
-        data = []
-        for eff_type in self.count_item.effort_types:
-            eff_type_sites = eff_type.effort_sites
-            eff_type_sites.sort(key=lambda x: x.local_site)
-            for eff_site in eff_type_sites:
-                if eff_type.count_type == eff_site.count_type:
-                    for cat in m_params.support_categories_points:
-
-                        temp = {'r_year': self.count_item.r_year,
-                                'site': self.count_item.site,
-                                'r_date': self.count_item.r_date,
-                                'time_start': self.count_item.time_start,
-                                'count_type': eff_type.count_type,
-                                'creator': self.count_item.creator,
-                                'species': self.count_item.species,
-                                'local_site': eff_site.local_site,
-                                'animal_category': cat.animal_category,
-                                'count': 'NA'
-                                }
-                        if cat.animal_category in self.get_effort_animal_categories(eff_type):
-                            temp['count'] = 0
-                        if not df_points.empty:
-                            local_sites_points = list(set(df_points['local_site']))
-                            local_sites_points.sort()
-
-                            if eff_site.local_site in local_sites_points:
-                                count_point = df_points[(df_points['animal_category'] == cat.animal_category) &
-                                                        (df_points['local_site'] == eff_site.local_site) &
-                                                        (df_points['count_type'] == eff_type.count_type)]
-
-                                if not count_point.empty:
-                                    temp['count'] = len(count_point)
-                        if not groups_count.empty:
-                            local_sites_groups = list(set(groups_count['local_site']))
-                            local_sites_groups.sort()
-                            if eff_site.local_site in local_sites_groups:
-                                temp_count = groups_count[(groups_count['animal_category'] == cat.animal_category) &
-                                                          (groups_count['local_site'] == eff_site.local_site) &
-                                                          (groups_count['count_type'] == eff_type.count_type)]
-
-                                if not temp_count.empty:
-                                    count = temp_count.groupby(['animal_category', 'local_site']).sum()
-                                    temp['count'] = count['count'][0]
-
-                        data.append(temp)
-
-        df = pd.DataFrame(data)
-        res = []
-        local_sites = list(set(df['local_site']))
-        local_sites.sort()
-
-        creator = self.count_item.creator
-        support_creator = m_params.support_observers.itemFromId(self.count_item.creator)
-        if support_creator:
-            creator = support_creator.observer_name
-
-        for local_site_id in local_sites:
-            local_site_name = local_site_id
-
-            support_local_site = m_params.support_local_sites.itemFromNameOrId(local_site_id)
-            if support_local_site:
-                local_site_name = support_local_site.local_site_name
-
-            temp = {'r_year': self.count_item.r_year,
-                    'site': self.count_item.site,
-                    'r_date': self.count_item.r_date,
-                    'time_start': self.count_item.time_start,
-                    'creator': creator,
-                    'species': self.count_item.species,
-                    'local_site_id': local_site_id,
-                    'local_site_name': local_site_name,
-                    'cameras': 'NA',
-                    'count_types': '',
-                    'comments': self.count_item.comments,
-                    }
-            total = 'NA'
-            lc_count_types = list(set(df[(df['local_site'] == local_site_id)]['count_type'].tolist()))
-            if 'Map' in lc_count_types:
-                points_count_local_site = self.main_session.query(PointsCount).filter_by(
-                    r_year=self.count_item.r_year,
-                    r_date=self.count_item.r_date,
-                    site=self.count_item.site,
-                    species=self.count_item.species,
-                    time_start=self.count_item.time_start,
-                    creator=self.count_item.creator,
-                    local_site=local_site_id,
-                    count_type='Map').all()
-                cameras_lc = list(
-                    set(str(file.file_name).split('_')[-1].split('.')[0] for file in points_count_local_site))
-                cameras_lc.sort()
-                temp['cameras'] = f"{len(cameras_lc)}: {cameras_lc}"
-
-            temp['count_types'] = f"{len(lc_count_types)}: {lc_count_types}"
-            temp_count = df[(df['local_site'] == local_site_id) & (df['count'] != 'NA')]
-            if not temp_count.empty:
-                total = 0
-            for cat in m_params.support_categories_points:
-
-                temp_count = df[(df['animal_category'] == cat.animal_category) &
-                                (df['local_site'] == local_site_id) & (df['count'] != 'NA')]
-                if not temp_count.empty:
-                    count = temp_count.groupby(['animal_category', 'local_site'])['count'].sum()[0]
-                    if cat.count_category:
-                        total += count
-                else:
-                    count = 'NA'
-                temp[cat.animal_category] = count
-
-            temp['Total'] = total
-            res.append(temp)
-        df_res = pd.DataFrame(res)
-        return df_res
-
-    def get_effort_animal_categories(self, eff_type):
-        """
-        Функция извлекает категории животных, связанные с заданным типом усилий.
-        """
-        effort_categories_points = self.main_session.query(CountEffortCategories).filter_by(
-            species=eff_type.species,
-            r_year=eff_type.r_year,
-            site=eff_type.site,
-            r_date=eff_type.r_date,
-            time_start=eff_type.time_start,
-            creator=eff_type.creator,
-            count_type=eff_type.count_type, ).all()
-        effort_categories_points = list(map(lambda x: x.animal_category, effort_categories_points))
-        return effort_categories_points
+    def closeEvent(self, event):
+        self.stop_photo_indexer()
+        super().closeEvent(event)
 
 
 if __name__ == "__main__":
+    # процессы отчета по учетам запускаются через spawn и в собранной программе
+    multiprocessing.freeze_support()
     app = QtWidgets.QApplication(sys.argv)
     app.setOrganizationName(COMPANY_NAME)
     app.setApplicationName(PRODUCT_NAME)
     if support_session:
+        # при выходе журналы WAL переносятся в файлы баз
+        app.aboutToQuit.connect(session_factory_main.close)
+        app.aboutToQuit.connect(session_factory_support.close)
         main_window = MainWindow()
         main_window.show()
         sys.exit(app.exec())
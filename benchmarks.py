@@ -0,0 +1,840 @@
+"""
+Замеры производительности отдельных подсистем.
+
+Запуск из корня проекта:
+    python -m benchmarks preview <файлы изображений>
+    python -m benchmarks points [количество точек]
+    python -m benchmarks clicks [количество точек]
+    python -m benchmarks plans [файл базы учета]
+    python -m benchmarks daily [количество точек] [noref]
+    python -m benchmarks report [количество файлов баз] [точек в файле]
+    python -m benchmarks cache [количество файлов баз] [точек в файле]
+    python -m benchmarks brands [количество животных]
+    python -m benchmarks archive [количество животных]
+    python -m benchmarks lists [количество поисков]
+    python -m benchmarks animals [количество регистраций]
+    python -m benchmarks resights [количество файлов баз] [животных в части]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+import psutil
+from PyQt5.QtCore import QRectF
+from PyQt5.QtGui import QPixmap, QImage, QPainter
+from PyQt5.QtWidgets import QApplication, QGraphicsScene
+from sqlalchemy import insert, update
+from sqlalchemy.orm import sessionmaker
+
+from app import m_params, PATTERN_SUFFIX
+
+from app.controllers.brand_index import BrandIndex, BRAND_POSITIONS, DIGIT_CLASS, LETTER_CLASS
+from app.controllers.category_brushes import CategoryBrushCache, make_category_brush
+from app.controllers.support_lists import LocalSitesList, AnimalNamesList, ObserversList, SitesList
+from app.custom_widgets.points_overlay import PointsOverlayItem
+from app.models.main_db import Base, PointsCount, SurveyEffort, CountList, CountEffortTypes, CountFiles, Resight, \
+    Daily, AnimalInfo, CountEffortCategories, GroupsCount
+from app.models.support_db import AnimalCategories, AnimalNames, LocalSites, Observers, Sites
+from app.services.animal_id_report import DataProcessor, animal_id_report_part, animal_id_report_sheets
+from app.services.archive_index import ArchiveIndex
+from app.services.count_report import ReportCategory, report_parts, count_report_part, merge_report_parts, \
+    report_executor, report_workers, run_report_parts
+from app.services.daily_total import DailyTotalCount, camera_from_file_name
+from app.services.db_manager import SQLITE_PROFILE, create_sqlite_engine, close_engine
+from app.services.helpers import open_image_preview
+from app.services.migrations import migrate, check_query_plans
+from app.services.report_cache import REPORT_CACHE_FILE
+from app.services.point_queue import PointWriteQueue
+from app.services.image_cache import image_cache
+from tests.factories import BENCH_KEY, create_bench_day
+
+
+def sheets_difference(sheets, expected):
+    """
+    Первое различие листов sheets и expected (pd.testing.assert_frame_equal: значения и типы столбцов)
+    или None, если листы совпадают.
+    """
+    if len(sheets) != len(expected):
+        return f"{len(sheets)} sheets, {len(expected)} expected"
+    for i, (sheet, expected_sheet) in enumerate(zip(sheets, expected)):
+        try:
+            pd.testing.assert_frame_equal(sheet, expected_sheet)
+        except AssertionError as ex:
+            return f"sheet {i}: {ex}"
+    return None
+
+
+def _measure(func, *args):
+    """
+    Выполняет func и возвращает время выполнения в секундах и прирост RSS процесса в байтах.
+    """
+    process = psutil.Process()
+    rss = process.memory_info().rss
+    start = time.perf_counter()
+    result = func(*args)
+    seconds = time.perf_counter() - start
+    delta = process.memory_info().rss - rss
+    del result
+    return seconds, delta
+
+
+def benchmark_preview_decode(paths, viewport=(1280, 800)):
+    """
+    Сравнивает полное декодирование QPixmap(path) и уменьшенное open_image_preview для области просмотра viewport.
+    Кэш изображений отключается на время замера. Возвращает список строк с результатами по каждому файлу.
+    """
+    budget = image_cache.budget_bytes
+    image_cache.set_budget(0)
+    rows = []
+    try:
+        for path in paths:
+            full_time, full_rss = _measure(QPixmap, path)
+            preview_time, preview_rss = _measure(open_image_preview, path, viewport)
+            rows.append(f"{path}: full {full_time * 1000:.1f} ms / {full_rss / 2 ** 20:.1f} MB, "
+                        f"preview {preview_time * 1000:.1f} ms / {preview_rss / 2 ** 20:.1f} MB")
+    finally:
+        image_cache.set_budget(budget)
+    return rows
+
+
+def benchmark_point_brushes(args, width=6000, height=4000):
+    """
+    Сравнивает заполнение и отрисовку слоя точек на кадре с большим количеством точек (по умолчанию 5000)
+    при создании кисти на каждую точку и при использовании CategoryBrushCache.
+    """
+    count = int(args[0]) if args else 5000
+    categories = [AnimalCategories(species='SSL', animal_category=f'C{i}',
+                                   color_representation_small=f'#{random.randrange(0x1000000):06x}',
+                                   color_representation_large=f'#{random.randrange(0x1000000):06x}')
+                  for i in range(12)]
+    points = [(random.uniform(0, width), random.uniform(0, height), random.choice(categories)) for _ in range(count)]
+    frame = QImage(1600, 1000, QImage.Format_RGB32)
+
+    def run(brush_for):
+        scene = QGraphicsScene()
+        overlay = PointsOverlayItem(10)
+        overlay.setImageRect(QRectF(0, 0, width, height))
+        scene.addItem(overlay)
+
+        start = time.perf_counter()
+        for x, y, category in points:
+            overlay.addPoint(None, x, y, category.animal_category, brush_for(category))
+        fill = time.perf_counter() - start
+
+        start = time.perf_counter()
+        painter = QPainter(frame)
+        scene.render(painter, QRectF(frame.rect()), QRectF(0, 0, width, height))
+        painter.end()
+        return fill, time.perf_counter() - start
+
+    cache = CategoryBrushCache()
+    rows = []
+    for name, brush_for in (('brush per point', make_category_brush), ('cached brushes', cache.brush)):
+        fill, paint = run(brush_for)
+        rows.append(f"{name}: {count} points, fill {fill * 1000:.1f} ms, paint {paint * 1000:.1f} ms")
+    return rows
+
+
+def create_bench_count_file(session):
+    """
+    Создает учет и файл учета, к которым относятся точки бенчмарков.
+    """
+    session.add(SurveyEffort(r_year=2024, site=1, species='SSL'))
+    session.flush()
+    session.add(CountList(**BENCH_KEY))
+    session.flush()
+    session.add(CountEffortTypes(**BENCH_KEY, observer='bench', count_type='Aerial'))
+    session.flush()
+    session.add(CountFiles(**BENCH_KEY, observer='bench', file_name='20240601_bench.jpg', count_type='Aerial'))
+    session.commit()
+
+
+def bench_point(i):
+    return PointsCount(**BENCH_KEY, observer='bench', local_site='A', animal_category='AF',
+                       iLeft=i, iTop=i, file_name='20240601_bench.jpg', count_type='Aerial')
+
+
+def benchmark_point_clicks(args):
+    """
+    Количество точек в секунду при сохранении каждой точки отдельной транзакцией, как в CountWindow.new_point,
+    с журналом отката (journal_mode=DELETE, synchronous=FULL) и с профилем SQLITE_PROFILE.
+    Файл базы создается во временной папке (по умолчанию 500 точек).
+    """
+    count = int(args[0]) if args else 500
+    profiles = (('rollback journal', {'journal_mode': 'DELETE', 'synchronous': 'FULL'}),
+                ('profile', SQLITE_PROFILE))
+    rows = []
+    for name, profile in profiles:
+        with tempfile.TemporaryDirectory() as folder:
+            engine = create_sqlite_engine(f"sqlite:///{os.path.join(folder, 'bench.sqlite')}", None, profile)
+            Base.metadata.create_all(bind=engine)
+            session = sessionmaker(bind=engine)()
+            create_bench_count_file(session)
+
+            start = time.perf_counter()
+            for i in range(count):
+                session.add(bench_point(i))
+                session.commit()
+            seconds = time.perf_counter() - start
+
+            session.close()
+            close_engine(engine)
+        rows.append(f"{name}: {count} points, {count / seconds:.0f} clicks/s, {seconds / count * 1000:.2f} ms per point")
+    return rows
+
+
+def benchmark_point_queue(args):
+    """
+    Время клика (постановка точки в PointWriteQueue) и время записи очереди при закрытии окна
+    в сравнении с сохранением каждой точки отдельной транзакцией (по умолчанию 500 точек).
+    """
+    count = int(args[0]) if args else 500
+    rows = []
+    with tempfile.TemporaryDirectory() as folder:
+        engine = create_sqlite_engine(f"sqlite:///{os.path.join(folder, 'bench.sqlite')}", None, SQLITE_PROFILE)
+        Base.metadata.create_all(bind=engine)
+        session = sessionmaker(bind=engine)()
+        create_bench_count_file(session)
+        session.close()
+
+        queue = PointWriteQueue()
+        queue.open(engine)
+        start = time.perf_counter()
+        for i in range(count):
+            queue.insert(bench_point(i))
+            QApplication.processEvents()
+        clicks = time.perf_counter() - start
+
+        start = time.perf_counter()
+        queue.flush(wait=True)
+        flush = time.perf_counter() - start
+        queue.close()
+
+        with engine.connect() as connection:
+            saved = connection.exec_driver_sql("SELECT count(*) FROM count_pointscount").scalar()
+        close_engine(engine)
+
+    rows.append(f"queue: {count} points, {clicks / count * 1000:.3f} ms per click, "
+                f"{flush * 1000:.1f} ms final flush, {saved} saved")
+    return rows + benchmark_point_clicks(args)[1:]
+
+
+def query_plans(args):
+    """
+    Проверка планов частых запросов (HOT_QUERIES) на базе учета args[0] или на новой пустой базе:
+    ни один запрос не должен выполняться полным просмотром таблицы. Для новых и мигрированных баз
+    то же проверяет tests/test_migrations.py; здесь - ручная проверка существующего файла.
+    """
+    with tempfile.TemporaryDirectory() as folder:
+        path = args[0] if args else os.path.join(folder, 'plans.sqlite')
+        engine = create_sqlite_engine(f"sqlite:///{path}", "SqliteMain")
+        if not args:
+            Base.metadata.create_all(bind=engine)
+        migrate(engine)
+        failed = check_query_plans(engine)
+        close_engine(engine)
+
+    if not failed:
+        return ["all hot queries use indexes"]
+    return [f"{name}: {' | '.join(plan)}" for name, plan in failed.items()]
+
+
+def daily_total_reference(count_item, session):
+    """
+    Прежний расчет DailyTotalCount.get_data (точки и групповые учеты во фреймах pandas, запросы категорий
+    усилий и камер по каждому участку). Используется как эталон для сравнения с DailyTotalCount.
+    """
+    def where(model):
+        return session.query(model).filter_by(r_year=count_item.r_year, r_date=count_item.r_date,
+                                              site=count_item.site, species=count_item.species,
+                                              time_start=count_item.time_start, creator=count_item.creator)
+
+    df_points = pd.DataFrame([x.as_dict() for x in where(PointsCount).all()])
+    groups_count = pd.DataFrame([x.as_dict() for x in where(GroupsCount).all()])
+
+    data = []
+    for eff_type in count_item.effort_types:
+        for eff_site in sorted(eff_type.effort_sites, key=lambda x: x.local_site):
+            if eff_type.count_type != eff_site.count_type:
+                continue
+            for cat in m_params.support_categories_points:
+                temp = {'count_type': eff_type.count_type, 'local_site': eff_site.local_site,
+                        'animal_category': cat.animal_category, 'count': 'NA'}
+                eff_categories = [x.animal_category for x in where(CountEffortCategories).filter_by(
+                    count_type=eff_type.count_type).all()]
+                if cat.animal_category in eff_categories:
+                    temp['count'] = 0
+                if not df_points.empty and eff_site.local_site in set(df_points['local_site']):
+                    count_point = df_points[(df_points['animal_category'] == cat.animal_category) &
+                                            (df_points['local_site'] == eff_site.local_site) &
+                                            (df_points['count_type'] == eff_type.count_type)]
+                    if not count_point.empty:
+                        temp['count'] = len(count_point)
+                if not groups_count.empty and eff_site.local_site in set(groups_count['local_site']):
+                    temp_count = groups_count[(groups_count['animal_category'] == cat.animal_category) &
+                                              (groups_count['local_site'] == eff_site.local_site) &
+                                              (groups_count['count_type'] == eff_type.count_type)]
+                    if not temp_count.empty:
+                        temp['count'] = temp_count['count'].sum()
+                data.append(temp)
+
+    df = pd.DataFrame(data)
+    support_creator = m_params.support_observers.itemFromId(count_item.creator)
+    creator = support_creator.observer_name if support_creator else count_item.creator
+    res = []
+    for local_site_id in sorted(set(df['local_site'])):
+        support_local_site = m_params.support_local_sites.itemFromNameOrId(local_site_id)
+        temp = {'r_year': count_item.r_year, 'site': count_item.site, 'r_date': count_item.r_date,
+                'time_start': count_item.time_start, 'creator': creator, 'species': count_item.species,
+                'local_site_id': local_site_id,
+                'local_site_name': support_local_site.local_site_name if support_local_site else local_site_id,
+                'cameras': 'NA', 'count_types': '', 'comments': count_item.comments}
+        # типы учета сортируются, как в DailyTotalCount (прежний порядок множества менялся между запусками)
+        lc_count_types = sorted(set(df[(df['local_site'] == local_site_id)]['count_type'].tolist()))
+        if 'Map' in lc_count_types:
+            files = where(PointsCount).filter_by(local_site=local_site_id, count_type='Map').all()
+            cameras_lc = sorted(set(camera_from_file_name(file.file_name) for file in files))
+            temp['cameras'] = f"{len(cameras_lc)}: {cameras_lc}"
+        temp['count_types'] = f"{len(lc_count_types)}: {lc_count_types}"
+        total = 'NA'
+        if not df[(df['local_site'] == local_site_id) & (df['count'] != 'NA')].empty:
+            total = 0
+        for cat in m_params.support_categories_points:
+            temp_count = df[(df['animal_category'] == cat.animal_category) &
+                            (df['local_site'] == local_site_id) & (df['count'] != 'NA')]
+            count = 'NA'
+            if not temp_count.empty:
+                count = temp_count['count'].sum()
+                if cat.count_category:
+                    total += count
+            temp[cat.animal_category] = count
+        temp['Total'] = total
+        res.append(temp)
+    return pd.DataFrame(res)
+
+
+def benchmark_daily_total(args):
+    """
+    Время дневного отчета DailyTotalCount на синтетическом дне (по умолчанию 500000 точек) и сравнение
+    с прежним расчетом daily_total_reference. Аргумент noref отключает расчет эталона.
+    """
+    count = int(args[0]) if args else 500000
+    reference = 'noref' not in args
+    rows = []
+    with tempfile.TemporaryDirectory() as folder:
+        engine = create_sqlite_engine(f"sqlite:///{os.path.join(folder, 'bench.sqlite')}", None, SQLITE_PROFILE)
+        Base.metadata.create_all(bind=engine)
+        migrate(engine)
+        session = sessionmaker(bind=engine)()
+        count_item = create_bench_day(session, count)
+
+        start = time.perf_counter()
+        df = DailyTotalCount(count_item, session).get_data()
+        seconds = time.perf_counter() - start
+        rows.append(f"grouped queries: {count} points, {len(df)} local sites, {seconds * 1000:.1f} ms")
+
+        if reference:
+            start = time.perf_counter()
+            df_reference = daily_total_reference(count_item, session)
+            seconds = time.perf_counter() - start
+            rows.append(f"pandas masks: {count} points, {len(df_reference)} local sites, {seconds * 1000:.1f} ms")
+            difference = sheets_difference([df], [df_reference])
+            rows.append(f"RESULT DIFFERS FROM REFERENCE: {difference}" if difference else "result matches reference")
+
+        session.close()
+        close_engine(engine)
+    return rows
+
+
+def benchmark_count_report(args):
+    """
+    Отчет по учетам нескольких файлов баз (по умолчанию 8 файлов по 20000 точек) последовательно
+    в одном процессе и в пуле процессов count_report. Результаты должны совпадать.
+    """
+    files = int(args[0]) if args else 8
+    count = int(args[1]) if len(args) > 1 else 20000
+    rows = []
+    with tempfile.TemporaryDirectory() as folder:
+        db_list = []
+        for i in range(files):
+            path = os.path.join(folder, f'bench_{i}.db')
+            engine = create_sqlite_engine(f"sqlite:///{path}", None, SQLITE_PROFILE)
+            Base.metadata.create_all(bind=engine)
+            migrate(engine)
+            session = sessionmaker(bind=engine)()
+            create_bench_day(session, count)
+            session.close()
+            close_engine(engine)
+            db_list.append(path)
+
+        parts = report_parts(db_list, [BENCH_KEY['r_year']], [BENCH_KEY['site']])
+        categories = [ReportCategory(cat.animal_category, cat.count_category)
+                      for cat in m_params.support_categories_points]
+
+        start = time.perf_counter()
+        sequential = merge_report_parts([count_report_part(part, 'SSL', categories, {}, {}) for part in parts])
+        seconds = time.perf_counter() - start
+        rows.append(f"sequential: {len(parts)} parts, {seconds * 1000:.0f} ms")
+
+        workers = min(report_workers(), len(parts))
+        start = time.perf_counter()
+        pooled = merge_report_parts(run_report_parts(parts, count_report_part, lambda part: ('SSL', categories, {}, {}),
+                                                     lambda index, result, done: None, lambda: False))
+        seconds = time.perf_counter() - start
+        rows.append(f"process pool ({workers} workers): {len(parts)} parts, {seconds * 1000:.0f} ms")
+
+        difference = sheets_difference(pooled, sequential)
+        rows.append(f"SHEETS DIFFER: {difference}" if difference else "sheets match")
+    return rows
+
+
+def benchmark_report_cache(args):
+    """
+    Отчет по учетам (по умолчанию 8 файлов баз по 20000 точек) без кэша, с пустым кэшем отчетов,
+    повторно и после изменения одной точки в одном файле. Результаты должны совпадать с отчетом без кэша.
+    Кэш создается во временной папке.
+    """
+    files = int(args[0]) if args else 8
+    count = int(args[1]) if len(args) > 1 else 20000
+    rows = []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as folder:
+        db_list = []
+        for i in range(files):
+            path = os.path.join(folder, f'bench_{i}.db')
+            engine = create_sqlite_engine(f"sqlite:///{path}", None, SQLITE_PROFILE)
+            Base.metadata.create_all(bind=engine)
+            migrate(engine)
+            session = sessionmaker(bind=engine)()
+            create_bench_day(session, count)
+            session.close()
+            close_engine(engine)
+            db_list.append(path)
+
+        parts = report_parts(db_list, [BENCH_KEY['r_year']], [BENCH_KEY['site']])
+        categories = [ReportCategory(cat.animal_category, cat.count_category)
+                      for cat in m_params.support_categories_points]
+
+        def run(name):
+            start = time.perf_counter()
+            sheets = merge_report_parts([count_report_part(part, 'SSL', categories, {}, {}) for part in parts])
+            rows.append(f"{name}: {len(parts)} parts, {(time.perf_counter() - start) * 1000:.0f} ms")
+            return sheets
+
+        # без кэша: файл кэша нельзя открыть (вместо файла папка)
+        os.chdir(folder)
+        os.mkdir(REPORT_CACHE_FILE)
+        try:
+            reference = run("no cache")
+            os.rmdir(REPORT_CACHE_FILE)
+            cold = run("empty cache")
+            warm = run("cached")
+
+            engine = create_sqlite_engine(f"sqlite:///{db_list[0]}", None, SQLITE_PROFILE)
+            with engine.begin() as connection:
+                connection.execute(update(PointsCount).where(PointsCount.iLeft == 0).values(
+                    local_site='S04', animal_category='C00', dateupdated='2099-01-01 00:00:00'))
+            close_engine(engine)
+            edited = run("one day edited")
+            reference_edited = merge_report_parts([count_report_part(part, 'SSL', categories, {}, {})
+                                                   for part in parts])
+        finally:
+            os.chdir(cwd)
+
+        difference = sheets_difference(cold, reference) or sheets_difference(warm, reference)
+        rows.append(f"CACHED SHEETS DIFFER: {difference}" if difference else "cached sheets match")
+        difference = sheets_difference(edited, reference_edited)
+        if not difference and sheets_difference(edited, reference) is None:
+            difference = "the edit is not in the report"
+        rows.append(f"EDITED SHEETS DIFFER: {difference}" if difference else "edited sheets match")
+    return rows
+
+
+def filter_brands_reference(animals, symbols):
+    """
+    Прежний поиск по знакам (AnimalRegistration.filter_animals_based_on_ui): последовательные фильтры
+    списка по позициям pos1..pos5.
+    """
+    for pos in BRAND_POSITIONS:
+        symbol = symbols.get(pos)
+        if symbol == DIGIT_CLASS:
+            animals = list(filter(lambda x: str(getattr(x, pos)).isdigit() and getattr(x, pos), animals))
+        elif symbol == LETTER_CLASS:
+            animals = list(filter(lambda x: not str(getattr(x, pos)).isdigit() and getattr(x, pos), animals))
+        elif symbol is not None:
+            animals = list(filter(lambda x: str(getattr(x, pos)) == symbol and getattr(x, pos), animals))
+    return animals
+
+
+def benchmark_brand_search(args):
+    """
+    Поиск животных по знакам меток (по умолчанию 50000 животных, 200 случайных запросов): последовательные
+    фильтры списка и BrandIndex. Результаты должны совпадать.
+    """
+    count = int(args[0]) if args else 50000
+    random.seed(21)
+    alphabet = '0123456789ABCDEFHKMPTX'
+    animals = []
+    for i in range(count):
+        length = random.choice([3, 4, 5])
+        symbols = [random.choice(alphabet) for _ in range(length)] + [''] * (5 - length)
+        animals.append(AnimalNames(species='SSL', animal_name=f'N{i}', **dict(zip(BRAND_POSITIONS, symbols))))
+
+    start = time.perf_counter()
+    index = BrandIndex(animals)
+    build = time.perf_counter() - start
+
+    queries = []
+    for _ in range(200):
+        queries.append({pos: random.choice([None, None, DIGIT_CLASS, LETTER_CLASS, random.choice(alphabet)])
+                        for pos in BRAND_POSITIONS})
+
+    start = time.perf_counter()
+    reference = [filter_brands_reference(animals, query) for query in queries]
+    filters = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matches = [index.match(query) for query in queries]
+    match = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = [index.search(query) for query in queries]
+    search = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for query in queries:
+        for pos in BRAND_POSITIONS:
+            index.counts(pos, query)
+    counts = time.perf_counter() - start
+
+    same = all(a == b for a, b in zip(reference, results))
+    return [f"index build: {count} animals, {build * 1000:.1f} ms",
+            f"filters: {filters / len(queries) * 1000:.2f} ms per query",
+            f"index match: {match / len(queries) * 1e6:.1f} us per query, "
+            f"with result list {search / len(queries) * 1000:.2f} ms per query",
+            f"position counts: {counts / len(queries) / len(BRAND_POSITIONS) * 1e6:.1f} us per position",
+            f"{len(matches)} queries, results match" if same else "RESULTS DIFFER"]
+
+
+def archive_images_reference(archive_path, animal_name):
+    """
+    Прежний поиск фотографий животного (AnimalRegistration.get_images): обход архива os.walk и Path.glob.
+    """
+    paths = []
+    for (root, dirs, files) in os.walk(archive_path, topdown=True):
+        for item in dirs:
+            for (_, s_dirs, _) in os.walk(os.path.join(root, item), topdown=True):
+                for res in filter(lambda x: str(x) == animal_name, s_dirs):
+                    paths.extend(os.path.join(root, item, res, f) for f in Path(os.path.join(root, item, res)).glob('*')
+                                 if f.suffix.lower() in PATTERN_SUFFIX)
+                break
+        break
+    return paths
+
+
+def benchmark_archive_index(args):
+    """
+    Поиск фотографий животного в архиве меток (по умолчанию 3000 животных в 6 папках годов и папке
+    not_verified): прежний обход архива и ArchiveIndex (построение, обновление без изменений, поиск).
+    Результаты должны совпадать, в том числе после добавления фотографии и папки животного.
+    """
+    count = int(args[0]) if args else 3000
+    random.seed(22)
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = os.path.join(tmp, 'archive')
+        groups = [f'B_{year}' for year in range(2015, 2021)] + ['B_2020_not_verified']
+        names = [f'{i:04d}L' for i in range(count)]
+        for group in groups:
+            for name in random.sample(names, count // 3):
+                os.makedirs(os.path.join(archive, group, name))
+                for k in range(random.randint(1, 3)):
+                    Path(archive, group, name, f'{name}_{k}.jpg').touch()
+                Path(archive, group, name, 'Thumbs.db').touch()
+
+        queries = random.sample(names, 50)
+        start = time.perf_counter()
+        reference = [sorted(archive_images_reference(archive, name)) for name in queries]
+        walk = time.perf_counter() - start
+
+        index = ArchiveIndex(archive, os.path.join(tmp, 'archive_index.sqlite'))
+        start = time.perf_counter()
+        index.refresh()
+        build = time.perf_counter() - start
+        start = time.perf_counter()
+        index.refresh()
+        refresh = time.perf_counter() - start
+        start = time.perf_counter()
+        results = [sorted(x.path for x in index.images(name)) for name in queries]
+        lookup = time.perf_counter() - start
+        same = results == reference
+
+        # новая фотография видна при поиске, новая папка животного - после обновления индекса
+        edited = sorted(os.listdir(os.path.join(archive, groups[0])))[:20]
+        time.sleep(0.01)
+        Path(archive, groups[0], edited[0], 'added.jpg').touch()
+        os.makedirs(os.path.join(archive, groups[1], 'NEW'))
+        Path(archive, groups[1], 'NEW', 'NEW_0.jpg').touch()
+        edited.append('NEW')
+        added = any(x.path.endswith('added.jpg') for x in index.images(edited[0]))
+        index.refresh()
+        same_edited = all(sorted(x.path for x in index.images(name)) == sorted(archive_images_reference(archive, name))
+                          for name in edited)
+
+    return [f"os.walk: {walk / len(queries) * 1000:.1f} ms per animal",
+            f"index build: {count} animals, {build * 1000:.0f} ms, refresh without changes {refresh * 1000:.0f} ms",
+            f"index lookup: {lookup / len(queries) * 1000:.2f} ms per animal",
+            f"{len(queries)} animals, results match" if same else "RESULTS DIFFER",
+            "edited archive matches" if same_edited and added else "EDITED ARCHIVE DIFFERS"]
+
+
+def scan_first(items, predicate):
+    """
+    Прежний поиск в справочниках (support_lists): первый объект списка, для которого predicate истинно.
+    """
+    try:
+        return next(x for x in items if predicate(x))
+    except StopIteration:
+        return None
+
+
+def benchmark_support_lists(args):
+    """
+    Поиск в справочниках (по умолчанию 20000 поисков каждого вида, включая отсутствующие значения):
+    последовательный просмотр списка и индексы IndexedList. Результаты должны совпадать.
+    """
+    count = int(args[0]) if args else 20000
+    random.seed(23)
+    local_sites = LocalSitesList(LocalSites(site=site, local_site_id=f'L{i:02d}', local_site_name=f'Rookery {i}')
+                                 for site in range(1, 4) for i in range(20))
+    names = AnimalNamesList(AnimalNames(species='SSL', animal_name=f'N{i}') for i in range(5000))
+    observers = ObserversList(Observers(observer=f'O{i}', observer_name=f'Observer {i}') for i in range(30))
+
+    cases = [
+        ('local site name or id', local_sites.itemFromNameOrId,
+         lambda v: scan_first(local_sites, lambda x: x.local_site_id == v or x.local_site_name == v),
+         [random.choice([f'L{random.randrange(25):02d}', f'Rookery {random.randrange(25)}']) for _ in range(count)]),
+        ('local site and site', lambda v: local_sites.itemFromNameOrIdAndSite(*v),
+         lambda v: scan_first(local_sites, lambda x: (x.local_site_id == v[0] or x.local_site_name == v[0])
+                              and x.site == v[1]),
+         [(f'L{random.randrange(25):02d}', random.randrange(1, 5)) for _ in range(count)]),
+        ('animal name', names.itemFromName, lambda v: scan_first(names, lambda x: x.animal_name == v),
+         [f'N{random.randrange(5500)}' for _ in range(count)]),
+        ('observer', observers.itemFromId, lambda v: scan_first(observers, lambda x: x.observer == v),
+         [f'O{random.randrange(35)}' for _ in range(count)]),
+    ]
+
+    rows = []
+    same = True
+    for title, indexed, reference, values in cases:
+        start = time.perf_counter()
+        expected = [reference(v) for v in values]
+        scan = time.perf_counter() - start
+        start = time.perf_counter()
+        found = [indexed(v) for v in values]
+        index = time.perf_counter() - start
+        same = same and all(a is b for a, b in zip(expected, found))
+        rows.append(f"{title}: scan {scan / len(values) * 1e6:.2f} us, index {index / len(values) * 1e6:.2f} us")
+
+    # изменение списка сбрасывает индексы
+    names.append(AnimalNames(species='SSL', animal_name='ADDED'))
+    same = same and names.itemFromName('ADDED') is names[-1]
+    rows.append(f"{len(cases)} lookups x {count}, results match" if same else "RESULTS DIFFER")
+    return rows
+
+
+def animal_columns_reference(resight_df, support_animal_names, support_sites):
+    """
+    Прежний расчет DataProcessor (animal_Id_report): iterrows по строкам каждого имени животного и поиск
+    в справочниках. Значения собираются в списки по именам животных, поэтому совпадают со строками
+    только если строки одного животного идут подряд и все имена и лежбища есть в справочниках.
+    """
+    ages = []
+    natal_rookeries = []
+    rookery_site = []
+    for animal_name in resight_df['animal_name'].unique():
+        for index, item_res in resight_df[resight_df['animal_name'] == animal_name].iterrows():
+            support_animal_name = support_animal_names.itemFromName(item_res['animal_name'])
+            if support_animal_name:
+                if support_animal_name.t_date:
+                    ages.append(int(item_res['r_year']) - int(str(support_animal_name.t_date)[0:4]))
+                else:
+                    ages.append(None)
+                support_rookery = support_sites.itemFromId(id_site=int(support_animal_name.t_site)) \
+                    if support_animal_name.t_site else None
+                natal_rookeries.append(support_rookery.site_name if support_rookery else None)
+                if item_res['site']:
+                    support_rookery = support_sites.itemFromId(id_site=int(item_res['site']))
+                    if support_rookery:
+                        rookery_site.append(support_rookery.site_name)
+    return ages, natal_rookeries, rookery_site
+
+
+def benchmark_animal_columns(args):
+    """
+    Возраст и лежбища для регистраций за год (по умолчанию 300000 регистраций, 20000 животных):
+    DataProcessor на всех регистрациях и сравнение с прежним расчетом на 3000 регистраций,
+    отсортированных по имени животного (на них прежний расчет дает правильный результат).
+    """
+    count = int(args[0]) if args else 300000
+    random.seed(24)
+    sites = SitesList(Sites(site=site, site_name=f'Rookery {site}') for site in range(1, 21))
+    names = AnimalNamesList(AnimalNames(species='SSL', animal_name=f'N{i}',
+                                        t_date=random.choice([0, random.randint(2000, 2020) * 10000 + 615]),
+                                        t_site=random.randint(1, 20)) for i in range(20000))
+    resight_df = pd.DataFrame({'species': 'SSL',
+                               'r_year': [random.randint(2010, 2024) for _ in range(count)],
+                               'site': [random.randint(1, 20) for _ in range(count)],
+                               'animal_name': [f'N{random.randrange(20000)}' for _ in range(count)]})
+
+    start = time.perf_counter()
+    DataProcessor(resight_df.copy(), names, sites).process()
+    vectorized = time.perf_counter() - start
+
+    sample = resight_df.head(3000).sort_values('animal_name', kind='stable').reset_index(drop=True)
+    start = time.perf_counter()
+    reference = animal_columns_reference(sample, names, sites)
+    loop = time.perf_counter() - start
+    processed = DataProcessor(sample.copy(), names, sites).process()
+
+    def values(column):
+        return [None if pd.isna(x) else x for x in column]
+
+    same = all(values(pd.Series(expected)) == values(processed[column])
+               for expected, column in zip(reference, ['age', 'natal_rookery', 'rookery_site']))
+    return [f"DataProcessor: {count} rows, {vectorized * 1000:.0f} ms",
+            f"previous loop: {len(sample)} rows, {loop * 1000:.0f} ms",
+            f"{len(sample)} rows, results match" if same else "RESULTS DIFFER"]
+
+
+def create_bench_resights(session, years, sites, animals, days):
+    """
+    Создает регистрации животных за годы years на участках sites: animals животных в каждой части,
+    ежедневные регистрации в течение days дней (примерно в трети дней) и сведения о животных.
+    """
+    random.seed(25)
+    statuses = ['WP', 'NP', 'M', 'F', 'J']
+    info_types = ['BiopsyTaken', 'MomPresence', 'PupName', 'PupSurvival', 'Other']
+    for year in years:
+        for site in sites:
+            session.add(SurveyEffort(r_year=year, site=site, species='SSL'))
+    session.flush()
+    for year in years:
+        for site in sites:
+            key = dict(species='SSL', r_year=year, site=site)
+            names = [f'N{i}' for i in random.sample(range(animals * 2), animals)]
+            session.execute(insert(Resight), [dict(key, animal_name=name, brand_quality='G', sex_r='F',
+                                                   status=random.choice(statuses), comments='bench', id_status=0)
+                                              for name in names])
+            session.execute(insert(Daily), [dict(key, animal_name=name, r_date=year * 10000 + 601 + day,
+                                                 status=random.choice(statuses), local_site=f'L{day % 5}',
+                                                 comments=None, observer='bench')
+                                            for day in range(days) for name in names if random.random() < 0.3])
+            info = {(name, random.choice(info_types)): random.choice(['yes', 'no', 'Pup 1'])
+                    for name in names for _ in range(2)}
+            session.execute(insert(AnimalInfo), [dict(key, animal_name=name, info_type=info_type, info_value=value,
+                                                      observer='bench')
+                                                 for (name, info_type), value in info.items()])
+    session.commit()
+
+
+def resight_part_in(folder, part, species, local_sites):
+    """
+    Часть отчета регистраций с кэшем отчетов в папке folder. Рабочая папка меняется только на время чтения:
+    процессы пула запускаются из папки программы (при запуске импортируется app).
+    """
+    cwd = os.getcwd()
+    os.chdir(folder)
+    try:
+        return animal_id_report_part(part, species, local_sites)
+    finally:
+        os.chdir(cwd)
+
+
+def benchmark_resight_report(args):
+    """
+    Отчет регистраций животных (по умолчанию 4 файла баз, 2 года и 2 участка, 500 животных в части, 30 дней):
+    части последовательно и в пуле процессов без кэша, затем в пуле с пустым и заполненным кэшем отчетов.
+    Листы должны совпадать. Кэш создается во временной папке.
+    """
+    files = int(args[0]) if args else 4
+    animals = int(args[1]) if len(args) > 1 else 500
+    years = [2023, 2024]
+    sites = [1, 2]
+    support_names = AnimalNamesList(AnimalNames(species='SSL', animal_name=f'N{i}', t_date=20100615 + i % 10 * 10000,
+                                                t_site=i % 3 + 1) for i in range(animals * 2))
+    support_sites = SitesList(Sites(site=site, site_name=f'Rookery {site}') for site in range(1, 4))
+    local_sites = {site: {f'L{i}': f'Local {i}' for i in range(4)} for site in sites}
+    rows = []
+    with tempfile.TemporaryDirectory() as folder:
+        db_list = []
+        for i in range(files):
+            path = os.path.join(folder, f'bench_{i}.db')
+            engine = create_sqlite_engine(f"sqlite:///{path}", None, SQLITE_PROFILE)
+            Base.metadata.create_all(bind=engine)
+            migrate(engine)
+            session = sessionmaker(bind=engine)()
+            create_bench_resights(session, years, sites, animals, 30)
+            session.close()
+            close_engine(engine)
+            db_list.append(path)
+
+        parts = report_parts(db_list, years, sites)
+        workers = min(report_workers(), len(parts))
+
+        def run(name, pool):
+            start = time.perf_counter()
+            if pool:
+                with report_executor(workers) as executor:
+                    futures = [executor.submit(resight_part_in, folder, part, 'SSL', local_sites[part.site])
+                               for part in parts]
+                    results = [future.result() for future in futures]
+            else:
+                results = [resight_part_in(folder, part, 'SSL', local_sites[part.site]) for part in parts]
+            read = time.perf_counter() - start
+            sheets = animal_id_report_sheets(results, support_names, support_sites)
+            rows.append(f"{name}: {len(parts)} parts, {sum(len(r[1]) for r in results)} daily rows, "
+                        f"read {read * 1000:.0f} ms, merge {(time.perf_counter() - start - read) * 1000:.0f} ms")
+            return sheets
+
+        # без кэша: файл кэша нельзя открыть (вместо файла папка)
+        os.mkdir(os.path.join(folder, REPORT_CACHE_FILE))
+        sequential = run("sequential, no cache", False)
+        pooled = run(f"process pool ({workers} workers), no cache", True)
+        os.rmdir(os.path.join(folder, REPORT_CACHE_FILE))
+        filled = run("process pool, empty cache", True)
+        cached = run("process pool, cached", True)
+
+    difference = (sheets_difference(pooled, sequential) or sheets_difference(filled, sequential)
+                  or sheets_difference(cached, sequential))
+    rows.append(f"SHEETS DIFFER: {difference}" if difference else "sheets match")
+    return rows
+
+
+BENCHMARKS = {
+    'preview': benchmark_preview_decode,
+    'points': benchmark_point_brushes,
+    'clicks': benchmark_point_clicks,
+    'queue': benchmark_point_queue,
+    'plans': query_plans,
+    'daily': benchmark_daily_total,
+    'report': benchmark_count_report,
+    'cache': benchmark_report_cache,
+    'brands': benchmark_brand_search,
+    'archive': benchmark_archive_index,
+    'lists': benchmark_support_lists,
+    'animals': benchmark_animal_columns,
+    'resights': benchmark_resight_report,
+}
+
+
+if __name__ == "__main__":
+    app = QApplication(sys.argv)
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print(f"usage: python -m benchmarks {{{'|'.join(BENCHMARKS)}}} [args]")
+        sys.exit(1)
+    for line in BENCHMARKS[sys.argv[1]](sys.argv[2:]):
+        print(line)
@@ -0,0 +1,35 @@
+"""
+Общая подготовка тестов.
+
+Пакет app при импорте подключается к системной базе support_base.sqlite и читает config.ini в текущей папке,
+поэтому тесты выполняются во временной папке с пустой системной базой, созданной по моделям support_db.
+"""
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+
+from sqlalchemy import create_engine
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+_cwd = os.getcwd()
+_folder = tempfile.mkdtemp(prefix='photocount-tests-')
+os.chdir(_folder)
+
+# модели системной базы загружаются из файла, не через пакет app: импорт app уже требует базу
+_spec = importlib.util.spec_from_file_location('support_schema', os.path.join(ROOT, 'app', 'models', 'support_db.py'))
+_support_schema = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(_support_schema)
+_engine = create_engine('sqlite:///support_base.sqlite')
+_support_schema.Base.metadata.create_all(bind=_engine)
+_engine.dispose()
+
+
+def pytest_unconfigure(config):
+    os.chdir(_cwd)
+    shutil.rmtree(_folder, ignore_errors=True)
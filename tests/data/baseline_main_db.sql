@@ -0,0 +1,240 @@
+-- Схема файла учета до миграций (user_version 0), как ее создавали модели main_db до суррогатных ключей.
+
+CREATE TABLE survey_effort (
+	r_year INTEGER NOT NULL, 
+	site INTEGER NOT NULL, 
+	species VARCHAR COLLATE "NOCASE" NOT NULL, 
+	comments TEXT, 
+	PRIMARY KEY (r_year, site, species)
+);
+
+CREATE TABLE count_list (
+	r_year INTEGER NOT NULL, 
+	site INTEGER NOT NULL, 
+	r_date INTEGER NOT NULL, 
+	time_start VARCHAR COLLATE "NOCASE" NOT NULL, 
+	creator VARCHAR COLLATE "NOCASE" NOT NULL, 
+	species VARCHAR COLLATE "NOCASE" NOT NULL, 
+	comments TEXT, 
+	datecreated VARCHAR, 
+	dateupdated VARCHAR, 
+	PRIMARY KEY (r_year, site, r_date, time_start, creator, species), 
+	FOREIGN KEY(r_year, site, species) REFERENCES survey_effort (r_year, site, species) ON DELETE CASCADE ON UPDATE CASCADE
+);
+
+CREATE TABLE id_resight (
+	species VARCHAR COLLATE "NOCASE" NOT NULL, 
+	r_year INTEGER NOT NULL, 
+	site INTEGER NOT NULL, 
+	animal_name VARCHAR COLLATE "NOCASE" NOT NULL, 
+	brand_quality VARCHAR COLLATE "NOCASE", 
+	sex_r VARCHAR COLLATE "NOCASE" NOT NULL, 
+	status VARCHAR COLLATE "NOCASE" NOT NULL, 
+	comments TEXT, 
+	id_status INTEGER, 
+	datecreated VARCHAR, 
+	dateupdated VARCHAR, 
+	PRIMARY KEY (species, r_year, site, animal_name), 
+	FOREIGN KEY(r_year, site, species) REFERENCES survey_effort (r_year, site, species) ON DELETE CASCADE ON UPDATE CASCADE
+);
+
+CREATE TABLE count_effort_types (
+	r_year INTEGER NOT NULL, 
+	site INTEGER NOT NULL, 
+	r_date INTEGER NOT NULL, 
+	time_start VARCHAR NOT NULL, 
+	creator VARCHAR COLLATE "NOCASE" NOT NULL, 
+	species VARCHAR COLLATE "NOCASE" NOT NULL, 
+	observer VARCHAR COLLATE "NOCASE" NOT NULL, 
+	count_type VARCHAR COLLATE "NOCASE" NOT NULL, 
+	comments TEXT, 
+	datecreated VARCHAR, 
+	dateupdated VARCHAR, 
+	PRIMARY KEY (r_year, site, r_date, time_start, creator, species, count_type), 
+	FOREIGN KEY(r_year, site, r_date, time_start, creator, species) REFERENCES count_list (r_year, site, r_date, time_start, creator, species) ON DELETE CASCADE ON UPDATE CASCADE
+);
+
+CREATE TABLE id_daily (
+	species VARCHAR COLLATE "NOCASE" NOT NULL, 
+	r_year INTEGER NOT NULL, 
+	site INTEGER NOT NULL, 
+	animal_name VARCHAR COLLATE "NOCASE" NOT NULL, 
+	r_date INTEGER NOT NULL, 
+	status VARCHAR COLLATE "NOCASE" NOT NULL, 
+	local_site VARCHAR COLLATE "NOCASE", 
+	comments TEXT, 
+	observer VARCHAR COLLATE "NOCASE" NOT NULL, 
+	datecreated VARCHAR, 
+	dateupdated VARCHAR, 
+	PRIMARY KEY (species, r_year, site, animal_name, r_date), 
+	FOREIGN KEY(r_year, site, species, animal_name) REFERENCES id_resight (r_year, site, species, animal_name) ON DELETE CASCADE ON UPDATE CASCADE
+);
+
+CREATE TABLE id_animal_info (
+	species VARCHAR COLLATE "NOCASE" NOT NULL, 
+	r_year INTEGER NOT NULL, 
+	site INTEGER NOT NULL, 
+	animal_name VARCHAR COLLATE "NOCASE" NOT NULL, 
+	info_type VARCHAR COLLATE "NOCASE" NOT NULL, 
+	info_value VARCHAR COLLATE "NOCASE", 
+	observer VARCHAR COLLATE "NOCASE" NOT NULL, 
+	datecreated VARCHAR, 
+	dateupdated VARCHAR, 
+	PRIMARY KEY (species, r_year, site, animal_name, info_type), 
+	FOREIGN KEY(r_year, site, species, animal_name) REFERENCES id_resight (r_year, site, species, animal_name) ON DELETE CASCADE ON UPDATE CASCADE
+);
+
+CREATE TABLE count_effort_sites (
+	r_year INTEGER NOT NULL, 
+	site INTEGER NOT NULL, 
+	r_date INTEGER NOT NULL, 
+	time_start VARCHAR NOT NULL, 
+	creator VARCHAR COLLATE "NOCASE" NOT NULL, 
+	species VARCHAR COLLATE "NOCASE" NOT NULL, 
+	observer VARCHAR COLLATE "NOCASE" NOT NULL, 
+	local_site VARCHAR COLLATE "NOCASE" NOT NULL, 
+	comments TEXT, 
+	visibility VARCHAR COLLATE "NOCASE" NOT NULL, 
+	rain VARCHAR COLLATE "NOCASE" NOT NULL, 
+	distance VARCHAR COLLATE "NOCASE" NOT NULL, 
+	splash VARCHAR COLLATE "NOCASE" NOT NULL, 
+	quality VARCHAR COLLATE "NOCASE" NOT NULL, 
+	count_type VARCHAR COLLATE "NOCASE" NOT NULL, 
+	count_performed BOOLEAN NOT NULL, 
+	coverage INTEGER NOT NULL, 
+	datecreated VARCHAR, 
+	dateupdated VARCHAR, 
+	PRIMARY KEY (r_year, site, r_date, time_start, creator, species, local_site, count_type), 
+	FOREIGN KEY(r_year, site, r_date, time_start, creator, species, count_type) REFERENCES count_effort_types (r_year, site, r_date, time_start, creator, species, count_type) ON DELETE CASCADE ON UPDATE CASCADE
+);
+
+CREATE TABLE count_effort_categories (
+	r_year INTEGER NOT NULL, 
+	site INTEGER NOT NULL, 
+	r_date INTEGER NOT NULL, 
+	time_start VARCHAR NOT NULL, 
+	creator VARCHAR COLLATE "NOCASE" NOT NULL, 
+	species VARCHAR COLLATE "NOCASE" NOT NULL, 
+	animal_category VARCHAR COLLATE "NOCASE" NOT NULL, 
+	count_type VARCHAR COLLATE "NOCASE" NOT NULL, 
+	datecreated VARCHAR, 
+	dateupdated VARCHAR, 
+	PRIMARY KEY (r_year, site, r_date, time_start, creator, species, animal_category, count_type), 
+	FOREIGN KEY(r_year, site, r_date, time_start, creator, species, count_type) REFERENCES count_effort_types (r_year, site, r_date, time_start, creator, species, count_type) ON DELETE CASCADE ON UPDATE CASCADE
+);
+
+CREATE TABLE count_source (
+	r_year INTEGER NOT NULL, 
+	site INTEGER NOT NULL, 
+	r_date INTEGER NOT NULL, 
+	time_start VARCHAR NOT NULL, 
+	creator VARCHAR COLLATE "NOCASE" NOT NULL, 
+	species VARCHAR COLLATE "NOCASE" NOT NULL, 
+	observer VARCHAR COLLATE "NOCASE" NOT NULL, 
+	comments TEXT, 
+	file_name VARCHAR COLLATE "NOCASE" NOT NULL, 
+	count_type VARCHAR COLLATE "NOCASE" NOT NULL, 
+	datecreated VARCHAR, 
+	dateupdated VARCHAR, 
+	PRIMARY KEY (r_year, site, r_date, time_start, creator, species, file_name, count_type), 
+	FOREIGN KEY(r_year, site, r_date, time_start, creator, species, count_type) REFERENCES count_effort_types (r_year, site, r_date, time_start, creator, species, count_type) ON DELETE CASCADE ON UPDATE CASCADE
+);
+
+CREATE TABLE id_location (
+	species VARCHAR COLLATE "NOCASE" NOT NULL, 
+	r_year INTEGER NOT NULL, 
+	site INTEGER NOT NULL, 
+	animal_name VARCHAR COLLATE "NOCASE" NOT NULL, 
+	r_date INTEGER NOT NULL, 
+	time_start VARCHAR NOT NULL, 
+	local_site VARCHAR COLLATE "NOCASE", 
+	animal_type VARCHAR COLLATE "NOCASE" NOT NULL, 
+	"iLeft" INTEGER NOT NULL, 
+	"iTop" INTEGER NOT NULL, 
+	observer VARCHAR COLLATE "NOCASE" NOT NULL, 
+	file_name VARCHAR COLLATE "NOCASE" NOT NULL, 
+	type_photo VARCHAR COLLATE "NOCASE", 
+	is_prediction_point INTEGER NOT NULL, 
+	datecreated VARCHAR, 
+	dateupdated VARCHAR, 
+	PRIMARY KEY (species, r_year, site, animal_name, r_date, "iLeft", "iTop", file_name), 
+	FOREIGN KEY(r_year, site, species, animal_name, r_date) REFERENCES id_daily (r_year, site, species, animal_name, r_date) ON DELETE CASCADE ON UPDATE CASCADE
+);
+
+CREATE TABLE count_pointscount (
+	r_year INTEGER NOT NULL, 
+	site INTEGER NOT NULL, 
+	r_date INTEGER NOT NULL, 
+	time_start VARCHAR NOT NULL, 
+	creator VARCHAR COLLATE "NOCASE" NOT NULL, 
+	species VARCHAR COLLATE "NOCASE" NOT NULL, 
+	observer VARCHAR COLLATE "NOCASE" NOT NULL, 
+	local_site VARCHAR COLLATE "NOCASE" NOT NULL, 
+	animal_category VARCHAR COLLATE "NOCASE" NOT NULL, 
+	"iLeft" INTEGER NOT NULL, 
+	"iTop" INTEGER NOT NULL, 
+	file_name VARCHAR COLLATE "NOCASE" NOT NULL, 
+	count_type VARCHAR COLLATE "NOCASE" NOT NULL, 
+	datecreated VARCHAR, 
+	dateupdated VARCHAR, 
+	PRIMARY KEY (r_year, site, r_date, time_start, creator, species, "iLeft", "iTop", file_name, count_type), 
+	FOREIGN KEY(r_year, site, r_date, time_start, creator, species, file_name, count_type) REFERENCES count_source (r_year, site, r_date, time_start, creator, species, file_name, count_type) ON DELETE CASCADE ON UPDATE CASCADE
+);
+
+CREATE TABLE count_patternscount (
+	r_year INTEGER NOT NULL, 
+	site INTEGER NOT NULL, 
+	r_date INTEGER NOT NULL, 
+	time_start VARCHAR NOT NULL, 
+	creator VARCHAR COLLATE "NOCASE" NOT NULL, 
+	species VARCHAR COLLATE "NOCASE" NOT NULL, 
+	observer VARCHAR COLLATE "NOCASE" NOT NULL, 
+	local_site VARCHAR COLLATE "NOCASE" NOT NULL, 
+	animal_category VARCHAR COLLATE "NOCASE" NOT NULL, 
+	"iLeft" INTEGER NOT NULL, 
+	"iTop" INTEGER NOT NULL, 
+	file_name VARCHAR COLLATE "NOCASE" NOT NULL, 
+	count_type VARCHAR COLLATE "NOCASE" NOT NULL, 
+	datecreated VARCHAR, 
+	dateupdated VARCHAR, 
+	PRIMARY KEY (r_year, site, r_date, time_start, creator, species, "iLeft", "iTop", file_name, count_type), 
+	FOREIGN KEY(r_year, site, r_date, time_start, creator, species, file_name, count_type) REFERENCES count_source (r_year, site, r_date, time_start, creator, species, file_name, count_type) ON DELETE CASCADE ON UPDATE CASCADE
+);
+
+CREATE TABLE count_groupscount (
+	r_year INTEGER NOT NULL, 
+	site INTEGER NOT NULL, 
+	r_date INTEGER NOT NULL, 
+	time_start VARCHAR NOT NULL, 
+	creator VARCHAR COLLATE "NOCASE" NOT NULL, 
+	species VARCHAR COLLATE "NOCASE" NOT NULL, 
+	observer VARCHAR COLLATE "NOCASE" NOT NULL, 
+	local_site VARCHAR COLLATE "NOCASE" NOT NULL, 
+	time_s VARCHAR NOT NULL, 
+	time_f VARCHAR, 
+	animal_category VARCHAR COLLATE "NOCASE" NOT NULL, 
+	count INTEGER NOT NULL, 
+	file_name VARCHAR COLLATE "NOCASE" NOT NULL, 
+	count_type VARCHAR COLLATE "NOCASE" NOT NULL, 
+	datecreated VARCHAR, 
+	dateupdated VARCHAR, 
+	PRIMARY KEY (r_year, site, r_date, time_start, creator, species, local_site, animal_category, file_name, count_type), 
+	FOREIGN KEY(r_year, site, r_date, time_start, creator, species, file_name, count_type) REFERENCES count_source (r_year, site, r_date, time_start, creator, species, file_name, count_type) ON DELETE CASCADE ON UPDATE CASCADE
+);
+
+CREATE TRIGGER count_effort_sites_AFTER_UPDATE
+                 AFTER UPDATE
+                    ON count_effort_sites
+              FOR EACH ROW
+        BEGIN
+            UPDATE count_pointscount
+               SET local_site = NEW.local_site
+             WHERE r_year = OLD.r_year AND
+                   site = OLD.site AND
+                   r_date = OLD.r_date AND
+                   time_start = OLD.time_start AND
+                   creator = OLD.creator AND
+                   local_site = OLD.local_site AND
+                   count_type = OLD.count_type AND
+                   species = OLD.species;
+        END;
@@ -0,0 +1,69 @@
+"""
+Синтетические данные учета для тестов и замеров производительности (benchmarks.py).
+"""
+import random
+
+from sqlalchemy import insert
+
+from app import m_params
+from app.controllers.support_lists import AnimalCategoriesList
+from app.models.main_db import SurveyEffort, CountList, CountEffortTypes, CountEffortSites, CountEffortCategories, \
+    CountFiles, PointsCount, GroupsCount
+from app.models.support_db import AnimalCategories
+
+BENCH_KEY = dict(r_year=2024, site=1, r_date=20240601, time_start='10:00', creator='bench', species='SSL')
+
+
+def create_bench_day(session, count):
+    """
+    Создает учет за один день: три типа учета с участками и категориями усилий, по 200 файлов на тип,
+    count точек и групповые учеты. Среди точек есть участки вне усилий и участки в другом регистре.
+    Возвращает строку учета (CountList).
+    """
+    random.seed(17)
+    types = ['Aerial', 'Map', 'Pan']
+    sites = [f'S{i:02}' for i in range(1, 13)]
+    categories = [f'C{i:02}' for i in range(12)]
+    m_params.support_categories_points = AnimalCategoriesList(
+        [AnimalCategories(species='SSL', animal_category=cat, order=i, count_category=i % 4 != 3)
+         for i, cat in enumerate(categories)])
+
+    session.add(SurveyEffort(r_year=2024, site=1, species='SSL'))
+    session.flush()
+    count_item = CountList(**BENCH_KEY, comments='bench')
+    session.add(count_item)
+    session.flush()
+    for n, count_type in enumerate(types):
+        session.add(CountEffortTypes(**BENCH_KEY, observer='bench', count_type=count_type))
+        session.flush()
+        for local_site in sites[n:n + 9]:
+            session.add(CountEffortSites(**BENCH_KEY, observer='bench', local_site=local_site, count_type=count_type,
+                                         visibility='G', rain='N', distance='N', splash='N', quality='G'))
+        for cat in categories[n::2]:
+            session.add(CountEffortCategories(**BENCH_KEY, animal_category=cat, count_type=count_type))
+        for i in range(200):
+            session.add(CountFiles(**BENCH_KEY, observer='bench', count_type=count_type,
+                                   file_name=f'20240601_{100000 + i}_CAM{i % 7}.jpg'))
+    session.commit()
+
+    files = {}
+    for source in session.query(CountFiles).all():
+        files.setdefault(source.count_type, []).append(source)
+    point_sites = sites + ['s01', 'X99']
+    point_categories = categories + ['Other']
+
+    def rows(total, values):
+        for i in range(total):
+            source = random.choice(files[random.choice(types)])
+            yield dict(BENCH_KEY, source_id=source.id, observer='bench', file_name=source.file_name,
+                       count_type=source.count_type, local_site=random.choice(point_sites),
+                       animal_category=random.choice(point_categories), **values(i))
+
+    session.execute(insert(PointsCount), list(rows(count, lambda i: {'iLeft': i, 'iTop': i})))
+    # групповой учет уникален по файлу, участку и категории
+    groups = {(row['source_id'], row['local_site'].lower(), row['animal_category']): row
+              for row in rows(max(1, count // 1000), lambda i: {
+                  'time_s': f'{i}', 'time_f': None, 'count': random.randint(1, 50)})}
+    session.execute(insert(GroupsCount), list(groups.values()))
+    session.commit()
+    return count_item
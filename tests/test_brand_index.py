@@ -0,0 +1,22 @@
+from app.controllers.brand_index import BrandIndex
+from app.controllers.support_lists import AnimalNamesList
+from app.models.support_db import AnimalNames
+
+
+def animal(name, *brand):
+    return AnimalNames(animal_name=name, **dict(zip(['pos1', 'pos2', 'pos3', 'pos4', 'pos5'], brand)))
+
+
+def test_index_follows_list_changes():
+    animals = AnimalNamesList([animal('a', 'A', '1'), animal('b', 'B', '2')])
+    index = BrandIndex.for_animals(animals)
+    assert BrandIndex.for_animals(animals) is index
+    assert [x.animal_name for x in index.search({'pos1': 'A'})] == ['a']
+
+    # замена элемента не меняет длину списка, но индекс строится заново
+    animals[0] = animal('c', 'B', '3')
+    assert [x.animal_name for x in BrandIndex.for_animals(animals).search({'pos1': 'B'})] == ['c', 'b']
+
+    animals[1].pos1 = 'A'
+    animals.invalidate()
+    assert [x.animal_name for x in BrandIndex.for_animals(animals).search({'pos1': 'A'})] == ['b']
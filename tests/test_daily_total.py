@@ -0,0 +1,37 @@
+import os
+
+import pandas as pd
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app import m_params
+from app.models.main_db import Base
+from app.services.daily_total import DailyTotalCount
+from app.services.db_manager import SQLITE_PROFILE, create_sqlite_engine, close_engine
+from app.services.migrations import migrate
+from tests.factories import create_bench_day
+
+# эталон получен прежним расчетом (daily_total_reference в benchmarks.py) на create_bench_day(session, 150);
+# в нем есть категории 'NA', поэтому столбцы категорий частично объектные
+GOLDEN = os.path.join(os.path.dirname(__file__), 'data', 'daily_total_golden.json')
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    # create_bench_day заменяет категории точек в m_params; после теста они восстанавливаются
+    monkeypatch.setattr(m_params, 'support_categories_points', m_params.support_categories_points)
+    engine = create_sqlite_engine(f"sqlite:///{tmp_path / 'daily.sqlite'}", None, SQLITE_PROFILE)
+    Base.metadata.create_all(bind=engine)
+    migrate(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    close_engine(engine)
+
+
+def test_daily_total_matches_golden(session):
+    count_item = create_bench_day(session, 150)
+
+    result = DailyTotalCount(count_item, session).get_data()
+
+    pd.testing.assert_frame_equal(result, pd.read_json(GOLDEN, orient='table'))
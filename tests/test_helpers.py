@@ -0,0 +1,34 @@
+import cv2
+import numpy as np
+from PyQt5.QtGui import QColor, QImage
+
+from app.services.helpers import decode_memory_report, open_image_to_qimage
+
+
+def test_png_alpha_is_kept(tmp_path):
+    path = str(tmp_path / "alpha.png")
+    image = np.zeros((4, 6, 4), dtype=np.uint8)
+    image[:, :] = (255, 0, 0, 128)  # синий в порядке BGRA, полупрозрачный
+    cv2.imwrite(path, image)
+
+    img = open_image_to_qimage(path)
+    assert img.format() == QImage.Format_RGBA8888
+    assert (img.width(), img.height()) == (6, 4)
+    assert QColor(img.pixelColor(2, 1)).getRgb() == (0, 0, 255, 128)
+    assert decode_memory_report()['count'] >= 1
+
+
+def test_opaque_images_are_rgb(tmp_path):
+    gray = str(tmp_path / "gray16.png")
+    cv2.imwrite(gray, np.full((3, 5), 65535, dtype=np.uint16))
+    color = str(tmp_path / "color.jpg")
+    cv2.imwrite(color, np.full((8, 8, 3), (0, 0, 255), dtype=np.uint8))
+
+    img = open_image_to_qimage(gray)
+    assert img.format() == QImage.Format_RGB888
+    assert QColor(img.pixelColor(4, 2)).getRgb() == (255, 255, 255, 255)
+
+    img = open_image_to_qimage(color)
+    assert img.format() == QImage.Format_RGB888
+    red, green, blue, _ = QColor(img.pixelColor(4, 4)).getRgb()
+    assert red > 240 and green < 16 and blue < 16
@@ -0,0 +1,157 @@
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from app.models.main_db import Base
+from app.services.db_manager import create_sqlite_engine, close_engine
+from app.services.migrations import migrate, check_query_plans, table_names, table_columns, HOT_QUERIES, \
+    SECONDARY_INDEXES, SCHEMA_VERSION, RESTORED_COMMENT
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_sqlite_engine(f"sqlite:///{tmp_path / 'plans.sqlite'}", "SqliteMain")
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    close_engine(engine)
+
+
+def query_tables(engine):
+    with engine.connect() as connection:
+        tables = {row[0] for row in connection.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    return {name: sql.split(' FROM ')[1].split()[0] in tables for name, sql in HOT_QUERIES.items()}
+
+
+def test_hot_queries_use_indexes(engine):
+    migrate(engine)
+
+    # check_query_plans пропускает запросы к отсутствующим таблицам: переименованная таблица не должна
+    # пропускать проверку незаметно
+    assert all(query_tables(engine).values())
+    assert check_query_plans(engine) == {}
+
+
+def test_hot_queries_use_indexes_after_migration(engine):
+    # файл, созданный до миграции индексов
+    with engine.begin() as connection:
+        for name, _, _ in SECONDARY_INDEXES:
+            connection.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+        connection.exec_driver_sql("PRAGMA user_version = 0")
+    assert check_query_plans(engine)
+
+    migrate(engine)
+
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA user_version").scalar() == SCHEMA_VERSION
+    assert check_query_plans(engine) == {}
+
+
+POINT_TABLES = {
+    'count_pointscount': ('source_id', 'count_source'),
+    'count_patternscount': ('source_id', 'count_source'),
+    'count_groupscount': ('source_id', 'count_source'),
+    'id_location': ('daily_id', 'id_daily'),
+}
+SOURCE_KEY = ['r_year', 'site', 'r_date', 'time_start', 'creator', 'species', 'file_name', 'count_type']
+DAILY_KEY = ['species', 'r_year', 'site', 'animal_name', 'r_date']
+
+
+def insert(con, table, **values):
+    con.execute(f"INSERT INTO {table} ({', '.join(values)}) VALUES ({', '.join('?' * len(values))})",
+                list(values.values()))
+
+
+def count_point(con, table, key, **values):
+    insert(con, table, r_year=2024, site=1, r_date=20240601, species='SSL', count_type='Main', observer='obs',
+           local_site='A', **dict(key, **values))
+
+
+def baseline_file(path):
+    """
+    Файл учета до миграций с ключами, которые различаются только регистром или совпадают без учета регистра,
+    и с точками без владельца (записаны с отключенной проверкой внешних ключей).
+    """
+    con = sqlite3.connect(path)
+    con.executescript((Path(__file__).parent / 'data' / 'baseline_main_db.sql').read_text(encoding='utf-8'))
+    insert(con, 'survey_effort', r_year=2024, site=1, species='SSL')
+    # в count_list время начала без учета регистра, в count_effort_types и count_source - с учетом
+    insert(con, 'count_list', r_year=2024, site=1, r_date=20240601, time_start='8:00am', creator='bob', species='SSL')
+    for time_start in ('8:00am', '8:00AM'):
+        insert(con, 'count_effort_types', r_year=2024, site=1, r_date=20240601, time_start=time_start,
+               creator='bob', species='SSL', observer='obs', count_type='Main')
+    # два файла учета с одним именем файла, время начала которых различается регистром
+    for time_start, file_name in (('8:00am', 'a.jpg'), ('8:00AM', 'a.jpg'), ('8:00am', 'b.jpg')):
+        insert(con, 'count_source', r_year=2024, site=1, r_date=20240601, time_start=time_start, creator='bob',
+               species='SSL', observer='obs', file_name=file_name, count_type='Main')
+
+    first = dict(time_start='8:00am', creator='bob', file_name='a.jpg')
+    second = dict(time_start='8:00AM', creator='BOB', file_name='A.JPG')
+    orphan = dict(time_start='9:00', creator='bob', file_name='c.jpg')
+    for table in ('count_pointscount', 'count_patternscount'):
+        count_point(con, table, first, animal_category='AF', iLeft=1, iTop=1)
+        count_point(con, table, second, animal_category='AF', iLeft=1, iTop=1)
+        count_point(con, table, dict(first, creator='Bob', file_name='A.jpg'), animal_category='AF', iLeft=1, iTop=2)
+        count_point(con, table, dict(first, file_name='b.jpg'), animal_category='AF', iLeft=1, iTop=1)
+        count_point(con, table, orphan, animal_category='AF', iLeft=1, iTop=1)
+        count_point(con, table, dict(orphan, creator='BOB', file_name='C.JPG'), animal_category='AF', iLeft=2, iTop=2)
+    for key in (first, second, orphan):
+        count_point(con, 'count_groupscount', key, animal_category='AF', time_s='10:00', count=3)
+
+    insert(con, 'id_resight', species='SSL', r_year=2024, site=1, animal_name='A1', sex_r='F', status='A')
+    insert(con, 'id_daily', species='SSL', r_year=2024, site=1, animal_name='A1', r_date=20240601, status='A',
+           observer='obs')
+    for species, animal_name, i in (('SSL', 'A1', 1), ('ssl', 'a1', 2), ('SSL', 'Z9', 1), ('ssl', 'z9', 2)):
+        insert(con, 'id_location', species=species, r_year=2024, site=1, animal_name=animal_name, r_date=20240601,
+               time_start='8:00am', animal_type='A', iLeft=i, iTop=i, observer='obs', file_name='a.jpg',
+               is_prediction_point=0)
+    con.commit()
+    con.close()
+
+
+def table_rows(con, table, columns):
+    return con.execute(f"SELECT {', '.join(columns)} FROM {table} ORDER BY rowid").fetchall()
+
+
+def test_migrate_baseline_file_keeps_rows(tmp_path):
+    path = tmp_path / 'baseline.db'
+    baseline_file(path)
+    con = sqlite3.connect(path)
+    tables = table_names(con)
+    counts = {table: con.execute(f"SELECT count(*) FROM {table}").fetchone()[0] for table in tables}
+    rows = {table: (table_columns(con, table), table_rows(con, table, table_columns(con, table)))
+            for table in POINT_TABLES}
+    con.close()
+
+    engine = create_sqlite_engine(f"sqlite:///{path}", "SqliteMain")
+    try:
+        assert migrate(engine)
+    finally:
+        close_engine(engine)
+
+    con = sqlite3.connect(path)
+    try:
+        assert con.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        # для точек без владельца создано по одной строке файла учета и дневной записи
+        restored = {table: con.execute(f"SELECT count(*) FROM {table} WHERE comments = ?",
+                                       (RESTORED_COMMENT,)).fetchone()[0] for table in ('count_source', 'id_daily')}
+        assert restored == {'count_source': 1, 'id_daily': 1}
+        for table in tables:
+            expected = counts[table] + restored.get(table, 0)
+            assert con.execute(f"SELECT count(*) FROM {table}").fetchone()[0] == expected, table
+
+        for table, (key, parent) in POINT_TABLES.items():
+            columns, before = rows[table]
+            assert table_rows(con, table, columns) == before, table
+            assert dict((row[1], row[3]) for row in con.execute(f"PRAGMA table_info({table})"))[key] == 1
+            assert con.execute(f"PRAGMA foreign_key_check({table})").fetchall() == []
+            # каждая точка ссылается на владельца со своим естественным ключом
+            match = ' AND '.join(f"p.{c} = c.{c}" for c in (SOURCE_KEY if parent == 'count_source' else DAILY_KEY))
+            linked = con.execute(f"SELECT count(*) FROM {table} c JOIN {parent} p ON p.id = c.{key} AND {match}")
+            assert linked.fetchone()[0] == len(before), table
+
+        # одинаковые координаты в файлах учета, время начала которых различается регистром, - разные точки
+        sources = con.execute("SELECT DISTINCT source_id FROM count_pointscount WHERE iLeft = 1 AND iTop = 1")
+        assert len(sources.fetchall()) == 4
+    finally:
+        con.close()
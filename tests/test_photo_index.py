@@ -0,0 +1,27 @@
+import os
+
+from app.services.photo_index import PhotoIndex
+
+
+def test_root_is_not_rescanned_without_changes(tmp_path):
+    root = tmp_path / "SSL_DB" / "2024_1_cam"
+    (root / "20240601").mkdir(parents=True)
+    (root / "20240601" / "20240601_120000_C1.jpg").write_bytes(b"jpg")
+
+    index = PhotoIndex.for_root(str(root))
+    assert index.day_folders() == ["20240601"]
+    assert [x.name for x in index.day_files("20240601")] == ["20240601_120000_C1.jpg"]
+    mtime = os.stat(root).st_mtime_ns
+
+    # файл кэша не в корне: открытие индекса не меняет время изменения корня
+    con = index.connect()
+    try:
+        assert not index.refresh_dir(con, '')
+        assert not index.refresh_dir(con, '20240601')
+    finally:
+        con.close()
+    assert os.stat(root).st_mtime_ns == mtime
+    assert sorted(os.listdir(root)) == ["20240601"]
+
+    (root / "20240602").mkdir()
+    assert index.day_folders() == ["20240601", "20240602"]
@@ -0,0 +1,39 @@
+from PyQt5.QtCore import QCoreApplication, QEventLoop, QTimer
+
+from app.services.photo_watcher import PhotoTreeWatcher, WATCH_DELAY
+
+
+def run_events(ms):
+    loop = QEventLoop()
+    QTimer.singleShot(ms, loop.quit)
+    loop.exec_()
+
+
+def test_idle_project_is_not_rescanned(tmp_path, monkeypatch):
+    app = QCoreApplication.instance() or QCoreApplication([])  # noqa: F841
+    root = tmp_path / "SSL_DB" / "2024_1_cam"
+    (root / "20240601").mkdir(parents=True)
+
+    updates = []
+    update = PhotoTreeWatcher._update
+    monkeypatch.setattr(PhotoTreeWatcher, "_update",
+                        lambda self, *args: (updates.append(args), update(self, *args)))
+    watcher = PhotoTreeWatcher()
+    changed = []
+    watcher.watcher.directoryChanged.connect(changed.append)
+    added = []
+    watcher.dayAdded.connect(lambda r, day: added.append(day))
+
+    watcher.setRoots([str(root)])
+    run_events(WATCH_DELAY * 4)
+    assert changed == [] and updates == []
+
+    (root / "20240602").mkdir()
+    run_events(WATCH_DELAY * 3)
+    assert added == ["20240602"]
+
+    # после обработки изменения папка снова не пересканируется
+    updates.clear()
+    run_events(WATCH_DELAY * 4)
+    assert updates == []
+    watcher.clear()